@@ -9,6 +9,16 @@ from ee.clickhouse.materialized_columns.analyze import (
     materialize,
 )
 from ee.clickhouse.queries.stickiness import ClickhouseStickiness
+from ee.clickhouse.queries.experiments.funnel_experiment_result import (
+    Variant as FunnelVariant,
+    _calculate_expected_loss,
+    simulate_winning_variant_for_conversion,
+)
+from ee.clickhouse.queries.experiments.trend_experiment_result import (
+    Variant as TrendVariant,
+    poisson_p_value,
+    simulate_winning_variant_for_arrival_rates,
+)
 from ee.clickhouse.queries.funnels.funnel_correlation import FunnelCorrelation
 from posthog.queries.funnels import ClickhouseFunnel
 from posthog.queries.property_values import get_property_values_for_key, get_person_property_values_for_key
@@ -17,12 +27,14 @@ from posthog.queries.session_recordings.session_recording_list import SessionRec
 from ee.clickhouse.queries.retention import ClickhouseRetention
 from posthog.queries.util import get_earliest_timestamp
 from posthog.models import Action, ActionStep, Cohort, Team, Organization
+from posthog.models.element.element import chain_to_elements, chain_to_serialized_elements, parse_elements_chain
 from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.session_recordings_filter import SessionRecordingsFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.filter import Filter
 from posthog.models.property import PropertyName, TableWithProperties
 from posthog.constants import FunnelCorrelationType
+from posthog.client import sync_execute
 
 MATERIALIZED_PROPERTIES: List[Tuple[TableWithProperties, PropertyName]] = [
     ("events", "$host"),
@@ -654,3 +666,67 @@ class QuerySuite:
             )
             cohort.calculate_people_ch(pending_version=0)
         self.cohort = cohort
+
+
+class ExperimentStatisticsSuite:
+    version = "v001"
+
+    def setup(self):
+        self.funnel_variants = [
+            FunnelVariant("control", 1_000, 9_000),
+            FunnelVariant("test_1", 1_100, 8_900),
+            FunnelVariant("test_2", 1_050, 8_950),
+            FunnelVariant("test_3", 980, 9_020),
+        ]
+        self.trend_variants = [
+            TrendVariant("control", 20_000, 1, 50_000),
+            TrendVariant("test_1", 21_000, 1, 50_000),
+            TrendVariant("test_2", 20_500, 1, 50_000),
+        ]
+
+    def time_funnel_probability_of_winning(self):
+        target, *others = self.funnel_variants
+        simulate_winning_variant_for_conversion(target, others)
+
+    def time_funnel_expected_loss(self):
+        # :KLUDGE: Calls the uncached implementation, results are otherwise memoized by variant counts
+        _calculate_expected_loss((1_100, 8_900), ((1_000, 9_000),), use_cache=False)
+
+    def time_trend_probability_of_winning(self):
+        target, *others = self.trend_variants
+        simulate_winning_variant_for_arrival_rates(target, others)
+
+    def time_trend_p_value(self):
+        poisson_p_value(20_000, 1, 21_000, 1, use_cache=False)
+
+
+class ElementsChainSuite:
+    version = "v001"
+
+    def setup(self):
+        # :TRICKY: Data in benchmark servers has ID=2
+        self.chains = [
+            chain
+            for (chain,) in sync_execute(
+                """
+                SELECT elements_chain
+                FROM events
+                WHERE team_id = 2 AND event = '$autocapture' AND elements_chain != ''
+                LIMIT 10000
+                """
+            )
+        ]
+
+    def time_parse_elements_chains(self):
+        parse_elements_chain.cache_clear()
+        for chain in self.chains:
+            chain_to_elements(chain)
+
+    def time_parse_elements_chains_cached(self):
+        for chain in self.chains:
+            chain_to_elements(chain)
+
+    def time_serialize_elements_chains(self):
+        parse_elements_chain.cache_clear()
+        for chain in self.chains:
+            chain_to_serialized_elements(chain)
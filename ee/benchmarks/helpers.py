@@ -1,6 +1,7 @@
 import os
 import sys
 from contextlib import contextmanager
+from datetime import timedelta
 from functools import wraps
 from os.path import dirname
 
@@ -14,7 +15,7 @@ import django  # noqa: E402
 
 django.setup()
 
-from ee.clickhouse.materialized_columns.columns import get_materialized_columns  # noqa: E402
+from ee.clickhouse.materialized_columns.columns import _LocalRegistry, _local_registries  # noqa: E402
 from posthog import client  # noqa: E402
 from posthog.clickhouse.query_tagging import reset_query_tags, tag_queries  # noqa: E402
 from posthog.models.utils import UUIDT  # noqa: E402
@@ -71,6 +72,9 @@ def benchmark_clickhouse(fn):
 @contextmanager
 def no_materialized_columns():
     "Allows running a function without any materialized columns being used in query"
-    get_materialized_columns._cache = {("events",): (now(), {}), ("person",): (now(), {})}
+    # :KLUDGE: Pin empty local registries far into the future so they're never re-read during the benchmark
+    pinned_until = now() + timedelta(days=1)
+    for table in ("events", "person"):
+        _local_registries[table] = _LocalRegistry(version=None, columns={}, loaded_at=pinned_until, checked_at=pinned_until)
     yield
-    get_materialized_columns._cache = {}
+    _local_registries.clear()
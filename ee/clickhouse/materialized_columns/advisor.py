@@ -0,0 +1,242 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+import structlog
+
+from ee.clickhouse.materialized_columns.analyze import Query, Suggestion, TeamManager, _get_queries
+from ee.clickhouse.materialized_columns.columns import ColumnName, _extract_property, get_materialized_columns
+from posthog.client import sync_execute
+from posthog.models.property import PropertyName, TableColumn, TableWithProperties
+from posthog.settings import CLICKHOUSE_DATABASE
+
+logger = structlog.get_logger(__name__)
+
+# Rough share of a query's time spent extracting a property from the JSON blob which materializing it saves.
+# Reading a narrow materialized column is typically several times faster than parsing the whole properties blob.
+EXPECTED_SPEEDUP_RATIO = 0.5
+# ClickHouse compresses short repetitive strings well, this is a conservative estimate of the ratio for LZ4.
+ESTIMATED_COMPRESSION_RATIO = 4
+# Fraction of a day of events read when estimating how much storage a new column would take up.
+STORAGE_ESTIMATE_SAMPLE_RATE = 0.01
+# Number of rows of tables without a sampling key (i.e. person) read when estimating the storage of a new column.
+STORAGE_ESTIMATE_SAMPLE_ROWS = 100_000
+# Avoids free-looking columns (e.g. properties which are rarely set) dominating the ranking.
+MIN_STORAGE_BYTES = 1024 * 1024
+
+CandidateKey = Tuple[TableWithProperties, TableColumn, PropertyName]
+
+
+@dataclass
+class PropertyUsage:
+    query_count: int = 0
+    duration_ms: float = 0
+    read_bytes: int = 0
+    estimated_saved_ms: float = 0
+    team_ids: Set[str] = field(default_factory=set)
+
+
+@dataclass(frozen=True)
+class MaterializationCandidate:
+    table: TableWithProperties
+    table_column: TableColumn
+    property_name: PropertyName
+    query_count: int
+    team_count: int
+    duration_ms: float
+    read_bytes: int
+    estimated_saved_ms: float
+    estimated_storage_bytes: int
+
+    @property
+    def score(self) -> float:
+        "Expected query time saved per GB of storage used"
+        return self.estimated_saved_ms / (max(self.estimated_storage_bytes, MIN_STORAGE_BYTES) / 1024**3)
+
+    @property
+    def suggestion(self) -> Suggestion:
+        return (self.table, self.table_column, self.property_name, int(self.estimated_saved_ms / 1000))
+
+
+@dataclass(frozen=True)
+class UnusedColumn:
+    table: TableWithProperties
+    table_column: TableColumn
+    property_name: PropertyName
+    column_name: ColumnName
+
+
+@dataclass
+class MaterializationPlan:
+    materialize: List[MaterializationCandidate]
+    drop: List[UnusedColumn]
+
+    def log(self) -> None:
+        for candidate in self.materialize:
+            logger.info(
+                "Materialization candidate",
+                table=candidate.table,
+                table_column=candidate.table_column,
+                property_name=candidate.property_name,
+                score=round(candidate.score),
+                query_count=candidate.query_count,
+                team_count=candidate.team_count,
+                estimated_saved_seconds=round(candidate.estimated_saved_ms / 1000),
+                estimated_storage_mb=round(candidate.estimated_storage_bytes / 1024**2),
+            )
+        for column in self.drop:
+            logger.info(
+                "Materialized column is unused and could be dropped",
+                table=column.table,
+                table_column=column.table_column,
+                property_name=column.property_name,
+                column_name=column.column_name,
+            )
+
+
+def advise(since_hours_ago: int, min_query_time: int, backfill_period_days: int) -> MaterializationPlan:
+    """
+    Builds a ranked plan of properties worth materializing and materialized columns which are no longer used.
+
+    Property accesses are parsed out of slow queries in `system.query_log` and aggregated per property, then
+    weighed against an estimate of how much storage each new column would take up.
+    """
+    usage = aggregate_property_usage(_get_queries(since_hours_ago, min_query_time))
+
+    already_materialized = {
+        (table, table_column, property_name)
+        for table in ("events", "person")
+        for property_name, table_column in get_materialized_columns(table, use_cache=False)
+    }
+    for key in already_materialized:
+        usage.pop(key, None)
+
+    storage = estimate_storage_bytes(list(usage.keys()), backfill_period_days)
+
+    candidates = [
+        MaterializationCandidate(
+            table=table,
+            table_column=table_column,
+            property_name=property_name,
+            query_count=property_usage.query_count,
+            team_count=len(property_usage.team_ids),
+            duration_ms=property_usage.duration_ms,
+            read_bytes=property_usage.read_bytes,
+            estimated_saved_ms=property_usage.estimated_saved_ms,
+            estimated_storage_bytes=storage.get((table, table_column, property_name), 0),
+        )
+        for (table, table_column, property_name), property_usage in usage.items()
+    ]
+    candidates.sort(key=lambda candidate: -candidate.score)
+
+    return MaterializationPlan(materialize=candidates, drop=find_unused_columns(since_hours_ago))
+
+
+def aggregate_property_usage(queries: List[Query]) -> Dict[CandidateKey, PropertyUsage]:
+    team_manager = TeamManager()
+    usage: Dict[CandidateKey, PropertyUsage] = defaultdict(PropertyUsage)
+
+    for query in queries:
+        if not query.is_valid:
+            continue
+
+        keys = set(query.properties(team_manager))
+        if len(keys) == 0:
+            continue
+
+        # :TRICKY: A query only stops reading the JSON blob once all of its properties are materialized, so the
+        #   expected saving is split between them.
+        saved_ms = query.query_time_ms * EXPECTED_SPEEDUP_RATIO / len(keys)
+        for key in keys:
+            property_usage = usage[key]
+            property_usage.query_count += 1
+            property_usage.duration_ms += query.query_time_ms
+            property_usage.read_bytes += query.read_bytes
+            property_usage.estimated_saved_ms += saved_ms
+            property_usage.team_ids.add(str(query.team_id))
+
+    return usage
+
+
+def estimate_storage_bytes(keys: List[CandidateKey], backfill_period_days: int) -> Dict[CandidateKey, int]:
+    "Estimates the compressed size of each candidate column by measuring a sample of property values"
+    properties_by_source: Dict[Tuple[TableWithProperties, TableColumn], List[PropertyName]] = defaultdict(list)
+    for table, table_column, property_name in keys:
+        properties_by_source[(table, table_column)].append(property_name)
+
+    result = {}
+    for (table, table_column), properties in properties_by_source.items():
+        if table == "events":
+            rows = sync_execute(
+                f"""
+                SELECT sumForEach(arrayMap(property -> length(JSONExtractRaw({table_column}, property)), %(properties)s))
+                FROM events SAMPLE %(sample_rate)s
+                WHERE timestamp > now() - toIntervalDay(1)
+                """,
+                {"properties": properties, "sample_rate": STORAGE_ESTIMATE_SAMPLE_RATE},
+            )
+            multiplier = max(backfill_period_days, 1) / STORAGE_ESTIMATE_SAMPLE_RATE
+        else:
+            # :TRICKY: person has no sampling key, so the first rows found are measured and scaled up to the table
+            rows = sync_execute(
+                f"""
+                SELECT
+                    sumForEach(arrayMap(property -> length(JSONExtractRaw({table_column}, property)), %(properties)s)),
+                    count(),
+                    (SELECT count() FROM {table})
+                FROM (SELECT {table_column} FROM {table} LIMIT %(sample_rows)s)
+                """,
+                {"properties": properties, "sample_rows": STORAGE_ESTIMATE_SAMPLE_ROWS},
+            )
+            sampled_rows, total_rows = (rows[0][1], rows[0][2]) if rows else (0, 0)
+            multiplier = total_rows / sampled_rows if sampled_rows else 1
+
+        sizes = rows[0][0] if rows and rows[0][0] else [0] * len(properties)
+        for property_name, size in zip(properties, sizes):
+            result[(table, table_column, property_name)] = int(size * multiplier / ESTIMATED_COMPRESSION_RATIO)
+
+    return result
+
+
+def find_unused_columns(since_hours_ago: int) -> List[UnusedColumn]:
+    """
+    Returns materialized columns which no query has referenced by name within the period. Queries extracting the
+    property from the JSON blob instead don't count, as dropping the column doesn't affect them.
+    """
+    rows = sync_execute(
+        """
+        SELECT table, name, comment
+        FROM system.columns
+        WHERE database = %(database)s
+          AND table IN ('events', 'person')
+          AND comment LIKE '%%column_materializer::%%'
+        """,
+        {"database": CLICKHOUSE_DATABASE},
+    )
+    if len(rows) == 0:
+        return []
+
+    column_names = [column_name for _, column_name, _ in rows]
+    used_rows = sync_execute(
+        """
+        SELECT column_name
+        FROM system.query_log
+        ARRAY JOIN %(column_names)s AS column_name
+        WHERE
+            query NOT LIKE '%%query_log%%'
+            AND query NOT LIKE '%%system.columns%%'
+            AND type = 'QueryFinish'
+            AND query_start_time > now() - toIntervalHour(%(since)s)
+            AND position(query, column_name) > 0
+        GROUP BY column_name
+        """,
+        {"column_names": column_names, "since": since_hours_ago},
+    )
+    used_column_names = {column_name for (column_name,) in used_rows}
+
+    unused = []
+    for table, column_name, comment in rows:
+        if column_name not in used_column_names:
+            property_name, table_column = _extract_property(comment)
+            unused.append(UnusedColumn(table, table_column, property_name, column_name))
+    return unused
@@ -1,5 +1,4 @@
 import re
-from collections import defaultdict
 from datetime import timedelta
 from typing import Dict, Generator, List, Optional, Set, Tuple
 
@@ -58,11 +57,86 @@ class TeamManager:
         return set(name for name, _ in rows)
 
 
+JSON_EXTRACT_FUNCTION_REGEX = re.compile(r"JSONExtract\w*\(")
+
+
+def extract_property_accesses(query_string: str) -> List[Tuple[str, PropertyName]]:
+    """
+    Finds `JSONExtract*(column, 'property', ...)` calls in a query, returning (column expression, property) pairs.
+
+    Unlike a plain regex this copes with nested function calls in the column argument, extra arguments after the
+    property name (e.g. return types) and escaped quotes in property names.
+    """
+    accesses = []
+    for match in JSON_EXTRACT_FUNCTION_REGEX.finditer(query_string):
+        column_expression, index = _read_argument(query_string, match.end())
+        if index >= len(query_string) or query_string[index] != "," or not column_expression:
+            continue
+        index += 1
+        while index < len(query_string) and query_string[index].isspace():
+            index += 1
+        property_name = _read_string_literal(query_string, index)
+        if property_name is not None:
+            accesses.append((column_expression, property_name))
+    return accesses
+
+
+def _read_argument(query_string: str, index: int) -> Tuple[str, int]:
+    "Reads a function argument up to the next top-level comma or closing bracket"
+    start, depth = index, 0
+    while index < len(query_string):
+        char = query_string[index]
+        if char == "'":
+            literal_end = _string_literal_end(query_string, index)
+            if literal_end is None:
+                break
+            index = literal_end
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == "," and depth == 0:
+            break
+        index += 1
+    return query_string[start:index].strip(), index
+
+
+def _string_literal_end(query_string: str, index: int) -> Optional[int]:
+    index += 1
+    while index < len(query_string):
+        if query_string[index] == "\\":
+            index += 2
+        elif query_string[index] == "'":
+            return index + 1
+        else:
+            index += 1
+    return None
+
+
+def _read_string_literal(query_string: str, index: int) -> Optional[str]:
+    if index >= len(query_string) or query_string[index] != "'":
+        return None
+    end = _string_literal_end(query_string, index)
+    if end is None:
+        return None
+    return re.sub(r"\\(.)", r"\1", query_string[index + 1 : end - 1])
+
+
 class Query:
-    def __init__(self, query_string: str, query_time_ms: float, min_query_time=MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME):
+    def __init__(
+        self,
+        query_string: str,
+        query_time_ms: float,
+        min_query_time=MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME,
+        read_bytes: int = 0,
+    ):
         self.query_string = query_string
         self.query_time_ms = query_time_ms
         self.min_query_time = min_query_time
+        self.read_bytes = read_bytes
 
     @property
     def cost(self) -> int:
@@ -79,7 +153,7 @@ class Query:
 
     @cached_property
     def _all_properties(self) -> List[Tuple[str, PropertyName]]:
-        return re.findall(r"JSONExtract\w+\((\S+), '([^']+)'\)", self.query_string)
+        return extract_property_accesses(self.query_string)
 
     def properties(
         self, team_manager: TeamManager
@@ -123,7 +197,8 @@ def _get_queries(since_hours_ago: int, min_query_time: int) -> List[Query]:
         f"""
         SELECT
             query,
-            query_duration_ms
+            query_duration_ms,
+            read_bytes
         FROM system.query_log
         WHERE
             query NOT LIKE '%%query_log%%'
@@ -136,29 +211,9 @@ def _get_queries(since_hours_ago: int, min_query_time: int) -> List[Query]:
         """,
         {"since": since_hours_ago, "min_query_time": min_query_time},
     )
-    return [Query(query, query_duration_ms, min_query_time) for query, query_duration_ms in raw_queries]
-
-
-def _analyze(queries: List[Query]) -> List[Suggestion]:
-    """
-    Analyzes query history to find which properties could get materialized.
-
-    Returns an ordered list of suggestions by cost.
-    """
-
-    team_manager = TeamManager()
-    costs: defaultdict = defaultdict(int)
-
-    for query in queries:
-        if not query.is_valid:
-            continue
-
-        for table, table_column, property in query.properties(team_manager):
-            costs[(table, table_column, property)] += query.cost
-
     return [
-        (table, table_column, property_name, cost)
-        for (table, table_column, property_name), cost in sorted(costs.items(), key=lambda kv: -kv[1])
+        Query(query, query_duration_ms, min_query_time, read_bytes=read_bytes)
+        for query, query_duration_ms, read_bytes in raw_queries
     ]
 
 
@@ -173,9 +228,12 @@ def materialize_properties_task(
     """
     Creates materialized columns for event and person properties based off of slow queries
     """
+    from ee.clickhouse.materialized_columns.advisor import advise
 
     if columns_to_materialize is None:
-        columns_to_materialize = _analyze(_get_queries(time_to_analyze_hours, min_query_time))
+        plan = advise(time_to_analyze_hours, min_query_time, backfill_period_days)
+        plan.log()
+        columns_to_materialize = [candidate.suggestion for candidate in plan.materialize]
     result = []
     for suggestion in columns_to_materialize:
         table, table_column, property_name, _ = suggestion
@@ -1,18 +1,24 @@
+import json
 import re
-from datetime import timedelta
-from typing import Dict, List, Literal, Tuple, Union, cast
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Literal, Optional, Tuple, Union, cast
 
+import structlog
 from clickhouse_driver.errors import ServerException
 from django.utils.timezone import now
+from redis.exceptions import RedisError
 
-from posthog.cache_utils import cache_for
 from posthog.clickhouse.kafka_engine import trim_quotes_expr
 from posthog.client import sync_execute
 from posthog.models.instance_setting import get_instance_setting
 from posthog.models.property import PropertyName, TableColumn, TableWithProperties
 from posthog.models.utils import generate_random_short_suffix
+from posthog.redis import get_client
 from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE, TEST
 
+logger = structlog.get_logger(__name__)
+
 ColumnName = str
 DEFAULT_TABLE_COLUMN: Literal["properties"] = "properties"
 
@@ -33,11 +39,127 @@ SHORT_TABLE_COLUMN_NAME = {
 }
 
 
-@cache_for(timedelta(minutes=15))
+# Materialized columns per table are shared between processes through a Redis hash holding the raw column list
+# and a version which is bumped whenever the columns change. Processes keep a local copy and only re-read it
+# when the version changes, so new columns get used within seconds without every process querying
+# `system.columns` on its own. The hash expires after REGISTRY_MAX_AGE and is then seeded from ClickHouse again, which
+# picks up columns changed outside of this module, e.g. by migrations or by hand. Only the process holding the seed lock
+# queries ClickHouse for that, the others keep using their local copy until the new hash is in place.
+MATERIALIZED_COLUMNS_REGISTRY_KEY = "materialized_columns_registry:{table}"
+MATERIALIZED_COLUMNS_REGISTRY_SEED_LOCK_KEY = "materialized_columns_registry_seed_lock:{table}"
+# How often the shared version is checked for changes
+REGISTRY_VERSION_CHECK_INTERVAL = timedelta(seconds=5)
+# How long a local copy is used before being re-read regardless, e.g. to pick up MATERIALIZED_COLUMNS_ENABLED changes
+# or when redis is not reachable
+REGISTRY_MAX_AGE = timedelta(minutes=15)
+# How long other processes wait for the registry to be seeded before one of them tries again
+REGISTRY_SEED_LOCK_TIMEOUT = timedelta(seconds=30)
+
+
+@dataclass
+class _LocalRegistry:
+    version: Optional[int]
+    columns: Dict[Tuple[PropertyName, TableColumn], ColumnName]
+    loaded_at: datetime
+    checked_at: datetime
+
+
+_local_registries: Dict[TablesWithMaterializedColumns, _LocalRegistry] = {}
+
+
 def get_materialized_columns(
-    table: TablesWithMaterializedColumns,
+    table: TablesWithMaterializedColumns, use_cache: bool = not TEST
 ) -> Dict[Tuple[PropertyName, TableColumn], ColumnName]:
-    rows = sync_execute(
+    if not use_cache:
+        return _to_materialized_columns(_fetch_materialized_column_rows(table))
+
+    current_time = now()
+    local = _local_registries.get(table)
+    if local is not None and current_time - local.checked_at < REGISTRY_VERSION_CHECK_INTERVAL:
+        return local.columns
+
+    try:
+        local = _load_registry(table, local, current_time)
+    except RedisError as err:
+        logger.warn("Could not read materialized columns registry", table=table, error=err)
+        if local is None or current_time - local.loaded_at > REGISTRY_MAX_AGE:
+            columns = _to_materialized_columns(_fetch_materialized_column_rows(table))
+            local = _LocalRegistry(version=None, columns=columns, loaded_at=current_time, checked_at=current_time)
+        else:
+            local.checked_at = current_time
+
+    _local_registries[table] = local
+    return local.columns
+
+
+def publish_materialized_columns(table: TablesWithMaterializedColumns) -> None:
+    "Re-reads the materialized columns for a table from ClickHouse and notifies all processes of the change"
+    rows = _fetch_materialized_column_rows(table)
+    _local_registries.pop(table, None)
+
+    try:
+        pipeline = get_client().pipeline(transaction=True)
+        pipeline.hset(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table=table), "columns", json.dumps(rows))
+        pipeline.hincrby(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table=table), "version", 1)
+        pipeline.expire(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table=table), REGISTRY_MAX_AGE)
+        pipeline.execute()
+    except RedisError as err:
+        logger.warn("Could not publish materialized columns registry", table=table, error=err)
+
+
+def _load_registry(
+    table: TablesWithMaterializedColumns, local: Optional[_LocalRegistry], current_time: datetime
+) -> _LocalRegistry:
+    client = get_client()
+    key = MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table=table)
+
+    raw_version = client.hget(key, "version")
+    version = int(raw_version) if raw_version is not None else None
+    if (
+        local is not None
+        and version is not None
+        and local.version == version
+        and current_time - local.loaded_at < REGISTRY_MAX_AGE
+    ):
+        local.checked_at = current_time
+        return local
+
+    version, raw_rows = client.hmget(key, ["version", "columns"])
+    if raw_rows is None:
+        if not client.set(
+            MATERIALIZED_COLUMNS_REGISTRY_SEED_LOCK_KEY.format(table=table), 1, nx=True, ex=REGISTRY_SEED_LOCK_TIMEOUT
+        ):
+            # another process is seeding the registry
+            if local is not None:
+                local.checked_at = current_time
+                return local
+            rows = _fetch_materialized_column_rows(table)
+            return _LocalRegistry(
+                version=None, columns=_to_materialized_columns(rows), loaded_at=current_time, checked_at=current_time
+            )
+
+        # :TRICKY: Registry has never been populated (e.g. fresh redis) or has expired, so seed it from ClickHouse.
+        #   The version is seeded from the clock, so that it differs from the one of the expired registry.
+        rows = _fetch_materialized_column_rows(table)
+        pipeline = client.pipeline(transaction=True)
+        pipeline.hsetnx(key, "columns", json.dumps(rows))
+        pipeline.hsetnx(key, "version", int(current_time.timestamp() * 1000))
+        pipeline.expire(key, REGISTRY_MAX_AGE)
+        pipeline.hget(key, "version")
+        *_, version = pipeline.execute()
+    else:
+        rows = [tuple(row) for row in json.loads(raw_rows)]
+
+    return _LocalRegistry(
+        version=int(version) if version is not None else None,
+        columns=_to_materialized_columns(rows),
+        loaded_at=current_time,
+        checked_at=current_time,
+    )
+
+
+def _fetch_materialized_column_rows(table: TablesWithMaterializedColumns) -> List[Tuple[str, ColumnName]]:
+    return sync_execute(
         """
         SELECT comment, name
         FROM system.columns
@@ -47,6 +169,11 @@ def get_materialized_columns(
     """,
         {"database": CLICKHOUSE_DATABASE, "table": table},
     )
+
+
+def _to_materialized_columns(
+    rows: List[Tuple[str, ColumnName]]
+) -> Dict[Tuple[PropertyName, TableColumn], ColumnName]:
     if rows and get_instance_setting("MATERIALIZED_COLUMNS_ENABLED"):
         return {_extract_property(comment): column_name for comment, column_name in rows}
     else:
@@ -114,6 +241,8 @@ def materialize(
     if create_minmax_index:
         add_minmax_index(table, column_name)
 
+    publish_materialized_columns(table)
+
 
 def add_minmax_index(table: TablesWithMaterializedColumns, column_name: str):
     # Note: This will be populated on backfill
@@ -192,6 +321,8 @@ def backfill_materialized_columns(
         settings=test_settings,
     )
 
+    publish_materialized_columns(table)
+
 
 def _materialized_column_name(
     table: TableWithProperties, property: PropertyName, table_column: TableColumn = DEFAULT_TABLE_COLUMN
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+from ee.clickhouse.materialized_columns.advisor import (
+    EXPECTED_SPEEDUP_RATIO,
+    MaterializationCandidate,
+    aggregate_property_usage,
+    advise,
+    estimate_storage_bytes,
+    find_unused_columns,
+)
+from ee.clickhouse.materialized_columns.analyze import Query
+from ee.clickhouse.materialized_columns.columns import materialize
+from posthog.models import PropertyDefinition
+from posthog.test.base import BaseTest, ClickhouseTestMixin, _create_person, flush_persons_and_events
+
+
+class TestMaterializedColumnsAdvisor(ClickhouseTestMixin, BaseTest):
+    def setUp(self):
+        super().setUp()
+        PropertyDefinition.objects.create(team=self.team, name="$browser")
+        PropertyDefinition.objects.create(team=self.team, name="$os")
+
+    def test_aggregate_property_usage(self):
+        queries = [
+            Query(
+                f"SELECT JSONExtractString(properties, '$browser') FROM events WHERE team_id = {self.team.pk}",
+                4000,
+                read_bytes=100,
+            ),
+            Query(
+                f"""
+                SELECT JSONExtractString(properties, '$browser'), JSONExtractString(properties, '$os')
+                FROM events WHERE team_id = {self.team.pk}
+                """,
+                6000,
+                read_bytes=300,
+            ),
+            Query("SELECT JSONExtractString(properties, '$browser') FROM events WHERE team_id = -1", 9000),
+        ]
+
+        usage = aggregate_property_usage(queries)
+
+        self.assertEqual(set(usage.keys()), {("events", "properties", "$browser"), ("events", "properties", "$os")})
+
+        browser = usage[("events", "properties", "$browser")]
+        self.assertEqual(browser.query_count, 2)
+        self.assertEqual(browser.duration_ms, 10000)
+        self.assertEqual(browser.read_bytes, 400)
+        self.assertEqual(browser.estimated_saved_ms, (4000 + 6000 / 2) * EXPECTED_SPEEDUP_RATIO)
+        self.assertEqual(browser.team_ids, {str(self.team.pk)})
+
+        os = usage[("events", "properties", "$os")]
+        self.assertEqual(os.query_count, 1)
+        self.assertEqual(os.estimated_saved_ms, 6000 / 2 * EXPECTED_SPEEDUP_RATIO)
+
+    def test_candidate_score_prefers_cheap_columns(self):
+        cheap = MaterializationCandidate("events", "properties", "a", 1, 1, 1000, 0, 1000, 10 * 1024**2)
+        expensive = MaterializationCandidate("events", "properties", "b", 1, 1, 1000, 0, 1000, 100 * 1024**2)
+
+        self.assertGreater(cheap.score, expensive.score)
+        self.assertEqual(cheap.suggestion, ("events", "properties", "a", 1))
+
+    def test_advise_skips_materialized_columns(self):
+        materialize("events", "$os")
+        queries = [
+            Query(
+                f"""
+                SELECT JSONExtractString(properties, '$browser'), JSONExtractString(properties, '$os')
+                FROM events WHERE team_id = {self.team.pk}
+                """,
+                6000,
+            )
+        ]
+
+        with patch("ee.clickhouse.materialized_columns.advisor._get_queries", return_value=queries):
+            plan = advise(since_hours_ago=24, min_query_time=3000, backfill_period_days=90)
+
+        self.assertEqual(
+            [(candidate.table, candidate.property_name) for candidate in plan.materialize], [("events", "$browser")]
+        )
+
+    @patch("ee.clickhouse.materialized_columns.advisor.STORAGE_ESTIMATE_SAMPLE_ROWS", 1)
+    def test_estimate_storage_bytes_samples_person_table(self):
+        _create_person(team=self.team, distinct_ids=["1"], properties={"$browser": "Chrome"})
+        _create_person(team=self.team, distinct_ids=["2"], properties={"$browser": "Chrome"})
+        flush_persons_and_events()
+
+        storage = estimate_storage_bytes([("person", "properties", "$browser")], backfill_period_days=90)
+
+        # one row of len('"Chrome"') bytes is measured and scaled up to both rows
+        self.assertEqual(storage, {("person", "properties", "$browser"): 4})
+
+    def test_find_unused_columns(self):
+        materialize("events", "$browser")
+
+        unused = find_unused_columns(since_hours_ago=24)
+
+        self.assertIn(("events", "properties", "$browser"), [(c.table, c.table_column, c.property_name) for c in unused])
@@ -1,4 +1,4 @@
-from ee.clickhouse.materialized_columns.analyze import Query, TeamManager
+from ee.clickhouse.materialized_columns.analyze import Query, TeamManager, extract_property_accesses
 from posthog.clickhouse.kafka_engine import trim_quotes_expr
 from posthog.models import Person, PropertyDefinition
 from posthog.models.event.util import bulk_create_events
@@ -121,3 +121,18 @@ class TestMaterializedColumnsAnalyze(ClickhouseTestMixin, BaseTest):
             f"SELECT JSONExtractString(, 'prop') FROM events WHERE team_id = {self.team.pk}", 3340
         )
         self.assertEqual(list(query_with_invalid_column.properties(TeamManager())), [])
+
+    def test_extract_property_accesses(self):
+        escaped_property_expr = trim_quotes_expr("JSONExtractRaw(e.person_properties, 'it\\'s')")
+        self.assertEqual(
+            extract_property_accesses(
+                f"""
+                SELECT
+                    JSONExtract(ifNull(properties, '{{}}'), 'typed_prop', 'Nullable(String)'),
+                    {escaped_property_expr}
+                FROM events e
+                WHERE JSONExtractString(, 'broken') = '' AND JSONHas(properties, 'ignored')
+                """
+            ),
+            [("ifNull(properties, '{}')", "typed_prop"), ("e.person_properties", "it's")],
+        )
@@ -1,18 +1,27 @@
 import random
 from datetime import timedelta
 from time import sleep
+from unittest.mock import patch
 
+from django.utils.timezone import now
 from freezegun import freeze_time
+from redis.exceptions import RedisError
 
 from ee.clickhouse.materialized_columns.columns import (
+    MATERIALIZED_COLUMNS_REGISTRY_KEY,
+    MATERIALIZED_COLUMNS_REGISTRY_SEED_LOCK_KEY,
+    REGISTRY_MAX_AGE,
+    REGISTRY_VERSION_CHECK_INTERVAL,
     backfill_materialized_columns,
     get_materialized_columns,
     materialize,
+    publish_materialized_columns,
 )
 from posthog.client import sync_execute
 from posthog.conftest import create_clickhouse_tables
 from posthog.constants import GROUP_TYPES_LIMIT
 from posthog.models.event.sql import EVENTS_DATA_TABLE
+from posthog.redis import get_client
 from posthog.settings import CLICKHOUSE_DATABASE
 from posthog.test.base import BaseTest, ClickhouseTestMixin, _create_event
 
@@ -68,19 +77,68 @@ class TestMaterializedColumns(ClickhouseTestMixin, BaseTest):
             )
             self.assertCountEqual(get_materialized_columns("person", use_cache=True).keys(), [("$zeta", "properties")])
 
+            # Materializing publishes the change, so it's picked up straight away
             materialize("events", "abc", create_minmax_index=True)
 
-            self.assertCountEqual(
-                [property_name for property_name, _ in get_materialized_columns("events", use_cache=True).keys()],
-                ["$foo", "$bar", *EVENTS_TABLE_DEFAULT_MATERIALIZED_COLUMNS],
-            )
-
-        with freeze_time("2020-01-04T14:00:01Z"):
             self.assertCountEqual(
                 [property_name for property_name, _ in get_materialized_columns("events", use_cache=True).keys()],
                 ["$foo", "$bar", "abc", *EVENTS_TABLE_DEFAULT_MATERIALIZED_COLUMNS],
             )
 
+    def test_caching_picks_up_changes_published_by_other_processes(self):
+        with freeze_time("2020-01-04T13:01:01Z") as frozen_time:
+            publish_materialized_columns("events")
+            self.assertNotIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+
+            # Simulate another process materializing a column
+            with patch("ee.clickhouse.materialized_columns.columns._local_registries", {}):
+                materialize("events", "$foo", create_minmax_index=True)
+
+            self.assertNotIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+
+            frozen_time.tick(REGISTRY_VERSION_CHECK_INTERVAL + timedelta(seconds=1))
+
+            with self.capture_select_queries() as queries:
+                self.assertIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+            self.assertFalse(any("system.columns" in query for query in queries))
+
+    def test_caching_picks_up_columns_changed_outside_of_materialize_once_registry_expires(self):
+        publish_materialized_columns("events")
+        self.assertNotIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+        self.assertGreater(get_client().ttl(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table="events")), 0)
+
+        # Simulate a column being added by a migration, which doesn't publish the change
+        with patch("ee.clickhouse.materialized_columns.columns.publish_materialized_columns"):
+            materialize("events", "$foo", create_minmax_index=True)
+
+        # Simulate the registry expiring
+        get_client().delete(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table="events"))
+        with freeze_time(now() + REGISTRY_MAX_AGE + timedelta(seconds=1)):
+            self.assertIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+        self.assertGreater(get_client().ttl(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table="events")), 0)
+
+    def test_only_one_process_seeds_an_expired_registry(self):
+        publish_materialized_columns("events")
+        get_materialized_columns("events", use_cache=True)
+
+        # Simulate the registry expiring while another process is seeding it
+        get_client().delete(MATERIALIZED_COLUMNS_REGISTRY_KEY.format(table="events"))
+        get_client().set(MATERIALIZED_COLUMNS_REGISTRY_SEED_LOCK_KEY.format(table="events"), 1)
+        try:
+            with freeze_time(now() + REGISTRY_MAX_AGE + timedelta(seconds=1)):
+                with self.capture_select_queries() as queries:
+                    get_materialized_columns("events", use_cache=True)
+                self.assertFalse(any("system.columns" in query for query in queries))
+        finally:
+            get_client().delete(MATERIALIZED_COLUMNS_REGISTRY_SEED_LOCK_KEY.format(table="events"))
+
+    def test_caching_falls_back_to_clickhouse_without_redis(self):
+        materialize("events", "$foo", create_minmax_index=True)
+
+        with patch("ee.clickhouse.materialized_columns.columns.get_client", side_effect=RedisError()):
+            with patch("ee.clickhouse.materialized_columns.columns._local_registries", {}):
+                self.assertIn(("$foo", "properties"), get_materialized_columns("events", use_cache=True))
+
     def test_materialized_column_naming(self):
         random.seed(0)
 
@@ -8,3 +8,7 @@ FF_DISTRIBUTION_THRESHOLD = 100
 # If probability of a variant is below this threshold, it will be considered
 # insignificant
 MIN_PROBABILITY_FOR_SIGNIFICANCE = 0.9
+
+# Number of distinct sets of variant counts for which simulated statistics are remembered, so that refreshing an
+# experiment whose results haven't changed doesn't re-run the simulations
+EXPERIMENT_STATISTICS_CACHE_SIZE = 1000
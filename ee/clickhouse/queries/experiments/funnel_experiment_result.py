@@ -1,16 +1,20 @@
 from dataclasses import asdict, dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Tuple, Type
 
+import numpy as np
 import pytz
-from numpy.random import default_rng
+from numpy.random import Generator, default_rng
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.experiments import (
     CONTROL_VARIANT_KEY,
+    EXPERIMENT_STATISTICS_CACHE_SIZE,
     FF_DISTRIBUTION_THRESHOLD,
     MIN_PROBABILITY_FOR_SIGNIFICANCE,
 )
+from ee.clickhouse.queries.experiments.statistics import SIMULATIONS_COUNT, expected_loss, probabilities_of_winning
+from posthog.cache_utils import cache_for
 from posthog.constants import ExperimentSignificanceCode
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.filters.filter import Filter
@@ -18,6 +22,8 @@ from posthog.models.team import Team
 from posthog.queries.funnels import ClickhouseFunnel
 
 Probability = float
+# (success count, failure count), which is all the statistics depend on
+VariantCounts = Tuple[int, int]
 
 
 @dataclass(frozen=True)
@@ -198,58 +204,19 @@ def calculate_expected_loss(target_variant: Variant, variants: List[Variant]) ->
     The unit of the return value is conversion rate values
 
     """
-    random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success, variant.failure_count + prior_failure, simulations_count
-        )
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success, target_variant.failure_count + prior_failure, simulations_count
-    )
-
-    loss = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        loss += max(0, max(variant_conversions[i]) - target_variant_samples[i])
+    return _calculate_expected_loss(_counts(target_variant), tuple(map(_counts, variants)))
 
-    return loss / simulations_count
 
-
-def simulate_winning_variant_for_conversion(target_variant: Variant, variants: List[Variant]) -> Probability:
+@cache_for(timedelta(minutes=30), maxsize=EXPERIMENT_STATISTICS_CACHE_SIZE)
+def _calculate_expected_loss(target_counts: VariantCounts, variants_counts: Tuple[VariantCounts, ...]) -> float:
     random_sampler = default_rng()
-    prior_success = 1
-    prior_failure = 1
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Beta distribution with alpha = prior_success + variant_sucess,
-        # and beta = prior_failure + variant_failure
-        samples = random_sampler.beta(
-            variant.success_count + prior_success, variant.failure_count + prior_failure, simulations_count
-        )
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.beta(
-        target_variant.success_count + prior_success, target_variant.failure_count + prior_failure, simulations_count
-    )
+    target_variant_samples = _sample_conversion_rates(random_sampler, (target_counts,))[0]
+    return expected_loss(target_variant_samples, _sample_conversion_rates(random_sampler, variants_counts))
 
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
 
-    return winnings / simulations_count
+def simulate_winning_variant_for_conversion(target_variant: Variant, variants: List[Variant]) -> Probability:
+    samples = _sample_conversion_rates(default_rng(), (_counts(target_variant), *map(_counts, variants)))
+    return probabilities_of_winning(samples)[0]
 
 
 def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
@@ -259,11 +226,31 @@ def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[P
     if len(variants) > 10:
         raise ValidationError("Can't calculate A/B test results for more than 10 variants", code="too_much_data")
 
-    probabilities = []
-    # simulate winning for each test variant
-    for index, variant in enumerate(variants):
-        probabilities.append(simulate_winning_variant_for_conversion(variant, variants[:index] + variants[index + 1 :]))
+    return list(_calculate_probability_of_winning_for_each(tuple(map(_counts, variants))))
+
+
+@cache_for(timedelta(minutes=30), maxsize=EXPERIMENT_STATISTICS_CACHE_SIZE)
+def _calculate_probability_of_winning_for_each(variants_counts: Tuple[VariantCounts, ...]) -> Tuple[Probability, ...]:
+    # All variants are compared on the same simulations, rather than sampling every variant again per variant
+    probabilities = probabilities_of_winning(_sample_conversion_rates(default_rng(), variants_counts))
 
     total_test_probabilities = sum(probabilities[1:])
 
-    return [max(0, 1 - total_test_probabilities), *probabilities[1:]]
+    return (max(0, 1 - total_test_probabilities), *probabilities[1:])
+
+
+def _sample_conversion_rates(random_sampler: Generator, variants_counts: Tuple[VariantCounts, ...]) -> np.ndarray:
+    """
+    Returns a matrix with a row of `SIMULATIONS_COUNT` conversion rate samples per variant, drawn from a Beta
+    distribution with alpha = prior_success + variant_success and beta = prior_failure + variant_failure
+    """
+    prior_success = 1
+    prior_failure = 1
+
+    alphas = np.array([success_count + prior_success for success_count, _ in variants_counts], dtype=np.float64)
+    betas = np.array([failure_count + prior_failure for _, failure_count in variants_counts], dtype=np.float64)
+    return random_sampler.beta(alphas[:, np.newaxis], betas[:, np.newaxis], (len(variants_counts), SIMULATIONS_COUNT))
+
+
+def _counts(variant: Variant) -> VariantCounts:
+    return (variant.success_count, variant.failure_count)
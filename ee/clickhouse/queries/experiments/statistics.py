@@ -0,0 +1,62 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Number of draws from each variant's posterior used to estimate probabilities and losses
+SIMULATIONS_COUNT = 100_000
+# Number of binomial terms held in memory at a time when summing binomial tails
+BINOMIAL_CHUNK_SIZE = 100_000
+
+
+def probabilities_of_winning(samples: np.ndarray) -> List[float]:
+    """
+    Given a matrix of posterior samples with one row per variant and one column per simulation, returns for each
+    variant the fraction of simulations in which its sample is strictly greater than every other variant's.
+    """
+    variants_count, simulations_count = samples.shape
+    if variants_count == 1:
+        return [1.0]
+
+    winners = samples.argmax(axis=0)
+    # :TRICKY: Ties don't count as a win for anyone, which matches comparing each variant against the max of the rest
+    top_two = np.partition(samples, variants_count - 2, axis=0)[variants_count - 2 :]
+    has_winner = top_two[1] > top_two[0]
+
+    wins = np.bincount(winners[has_winner], minlength=variants_count)
+    return [float(count) / simulations_count for count in wins]
+
+
+def expected_loss(target_samples: np.ndarray, other_samples: np.ndarray) -> float:
+    """
+    Mean amount by which the best of `other_samples` (one row per variant) exceeds `target_samples` per simulation,
+    counting simulations where the target is best as zero loss.
+    """
+    return float(np.maximum(other_samples.max(axis=0) - target_samples, 0).mean())
+
+
+def log_binomial_coefficients(n: int, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+    "Returns log(n choose k) for every k from `start` up to but excluding `stop`, which defaults to n + 1"
+    stop = n + 1 if stop is None else stop
+    first = math.lgamma(n + 1) - math.lgamma(start + 1) - math.lgamma(n - start + 1)
+    k = np.arange(start + 1, stop, dtype=np.float64)
+    return np.concatenate(([first], first + np.cumsum(np.log(n - k + 1) - np.log(k))))
+
+
+def binomial_tail_probabilities(n: int, k: int, p: float) -> Tuple[float, float]:
+    """
+    Returns P(X <= k) and P(X >= k) for X ~ Binomial(n, p), summing the terms in log-space so that large counts
+    don't overflow. Terms are computed BINOMIAL_CHUNK_SIZE at a time, so memory use doesn't grow with n.
+    """
+    low, high = 0.0, 0.0
+    for start in range(0, n + 1, BINOMIAL_CHUNK_SIZE):
+        stop = min(start + BINOMIAL_CHUNK_SIZE, n + 1)
+        i = np.arange(start, stop, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # :TRICKY: 0 * log(0) is nan, but p^0 is 1 even when p is 0
+            log_successes = np.where(i > 0, i * np.log(p), 0.0)
+            log_failures = np.where(n - i > 0, (n - i) * np.log1p(-p), 0.0)
+        terms = np.exp(log_binomial_coefficients(n, start, stop) + log_successes + log_failures)
+        low += float(terms[: max(k + 1 - start, 0)].sum())
+        high += float(terms[max(k - start, 0) :].sum())
+    return low, high
@@ -0,0 +1,60 @@
+import unittest
+from math import exp, lgamma, log
+from unittest.mock import patch
+
+import numpy as np
+
+from ee.clickhouse.queries.experiments.statistics import (
+    binomial_tail_probabilities,
+    expected_loss,
+    probabilities_of_winning,
+)
+
+
+class TestExperimentStatistics(unittest.TestCase):
+    def setUp(self):
+        random_sampler = np.random.default_rng(seed=42)
+        self.samples = random_sampler.beta([[11], [15], [9]], [[90], [85], [95]], (3, 10_000))
+        self.target_samples = random_sampler.beta(12, 90, 10_000)
+
+    def test_probabilities_of_winning_match_pairwise_comparison(self):
+        expected = []
+        for index in range(len(self.samples)):
+            others = np.delete(self.samples, index, axis=0)
+            wins = sum(1 for i in range(self.samples.shape[1]) if self.samples[index][i] > max(others[:, i]))
+            expected.append(wins / self.samples.shape[1])
+
+        self.assertEqual(probabilities_of_winning(self.samples), expected)
+
+    def test_probabilities_of_winning_ignores_ties(self):
+        samples = np.array([[0.5, 0.6, 0.1], [0.5, 0.2, 0.3]])
+
+        self.assertEqual(probabilities_of_winning(samples), [1 / 3, 1 / 3])
+
+    def test_expected_loss_matches_loop(self):
+        loss = 0
+        for i in range(self.samples.shape[1]):
+            loss += max(0, max(self.samples[:, i]) - self.target_samples[i])
+
+        self.assertAlmostEqual(expected_loss(self.target_samples, self.samples), loss / self.samples.shape[1])
+
+    def test_binomial_tail_probabilities_match_closed_form(self):
+        def term(n, i, p):
+            return exp(lgamma(n + 1) - lgamma(i + 1) - lgamma(n - i + 1) + i * log(p) + (n - i) * log(1 - p))
+
+        for n, k, p in [(50, 20, 0.5), (4100, 2100, 0.5), (1000, 10, 0.3)]:
+            low, high = binomial_tail_probabilities(n, k, p)
+            self.assertAlmostEqual(low, sum(term(n, i, p) for i in range(k + 1)))
+            self.assertAlmostEqual(high, sum(term(n, i, p) for i in range(k, n + 1)))
+
+    def test_binomial_tail_probabilities_with_certain_outcomes(self):
+        self.assertEqual(binomial_tail_probabilities(5, 0, 0.0), (1.0, 1.0))
+        self.assertAlmostEqual(binomial_tail_probabilities(5, 5, 1.0)[1], 1.0)
+
+    def test_binomial_tail_probabilities_are_summed_in_chunks(self):
+        for n, k, p in [(4100, 2100, 0.5), (1000, 10, 0.3), (1000, 999, 0.9)]:
+            expected = binomial_tail_probabilities(n, k, p)
+            with patch("ee.clickhouse.queries.experiments.statistics.BINOMIAL_CHUNK_SIZE", 7):
+                low, high = binomial_tail_probabilities(n, k, p)
+            self.assertAlmostEqual(low, expected[0])
+            self.assertAlmostEqual(high, expected[1])
@@ -1,18 +1,24 @@
 from dataclasses import asdict, dataclass
-from datetime import datetime
-from functools import lru_cache
-from math import exp, lgamma, log
+from datetime import datetime, timedelta
 from typing import List, Optional, Tuple, Type
 
+import numpy as np
 import pytz
-from numpy.random import default_rng
+from numpy.random import Generator, default_rng
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.experiments import (
     CONTROL_VARIANT_KEY,
+    EXPERIMENT_STATISTICS_CACHE_SIZE,
     FF_DISTRIBUTION_THRESHOLD,
     MIN_PROBABILITY_FOR_SIGNIFICANCE,
 )
+from ee.clickhouse.queries.experiments.statistics import (
+    SIMULATIONS_COUNT,
+    binomial_tail_probabilities,
+    probabilities_of_winning,
+)
+from posthog.cache_utils import cache_for
 from posthog.constants import (
     ACTIONS,
     EVENTS,
@@ -28,6 +34,8 @@ from posthog.queries.trends.trends import Trends
 from posthog.queries.trends.util import COUNT_PER_ACTOR_MATH_FUNCTIONS
 
 Probability = float
+# (count, relative exposure), which is all the statistics depend on
+VariantCounts = Tuple[int, float]
 
 P_VALUE_SIGNIFICANCE_LEVEL = 0.05
 
@@ -303,27 +311,8 @@ class ClickhouseTrendExperimentResult:
 
 
 def simulate_winning_variant_for_arrival_rates(target_variant: Variant, variants: List[Variant]) -> float:
-    random_sampler = default_rng()
-    simulations_count = 100_000
-
-    variant_samples = []
-    for variant in variants:
-        # Get `N=simulations` samples from a Gamma distribution with alpha = variant_sucess + 1,
-        # and exposure = relative exposure of variant
-        samples = random_sampler.gamma(variant.count + 1, 1 / variant.exposure, simulations_count)
-        variant_samples.append(samples)
-
-    target_variant_samples = random_sampler.gamma(
-        target_variant.count + 1, 1 / target_variant.exposure, simulations_count
-    )
-
-    winnings = 0
-    variant_conversions = list(zip(*variant_samples))
-    for i in range(simulations_count):
-        if target_variant_samples[i] > max(variant_conversions[i]):
-            winnings += 1
-
-    return winnings / simulations_count
+    samples = _sample_arrival_rates(default_rng(), (_counts(target_variant), *map(_counts, variants)))
+    return probabilities_of_winning(samples)[0]
 
 
 def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[Probability]:
@@ -334,34 +323,34 @@ def calculate_probability_of_winning_for_each(variants: List[Variant]) -> List[P
     if len(variants) > 10:
         raise ValidationError("Can't calculate A/B test results for more than 10 variants", code="too_much_data")
 
-    probabilities = []
-    # simulate winning for each test variant
-    for index, variant in enumerate(variants):
-        probabilities.append(
-            simulate_winning_variant_for_arrival_rates(variant, variants[:index] + variants[index + 1 :])
-        )
+    return list(_calculate_probability_of_winning_for_each(tuple(map(_counts, variants))))
+
+
+@cache_for(timedelta(minutes=30), maxsize=EXPERIMENT_STATISTICS_CACHE_SIZE)
+def _calculate_probability_of_winning_for_each(variants_counts: Tuple[VariantCounts, ...]) -> Tuple[Probability, ...]:
+    # All variants are compared on the same simulations, rather than sampling every variant again per variant
+    probabilities = probabilities_of_winning(_sample_arrival_rates(default_rng(), variants_counts))
 
     total_test_probabilities = sum(probabilities[1:])
 
-    return [max(0, 1 - total_test_probabilities), *probabilities[1:]]
+    return (max(0, 1 - total_test_probabilities), *probabilities[1:])
 
 
-@lru_cache(maxsize=100_000)
-def combinationln(n: int, k: int) -> float:
+def _sample_arrival_rates(random_sampler: Generator, variants_counts: Tuple[VariantCounts, ...]) -> np.ndarray:
     """
-    Returns the log of the binomial coefficient.
+    Returns a matrix with a row of `SIMULATIONS_COUNT` arrival rate samples per variant, drawn from a Gamma
+    distribution with alpha = variant_count + 1 and scale = 1 / relative exposure of the variant
     """
-    return lgamma(n + 1) - lgamma(k + 1) - lgamma(n - k + 1)
+    shapes = np.array([count + 1 for count, _ in variants_counts], dtype=np.float64)
+    scales = np.array([1 / exposure for _, exposure in variants_counts], dtype=np.float64)
+    return random_sampler.gamma(shapes[:, np.newaxis], scales[:, np.newaxis], (len(variants_counts), SIMULATIONS_COUNT))
 
 
-def intermediate_poisson_term(count: int, iterator: int, relative_exposure: float):
-    return exp(
-        combinationln(count, iterator)
-        + iterator * log(relative_exposure)
-        + (count - iterator) * log(1 - relative_exposure)
-    )
+def _counts(variant: Variant) -> VariantCounts:
+    return (variant.count, variant.exposure)
 
 
+@cache_for(timedelta(minutes=30), maxsize=EXPERIMENT_STATISTICS_CACHE_SIZE)
 def poisson_p_value(control_count, control_exposure, test_count, test_exposure):
     """
     Calculates the p-value of the A/B test.
@@ -370,14 +359,7 @@ def poisson_p_value(control_count, control_exposure, test_count, test_exposure):
     relative_exposure = test_exposure / (control_exposure + test_exposure)
     total_count = control_count + test_count
 
-    low_p_value = 0.0
-    high_p_value = 0.0
-
-    for i in range(test_count + 1):
-        low_p_value += intermediate_poisson_term(total_count, i, relative_exposure)
-
-    for i in range(test_count, total_count + 1):
-        high_p_value += intermediate_poisson_term(total_count, i, relative_exposure)
+    low_p_value, high_p_value = binomial_tail_probabilities(total_count, test_count, relative_exposure)
 
     return min(1, 2 * min(low_p_value, high_p_value))
 
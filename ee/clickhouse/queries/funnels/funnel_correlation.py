@@ -1,5 +1,8 @@
 import dataclasses
+import json
+import math
 import urllib.parse
+from hashlib import md5
 from typing import (
     Any,
     Dict,
@@ -13,14 +16,15 @@ from typing import (
     cast,
 )
 
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.exceptions import ValidationError
 
 from ee.clickhouse.queries.column_optimizer import EnterpriseColumnOptimizer
 from ee.clickhouse.queries.groups_join_query import GroupsJoinQuery
 from posthog.clickhouse.materialized_columns import get_materialized_columns
 from posthog.constants import AUTOCAPTURE_EVENT, TREND_FILTER_TYPE_ACTIONS, FunnelCorrelationType
-from posthog.models.element.element import chain_to_elements
-from posthog.models.event.util import ElementSerializer
+from posthog.models.element.element import chain_to_serialized_elements
 from posthog.models.filters import Filter
 from posthog.models.property.util import get_property_string_expr
 from posthog.models.team import Team
@@ -39,7 +43,12 @@ class EventDefinition(TypedDict):
     elements: list
 
 
-class EventOddsRatio(TypedDict):
+class _EventOddsRatioInterval(TypedDict, total=False):
+    # 95% confidence interval of the odds ratio, only included when the funnel actors are sampled
+    odds_ratio_interval: Tuple[float, float]
+
+
+class EventOddsRatio(_EventOddsRatioInterval):
     event: str
 
     success_count: int
@@ -49,7 +58,7 @@ class EventOddsRatio(TypedDict):
     correlation_type: Literal["success", "failure"]
 
 
-class EventOddsRatioSerialized(TypedDict):
+class EventOddsRatioSerialized(_EventOddsRatioInterval):
     event: EventDefinition
 
     success_count: int
@@ -94,6 +103,9 @@ class EventContingencyTable:
     success_total: int
     failure_total: int
 
+    # The property the event is for, when correlating properties
+    property_name: Optional[str] = None
+
 
 class FunnelCorrelation:
 
@@ -109,10 +121,12 @@ class FunnelCorrelation:
         filter: Filter,  # Used to filter people
         team: Team,  # Used to partition by team
         base_uri: str = "/",  # Used to generate absolute urls
+        refresh: bool = False,  # Used to skip cached contingency tables
     ) -> None:
         self._filter = filter
         self._team = team
         self._base_uri = base_uri
+        self._refresh = refresh
 
         if self._filter.funnel_step is None:
             self._filter = self._filter.shallow_clone({"funnel_step": 1})
@@ -225,6 +239,7 @@ class FunnelCorrelation:
 
             SELECT
                 event.event AS name,
+                '' AS property_name,
 
                 -- If we have a `person.steps = target_step`, we know the person
                 -- reached the end of the funnel
@@ -241,7 +256,6 @@ class FunnelCorrelation:
 
             FROM events AS event
                 {event_join_query}
-                AND event.event NOT IN %(exclude_event_names)s
             GROUP BY name
 
             -- To get the total success/failure numbers, we do an aggregation on
@@ -252,6 +266,7 @@ class FunnelCorrelation:
                 -- We're not using WITH TOTALS because the resulting queries are
                 -- not runnable in Metabase
                 '{self.TOTAL_IDENTIFIER}' as name,
+                '' as property_name,
 
                 countDistinctIf(
                     actors.actor_id,
@@ -268,7 +283,6 @@ class FunnelCorrelation:
             **funnel_persons_params,
             "funnel_step_names": self._get_funnel_step_names(),
             "target_step": len(self._filter.entities),
-            "exclude_event_names": self._filter.correlation_event_exclude_names,
         }
 
         return query, params
@@ -305,6 +319,7 @@ class FunnelCorrelation:
                 %(funnel_step_names)s as funnel_step_names
 
             SELECT concat(event_name, '::', prop.1, '::', prop.2) as name,
+                   prop.1 as property_name,
                    countDistinctIf(actor_id, steps = target_step) as success_count,
                    countDistinctIf(actor_id, steps <> target_step) as failure_count
             FROM (
@@ -318,17 +333,17 @@ class FunnelCorrelation:
                     {event_join_query}
                     AND event.event IN %(event_names)s
             )
-            GROUP BY name
+            GROUP BY event_name, prop.1, prop.2
             -- Discard high cardinality / low hits properties
             -- This removes the long tail of random properties with empty, null, or very small values
             HAVING (success_count + failure_count) > 2
-            AND prop.1 NOT IN %(exclude_property_names)s
 
             UNION ALL
             -- To get the total success/failure numbers, we do an aggregation on
             -- the funnel people CTE and count distinct actor_ids
             SELECT
                 '{self.TOTAL_IDENTIFIER}' as name,
+                '' as property_name,
 
                 countDistinctIf(
                     actors.actor_id,
@@ -346,7 +361,6 @@ class FunnelCorrelation:
             "funnel_step_names": self._get_funnel_step_names(),
             "target_step": len(self._filter.entities),
             "event_names": self._filter.correlation_event_names,
-            "exclude_property_names": self._filter.correlation_event_exclude_property_names,
         }
 
         return query, params
@@ -369,6 +383,7 @@ class FunnelCorrelation:
             SELECT
                 concat(prop.1, '::', prop.2) as name,
                 -- We generate a unique identifier for each property value as: PropertyName::Value
+                prop.1 as property_name,
                 countDistinctIf(actor_id, steps = target_step) AS success_count,
                 countDistinctIf(actor_id, steps <> target_step) AS failure_count
             FROM (
@@ -406,10 +421,10 @@ class FunnelCorrelation:
             ) aggregation_target_with_props
             -- Group by the tuple items: (property_name, property_value) generated by zip
             GROUP BY prop.1, prop.2
-            HAVING prop.1 NOT IN %(exclude_property_names)s
             UNION ALL
             SELECT
                 '{self.TOTAL_IDENTIFIER}' as name,
+                '' as property_name,
                 countDistinctIf(actor_id, steps = target_step) AS success_count,
                 countDistinctIf(actor_id, steps <> target_step) AS failure_count
             FROM funnel_actors
@@ -420,7 +435,6 @@ class FunnelCorrelation:
             **aggregation_join_params,
             "target_step": len(self._filter.entities),
             "property_names": self._filter.correlation_property_names,
-            "exclude_property_names": self._filter.correlation_property_exclude_names,
         }
 
         return query, params
@@ -655,9 +669,9 @@ class FunnelCorrelation:
             skewed_totals = True
 
         odds_ratios = [
-            get_entity_odds_ratio(event_stats, FunnelCorrelation.PRIOR_COUNT)
+            get_entity_odds_ratio(event_stats, FunnelCorrelation.PRIOR_COUNT, self._filter.sampling_factor)
             for event_stats in event_contingency_tables
-            if not FunnelCorrelation.are_results_insignificant(event_stats)
+            if not FunnelCorrelation.are_results_insignificant(event_stats) and not self.is_excluded(event_stats)
         ]
 
         positively_correlated_events = sorted(
@@ -798,17 +812,29 @@ class FunnelCorrelation:
         """
 
         query, params = self.get_contingency_table_query()
-        results_with_total = insight_sync_execute(
-            query,
-            {**params, **self._filter.hogql_context.values},
-            query_type="funnel_correlation",
-            filter=self._filter,
-            team_id=self._team.pk,
-        )
+        params = {**params, **self._filter.hogql_context.values}
+
+        # The counts don't depend on exclusions or the significance thresholds, so they're reused when only those
+        # change, e.g. when excluding correlated events one by one
+        cache_key = self._contingency_table_cache_key(query, params)
+        results_with_total = None
+        if settings.FUNNEL_CORRELATION_CACHE_TTL and not self._refresh:
+            results_with_total = cache.get(cache_key)
+
+        if results_with_total is None:
+            results_with_total = insight_sync_execute(
+                query,
+                params,
+                query_type="funnel_correlation",
+                filter=self._filter,
+                team_id=self._team.pk,
+            )
+            if settings.FUNNEL_CORRELATION_CACHE_TTL:
+                cache.set(cache_key, results_with_total, settings.FUNNEL_CORRELATION_CACHE_TTL)
 
         # Get the total success/failure counts from the results
         results = [result for result in results_with_total if result[0] != self.TOTAL_IDENTIFIER]
-        _, success_total, failure_total = [
+        _, _, success_total, failure_total = [
             result for result in results_with_total if result[0] == self.TOTAL_IDENTIFIER
         ][0]
 
@@ -818,9 +844,10 @@ class FunnelCorrelation:
             [
                 EventContingencyTable(
                     event=result[0],
-                    visited=EventStats(success_count=result[1], failure_count=result[2]),
+                    visited=EventStats(success_count=result[2], failure_count=result[3]),
                     success_total=success_total,
                     failure_total=failure_total,
+                    property_name=result[1] or None,
                 )
                 for result in results
             ],
@@ -828,6 +855,23 @@ class FunnelCorrelation:
             failure_total,
         )
 
+    def _contingency_table_cache_key(self, query: str, params: Dict[str, Any]) -> str:
+        query_hash = md5(json.dumps([query, params], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"funnel_correlation_contingency_tables:{self._team.pk}:{query_hash}"
+
+    def is_excluded(self, event_stats: EventContingencyTable) -> bool:
+        """
+        Check if the event or property value was excluded by the filter. Exclusions are applied here rather than in
+        the query, so that excluding a result doesn't invalidate the cached contingency tables.
+        """
+        if self._filter.correlation_type == FunnelCorrelationType.PROPERTIES:
+            return event_stats.property_name in self._filter.correlation_property_exclude_names
+
+        if self._filter.correlation_type == FunnelCorrelationType.EVENT_WITH_PROPERTIES:
+            return event_stats.property_name in self._filter.correlation_event_exclude_property_names
+
+        return event_stats.event in self._filter.correlation_event_exclude_names
+
     def get_funnel_actors_cte(self) -> Tuple[str, Dict[str, Any]]:
         extra_fields = ["steps", "final_timestamp", "first_timestamp"]
 
@@ -854,7 +898,7 @@ class FunnelCorrelation:
 
     def serialize_event_odds_ratio(self, odds_ratio: EventOddsRatio) -> EventOddsRatioSerialized:
         event_definition = self.serialize_event_with_property(event=odds_ratio["event"])
-        return {
+        serialized: EventOddsRatioSerialized = {
             "success_count": odds_ratio["success_count"],
             "success_people_url": self.construct_people_url(success=True, event_definition=event_definition),
             "failure_count": odds_ratio["failure_count"],
@@ -863,6 +907,9 @@ class FunnelCorrelation:
             "correlation_type": odds_ratio["correlation_type"],
             "event": event_definition,
         }
+        if "odds_ratio_interval" in odds_ratio:
+            serialized["odds_ratio_interval"] = odds_ratio["odds_ratio_interval"]
+        return serialized
 
     def serialize_event_with_property(self, event: str) -> EventDefinition:
         """
@@ -878,24 +925,26 @@ class FunnelCorrelation:
             return EventDefinition(
                 event=event,
                 properties={self.AUTOCAPTURE_EVENT_TYPE: event_type},
-                elements=cast(list, ElementSerializer(chain_to_elements(elements_chain), many=True).data),
+                elements=[{"event": None, **element} for element in chain_to_serialized_elements(elements_chain)],
             )
 
         return EventDefinition(event=event, properties={}, elements=[])
 
 
-def get_entity_odds_ratio(event_contingency_table: EventContingencyTable, prior_counts: int) -> EventOddsRatio:
+def get_entity_odds_ratio(
+    event_contingency_table: EventContingencyTable, prior_counts: int, sampling_factor: Optional[float] = None
+) -> EventOddsRatio:
 
     # Add 1 to all values to prevent divide by zero errors, and introduce a [prior](https://en.wikipedia.org/wiki/Prior_probability)
-    odds_ratio = (
-        (event_contingency_table.visited.success_count + prior_counts)
-        * (event_contingency_table.failure_total - event_contingency_table.visited.failure_count + prior_counts)
-    ) / (
-        (event_contingency_table.success_total - event_contingency_table.visited.success_count + prior_counts)
-        * (event_contingency_table.visited.failure_count + prior_counts)
-    )
-
-    return EventOddsRatio(
+    cells = [
+        event_contingency_table.visited.success_count + prior_counts,
+        event_contingency_table.failure_total - event_contingency_table.visited.failure_count + prior_counts,
+        event_contingency_table.success_total - event_contingency_table.visited.success_count + prior_counts,
+        event_contingency_table.visited.failure_count + prior_counts,
+    ]
+    odds_ratio = (cells[0] * cells[1]) / (cells[2] * cells[3])
+
+    result = EventOddsRatio(
         event=event_contingency_table.event,
         success_count=event_contingency_table.visited.success_count,
         failure_count=event_contingency_table.visited.failure_count,
@@ -903,6 +952,19 @@ def get_entity_odds_ratio(event_contingency_table: EventContingencyTable, prior_
         correlation_type="success" if odds_ratio > 1 else "failure",
     )
 
+    if sampling_factor:
+        # The odds ratio is the same for the sample as for everyone, but the counts need scaling up, and the ratio is
+        # only an estimate. See https://en.wikipedia.org/wiki/Odds_ratio#Statistical_inference
+        result["success_count"] = int(correct_result_for_sampling(result["success_count"], sampling_factor))
+        result["failure_count"] = int(correct_result_for_sampling(result["failure_count"], sampling_factor))
+        standard_error = math.sqrt(sum(1 / cell for cell in cells))
+        result["odds_ratio_interval"] = (
+            math.exp(math.log(odds_ratio) - 1.96 * standard_error),
+            math.exp(math.log(odds_ratio) + 1.96 * standard_error),
+        )
+
+    return result
+
 
 def build_selector(elements: List[Dict[str, Any]]) -> str:
     # build a CSS select given an "elements_chain"
@@ -45,10 +45,15 @@ class FunnelCorrelationActors(ActorBaseQuery):
     def get_actors(
         self,
     ) -> Tuple[Union[QuerySet[Person], QuerySet[Group]], Union[List[SerializedGroup], List[SerializedPerson]], int]:
+        actors_query: ActorBaseQuery
         if self._filter.correlation_type == FunnelCorrelationType.PROPERTIES:
-            return _FunnelPropertyCorrelationActors(self._filter, self._team, self._base_uri).get_actors()
+            actors_query = _FunnelPropertyCorrelationActors(self._filter, self._team, self._base_uri)
         else:
-            return _FunnelEventsCorrelationActors(self._filter, self._team, self._base_uri).get_actors()
+            actors_query = _FunnelEventsCorrelationActors(self._filter, self._team, self._base_uri)
+
+        results = actors_query.get_actors()
+        self.timings = actors_query.timings
+        return results
 
 
 class _FunnelEventsCorrelationActors(ActorBaseQuery):
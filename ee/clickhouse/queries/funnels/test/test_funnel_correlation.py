@@ -1,8 +1,15 @@
 import unittest
+from unittest.mock import patch
 
+from django.test import override_settings
 from rest_framework.exceptions import ValidationError
 
-from ee.clickhouse.queries.funnels.funnel_correlation import EventContingencyTable, EventStats, FunnelCorrelation
+from ee.clickhouse.queries.funnels.funnel_correlation import (
+    EventContingencyTable,
+    EventStats,
+    FunnelCorrelation,
+    get_entity_odds_ratio,
+)
 from ee.clickhouse.queries.funnels.funnel_correlation_persons import FunnelCorrelationActors
 from posthog.constants import INSIGHT_FUNNELS
 from posthog.models.action import Action
@@ -12,6 +19,7 @@ from posthog.models.filters import Filter
 from posthog.models.group.util import create_group
 from posthog.models.group_type_mapping import GroupTypeMapping
 from posthog.models.instance_setting import override_instance_config
+from posthog.queries.insight import insight_sync_execute
 from posthog.test.base import (
     APIBaseTest,
     ClickhouseTestMixin,
@@ -1077,6 +1085,33 @@ class TestClickhouseFunnelCorrelation(ClickhouseTestMixin, APIBaseTest):
         self.assertEqual(len(self._get_actors_for_property(filter, [("$nice", "", "person", None)], False)), 1)
         self.assertEqual(len(self._get_actors_for_property(filter, [("$nice", "very", "person", None)])), 5)
 
+    def test_excluding_property_names_containing_separator(self):
+        filter = Filter(
+            data={
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "funnel_correlation_type": "properties",
+                "funnel_correlation_names": ["$all"],
+                "funnel_correlation_exclude_names": ["utm::source"],
+            }
+        )
+        correlation = FunnelCorrelation(filter, self.team)
+
+        def contingency_table(event: str, property_name: str) -> EventContingencyTable:
+            return EventContingencyTable(
+                event=event,
+                visited=EventStats(success_count=5, failure_count=1),
+                success_total=10,
+                failure_total=10,
+                property_name=property_name,
+            )
+
+        self.assertTrue(correlation.is_excluded(contingency_table("utm::source::google", "utm::source")))
+        self.assertFalse(correlation.is_excluded(contingency_table("utm::google", "utm")))
+
     def test_discarding_insignificant_events(self):
         filters = {
             "events": [
@@ -1568,8 +1603,106 @@ class TestClickhouseFunnelCorrelation(ClickhouseTestMixin, APIBaseTest):
             6,
         )
 
+    @override_settings(FUNNEL_CORRELATION_CACHE_TTL=60)
+    def test_contingency_tables_are_reused_when_excluding_events(self):
+        filter = Filter(
+            data={
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-14",
+                "funnel_correlation_type": "events",
+            }
+        )
+
+        for i in range(20):
+            _create_person(distinct_ids=[f"user_{i}"], team_id=self.team.pk)
+            _create_event(
+                team=self.team, event="user signed up", distinct_id=f"user_{i}", timestamp="2020-01-02T14:00:00Z"
+            )
+            _create_event(
+                team=self.team,
+                event="positively_related" if i < 10 else "negatively_related",
+                distinct_id=f"user_{i}",
+                timestamp="2020-01-03T14:00:00Z",
+            )
+            if i < 10:
+                _create_event(team=self.team, event="paid", distinct_id=f"user_{i}", timestamp="2020-01-04T14:00:00Z")
+
+        with patch(
+            "ee.clickhouse.queries.funnels.funnel_correlation.insight_sync_execute", wraps=insight_sync_execute
+        ) as mock_execute:
+            result, _ = FunnelCorrelation(filter, self.team)._run()
+            self.assertEqual([item["event"] for item in result], ["positively_related", "negatively_related"])
+
+            filter = filter.shallow_clone({"funnel_correlation_exclude_event_names": ["positively_related"]})
+            result, _ = FunnelCorrelation(filter, self.team)._run()
+            self.assertEqual([item["event"] for item in result], ["negatively_related"])
+            self.assertEqual(mock_execute.call_count, 1)
+
+            FunnelCorrelation(filter, self.team, refresh=True)._run()
+            self.assertEqual(mock_execute.call_count, 2)
+
+    def test_sampled_funnel_correlation_includes_confidence_interval(self):
+        filter = Filter(
+            data={
+                "events": [
+                    {"id": "user signed up", "type": "events", "order": 0},
+                    {"id": "paid", "type": "events", "order": 1},
+                ],
+                "insight": INSIGHT_FUNNELS,
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-14",
+                "funnel_correlation_type": "events",
+                "sampling_factor": 1,
+            }
+        )
+
+        for i in range(20):
+            _create_person(distinct_ids=[f"user_{i}"], team_id=self.team.pk)
+            _create_event(
+                team=self.team, event="user signed up", distinct_id=f"user_{i}", timestamp="2020-01-02T14:00:00Z"
+            )
+            if i < 10:
+                _create_event(
+                    team=self.team,
+                    event="positively_related",
+                    distinct_id=f"user_{i}",
+                    timestamp="2020-01-03T14:00:00Z",
+                )
+                _create_event(team=self.team, event="paid", distinct_id=f"user_{i}", timestamp="2020-01-04T14:00:00Z")
+
+        result, _ = FunnelCorrelation(filter, self.team)._run()
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["success_count"], 10)
+        lower, upper = result[0]["odds_ratio_interval"]
+        self.assertLess(lower, result[0]["odds_ratio"])
+        self.assertGreater(upper, result[0]["odds_ratio"])
+
 
 class TestCorrelationFunctions(unittest.TestCase):
+    def test_entity_odds_ratio_for_sampled_actors(self):
+        contingency_table = EventContingencyTable(
+            event="watched video",
+            visited=EventStats(success_count=5, failure_count=1),
+            success_total=7,
+            failure_total=11,
+        )
+
+        unsampled = get_entity_odds_ratio(contingency_table, FunnelCorrelation.PRIOR_COUNT)
+        self.assertNotIn("odds_ratio_interval", unsampled)
+
+        sampled = get_entity_odds_ratio(contingency_table, FunnelCorrelation.PRIOR_COUNT, sampling_factor=0.1)
+        self.assertEqual(sampled["odds_ratio"], unsampled["odds_ratio"])
+        self.assertEqual((sampled["success_count"], sampled["failure_count"]), (50, 10))
+        lower, upper = sampled["odds_ratio_interval"]
+        self.assertLess(lower, sampled["odds_ratio"])
+        self.assertGreater(upper, sampled["odds_ratio"])
+
     def test_are_results_insignificant(self):
         # Same setup as above test: test_discarding_insignificant_events
         contingency_tables = [
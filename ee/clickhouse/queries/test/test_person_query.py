@@ -1,10 +1,11 @@
 import pytest
+import pytz
 
 from ee.clickhouse.materialized_columns.columns import materialize
 from posthog.client import sync_execute
 from posthog.models.filters import Filter
 from posthog.models.team import Team
-from posthog.queries.person_query import PersonQuery
+from posthog.queries.person_query import PersonCursor, PersonQuery
 from posthog.test.base import _create_person
 from posthog.models.cohort import Cohort
 from posthog.models.property import Property
@@ -291,3 +292,25 @@ def test_person_query_with_updated_after(testdata, team, snapshot):
 
     assert person_query(team, filter) == snapshot
     assert run_query(team, filter) == {"rows": 0}
+
+
+def test_person_query_with_cursor(testdata, team):
+    filter = Filter(data={"limit": 2})
+
+    query, params = PersonQuery(filter, team.pk).get_query(paginate=True, keyset=True)
+    first_page = sync_execute(query, {**params, **filter.hogql_context.values})
+    assert len(first_page) == 2
+
+    cursor = PersonCursor(created_at=first_page[-1][-1], id=first_page[-1][0])
+    assert PersonCursor.decode(cursor.encode()) == PersonCursor(
+        created_at=cursor.created_at.replace(tzinfo=pytz.UTC), id=cursor.id
+    )
+
+    query, params = PersonQuery(filter, team.pk).get_query(paginate=True, keyset=True, cursor=cursor)
+    second_page = sync_execute(query, {**params, **filter.hogql_context.values})
+    assert len(second_page) == 1
+    assert second_page[0][0] not in {row[0] for row in first_page}
+
+    previous_cursor = PersonCursor(created_at=second_page[0][-1], id=second_page[0][0], direction="previous")
+    query, params = PersonQuery(filter, team.pk).get_query(paginate=True, keyset=True, cursor=previous_cursor)
+    assert list(reversed(sync_execute(query, {**params, **filter.hogql_context.values}))) == first_page
@@ -4,6 +4,7 @@ import fakeredis
 from clickhouse_driver.errors import ServerException
 from django.test import TestCase
 
+from posthog import redis
 from posthog.clickhouse.client import execute_async as client
 from posthog.client import sync_execute
 from posthog.test.base import ClickhouseTestMixin
@@ -22,6 +23,20 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
         self.assertTrue(result.complete)
         self.assertEqual(result.results, [[2]])
 
+    @patch("posthog.clickhouse.client.execute_async.RESULTS_PAGE_SIZE", 2)
+    def test_async_query_client_pages_results(self):
+        query = "SELECT number FROM numbers(5)"
+        team_id = 2
+        query_id = client.enqueue_execute_with_progress(team_id, query, bypass_celery=True)
+
+        result = client.get_status_or_results(team_id, query_id, offset=1, limit=3)
+        self.assertTrue(result.complete)
+        self.assertEqual(result.num_results, 5)
+        self.assertEqual(result.results, [[1], [2], [3]])
+
+        result = client.get_status_or_results(team_id, query_id, offset=4)
+        self.assertEqual(result.results, [[4]])
+
     def test_async_query_client_errors(self):
         query = "SELECT WOW SUCH DATA FROM NOWHERE THIS WILL CERTAINLY WORK"
         team_id = 2
@@ -96,6 +111,36 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
         # Assert that we called clickhouse twice
         self.assertEqual(execute_sync_mock.call_count, 2)
 
+    @patch("posthog.clickhouse.client.execute_async.RESULTS_PAGE_SIZE", 2)
+    def test_async_query_client_force_deletes_previous_results(self):
+        query = "SELECT number FROM numbers(5)"
+        team_id = 2
+        query_id = client.enqueue_execute_with_progress(team_id, query, bypass_celery=True)
+        key = client.generate_redis_results_key(query_id)
+
+        with patch("posthog.clickhouse.client.execute_async._delete_results") as mock_delete_results:
+            client.enqueue_execute_with_progress(team_id, query, bypass_celery=True, force=True)
+        mock_delete_results.assert_called_once_with(key)
+
+        client._delete_results(key)
+        self.assertEqual(redis.get_client().get(client._results_page_key(key, 0)), None)
+
+    @patch("posthog.clickhouse.client.execute_async.object_storage")
+    def test_clear_expired_query_results(self, mock_object_storage):
+        query_id = client.enqueue_execute_with_progress(2, "SELECT 1+1", bypass_celery=True)
+        mock_object_storage.list_objects_modified_before.return_value = [
+            f"query_results/query_with_progress/{query_id}/0",
+            "query_results/query_with_progress/expired:query/0",
+            "query_results/query_with_progress/expired:query/1",
+        ]
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_QUERY_RESULTS_FOLDER="query_results"):
+            client.clear_expired_query_results()
+
+        mock_object_storage.delete_objects.assert_called_once_with(
+            ["query_results/query_with_progress/expired:query/0", "query_results/query_with_progress/expired:query/1"]
+        )
+
     def test_client_strips_comments_from_request(self):
         """
         To ensure we can easily copy queries from `system.query_log` in e.g.
@@ -14,6 +14,7 @@ from posthog.decorators import cached_function
 from posthog.models import Insight
 from posthog.models.dashboard import Dashboard
 from posthog.models.filters import Filter
+from posthog.utils import refresh_requested_by_client
 
 
 class CanEditInsight(BasePermission):
@@ -53,6 +54,8 @@ class ClickhouseInsightsViewSet(InsightViewSet):
         filter = Filter(request=request, team=team)
 
         base_uri = request.build_absolute_uri("/")
-        result = FunnelCorrelation(filter=filter, team=team, base_uri=base_uri).run()
+        result = FunnelCorrelation(
+            filter=filter, team=team, base_uri=base_uri, refresh=refresh_requested_by_client(request)
+        ).run()
 
         return {"result": result}
@@ -27,9 +27,8 @@ class EnterprisePersonViewSet(PersonViewSet):
         if not filter.correlation_person_limit:
             filter = filter.shallow_clone({FUNNEL_CORRELATION_PERSON_LIMIT: 100})
         base_uri = request.build_absolute_uri("/")
-        actors, serialized_actors, raw_count = FunnelCorrelationActors(
-            filter=filter, team=self.team, base_uri=base_uri
-        ).get_actors()
+        actors_query = FunnelCorrelationActors(filter=filter, team=self.team, base_uri=base_uri)
+        actors, serialized_actors, raw_count = actors_query.get_actors()
         _should_paginate = raw_count >= filter.correlation_person_limit
 
         next_url = (
@@ -45,7 +44,10 @@ class EnterprisePersonViewSet(PersonViewSet):
         initial_url = format_query_params_absolute_url(request, 0)
 
         # cached_function expects a dict with the key result
-        return {"result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors))}
+        return {
+            "result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors)),
+            "timings": actors_query.timings,
+        }
 
 
 class LegacyEnterprisePersonViewSet(EnterprisePersonViewSet):
@@ -88,6 +88,11 @@ export function AsyncMigrations(): JSX.Element {
             return (
                 <div>
                     <Progress percent={progress} />
+                    {asyncMigration.estimated_completion_time && (
+                        <div className="text-muted text-xs">
+                            Estimated to finish {humanFriendlyDetailedTime(asyncMigration.estimated_completion_time)}
+                        </div>
+                    )}
                 </div>
             )
         },
@@ -60,6 +60,7 @@ export interface AsyncMigration {
     parameters: Record<string, number>
     parameter_definitions: Record<string, [string | number | null, string]>
     is_available: boolean
+    estimated_completion_time: string | null
 }
 
 export interface AsyncMigrationModalProps {
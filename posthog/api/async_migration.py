@@ -6,7 +6,12 @@ from semantic_version.base import Version
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.async_migrations.runner import MAX_CONCURRENT_ASYNC_MIGRATIONS, is_posthog_version_compatible
 from posthog.async_migrations.setup import get_async_migration_definition
-from posthog.async_migrations.utils import force_stop_migration, rollback_migration, trigger_migration
+from posthog.async_migrations.utils import (
+    force_stop_migration,
+    get_estimated_completion_time,
+    rollback_migration,
+    trigger_migration,
+)
 from posthog.models.async_migration import (
     AsyncMigration,
     AsyncMigrationError,
@@ -31,6 +36,7 @@ class AsyncMigrationSerializer(serializers.ModelSerializer):
     error_count = serializers.SerializerMethodField()
     parameter_definitions = serializers.SerializerMethodField()
     is_available = serializers.SerializerMethodField()
+    estimated_completion_time = serializers.SerializerMethodField()
 
     class Meta:
         model = AsyncMigration
@@ -51,6 +57,7 @@ class AsyncMigrationSerializer(serializers.ModelSerializer):
             "error_count",
             "parameter_definitions",
             "is_available",
+            "estimated_completion_time",
         ]
         read_only_fields = [
             "id",
@@ -68,11 +75,17 @@ class AsyncMigrationSerializer(serializers.ModelSerializer):
             "error_count",
             "parameter_definitions",
             "is_available",
+            "estimated_completion_time",
         ]
 
     def get_error_count(self, async_migration: AsyncMigration):
         return AsyncMigrationError.objects.filter(async_migration=async_migration).count()
 
+    def get_estimated_completion_time(self, async_migration: AsyncMigration):
+        if async_migration.status != MigrationStatus.Running:
+            return None
+        return get_estimated_completion_time(async_migration)
+
     def get_parameter_definitions(self, async_migration: AsyncMigration):
         try:
             definition = get_async_migration_definition(async_migration.name)
@@ -2,6 +2,7 @@ import hashlib
 import json
 import re
 import time
+from contextlib import contextmanager
 from datetime import datetime
 from random import random
 from typing import Any, Dict, Iterator, List, Optional, Tuple
@@ -14,7 +15,7 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from kafka.errors import KafkaError, MessageSizeTooLargeError
 from kafka.producer.future import FutureRecordMetadata
-from prometheus_client import Counter
+from prometheus_client import Counter, Histogram
 from rest_framework import status
 from sentry_sdk import configure_scope
 from sentry_sdk.api import capture_exception, start_span
@@ -25,6 +26,8 @@ from posthog.api.utils import get_data, get_token, safe_clickhouse_string
 from posthog.exceptions import generate_exception_response
 from posthog.kafka_client.client import (
     KafkaProducer,
+    KafkaProducerBufferFullError,
+    eventsKafkaProducer,
     sessionRecordingKafkaProducer,
 )
 from posthog.kafka_client.topics import (
@@ -35,7 +38,9 @@ from posthog.kafka_client.topics import (
 from posthog.logging.timing import timed
 from posthog.metrics import LABEL_RESOURCE_TYPE
 from posthog.models.utils import UUIDT
+from posthog.rate_limit import SharedRateLimiter
 from posthog.session_recordings.session_recording_helpers import (
+    SnapshotDataSerializer,
     legacy_preprocess_session_recording_events_for_clickhouse,
     preprocess_replay_events_for_blob_ingestion,
     split_replay_events,
@@ -44,10 +49,11 @@ from posthog.utils import cors_response, get_ip_address
 
 logger = structlog.get_logger(__name__)
 
-LIMITER = Limiter(
+# Shared by all capture workers, so that hot partition keys are detected at their cluster wide rate
+LIMITER = SharedRateLimiter(
+    name="partition_key",
     rate=settings.PARTITION_KEY_BUCKET_REPLENTISH_RATE,
     capacity=settings.PARTITION_KEY_BUCKET_CAPACITY,
-    storage=MemoryStorage(),
 )
 LOG_RATE_LIMITER = Limiter(
     rate=1 / 60,
@@ -80,6 +86,12 @@ PARTITION_KEY_CAPACITY_EXCEEDED_COUNTER = Counter(
     labelnames=["partition_key"],
 )
 
+REPLAY_PROCESSING_CPU_SECONDS_HISTOGRAM = Histogram(
+    "capture_replay_processing_cpu_seconds",
+    "CPU time spent preparing the recording events of a request for the legacy or blob ingestion path.",
+    labelnames=["path"],
+)
+
 TOKEN_SHAPE_INVALID_COUNTER = Counter(
     "capture_token_shape_invalid_total",
     "Events dropped due to an invalid token shape, per reason.",
@@ -162,12 +174,17 @@ def log_event(data: Dict, event_name: str, partition_key: Optional[str]):
     try:
         if event_name in SESSION_RECORDING_DEDICATED_KAFKA_EVENTS:
             producer = sessionRecordingKafkaProducer()
+        elif kafka_topic in (settings.KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, KAFKA_EVENTS_PLUGIN_INGESTION_HISTORICAL):
+            producer = eventsKafkaProducer()
         else:
             producer = KafkaProducer()
 
         future = producer.produce(topic=kafka_topic, data=data, key=partition_key)
         statsd.incr("posthog_cloud_plugin_server_ingestion")
         return future
+    except KafkaProducerBufferFullError:
+        # counted by the producer, and too frequent under load to log every time
+        raise
     except Exception as e:
         statsd.incr("capture_endpoint_log_event_error")
         logger.exception("Failed to produce event to Kafka topic %s with error", kafka_topic)
@@ -368,13 +385,22 @@ def get_event(request):
 
         consumer_destination = "v2" if random() <= settings.REPLAY_EVENTS_NEW_CONSUMER_RATIO else "v1"
 
+        # Both replay ingestion paths serialize the same snapshot data, which is the bulk of the request
+        snapshot_serializer = SnapshotDataSerializer()
+
         try:
             replay_events, other_events = split_replay_events(events)
             processed_replay_events = replay_events
 
             if len(replay_events) > 0:
-                # Legacy solution stays in place
-                processed_replay_events = legacy_preprocess_session_recording_events_for_clickhouse(replay_events)
+                if token in settings.REPLAY_LEGACY_INGESTION_DISABLED_TOKENS:
+                    processed_replay_events = []
+                else:
+                    # Legacy solution stays in place
+                    with _replay_processing_cpu_time("legacy"):
+                        processed_replay_events = legacy_preprocess_session_recording_events_for_clickhouse(
+                            replay_events, serializer=snapshot_serializer
+                        )
 
                 # Mark all events so that they are only consumed by one consumer
                 for event in processed_replay_events:
@@ -405,6 +431,20 @@ def get_event(request):
         for event, event_uuid, distinct_id in processed_events:
             try:
                 futures.append(capture_internal(event, distinct_id, ip, site_url, now, sent_at, event_uuid, token))
+            except KafkaProducerBufferFullError:
+                # Kafka can't keep up, shed load rather than queue up requests waiting for buffer space
+                response = cors_response(
+                    request,
+                    generate_exception_response(
+                        "capture",
+                        "Too many events are being ingested right now. Please try again shortly.",
+                        code="server_busy",
+                        type="server_error",
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    ),
+                )
+                response["Retry-After"] = "1"
+                return response
             except Exception as exc:
                 capture_exception(exc, {"data": data})
                 statsd.incr("posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture"})
@@ -452,11 +492,14 @@ def get_event(request):
                 )
 
     try:
-        if replay_events:
+        if replay_events and token not in settings.REPLAY_BLOB_INGESTION_DISABLED_TOKENS:
             # The new flow we only enable if the dedicated kafka is enabled
-            alternative_replay_events = preprocess_replay_events_for_blob_ingestion(
-                replay_events, settings.SESSION_RECORDING_KAFKA_MAX_REQUEST_SIZE_BYTES
-            )
+            with _replay_processing_cpu_time("blob"):
+                alternative_replay_events = preprocess_replay_events_for_blob_ingestion(
+                    replay_events,
+                    settings.SESSION_RECORDING_KAFKA_MAX_REQUEST_SIZE_BYTES,
+                    serializer=snapshot_serializer,
+                )
 
             # Mark all events so that they are only consumed by one consumer
             for event in alternative_replay_events:
@@ -484,6 +527,16 @@ def get_event(request):
     return cors_response(request, JsonResponse({"status": 1}))
 
 
+@contextmanager
+def _replay_processing_cpu_time(path: str) -> Iterator[None]:
+    # :TRICKY: Thread time, as wall time would include time other threads of the worker were scheduled
+    start = time.thread_time()
+    try:
+        yield
+    finally:
+        REPLAY_PROCESSING_CPU_SECONDS_HISTOGRAM.labels(path=path).observe(time.thread_time() - start)
+
+
 def preprocess_events(events: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], UUIDT, str]]:
     for event in events:
         event_uuid = UUIDT()
@@ -562,8 +615,9 @@ def is_randomly_partitioned(candidate_partition_key: str) -> bool:
 
     Checking whether an event should be randomly partitioned is a two step process:
 
-    1. Using a token-bucket algorithm, check if the event's candidate key has exceeded
-       the given PARTITION_KEY_BUCKET_CAPACITY. If it has, events with that key could
+    1. Using a token-bucket like rate limiter shared by all capture workers, check if the
+       event's candidate key has exceeded the given PARTITION_KEY_BUCKET_CAPACITY across
+       the cluster. If it has, events with that key could
        be experiencing a temporary burst in traffic and should be randomly partitioned.
        Otherwise, go to 2.
 
@@ -595,7 +649,7 @@ def is_randomly_partitioned(candidate_partition_key: str) -> bool:
             logger.warning(
                 "Partition key %s overridden as bucket capacity of %s tokens exceeded",
                 candidate_partition_key,
-                LIMITER._capacity,
+                settings.PARTITION_KEY_BUCKET_CAPACITY,
             )
             return True
 
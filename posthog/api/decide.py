@@ -23,6 +23,11 @@ from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.logging.timing import timed
 from posthog.models import Team, User
 from posthog.models.feature_flag import get_all_feature_flags
+from posthog.models.team.team_caching import (
+    decide_config_recently_invalidated,
+    get_decide_config_in_cache,
+    set_decide_config_in_cache,
+)
 from posthog.models.utils import execute_with_timeout
 from posthog.plugins.site import get_decide_site_apps
 from posthog.utils import cors_response, get_ip_address, label_for_team_id_to_track, load_data_from_request
@@ -69,6 +74,54 @@ def parse_domain(url: Any) -> Optional[str]:
     return urlparse(url).hostname
 
 
+def get_team_decide_config(team: Team, errors: bool) -> Dict[str, Any]:
+    """
+    Returns the parts of the decide response which only depend on the team, served from cache when possible.
+
+    The cache is invalidated whenever the team, its plugin configs or their plugin source files change, and expires
+    after a minute to pick up site apps transpiled by plugin-server. Right after an invalidation the config is rebuilt
+    from the primary database, as the read replica may not have caught up with the change yet.
+    """
+    config = get_decide_config_in_cache(team.pk)
+    if config is not None:
+        return config
+
+    config = {
+        "capturePerformance": True if team.capture_performance_opt_in else False,
+        "autocapture_opt_out": True if team.autocapture_opt_out else False,
+        "autocaptureExceptions": (
+            {"endpoint": "/e/", "errors_to_ignore": team.autocapture_exceptions_errors_to_ignore or []}
+            if team.autocapture_exceptions_opt_in
+            else False
+        ),
+        # :TRICKY: Whether recording is enabled also depends on the request origin, which is checked per request
+        "sessionRecording": (
+            {
+                "endpoint": "/s/",
+                "consoleLogRecordingEnabled": True if team.capture_console_log_opt_in else False,
+                "recorderVersion": "v2",
+            }
+            if team.session_recording_opt_in
+            else False
+        ),
+        "siteApps": [],
+    }
+
+    if team.inject_web_apps:
+        # errors mean the database is unavailable, bail in this case and don't cache the missing site apps
+        if errors:
+            return config
+        database = "default" if decide_config_recently_invalidated(team.pk) else DATABASE_FOR_FLAG_MATCHING
+        try:
+            with execute_with_timeout(200, database):
+                config["siteApps"] = get_decide_site_apps(team, using_database=database)
+        except Exception:
+            return config
+
+    set_decide_config_in_cache(team.pk, config)
+    return config
+
+
 @csrf_exempt
 @timed("posthog_cloud_decide_endpoint")
 def get_decide(request: HttpRequest):
@@ -208,34 +261,17 @@ def get_decide(request: HttpRequest):
             else:
                 response["featureFlags"] = {}
 
-            response["capturePerformance"] = True if team.capture_performance_opt_in else False
-            response["autocapture_opt_out"] = True if team.autocapture_opt_out else False
-            response["autocaptureExceptions"] = (
-                {"endpoint": "/e/", "errors_to_ignore": team.autocapture_exceptions_errors_to_ignore or []}
-                if team.autocapture_exceptions_opt_in
-                else False
-            )
+            team_config = get_team_decide_config(team, errors)
+            response["capturePerformance"] = team_config["capturePerformance"]
+            response["autocapture_opt_out"] = team_config["autocapture_opt_out"]
+            response["autocaptureExceptions"] = team_config["autocaptureExceptions"]
 
-            if team.session_recording_opt_in and (
+            if team_config["sessionRecording"] and (
                 on_permitted_recording_domain(team, request) or not team.recording_domains
             ):
-                capture_console_logs = True if team.capture_console_log_opt_in else False
-                response["sessionRecording"] = {
-                    "endpoint": "/s/",
-                    "consoleLogRecordingEnabled": capture_console_logs,
-                    "recorderVersion": "v2",
-                }
-
-            site_apps = []
-            # errors mean the database is unavailable, bail in this case
-            if team.inject_web_apps and not errors:
-                try:
-                    with execute_with_timeout(200, DATABASE_FOR_FLAG_MATCHING):
-                        site_apps = get_decide_site_apps(team, using_database=DATABASE_FOR_FLAG_MATCHING)
-                except Exception:
-                    pass
+                response["sessionRecording"] = team_config["sessionRecording"]
 
-            response["siteApps"] = site_apps
+            response["siteApps"] = team_config["siteApps"]
 
             # NOTE: Whenever you add something to decide response, update this test:
             # `test_decide_doesnt_error_out_when_database_is_down`
@@ -1,20 +1,74 @@
-from typing import Dict, Optional
+import ipaddress
+import os
+import time
+from typing import Dict, Optional, Union
 
+import geoip2.database
 import structlog
-from django.contrib.gis.geoip2 import GeoIP2
+from django.conf import settings
+from maxminddb import MODE_AUTO, MODE_MEMORY
+from prometheus_client import Histogram
 from sentry_sdk import capture_exception
 
+from posthog.cache_utils import LRUCache
+
 logger = structlog.get_logger(__name__)
 
+GEOIP_CITY_DATABASE = "GeoLite2-City.mmdb"
+
+GEOIP_MODES = {
+    # Load database into memory. Pure Python, provides faster performance but uses more memory per worker.
+    "memory": MODE_MEMORY,
+    # Memory-map the database file, using the C extension if it's available.
+    "mmap": MODE_AUTO,
+}
+
+# IPs within the same network prefix of this size usually resolve to the same location. Results are shared across
+# the prefix only when the database says the whole prefix belongs to a single network.
+IPV4_SHARED_PREFIX_LENGTH = 24
+IPV6_SHARED_PREFIX_LENGTH = 48
+
+GEOIP_LOOKUP_LATENCY = Histogram(
+    "posthog_geoip_lookup_seconds",
+    "Time taken to resolve geoip properties for an IP address",
+    labelnames=["cached"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, float("inf")),
+)
+
+
+def _resident_memory_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _open_database() -> Optional[geoip2.database.Reader]:
+    rss_before = _resident_memory_bytes()
+    start = time.perf_counter()
+    try:
+        reader = geoip2.database.Reader(
+            os.path.join(settings.GEOIP_PATH, GEOIP_CITY_DATABASE), mode=GEOIP_MODES[settings.GEOIP_MODE]
+        )
+    except Exception as e:
+        # Inform Sentry, but don't bring down the app
+        capture_exception(e)
+        return None
 
-try:
-    geoip: Optional[GeoIP2] = GeoIP2(cache=8)
-    # Cache setting corresponds to MODE_MEMORY: Load database into memory. Pure Python.
-    # Provides faster performance but uses more memory.
-except Exception as e:
-    # Inform Sentry, but don't bring down the app
-    capture_exception(e)
-    geoip = None
+    rss_after = _resident_memory_bytes()
+    logger.info(
+        "geoip_database_loaded",
+        mode=settings.GEOIP_MODE,
+        duration_ms=round((time.perf_counter() - start) * 1000),
+        # In mmap mode pages are only counted once they're read, and are shared with other workers
+        rss_increase_bytes=rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    )
+    return reader
+
+
+geoip: Optional[geoip2.database.Reader] = _open_database()
+_geoip_cache = LRUCache("posthog.api.geoip.get_geoip_properties", max(settings.GEOIP_CACHE_SIZE, 1))
 
 VALID_GEOIP_PROPERTIES = [
     "city_name",
@@ -44,14 +98,52 @@ def get_geoip_properties(ip_address: Optional[str]) -> Dict[str, str]:
         # "127.0.0.1" would throw "The address 127.0.0.1 is not in the database." below
         return {}
 
+    start = time.perf_counter()
+    use_cache = settings.GEOIP_CACHE_SIZE > 0
+    prefix = _shared_prefix(ip_address) if use_cache else None
+
+    if use_cache:
+        entry = _geoip_cache.get(ip_address) or (_geoip_cache.get(prefix) if prefix else None)
+        if entry is not None:
+            GEOIP_LOOKUP_LATENCY.labels(cached="true").observe(time.perf_counter() - start)
+            return dict(entry[1])
+
     try:
-        geoip_properties = geoip.city(ip_address)
+        response = geoip.city(ip_address)
     except Exception as e:
         logger.exception(f"geoIP computation error: {e}")
         return {}
 
+    geoip_properties = {
+        "city_name": response.city.name,
+        "country_name": response.country.name,
+        "country_code": response.country.iso_code,
+        "continent_name": response.continent.name,
+        "continent_code": response.continent.code,
+        "postal_code": response.postal.code,
+        "time_zone": response.location.time_zone,
+    }
+
     properties = {}
     for key, value in geoip_properties.items():
         if value and key in VALID_GEOIP_PROPERTIES:
             properties[f"$geoip_{key}"] = value
-    return properties
+
+    if use_cache:
+        _geoip_cache.set(ip_address, properties)
+        network = response.traits.network
+        if prefix is not None and network is not None and network.version == prefix.version:
+            if network.supernet_of(prefix):  # type: ignore
+                _geoip_cache.set(prefix, properties)
+
+    GEOIP_LOOKUP_LATENCY.labels(cached="false").observe(time.perf_counter() - start)
+    return dict(properties)
+
+
+def _shared_prefix(ip_address: str) -> Optional[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return None
+    prefix_length = IPV4_SHARED_PREFIX_LENGTH if address.version == 4 else IPV6_SHARED_PREFIX_LENGTH
+    return ipaddress.ip_network(f"{address}/{prefix_length}", strict=False)
@@ -51,7 +51,7 @@ from posthog.queries.funnels.funnel_strict_persons import ClickhouseFunnelStrict
 from posthog.queries.funnels.funnel_unordered_persons import ClickhouseFunnelUnorderedActors
 from posthog.queries.insight import insight_sync_execute
 from posthog.queries.paths import PathsActors
-from posthog.queries.person_query import PersonQuery
+from posthog.queries.person_query import PersonCursor, PersonQuery
 from posthog.queries.properties_timeline import PropertiesTimeline
 from posthog.queries.property_values import get_person_property_values_for_key
 from posthog.queries.retention import Retention
@@ -62,9 +62,18 @@ from posthog.queries.util import get_earliest_timestamp
 from posthog.rate_limit import ClickHouseBurstRateThrottle, ClickHouseSustainedRateThrottle
 from posthog.settings import EE_AVAILABLE
 from posthog.tasks.split_person import split_person
-from posthog.utils import convert_property_value, format_query_params_absolute_url, is_anonymous_id
+from posthog.utils import (
+    convert_property_value,
+    format_cursor_absolute_url,
+    format_query_params_absolute_url,
+    is_anonymous_id,
+)
 
 DEFAULT_PAGE_LIMIT = 100
+# `include_total=approximate` counts roughly one in this many persons and scales the result up
+APPROXIMATE_COUNT_SAMPLE_MODULO = 100
+# Below this many persons the sampled count is too noisy, so the exact count is returned instead
+APPROXIMATE_COUNT_MIN_ESTIMATE = 100_000
 # Sync with .../lib/constants.tsx and .../ingestion/hooks.ts
 PERSON_DEFAULT_DISPLAY_NAME_PROPERTIES = [
     "email",
@@ -221,6 +230,11 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
                 examples=[OpenApiExample(name="email", value="test@test.com")],
             ),
             OpenApiParameter("distinct_id", OpenApiTypes.STR, description="Filter list by distinct id."),
+            OpenApiParameter(
+                "cursor",
+                OpenApiTypes.STR,
+                description="Opaque pagination cursor, as returned in the `next` and `previous` urls.",
+            ),
             OpenApiParameter(
                 "search",
                 OpenApiTypes.STR,
@@ -239,8 +253,14 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         elif not filter.limit:
             filter = filter.shallow_clone({LIMIT: DEFAULT_PAGE_LIMIT})
 
+        cursor = self._get_cursor(request)
+        # Offset pagination is kept for CSV exports and clients which explicitly ask for an offset
+        use_keyset = cursor is not None or (not is_csv_request and OFFSET not in request.GET)
+
         person_query = PersonQuery(filter, team.pk)
-        paginated_query, paginated_params = person_query.get_query(paginate=True, filter_future_persons=True)
+        paginated_query, paginated_params = person_query.get_query(
+            paginate=True, filter_future_persons=True, keyset=use_keyset, cursor=cursor
+        )
         raw_paginated_result = insight_sync_execute(
             paginated_query,
             {**paginated_params, **filter.hogql_context.values},
@@ -248,32 +268,32 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             query_type="person_list",
             team_id=team.pk,
         )
+        if cursor is not None and cursor.direction == "previous":
+            raw_paginated_result = list(reversed(raw_paginated_result))
         actor_ids = [row[0] for row in raw_paginated_result]
         _, serialized_actors = get_people(team, actor_ids)
 
         # If the undocumented include_total param is set to true, we'll return the total count of people
         # This is extra time and DB load, so we only do this when necessary, which is in PostHog 3000 navigation
-        # TODO: Use a more scalable solution before PostHog 3000 navigation is released, and remove this param
+        # With `include_total=approximate` the count is estimated from a sample of persons instead
         total_count: Optional[int] = None
         if "include_total" in request.GET:
-            total_query, total_params = person_query.get_query(paginate=False, filter_future_persons=True)
-            total_query_aggregated = f"SELECT count() FROM ({total_query})"
-            raw_paginated_result = insight_sync_execute(
-                total_query_aggregated,
-                {**total_params, **filter.hogql_context.values},
-                filter=filter,
-                query_type="person_list_total",
-                team_id=team.pk,
+            total_count = self._get_total_count(
+                person_query, filter, approximate=request.GET["include_total"] == "approximate"
             )
-            total_count = raw_paginated_result[0][0]
 
-        _should_paginate = len(actor_ids) >= filter.limit
-        next_url = format_query_params_absolute_url(request, filter.offset + filter.limit) if _should_paginate else None
-        previous_url = (
-            format_query_params_absolute_url(request, filter.offset - filter.limit)
-            if filter.offset - filter.limit >= 0
-            else None
-        )
+        if use_keyset:
+            next_url, previous_url = self._get_cursor_urls(request, raw_paginated_result, cursor, filter.limit)
+        else:
+            _should_paginate = len(actor_ids) >= filter.limit
+            next_url = (
+                format_query_params_absolute_url(request, filter.offset + filter.limit) if _should_paginate else None
+            )
+            previous_url = (
+                format_query_params_absolute_url(request, filter.offset - filter.limit)
+                if filter.offset - filter.limit >= 0
+                else None
+            )
 
         return Response(
             {
@@ -284,6 +304,66 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             }
         )
 
+    def _get_cursor(self, request: request.Request) -> Optional[PersonCursor]:
+        if not request.GET.get("cursor"):
+            return None
+        try:
+            return PersonCursor.decode(request.GET["cursor"])
+        except ValueError:
+            raise ValidationError({"cursor": "Invalid cursor."})
+
+    def _get_cursor_urls(
+        self, request: request.Request, rows: List, cursor: Optional[PersonCursor], limit: int
+    ) -> Tuple[Optional[str], Optional[str]]:
+        # :TRICKY: Cursors are built from the ClickHouse rows rather than the serialized persons, as persons missing
+        #   from postgres would otherwise shift the page boundaries. `created_at` is the last column of each row.
+        if len(rows) == 0:
+            return None, None
+
+        first, last = rows[0], rows[-1]
+        has_next = len(rows) >= limit if cursor is None or cursor.direction == "next" else True
+        has_previous = cursor is not None if cursor is None or cursor.direction == "next" else len(rows) >= limit
+
+        next_url = (
+            format_cursor_absolute_url(request, PersonCursor(created_at=last[-1], id=last[0]).encode())
+            if has_next
+            else None
+        )
+        previous_url = (
+            format_cursor_absolute_url(
+                request, PersonCursor(created_at=first[-1], id=first[0], direction="previous").encode()
+            )
+            if has_previous
+            else None
+        )
+        return next_url, previous_url
+
+    def _get_total_count(self, person_query: PersonQuery, filter: Filter, approximate: bool) -> int:
+        if approximate:
+            sampled_query, sampled_params = person_query.get_query(
+                filter_future_persons=True, sample_modulo=APPROXIMATE_COUNT_SAMPLE_MODULO
+            )
+            sampled_count = insight_sync_execute(
+                f"SELECT count() FROM ({sampled_query})",
+                {**sampled_params, **filter.hogql_context.values},
+                filter=filter,
+                query_type="person_list_total_approximate",
+                team_id=self.team.pk,
+            )[0][0]
+            estimate = sampled_count * APPROXIMATE_COUNT_SAMPLE_MODULO
+            # Small samples are too noisy to be useful, and the exact count is cheap for small projects anyway
+            if estimate >= APPROXIMATE_COUNT_MIN_ESTIMATE:
+                return estimate
+
+        total_query, total_params = person_query.get_query(paginate=False, filter_future_persons=True)
+        return insight_sync_execute(
+            f"SELECT count() FROM ({total_query})",
+            {**total_params, **filter.hogql_context.values},
+            filter=filter,
+            query_type="person_list_total",
+            team_id=self.team.pk,
+        )[0][0]
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -546,6 +626,7 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
                 "missing_persons": missing_persons,
                 "is_cached": results_package.get("is_cached"),
                 "last_refresh": results_package.get("last_refresh"),
+                "timings": results_package.get("timings"),
             }
         )
 
@@ -564,12 +645,16 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         filter = prepare_actor_query_filter(filter)
         funnel_actor_class = get_funnel_actor_class(filter)
 
-        actors, serialized_actors, raw_count = funnel_actor_class(filter, self.team).get_actors()
+        actors_query = funnel_actor_class(filter, self.team)
+        actors, serialized_actors, raw_count = actors_query.get_actors()
         initial_url = format_query_params_absolute_url(request, 0)
         next_url = paginated_result(request, raw_count, filter.offset, filter.limit)
 
         # cached_function expects a dict with the key result
-        return {"result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors))}
+        return {
+            "result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors)),
+            "timings": actors_query.timings,
+        }
 
     @action(methods=["GET", "POST"], detail=False)
     def path(self, request: request.Request, **kwargs) -> response.Response:
@@ -592,12 +677,16 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
                 funnel_filter_data = json.loads(funnel_filter_data)
             funnel_filter = Filter(data={"insight": INSIGHT_FUNNELS, **funnel_filter_data}, team=self.team)
 
-        actors, serialized_actors, raw_count = PathsActors(filter, self.team, funnel_filter=funnel_filter).get_actors()
+        actors_query = PathsActors(filter, self.team, funnel_filter=funnel_filter)
+        actors, serialized_actors, raw_count = actors_query.get_actors()
         next_url = paginated_result(request, raw_count, filter.offset, filter.limit)
         initial_url = format_query_params_absolute_url(request, 0)
 
         # cached_function expects a dict with the key result
-        return {"result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors))}
+        return {
+            "result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors)),
+            "timings": actors_query.timings,
+        }
 
     @action(methods=["GET"], detail=False)
     def trends(self, request: request.Request, *args: Any, **kwargs: Any) -> Response:
@@ -614,12 +703,16 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
         filter = prepare_actor_query_filter(filter)
         entity = get_target_entity(filter)
 
-        actors, serialized_actors, raw_count = TrendsActors(self.team, entity, filter).get_actors()
+        actors_query = TrendsActors(self.team, entity, filter)
+        actors, serialized_actors, raw_count = actors_query.get_actors()
         next_url = paginated_result(request, raw_count, filter.offset, filter.limit)
         initial_url = format_query_params_absolute_url(request, 0)
 
         # cached_function expects a dict with the key result
-        return {"result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors))}
+        return {
+            "result": (serialized_actors, next_url, initial_url, raw_count - len(serialized_actors)),
+            "timings": actors_query.timings,
+        }
 
     @action(methods=["GET"], detail=True)
     def properties_timeline(self, request: request.Request, *args: Any, **kwargs: Any) -> Response:
@@ -1,31 +1,59 @@
+import gzip
 import json
+from dataclasses import dataclass
+from datetime import timedelta
+from hashlib import md5
 
 from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
+from posthog.cache_utils import LRUCache
 from posthog.exceptions import generate_exception_response
 from posthog.logging.timing import timed
 from posthog.plugins.site import get_site_config_from_schema, get_transpiled_site_source
 
+# Number of rendered site app bundles kept in memory. Every page view on a site with site apps requests its bundles,
+# while the number of distinct bundles is small.
+SITE_APP_CACHE_SIZE = 1000
+# How long a bundle is served from memory before checking again that the site app still exists and is enabled
+SITE_APP_CACHE_TTL = timedelta(minutes=1)
+# The url contains a hash of the source and config, so a response for a matching hash never changes
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# The hash is stale or made up, so the bundle can change under the same url
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+@dataclass(frozen=True)
+class SiteAppBundle:
+    content: bytes
+    gzipped_content: bytes
+    content_hash: str
+    cache_control: str
+
+
+_bundle_cache = LRUCache("site_app_bundles", SITE_APP_CACHE_SIZE)
+
 
 @csrf_exempt
 @timed("posthog_cloud_site_app_endpoint")
 def get_site_app(request: HttpRequest, id: int, token: str, hash: str) -> HttpResponse:
     try:
-        source_file = get_transpiled_site_source(id, token) if token else None
-        if not source_file:
-            raise Exception("No source file found")
-
-        id = source_file.id
-        source = source_file.source
-        config = get_site_config_from_schema(source_file.config_schema, source_file.config)
-        response = f"{source}().inject({{config:{json.dumps(config)},posthog:window['__$$ph_site_app_{id}']}})"
+        entry = _bundle_cache.get((id, token, hash))
+        if entry is not None and now() < entry[0]:
+            bundle = entry[1]
+        else:
+            bundle = render_site_app(id, token, hash)
+            # :TRICKY: Only bundles for the current hash are cached, as anyone can request a url with a made up hash
+            if bundle.cache_control == IMMUTABLE_CACHE_CONTROL:
+                _bundle_cache.set((id, token, hash), bundle, now() + SITE_APP_CACHE_TTL)
 
         statsd.incr(f"posthog_cloud_raw_endpoint_success", tags={"endpoint": "site_app"})
-        return HttpResponse(content=response, content_type="application/javascript")
+        return bundle_response(request, bundle)
     except Exception as e:
         capture_exception(e, {"data": {"id": id, "token": token}})
         statsd.incr("posthog_cloud_raw_endpoint_failure", tags={"endpoint": "site_app"})
@@ -36,3 +64,43 @@ def get_site_app(request: HttpRequest, id: int, token: str, hash: str) -> HttpRe
             type="server_error",
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
         )
+
+
+def render_site_app(id: int, token: str, hash: str) -> SiteAppBundle:
+    source_file = get_transpiled_site_source(id, token) if token else None
+    if not source_file:
+        raise Exception("No source file found")
+
+    id = source_file.id
+    source = source_file.source
+    config = get_site_config_from_schema(source_file.config_schema, source_file.config)
+    content = f"{source}().inject({{config:{json.dumps(config)},posthog:window['__$$ph_site_app_{id}']}})".encode(
+        "utf-8"
+    )
+
+    return SiteAppBundle(
+        content=content,
+        # mtime is fixed so that the compressed body is the same on every server
+        gzipped_content=gzip.compress(content, mtime=0),
+        content_hash=md5(content).hexdigest(),
+        cache_control=IMMUTABLE_CACHE_CONTROL if source_file.hash == hash else REVALIDATE_CACHE_CONTROL,
+    )
+
+
+def bundle_response(request: HttpRequest, bundle: SiteAppBundle) -> HttpResponse:
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    # Strong etags must differ between the compressed and uncompressed representations
+    etag = f'"{bundle.content_hash}-gzip"' if use_gzip else f'"{bundle.content_hash}"'
+
+    if etag in [value.strip() for value in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    elif use_gzip:
+        response = HttpResponse(content=bundle.gzipped_content, content_type="application/javascript")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(content=bundle.content, content_type="application/javascript")
+
+    response["ETag"] = etag
+    response["Cache-Control"] = bundle.cache_control
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
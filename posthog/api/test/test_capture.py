@@ -33,7 +33,7 @@ from posthog.api.capture import (
 )
 from posthog.api.test.mock_sentry import mock_sentry_context_for_tagging
 from posthog.api.test.openapi_validation import validate_response
-from posthog.kafka_client.client import KafkaProducer, sessionRecordingKafkaProducer
+from posthog.kafka_client.client import KafkaProducer, KafkaProducerBufferFullError, sessionRecordingKafkaProducer
 from posthog.kafka_client.topics import (
     KAFKA_EVENTS_PLUGIN_INGESTION_HISTORICAL,
     KAFKA_SESSION_RECORDING_EVENTS,
@@ -296,6 +296,17 @@ class TestCapture(BaseTest):
         response = self.client.get("/e/?data=%s" % quote(self._to_json(data)), HTTP_ORIGIN="https://localhost")
         self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_capture_events_503_with_retry_after_when_kafka_buffer_is_full(self, kafka_produce):
+        kafka_produce.side_effect = KafkaProducerBufferFullError("buffer is full")
+        data = {"event": "$pageview", "properties": {"distinct_id": 2, "token": self.team.api_token}}
+
+        response = self.client.get("/e/?data=%s" % quote(self._to_json(data)), HTTP_ORIGIN="https://localhost")
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()["code"], "server_busy")
+        self.assertEqual(response["Retry-After"], "1")
+
     @patch("posthog.kafka_client.client._KafkaProducer.produce")
     def test_capture_event_ip(self, kafka_produce):
         data = {"event": "some_event", "properties": {"distinct_id": 2, "token": self.team.api_token}}
@@ -1282,6 +1293,21 @@ class TestCapture(BaseTest):
                 {KAFKA_SESSION_RECORDING_EVENTS: 3, KAFKA_SESSION_RECORDING_SNAPSHOT_ITEM_EVENTS: 1}
             )
 
+    @patch("posthog.kafka_client.client._KafkaProducer.produce")
+    def test_recording_ingestion_paths_can_be_disabled_per_team(self, kafka_produce) -> None:
+        with self.settings(REPLAY_LEGACY_INGESTION_DISABLED_TOKENS=[self.team.api_token]):
+            self._send_session_recording_event()
+
+        self.assertEqual(
+            [call[1]["topic"] for call in kafka_produce.call_args_list], [KAFKA_SESSION_RECORDING_SNAPSHOT_ITEM_EVENTS]
+        )
+
+        kafka_produce.reset_mock()
+        with self.settings(REPLAY_BLOB_INGESTION_DISABLED_TOKENS=[self.team.api_token]):
+            self._send_session_recording_event()
+
+        self.assertEqual([call[1]["topic"] for call in kafka_produce.call_args_list], [KAFKA_SESSION_RECORDING_EVENTS])
+
     @patch("posthog.kafka_client.client.SessionRecordingKafkaProducer")
     def test_create_session_recording_kafka_with_expected_hosts(
         self,
@@ -1308,6 +1334,7 @@ class TestCapture(BaseTest):
                 ],
                 kafka_security_protocol="SSL",
                 max_request_size=1234,
+                profile="session_recordings",
             )
 
     @patch("posthog.api.capture.sessionRecordingKafkaProducer")
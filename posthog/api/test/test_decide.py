@@ -1,4 +1,5 @@
 import base64
+import gzip
 import json
 import random
 from unittest.mock import patch
@@ -8,6 +9,7 @@ from django.conf import settings
 
 from django.core.cache import cache
 from django.db import connection, connections
+from django.utils.timezone import now
 from django.test import TransactionTestCase, TestCase
 from django.test.client import Client
 from freezegun import freeze_time
@@ -24,6 +26,7 @@ from posthog.models.cohort.cohort import Cohort
 from posthog.models.organization import Organization, OrganizationMembership
 from posthog.models.personal_api_key import hash_key_value
 from posthog.models.plugin import sync_team_inject_web_apps
+from posthog.models.team.team_caching import delete_decide_config_in_cache
 from posthog.models.team.team import Team
 from posthog.models.person import PersonDistinctId
 from posthog.models.user import User
@@ -31,6 +34,7 @@ from posthog.models.utils import generate_random_token_personal
 from posthog.test.base import BaseTest, QueryMatchingTest, snapshot_postgres_queries, snapshot_postgres_queries_context
 from posthog.database_healthcheck import postgres_healthcheck
 from posthog import redis
+from posthog.utils import STREAMING_DECODE_MIN_BYTES
 
 
 @patch("posthog.models.feature_flag.flag_matching.postgres_healthcheck.is_connected", return_value=True)
@@ -113,6 +117,25 @@ class TestDecide(BaseTest, QueryMatchingTest):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_decide_is_csrf_exempt(self, *args):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+
+        response = client.post(
+            "/decide/?v=3",
+            {"data": self._dict_to_b64({"token": self.team.api_token, "distinct_id": "example_id"})},
+            HTTP_ORIGIN="http://127.0.0.1:8000",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = client.post(
+            "/decide/?v=3",
+            json.dumps({"token": self.team.api_token, "distinct_id": "example_id"}),
+            content_type="application/json",
+            HTTP_ORIGIN="http://127.0.0.1:8000",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_user_on_evil_site(self, *args):
         user = self.organization.members.first()
         user.toolbar_mode = "toolbar"
@@ -286,6 +309,48 @@ class TestDecide(BaseTest, QueryMatchingTest):
             self.assertEqual(len(injected), 1)
             self.assertTrue(injected[0]["url"].startswith(f"/site_app/{plugin_config.id}/{plugin_config.web_token}/"))
 
+    def test_site_apps_are_cached_until_plugin_changes(self, *args):
+        plugin = Plugin.objects.create(organization=self.team.organization, name="My Plugin", plugin_type="source")
+        PluginSourceFile.objects.create(
+            plugin=plugin,
+            filename="site.ts",
+            source="export function inject (){}",
+            transpiled="function inject(){}",
+            status=PluginSourceFile.Status.TRANSPILED,
+        )
+        plugin_config = PluginConfig.objects.create(
+            plugin=plugin, enabled=True, order=1, team=self.team, config={}, web_token="tokentoken"
+        )
+        response = self._post_decide()
+        self.assertEqual(len(response.json()["siteApps"]), 1)
+
+        with patch("posthog.api.decide.get_decide_site_apps") as mock_get_decide_site_apps:
+            response = self._post_decide()
+            self.assertEqual(len(response.json()["siteApps"]), 1)
+            mock_get_decide_site_apps.assert_not_called()
+
+        url = response.json()["siteApps"][0]["url"]
+        source_file = PluginSourceFile.objects.get(plugin=plugin)
+        source_file.updated_at = now()
+        source_file.save()
+        response = self._post_decide()
+        self.assertNotEqual(response.json()["siteApps"][0]["url"], url)
+
+        plugin_config.enabled = False
+        plugin_config.save()
+        response = self._post_decide()
+        self.assertEqual(response.json()["siteApps"], [])
+
+    def test_team_static_config_is_invalidated_on_team_save(self, *args):
+        response = self._post_decide()
+        self.assertEqual(response.json()["capturePerformance"], False)
+
+        self.team.capture_performance_opt_in = True
+        self.team.save()
+
+        response = self._post_decide()
+        self.assertEqual(response.json()["capturePerformance"], True)
+
     def test_feature_flags(self, *args):
         self.team.app_urls = ["https://example.com"]
         self.team.save()
@@ -1879,6 +1944,23 @@ class TestDecide(BaseTest, QueryMatchingTest):
                 },
             )
 
+    def test_rate_limits_with_large_gzipped_body(self, *args):
+        with self.settings(DECIDE_RATE_LIMIT_ENABLED="y", DECIDE_BUCKET_REPLENISH_RATE=0.1, DECIDE_BUCKET_CAPACITY=3):
+            self.client.logout()
+            data = {"token": self.team.api_token, "distinct_id": "example_id", "padding": "x" * 100_000}
+            # stored without compressing, so that the body is large enough to be read as a stream
+            body = gzip.compress(json.dumps(data).encode("utf-8"), compresslevel=0)
+            self.assertGreater(len(body), STREAMING_DECODE_MIN_BYTES)
+
+            response = self.client.post(
+                "/decide/?v=3&compression=gzip",
+                data=body,
+                content_type="text/plain",
+                HTTP_ORIGIN="http://127.0.0.1:8000",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()["featureFlags"], {})
+
     def test_rate_limits_replenish_over_time(self, *args):
         with self.settings(DECIDE_RATE_LIMIT_ENABLED="y", DECIDE_BUCKET_REPLENISH_RATE=1, DECIDE_BUCKET_CAPACITY=1):
             self.client.logout()
@@ -2924,6 +3006,9 @@ class TestDecideUsesReadReplica(TransactionTestCase):
 
         # update caches
         self._post_decide(api_version=3)
+        # the decide config expired
+        cache.delete(f"team_decide_config:{self.team.pk}")
+        cache.delete(f"team_decide_config_invalidated:{self.team.pk}")
 
         with self.assertNumQueries(2, using="replica"), self.assertNumQueries(0, using="default"):
             response = self._post_decide(api_version=3)
@@ -2931,6 +3016,16 @@ class TestDecideUsesReadReplica(TransactionTestCase):
             injected = response.json()["siteApps"]
             self.assertEqual(len(injected), 1)
 
+        with self.assertNumQueries(0, using="replica"), self.assertNumQueries(0, using="default"):
+            response = self._post_decide(api_version=3)
+            self.assertEqual(len(response.json()["siteApps"]), 1)
+
+        # the replica may lag behind right after an invalidation, so the config is rebuilt from the primary
+        delete_decide_config_in_cache([self.team.pk])
+        with self.assertNumQueries(0, using="replica"), self.assertNumQueries(2, using="default"):
+            response = self._post_decide(api_version=3)
+            self.assertEqual(len(response.json()["siteApps"]), 1)
+
 
 class TestDecideMetricLabel(TestCase):
     def test_simple_team_ids(self):
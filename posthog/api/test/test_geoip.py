@@ -1,11 +1,14 @@
+import ipaddress
+from types import SimpleNamespace
 from typing import cast
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from django.contrib.gis.geoip2 import GeoIP2, GeoIP2Exception
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from posthog.api.geoip import geoip, get_geoip_properties
+from posthog.cache_utils import LRUCache
 
 australia_ip = "13.106.122.3"
 uk_ip = "31.28.64.3"
@@ -46,3 +49,49 @@ class TestGeoIPError(TestCase):
         properties = get_geoip_properties(None)
 
         self.assertEqual(properties, {})
+
+
+@override_settings(GEOIP_CACHE_SIZE=100)
+class TestGeoIPCache(TestCase):
+    def setUp(self) -> None:
+        self.cache_patcher = patch("posthog.api.geoip._geoip_cache", LRUCache("test_geoip", 100))
+        self.cache_patcher.start()
+
+    def tearDown(self) -> None:
+        self.cache_patcher.stop()
+
+    def test_repeated_lookups_are_served_from_cache(self):
+        properties = get_geoip_properties(uk_ip)
+
+        with patch.object(geoip, "city", side_effect=GeoIP2Exception("Should not be called")) as mock_city:
+            self.assertEqual(get_geoip_properties(uk_ip), properties)
+            mock_city.assert_not_called()
+
+    def test_cached_properties_cannot_be_modified_by_callers(self):
+        get_geoip_properties(uk_ip)["$geoip_country_name"] = "Changed"
+
+        self.assertEqual(get_geoip_properties(uk_ip)["$geoip_country_name"], "United Kingdom")
+
+    def test_lookups_share_results_within_a_network_prefix(self):
+        with patch.object(geoip, "city", return_value=_london_response("31.28.0.0/16")):
+            properties = get_geoip_properties(uk_ip)
+        with patch.object(geoip, "city", side_effect=GeoIP2Exception("Should not be called")):
+            self.assertEqual(get_geoip_properties("31.28.64.200"), properties)
+        self.assertEqual(properties["$geoip_city_name"], "London")
+
+    def test_lookups_do_not_share_results_across_smaller_networks(self):
+        with patch.object(geoip, "city", return_value=_london_response("31.28.64.0/28")):
+            get_geoip_properties(uk_ip)
+        with patch.object(geoip, "city", side_effect=GeoIP2Exception("Not in database")):
+            self.assertEqual(get_geoip_properties("31.28.64.200"), {})
+
+
+def _london_response(network: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        city=SimpleNamespace(name="London"),
+        country=SimpleNamespace(name="United Kingdom", iso_code="GB"),
+        continent=SimpleNamespace(name="Europe", code="EU"),
+        postal=SimpleNamespace(code=None),
+        location=SimpleNamespace(time_zone="Europe/London"),
+        traits=SimpleNamespace(network=ipaddress.ip_network(network)),
+    )
@@ -691,6 +691,56 @@ class TestPerson(ClickhouseTestMixin, APIBaseTest):
             response_include_total = self.client.get("/api/person/?limit=10&include_total").json()
         self.assertEqual(response_include_total["count"], 20)  #  With `include_total`, the total count is returned too
 
+    @override_settings(PERSON_ON_EVENTS_V2_OVERRIDE=False)
+    def test_cursor_pagination(self):
+        created_ids = []
+        for index in range(0, 25):
+            created_ids.append(str(index + 100))
+            Person.objects.create(team=self.team, distinct_ids=[str(index + 100)])
+        created_ids.reverse()
+
+        first_page = self.client.get("/api/person/?limit=10").json()
+        self.assertIn("cursor=", first_page["next"])
+        self.assertNotIn("offset=", first_page["next"])
+        self.assertIsNone(first_page["previous"])
+
+        second_page = self.client.get(first_page["next"]).json()
+        third_page = self.client.get(second_page["next"]).json()
+        self.assertEqual(len(third_page["results"]), 5)
+        self.assertIsNone(third_page["next"])
+
+        returned_ids = [
+            person["distinct_ids"][0] for page in (first_page, second_page, third_page) for person in page["results"]
+        ]
+        self.assertEqual(returned_ids, created_ids)
+
+        previous_page = self.client.get(third_page["previous"]).json()
+        self.assertEqual([person["distinct_ids"][0] for person in previous_page["results"]], created_ids[10:20])
+        previous_page = self.client.get(previous_page["previous"]).json()
+        self.assertEqual([person["distinct_ids"][0] for person in previous_page["results"]], created_ids[0:10])
+        # As with offsets, a full page is assumed to have more before it
+        self.assertEqual(self.client.get(previous_page["previous"]).json()["results"], [])
+
+    def test_cursor_pagination_invalid_cursor(self):
+        response = self.client.get("/api/person/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PERSON_ON_EVENTS_V2_OVERRIDE=False)
+    def test_offset_pagination_is_kept_when_requested(self):
+        for index in range(0, 15):
+            Person.objects.create(team=self.team, distinct_ids=[str(index + 100)])
+
+        response = self.client.get("/api/person/?limit=10&offset=0").json()
+        self.assertIn("offset=10", response["next"])
+        self.assertNotIn("cursor=", response["next"])
+
+    def test_include_total_approximate_is_exact_for_small_teams(self):
+        for index in range(0, 5):
+            Person.objects.create(team=self.team, distinct_ids=[str(index + 100)])
+
+        response = self.client.get("/api/person/?include_total=approximate").json()
+        self.assertEqual(response["count"], 5)
+
     def test_retrieve_person(self):
         person = Person.objects.create(  # creating without _create_person to guarentee created_at ordering
             team=self.team, distinct_ids=["123456789"]
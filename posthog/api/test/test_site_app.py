@@ -1,10 +1,20 @@
+import gzip
+from datetime import timedelta
 from typing import List
+from unittest.mock import patch
 
 from django.test.client import Client
+from freezegun import freeze_time
 from rest_framework import status
 
-from posthog.api.site_app import get_site_config_from_schema
+from posthog.api.site_app import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    SITE_APP_CACHE_TTL,
+    _bundle_cache,
+)
 from posthog.models import Plugin, PluginConfig, PluginSourceFile
+from posthog.plugins.site import get_decide_site_apps, get_site_config_from_schema
 from posthog.test.base import BaseTest
 
 
@@ -14,6 +24,20 @@ class TestSiteApp(BaseTest):
         # it is really important to know that /site_app/ is CSRF exempt. Enforce checking in the client
         self.client = Client(enforce_csrf_checks=True)
         self.client.force_login(self.user)
+        _bundle_cache.clear()
+
+    def _create_site_app(self) -> PluginConfig:
+        plugin = Plugin.objects.create(organization=self.team.organization, name="My Plugin", plugin_type="source")
+        PluginSourceFile.objects.create(
+            plugin=plugin,
+            filename="site.ts",
+            source="export function inject (){}",
+            transpiled="function inject(){}",
+            status=PluginSourceFile.Status.TRANSPILED,
+        )
+        return PluginConfig.objects.create(
+            plugin=plugin, enabled=True, order=1, team=self.team, config={}, web_token="tokentoken"
+        )
 
     def test_site_app(self):
         plugin = Plugin.objects.create(organization=self.team.organization, name="My Plugin", plugin_type="source")
@@ -38,6 +62,69 @@ class TestSiteApp(BaseTest):
             f"function inject(){{}}().inject({{config:{{}},posthog:window['__$$ph_site_app_{plugin_config.id}']}})",
         )
 
+    def test_site_app_is_immutable_and_cached_for_current_hash(self):
+        plugin_config = self._create_site_app()
+        url = get_decide_site_apps(self.team)[0]["url"]
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertIn("Accept-Encoding", response["Vary"])
+        content = response.content
+
+        with patch("posthog.api.site_app.get_transpiled_site_source") as mock_get_transpiled_site_source:
+            response = self.client.get(url)
+            self.assertEqual(response.content, content)
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            mock_get_transpiled_site_source.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertIn(str(plugin_config.id).encode(), content)
+
+    def test_disabled_site_app_stops_being_served_once_cache_expires(self):
+        plugin_config = self._create_site_app()
+        url = get_decide_site_apps(self.team)[0]["url"]
+
+        with freeze_time("2023-01-01T12:00:00Z") as frozen_time:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+            plugin_config.enabled = False
+            plugin_config.save()
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+            frozen_time.tick(SITE_APP_CACHE_TTL + timedelta(seconds=1))
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_site_app_with_stale_hash_is_not_cached(self):
+        plugin_config = self._create_site_app()
+
+        response = self.client.get(f"/site_app/{plugin_config.id}/tokentoken/somehash/")
+        self.assertEqual(response["Cache-Control"], REVALIDATE_CACHE_CONTROL)
+
+        with patch("posthog.api.site_app.get_transpiled_site_source", return_value=None):
+            response = self.client.get(f"/site_app/{plugin_config.id}/tokentoken/somehash/")
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_site_app_etag(self):
+        plugin_config = self._create_site_app()
+        url = get_decide_site_apps(self.team)[0]["url"]
+
+        etag = self.client.get(url)["ETag"]
+        gzip_etag = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        self.assertNotEqual(etag, gzip_etag)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(f"/site_app/{plugin_config.id}/wrongtoken/somehash/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
     def test_get_site_config_from_schema(self):
         schema: List[dict] = [{"key": "in_site", "site": True}, {"key": "not_in_site"}]
         config = {"in_site": "123", "not_in_site": "12345"}
@@ -71,6 +71,71 @@ class AsyncMigrationOperationSQL(AsyncMigrationOperation):
     __repr__ = sane_repr("sql", "rollback", "database", "timeout_seconds", include_id=False)
 
 
+class AsyncMigrationOperationPartitioned(AsyncMigrationOperation):
+    """
+    Runs `sql` once for every partition of `table`, on each shard in parallel.
+
+    `sql` is formatted with `{on_cluster_clause}` and receives the partition as the `partition_id` argument, e.g.
+    `ALTER TABLE sharded_events {on_cluster_clause} UPDATE ... IN PARTITION ID %(partition_id)s WHERE ...`.
+    Concurrency backs off while the cluster is busy merging, mutating or catching up on replication. Completed
+    partitions are recorded on the migration, so a restarted operation only runs the remaining ones.
+    """
+
+    def __init__(
+        self,
+        *,
+        migration_name: str,
+        unique_name: str,
+        table: str,
+        sql: str,
+        args: Optional[Dict] = None,
+        sql_settings: Optional[Dict] = None,
+        rollback: Optional[str],
+        rollback_settings: Optional[Dict] = None,
+        timeout_seconds: int = ASYNC_MIGRATIONS_DEFAULT_TIMEOUT_SECONDS,
+        max_concurrency: int = 4,
+    ):
+        self.migration_name = migration_name
+        self.unique_name = unique_name
+        self.table = table
+        self.sql = sql
+        self.args = args
+        self.sql_settings = sql_settings
+        self.rollback = rollback
+        self.rollback_settings = rollback_settings
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrency = max_concurrency
+
+    def fn(self, query_id: str):
+        from posthog.async_migrations.utils import execute_op_clickhouse_partitioned
+
+        execute_op_clickhouse_partitioned(
+            self.sql,
+            self.args,
+            migration_name=self.migration_name,
+            unique_name=self.unique_name,
+            table=self.table,
+            query_id=query_id,
+            timeout_seconds=self.timeout_seconds,
+            settings=self.sql_settings,
+            max_concurrency=self.max_concurrency,
+        )
+
+    def rollback_fn(self, query_id: str):
+        from posthog.async_migrations.utils import execute_op_clickhouse
+
+        if self.rollback is not None:
+            execute_op_clickhouse(
+                self.rollback,
+                query_id=query_id,
+                timeout_seconds=self.timeout_seconds,
+                settings=self.rollback_settings,
+                per_shard=True,
+            )
+
+    __repr__ = sane_repr("unique_name", "table", "sql", "rollback", "max_concurrency", include_id=False)
+
+
 class AsyncMigrationDefinition:
     name: str
 
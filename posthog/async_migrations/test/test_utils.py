@@ -3,13 +3,15 @@ from unittest.mock import patch
 
 import pytest
 
-from posthog.async_migrations.definition import AsyncMigrationOperationSQL
+from posthog.async_migrations.definition import AsyncMigrationOperationPartitioned, AsyncMigrationOperationSQL
 from posthog.async_migrations.test.util import AsyncMigrationBaseTest, create_async_migration
 from posthog.async_migrations.utils import (
+    _next_partitioned_op_concurrency,
     complete_migration,
     execute_on_each_shard,
     execute_op,
     force_stop_migration,
+    get_estimated_completion_time,
     process_error,
     trigger_migration,
 )
@@ -88,3 +90,70 @@ class TestUtils(AsyncMigrationBaseTest):
         execute_on_each_shard("SELECT 1")
         with self.assertRaises(Exception):
             execute_on_each_shard("SELECT fail")
+
+    @patch("posthog.async_migrations.utils._next_partitioned_op_concurrency", return_value=1)
+    @patch("posthog.async_migrations.utils._get_partition_ids", return_value=["202201", "202202", "202203"])
+    def test_execute_op_clickhouse_partitioned(self, *args):
+        sm = create_async_migration(status=MigrationStatus.Running)
+        op = AsyncMigrationOperationPartitioned(
+            migration_name=sm.name,
+            unique_name="select_partitions",
+            table="sharded_events",
+            sql="SELECT %(partition_id)s",
+            rollback=None,
+        )
+
+        with patch("posthog.async_migrations.utils._execute_on_partition") as mock_execute:
+            mock_execute.side_effect = [None, Exception("partition failed"), None]
+            with self.assertRaises(Exception):
+                execute_op(op, "some_id")
+
+        sm.refresh_from_db()
+        self.assertEqual(len(sm.partition_progress["select_partitions"]["done"]), 1)
+        self.assertEqual(sm.partition_progress["select_partitions"]["total"], 3)
+        self.assertIsNotNone(get_estimated_completion_time(sm))
+
+        # only the remaining partitions are run again
+        with patch("posthog.async_migrations.utils._execute_on_partition") as mock_execute:
+            execute_op(op, "some_id")
+
+        self.assertEqual(
+            sorted(call.args[2]["partition_id"] for call in mock_execute.call_args_list), ["202202", "202203"]
+        )
+        sm.refresh_from_db()
+        self.assertEqual(len(sm.partition_progress["select_partitions"]["done"]), 3)
+        self.assertIsNone(get_estimated_completion_time(sm))
+
+    @patch("posthog.async_migrations.utils._next_partitioned_op_concurrency", return_value=1)
+    @patch("posthog.async_migrations.utils._get_partition_ids", return_value=["202201", "202202"])
+    @patch(
+        "posthog.async_migrations.utils._get_all_shard_connections",
+        return_value=[(1, "host1", "pool1"), (2, "host2", "pool2")],
+    )
+    def test_execute_op_clickhouse_partitioned_alternates_shards_and_waits_for_mutations(self, *args):
+        sm = create_async_migration(status=MigrationStatus.Running)
+        op = AsyncMigrationOperationPartitioned(
+            migration_name=sm.name,
+            unique_name="update_partitions",
+            table="sharded_events",
+            sql="ALTER TABLE sharded_events UPDATE x = 1 IN PARTITION ID %(partition_id)s WHERE 1",
+            rollback=None,
+        )
+
+        with patch("posthog.async_migrations.utils._execute_on_partition") as mock_execute:
+            execute_op(op, "some_id")
+
+        self.assertEqual(
+            [(call.args[0], call.args[2]["partition_id"]) for call in mock_execute.call_args_list],
+            [("pool1", "202201"), ("pool2", "202201"), ("pool1", "202202"), ("pool2", "202202")],
+        )
+        self.assertEqual(mock_execute.call_args_list[0].args[3]["mutations_sync"], 2)
+
+    def test_partitioned_op_concurrency_backs_off_under_load(self):
+        with patch("posthog.async_migrations.utils._get_cluster_load", return_value=(0, 0, 0)):
+            self.assertEqual(_next_partitioned_op_concurrency(2, 4, "sharded_events"), 3)
+            self.assertEqual(_next_partitioned_op_concurrency(4, 4, "sharded_events"), 4)
+
+        with patch("posthog.async_migrations.utils._get_cluster_load", return_value=(0, 0, 3600)):
+            self.assertEqual(_next_partitioned_op_concurrency(4, 4, "sharded_events"), 2)
+            self.assertEqual(_next_partitioned_op_concurrency(1, 4, "sharded_events"), 0)
@@ -1,6 +1,9 @@
 import asyncio
-from datetime import datetime
-from typing import Callable, Optional
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import zip_longest
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import posthoganalytics
 import structlog
@@ -30,6 +33,12 @@ logger = structlog.get_logger(__name__)
 
 SLEEP_TIME_SECONDS = 20 if not TEST else 1
 
+# Partitioned operations back off while any replica has more merges running than this, other tables have more
+# mutations pending than this, or replication is lagging by more than this
+PARTITIONED_OP_MAX_MERGES_PER_HOST = 10
+PARTITIONED_OP_MAX_PENDING_MUTATIONS = 5
+PARTITIONED_OP_MAX_REPLICA_DELAY_SECONDS = 300
+
 
 def send_analytics_to_posthog(event, data):
     posthoganalytics.project_api_key = "sTMFPsFhdP1Ssg"
@@ -124,6 +133,206 @@ def _get_all_shard_connections():
         yield None, None, default_ch_pool
 
 
+def execute_op_clickhouse_partitioned(
+    sql: str,
+    args=None,
+    *,
+    migration_name: str,
+    unique_name: str,
+    table: str,
+    query_id: str,
+    timeout_seconds: int = settings.ASYNC_MIGRATIONS_DEFAULT_TIMEOUT_SECONDS,
+    settings=None,
+    max_concurrency: int = 4,
+):
+    """
+    Runs `sql` for every partition of `table` on each shard, see `AsyncMigrationOperationPartitioned`.
+
+    Concurrency starts at one partition at a time, grows by one while the cluster is healthy and halves (down to
+    pausing entirely) while it's under load. Partitions are taken from the shards in turn. Progress is saved on the
+    migration after every completed partition.
+    """
+    # :TRICKY: Mutations return as soon as they are queued by default. Wait for them to finish on all replicas so that
+    #   a partition only counts as done (and towards concurrency) while it's actually being worked on
+    settings = {"max_execution_time": timeout_seconds, "mutations_sync": 2, **(settings or {})}
+    if CLICKHOUSE_ALLOW_PER_SHARD_EXECUTION:
+        sql = sql.format(on_cluster_clause="")
+    else:
+        sql = sql.format(on_cluster_clause=f"ON CLUSTER '{CLICKHOUSE_CLUSTER}'")
+    sql = f"/* async_migration:{query_id} */ {sql}"
+
+    migration_instance = AsyncMigration.objects.get(name=migration_name)
+    progress = (migration_instance.partition_progress or {}).get(unique_name, {})
+    done: Set[Tuple[Any, str]] = {(shard, partition_id) for shard, partition_id in progress.get("done", [])}
+
+    connection_pools = {}
+    remaining_per_shard: List[List[Tuple[Any, str]]] = []
+    for shard, _, connection_pool in _get_all_shard_connections():
+        connection_pools[shard] = connection_pool
+        remaining_per_shard.append(
+            [
+                (shard, partition_id)
+                for partition_id in _get_partition_ids(connection_pool, table)
+                if (shard, partition_id) not in done
+            ]
+        )
+    # round robin over the shards, so that all of them are worked on in parallel
+    remaining: List[Tuple[Any, str]] = [
+        partition for partitions in zip_longest(*remaining_per_shard) for partition in partitions if partition
+    ]
+    total = len(done) + len(remaining)
+
+    logger.info(
+        "Running partitioned operation", name=unique_name, partitions=total, already_done=len(done), query_id=query_id
+    )
+
+    start_time = time.monotonic()
+    completed = 0
+    concurrency = 1
+    errors: List[Exception] = []
+    running: Dict[Any, Tuple[Any, str]] = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while (remaining and not errors) or running:
+            while remaining and not errors and len(running) < concurrency:
+                shard, partition_id = remaining.pop(0)
+                future = executor.submit(
+                    _execute_on_partition,
+                    connection_pools[shard],
+                    sql,
+                    {**(args or {}), "partition_id": partition_id},
+                    settings,
+                )
+                running[future] = (shard, partition_id)
+
+            if running:
+                finished, _ = wait(running, timeout=SLEEP_TIME_SECONDS, return_when=FIRST_COMPLETED)
+            else:
+                # paused due to cluster load
+                time.sleep(SLEEP_TIME_SECONDS)
+                finished = set()
+
+            for future in finished:
+                shard, partition_id = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                done.add((shard, partition_id))
+                completed += 1
+
+            if finished:
+                seconds_per_partition = (time.monotonic() - start_time) / completed if completed else None
+                _save_partition_progress(migration_instance, unique_name, done, total, seconds_per_partition)
+
+            if remaining and not errors:
+                concurrency = _next_partitioned_op_concurrency(concurrency, max_concurrency, table)
+
+    if errors:
+        raise Exception(
+            f"Failed to execute ClickHouse op: sql={sql},\nquery_id={query_id},\nexception={str(errors[0])}"
+        )
+
+
+def _get_partition_ids(connection_pool, table: str) -> List[str]:
+    # without per shard execution the operation runs ON CLUSTER, so partitions on any replica count
+    parts_table = (
+        "system.parts" if CLICKHOUSE_ALLOW_PER_SHARD_EXECUTION else "clusterAllReplicas(%(cluster)s, system.parts)"
+    )
+    with connection_pool.get_client() as connection:
+        rows = connection.execute(
+            f"""
+            SELECT DISTINCT partition_id
+            FROM {parts_table}
+            WHERE database = %(database)s AND table = %(table)s AND active
+            ORDER BY partition_id
+            """,
+            {"cluster": CLICKHOUSE_CLUSTER, "database": settings.CLICKHOUSE_DATABASE, "table": table},
+        )
+    return [partition_id for (partition_id,) in rows]
+
+
+def _execute_on_partition(connection_pool, sql: str, args: Dict, settings: Dict) -> None:
+    with connection_pool.get_client() as connection:
+        connection.execute(sql, args, settings=settings)
+
+
+def _next_partitioned_op_concurrency(concurrency: int, max_concurrency: int, table: str) -> int:
+    max_merges, pending_mutations, replica_delay = _get_cluster_load(table)
+    if (
+        max_merges > PARTITIONED_OP_MAX_MERGES_PER_HOST
+        or pending_mutations > PARTITIONED_OP_MAX_PENDING_MUTATIONS
+        or replica_delay > PARTITIONED_OP_MAX_REPLICA_DELAY_SECONDS
+    ):
+        logger.info(
+            "Cluster under load, lowering partitioned operation concurrency",
+            max_merges=max_merges,
+            pending_mutations=pending_mutations,
+            replica_delay=replica_delay,
+        )
+        return concurrency // 2
+    return min(concurrency + 1, max_concurrency)
+
+
+def _get_cluster_load(table: str) -> Tuple[int, int, int]:
+    """
+    Returns the most merges running on a single replica and the number of mutations pending, both leaving out the
+    mutations of the table being migrated, and the highest replication delay in seconds.
+    """
+    return sync_execute(
+        """
+        SELECT
+            (
+                SELECT max(merges) FROM (
+                    SELECT hostName() AS host, count() AS merges
+                    FROM clusterAllReplicas(%(cluster)s, system, 'merges')
+                    WHERE NOT (is_mutation AND table = %(table)s)
+                    GROUP BY host
+                )
+            ),
+            (
+                SELECT count()
+                FROM clusterAllReplicas(%(cluster)s, system, 'mutations')
+                WHERE NOT is_done AND table != %(table)s
+            ),
+            (SELECT max(absolute_delay) FROM clusterAllReplicas(%(cluster)s, system, 'replicas'))
+        """,
+        {"cluster": CLICKHOUSE_CLUSTER, "table": table},
+    )[0]
+
+
+def _save_partition_progress(
+    migration_instance: AsyncMigration,
+    unique_name: str,
+    done: Set[Tuple[Any, str]],
+    total: int,
+    seconds_per_partition: Optional[float],
+) -> None:
+    estimated_completion_time = None
+    if seconds_per_partition is not None:
+        estimated_completion_time = (now() + timedelta(seconds=seconds_per_partition * (total - len(done)))).isoformat()
+
+    with transaction.atomic():
+        instance = AsyncMigration.objects.select_for_update().get(pk=migration_instance.pk)
+        instance.partition_progress = {
+            **(instance.partition_progress or {}),
+            unique_name: {
+                "done": sorted(done, key=str),
+                "total": total,
+                "estimated_completion_time": estimated_completion_time,
+            },
+        }
+        instance.save(update_fields=["partition_progress"])
+
+
+def get_estimated_completion_time(migration_instance: AsyncMigration) -> Optional[str]:
+    "Returns when the partitioned operation currently running is expected to finish, if any"
+    for progress in (migration_instance.partition_progress or {}).values():
+        if len(progress["done"]) < progress["total"]:
+            return progress["estimated_completion_time"]
+    return None
+
+
 def execute_op_postgres(sql: str, query_id: str):
     from django.db import connection
 
@@ -304,6 +513,7 @@ def mark_async_migration_as_running(migration_instance: AsyncMigration) -> bool:
         instance.status = MigrationStatus.Running
         instance.current_query_id = ""
         instance.progress = 0
+        instance.partition_progress = None
         instance.current_operation_index = 0
         instance.started_at = now()
         instance.finished_at = None
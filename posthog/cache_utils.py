@@ -1,63 +1,213 @@
 import threading
-from datetime import timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from functools import wraps
-from typing import no_type_check
+from typing import Any, Callable, Hashable, Optional, Tuple, Union, no_type_check
 
 from django.utils.timezone import now
+from prometheus_client import Counter, Gauge
+from sentry_sdk import capture_exception
 
 from posthog.settings import TEST
 
+# Default number of distinct arguments remembered per memoized function. Functions keyed by e.g. team can otherwise
+# grow without bound in long-lived workers.
+DEFAULT_CACHE_MAXSIZE = 1000
+# Number of threads shared by all memoized functions for refreshing stale values in the background
+BACKGROUND_REFRESH_WORKERS = 4
+# Concurrent calls for the same arguments wait on one of these locks rather than all computing the value
+LOCK_STRIPES = 64
+
+MEMOIZED_CACHE_SIZE = Gauge("posthog_memoized_cache_size", "Number of entries in a memoized function cache", ["name"])
+MEMOIZED_CACHE_HITS = Counter("posthog_memoized_cache_hits", "Memoized function calls served from cache", ["name"])
+MEMOIZED_CACHE_MISSES = Counter("posthog_memoized_cache_misses", "Memoized function calls that were computed", ["name"])
+MEMOIZED_CACHE_EVICTIONS = Counter(
+    "posthog_memoized_cache_evictions", "Entries evicted from memoized function caches due to size", ["name"]
+)
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_executor_lock = threading.Lock()
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+
+    with _refresh_executor_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(
+                max_workers=BACKGROUND_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+            )
+        return _refresh_executor
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded cache which evicts the least recently used entry once full.
+
+    Each entry is stored together with the time it expires at (None if never), so callers can decide whether to use
+    stale values. Caches which exist many times under the same name, e.g. per instance, shouldn't `report_size`, as
+    the sizes would overwrite each other.
+    """
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_CACHE_MAXSIZE, report_size: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[datetime], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size_metric = MEMOIZED_CACHE_SIZE.labels(name) if report_size else None
+        self._evictions_metric = MEMOIZED_CACHE_EVICTIONS.labels(name)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Optional[datetime], Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[datetime] = None) -> None:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            size = len(self._entries)
+
+        if self._size_metric is not None:
+            self._size_metric.set(size)
+        if evicted > 0:
+            self._evictions_metric.inc(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._size_metric is not None:
+            self._size_metric.set(0)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def cache_for(
+    cache_time: Union[timedelta, Callable[[Any], timedelta]],
+    background_refresh=False,
+    maxsize: int = DEFAULT_CACHE_MAXSIZE,
+):
+    """
+    Memoizes a function for `cache_time`, remembering the results for up to `maxsize` distinct arguments.
+    `cache_time` can also be a function of the result, to cache e.g. empty results for less time.
+
+    With `background_refresh`, stale values keep being returned while a fresh one is computed on a shared
+    background executor. Otherwise stale values are recomputed on the calling thread. Either way only one
+    caller computes the value for the same arguments at a time.
+    """
 
-def cache_for(cache_time: timedelta, background_refresh=False):
     def wrapper(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        cache = LRUCache(name, maxsize)
+        hits = MEMOIZED_CACHE_HITS.labels(name)
+        misses = MEMOIZED_CACHE_MISSES.labels(name)
+        locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def store(key, value):
+            ttl = cache_time(value) if callable(cache_time) else cache_time
+            cache.set(key, value, now() + ttl)
+
+        def compute(key, args, kwargs):
+            with locks[hash(key) % LOCK_STRIPES]:
+                # :TRICKY: Another caller may have computed the value while we were waiting for the lock
+                entry = cache.get(key)
+                if entry is not None and now() < entry[0]:
+                    return entry[1]
+
+                value = fn(*args, **kwargs)
+                store(key, value)
+                return value
+
+        def refresh_in_background(key, args, kwargs):
+            try:
+                value = fn(*args, **kwargs)
+                store(key, value)
+            except Exception as err:
+                capture_exception(err)
+            finally:
+                with refreshing_lock:
+                    refreshing.discard(key)
+
         @wraps(fn)
         @no_type_check
         def memoized_fn(*args, use_cache=not TEST, **kwargs):
             if not use_cache:
                 return fn(*args, **kwargs)
 
-            current_time = now()
             key = (args, frozenset(sorted(kwargs.items())))
+            entry = cache.get(key)
 
-            def refresh():
-                try:
-                    value = fn(*args, **kwargs)
-                    memoized_fn._cache[key] = (now(), value)
-                    memoized_fn._refreshing[key] = None
-                except Exception:
-                    memoized_fn._refreshing[key] = None
-                    raise
-
-            if key not in memoized_fn._cache:
-                refresh()
-            elif current_time - memoized_fn._cache[key][0] > cache_time:
-                if background_refresh:
-                    if not memoized_fn._refreshing.get(key):
-                        memoized_fn._refreshing[key] = current_time
-                        t = threading.Thread(target=refresh)
-                        t.start()
-                else:
-                    refresh()
-
-            return memoized_fn._cache[key][1]
-
-        memoized_fn._cache = {}
-        memoized_fn._refreshing = {}
+            if entry is None:
+                misses.inc()
+                return compute(key, args, kwargs)
+
+            expires_at, value = entry
+            if now() < expires_at:
+                hits.inc()
+                return value
+
+            if background_refresh:
+                hits.inc()
+                with refreshing_lock:
+                    should_refresh = key not in refreshing
+                    refreshing.add(key)
+                if should_refresh:
+                    _get_refresh_executor().submit(refresh_in_background, key, args, kwargs)
+                return value
+
+            misses.inc()
+            return compute(key, args, kwargs)
+
+        memoized_fn._cache = cache
         return memoized_fn
 
     return wrapper
 
 
-def instance_memoize(callback):
-    name = f"_{callback.__name__}_memo"
+def instance_memoize(callback=None, *, maxsize: int = DEFAULT_CACHE_MAXSIZE):
+    """
+    Memoizes a method per instance, remembering the results for up to `maxsize` distinct arguments.
+    """
+
+    def decorator(callback):
+        name = f"_{callback.__name__}_memo"
+        metric_name = f"{callback.__module__}.{callback.__qualname__}"
+        hits = MEMOIZED_CACHE_HITS.labels(metric_name)
+        misses = MEMOIZED_CACHE_MISSES.labels(metric_name)
+
+        @wraps(callback)
+        def _inner(self, *args):
+            if not hasattr(self, name):
+                setattr(self, name, LRUCache(metric_name, maxsize, report_size=False))
+
+            memo = getattr(self, name)
+            entry = memo.get(args)
+            if entry is not None:
+                hits.inc()
+                return entry[1]
 
-    def _inner(self, *args):
-        if not hasattr(self, name):
-            setattr(self, name, {})
+            misses.inc()
+            value = callback(self, *args)
+            memo.set(args, value)
+            return value
 
-        memo = getattr(self, name)
-        if args not in memo:
-            memo[args] = callback(self, *args)
-        return memo[args]
+        return _inner
 
-    return _inner
+    if callback is not None:
+        return decorator(callback)
+    return decorator
@@ -1,6 +1,7 @@
+import math
 from datetime import datetime, timedelta
 from time import perf_counter
-from typing import Any, List, Optional, Tuple, cast
+from typing import Any, Dict, List, Optional, Tuple, cast
 from uuid import UUID
 
 import structlog
@@ -13,6 +14,7 @@ from sentry_sdk.api import capture_exception
 from statshog.defaults.django import statsd
 
 from posthog.caching.calculate_results import calculate_result_by_insight
+from posthog.caching.insight_result_encoding import encode_insight_result
 from posthog.models import Dashboard, Insight, InsightCachingState, Team
 from posthog.models.instance_setting import get_instance_setting
 
@@ -21,6 +23,18 @@ logger = structlog.get_logger(__name__)
 REQUEUE_DELAY = timedelta(hours=2)
 MAX_ATTEMPTS = 3
 
+# How far back insight views count towards an insight's refresh priority
+VIEWED_WINDOW = timedelta(weeks=2)
+# Used as the cost of insights which haven't been calculated by the scheduler yet
+DEFAULT_REFRESH_DURATION = timedelta(seconds=1)
+# Avoids cheap insights dominating the queue due to dividing by ~0
+MIN_REFRESH_DURATION = timedelta(milliseconds=100)
+# :TRICKY: The plugin server only bumps `last_seen_at` on event definitions once a day, so only teams which have
+#   not ingested anything for longer than that before the last refresh are considered idle.
+LAST_SEEN_AT_GRACE = timedelta(days=1)
+# Stops a single team with a lot of stale dashboards from hogging the whole batch
+MAX_TEAM_SHARE_OF_BATCH = 0.5
+
 insight_cache_write_counter = Counter("posthog_cloud_insight_cache_write", "A write to the redis insight cache")
 
 
@@ -49,29 +63,82 @@ def schedule_cache_updates():
 
 
 def fetch_states_in_need_of_updating(limit: int) -> List[Tuple[int, str, UUID]]:
+    """
+    Returns caching states to refresh, most valuable first.
+
+    Candidates are ranked by how often the insight has been viewed recently, how stale it is relative to its
+    target age and how expensive it was to calculate last time. States of teams which haven't ingested any
+    events since the last refresh are skipped, and no single team can take more than its share of a batch.
+    """
     current_time = now()
     with connection.cursor() as cursor:
         cursor.execute(
             """
-            SELECT team_id, cache_key, id
-            FROM posthog_insightcachingstate
-            WHERE target_cache_age_seconds IS NOT NULL
-            AND refresh_attempt < %(max_attempts)s
-            AND (
-                last_refresh IS NULL OR
-                last_refresh < %(current_time)s - target_cache_age_seconds * interval '1' second
+            WITH candidates AS (
+                SELECT
+                    state.team_id,
+                    state.cache_key,
+                    state.id,
+                    state.last_refresh IS NULL AS never_refreshed,
+                    (
+                        1 + (
+                            SELECT count(*)
+                            FROM posthog_insightviewed viewed
+                            WHERE viewed.insight_id = state.insight_id
+                            AND viewed.last_viewed_at >= %(viewed_threshold)s
+                        )
+                    ) * (
+                        EXTRACT(EPOCH FROM %(current_time)s - coalesce(state.last_refresh, %(current_time)s))
+                        / greatest(state.target_cache_age_seconds, 1)
+                    ) / greatest(
+                        coalesce(state.last_refresh_duration_seconds, %(default_duration)s), %(min_duration)s
+                    ) AS priority
+                FROM posthog_insightcachingstate state
+                WHERE state.target_cache_age_seconds IS NOT NULL
+                AND state.refresh_attempt < %(max_attempts)s
+                AND (
+                    state.last_refresh IS NULL OR
+                    state.last_refresh < %(current_time)s - state.target_cache_age_seconds * interval '1' second
+                )
+                AND (
+                    state.last_refresh_queued_at IS NULL OR
+                    state.last_refresh_queued_at < %(last_refresh_queued_at_threshold)s
+                )
+                AND (
+                    state.last_refresh IS NULL OR
+                    state.last_refresh < %(cache_expiry_threshold)s OR
+                    coalesce(
+                        (
+                            SELECT max(definition.last_seen_at)
+                            FROM posthog_eventdefinition definition
+                            WHERE definition.team_id = state.team_id
+                        ),
+                        %(current_time)s
+                    ) >= state.last_refresh - %(last_seen_grace)s
+                )
+            ),
+            ranked AS (
+                SELECT
+                    *,
+                    row_number() OVER (PARTITION BY team_id ORDER BY never_refreshed DESC, priority DESC) AS team_rank
+                FROM candidates
             )
-            AND (
-                last_refresh_queued_at IS NULL OR
-                last_refresh_queued_at < %(last_refresh_queued_at_threshold)s
-            )
-            ORDER BY last_refresh ASC NULLS FIRST
+            SELECT team_id, cache_key, id
+            FROM ranked
+            WHERE team_rank <= %(team_limit)s
+            ORDER BY never_refreshed DESC, priority DESC
             LIMIT %(limit)s
             """,
             {
                 "max_attempts": MAX_ATTEMPTS,
                 "current_time": current_time,
                 "last_refresh_queued_at_threshold": current_time - REQUEUE_DELAY,
+                "viewed_threshold": current_time - VIEWED_WINDOW,
+                "cache_expiry_threshold": current_time - timedelta(seconds=settings.CACHED_RESULTS_TTL),
+                "last_seen_grace": LAST_SEEN_AT_GRACE,
+                "default_duration": DEFAULT_REFRESH_DURATION.total_seconds(),
+                "min_duration": MIN_REFRESH_DURATION.total_seconds(),
+                "team_limit": max(1, math.ceil(limit * MAX_TEAM_SHARE_OF_BATCH)),
                 "limit": limit,
             },
         )
@@ -116,6 +183,7 @@ def update_cache(caching_state_id: UUID):
             cast(str, cache_key),
             timestamp,
             {"result": result, "type": cache_type, "last_refresh": timestamp},
+            duration=duration,
         )
         statsd.incr("caching_state_update_success")
         statsd.incr("caching_state_update_rows_updated", rows_updated)
@@ -141,15 +209,24 @@ def update_cache(caching_state_id: UUID):
         )
 
 
-def update_cached_state(team_id: int, cache_key: str, timestamp: datetime, result: Any, ttl: Optional[int] = None):
-    cache.set(cache_key, result, ttl if ttl is not None else settings.CACHED_RESULTS_TTL)
+def update_cached_state(
+    team_id: int,
+    cache_key: str,
+    timestamp: datetime,
+    result: Any,
+    ttl: Optional[int] = None,
+    duration: Optional[float] = None,
+):
+    value = encode_insight_result(result) if settings.INSIGHT_CACHE_BINARY_ENCODING else result
+    cache.set(cache_key, value, ttl if ttl is not None else settings.CACHED_RESULTS_TTL)
     insight_cache_write_counter.inc()
 
     # :TRICKY: We update _all_ states with same cache_key to avoid needless re-calculations and
     #   handle race conditions around cache_key changing.
-    return InsightCachingState.objects.filter(team_id=team_id, cache_key=cache_key).update(
-        last_refresh=timestamp, refresh_attempt=0
-    )
+    updates: Dict[str, Any] = {"last_refresh": timestamp, "refresh_attempt": 0}
+    if duration is not None:
+        updates["last_refresh_duration_seconds"] = duration
+    return InsightCachingState.objects.filter(team_id=team_id, cache_key=cache_key).update(**updates)
 
 
 def _extract_insight_dashboard(caching_state: InsightCachingState) -> Tuple[Insight, Optional[Dashboard]]:
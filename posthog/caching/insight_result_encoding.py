@@ -0,0 +1,170 @@
+import pickle
+import struct
+import sys
+from array import array
+from typing import Any, List, Tuple
+
+import zstandard
+from prometheus_client import Histogram
+
+# Values written with this encoding start with this header so that they can live in the cache next to the
+# plain pickled dicts written before it was introduced. Readers check for the header and pass anything else
+# through untouched.
+MAGIC = b"\x93PHI"
+VERSION = 1
+
+CODEC_NONE = 0
+CODEC_ZSTD = 1
+
+ZSTD_LEVEL = 3
+
+# Don't bother moving tiny series into columns, the framing overhead outweighs the savings
+MIN_COLUMN_LENGTH = 8
+
+_HEADER = struct.Struct("!4sBB")
+_LENGTH = struct.Struct("!I")
+_COLUMN_HEADER = struct.Struct("!cI")
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+INSIGHT_CACHE_ENCODED_SIZE = Histogram(
+    "posthog_insight_cache_encoded_size_bytes",
+    "Size of insight results written to the cache with the binary encoding",
+    buckets=(1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, float("inf")),
+)
+
+
+class InsightResultDecodeError(Exception):
+    pass
+
+
+class _ColumnRef:
+    """Placeholder left in the pickled skeleton where a numeric `data` series used to be."""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __reduce__(self):
+        return (_ColumnRef, (self.index,))
+
+
+def is_encoded_insight_result(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray)) and value[: len(MAGIC)] == MAGIC
+
+
+def encode_insight_result(value: Any, compress: bool = True) -> bytes:
+    """
+    Encodes a cached insight result package into a compact binary value.
+
+    Numeric `data` series (trend values, retention counts, ...) are pulled out of the result into typed
+    little-endian columns so they don't have to be pickled one Python float at a time. Everything else is
+    pickled as before. The body is framed with length prefixes and zstd-compressed behind a version header.
+    """
+    columns: List[array] = []
+    skeleton = _extract_columns(value, columns)
+
+    body = bytearray()
+    pickled = pickle.dumps(skeleton, protocol=pickle.HIGHEST_PROTOCOL)
+    body += _LENGTH.pack(len(pickled))
+    body += pickled
+    body += _LENGTH.pack(len(columns))
+    for column in columns:
+        if sys.byteorder != "little":
+            column = array(column.typecode, column)
+            column.byteswap()
+        body += _COLUMN_HEADER.pack(column.typecode.encode(), len(column))
+        body += column.tobytes()
+
+    if compress:
+        encoded = _HEADER.pack(MAGIC, VERSION, CODEC_ZSTD) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    else:
+        encoded = _HEADER.pack(MAGIC, VERSION, CODEC_NONE) + bytes(body)
+
+    INSIGHT_CACHE_ENCODED_SIZE.observe(len(encoded))
+    return encoded
+
+
+def decode_insight_result(value: bytes) -> Any:
+    if not is_encoded_insight_result(value):
+        raise InsightResultDecodeError("Value is not an encoded insight result")
+
+    _, version, codec = _HEADER.unpack_from(value)
+    if version != VERSION:
+        raise InsightResultDecodeError(f"Unsupported insight result encoding version {version}")
+
+    payload = memoryview(value)[_HEADER.size :]
+    if codec == CODEC_ZSTD:
+        body = memoryview(zstandard.ZstdDecompressor().decompress(payload))
+    elif codec == CODEC_NONE:
+        body = payload
+    else:
+        raise InsightResultDecodeError(f"Unknown insight result codec {codec}")
+
+    (pickled_length,) = _LENGTH.unpack_from(body)
+    offset = _LENGTH.size
+    skeleton = pickle.loads(body[offset : offset + pickled_length])
+    offset += pickled_length
+
+    (column_count,) = _LENGTH.unpack_from(body, offset)
+    offset += _LENGTH.size
+
+    columns: List[list] = []
+    for _ in range(column_count):
+        typecode, length = _COLUMN_HEADER.unpack_from(body, offset)
+        offset += _COLUMN_HEADER.size
+        column = array(typecode.decode())
+        end = offset + length * column.itemsize
+        column.frombytes(body[offset:end])
+        if sys.byteorder != "little":
+            column.byteswap()
+        columns.append(column.tolist())
+        offset = end
+
+    return _restore_columns(skeleton, columns)
+
+
+def _column_typecode(values: list) -> Tuple[bool, str]:
+    if len(values) < MIN_COLUMN_LENGTH:
+        return False, ""
+
+    first_type = type(values[0])
+    if first_type is float:
+        return all(type(value) is float for value in values), "d"
+    if first_type is int:
+        return all(type(value) is int and _INT64_MIN <= value <= _INT64_MAX for value in values), "q"
+    return False, ""
+
+
+def _extract_columns(value: Any, columns: List[array]) -> Any:
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key == "data" and type(item) is list:
+                is_numeric, typecode = _column_typecode(item)
+                if is_numeric:
+                    columns.append(array(typecode, item))
+                    result[key] = _ColumnRef(len(columns) - 1)
+                    continue
+            result[key] = _extract_columns(item, columns)
+        return result
+    # :TRICKY: Only descend into lists of containers, lists of scalars (labels, days, ...) are pickled as is
+    if isinstance(value, list) and len(value) > 0 and isinstance(value[0], (dict, list)):
+        return [_extract_columns(item, columns) for item in value]
+    return value
+
+
+def _restore_columns(value: Any, columns: List[list]) -> Any:
+    if isinstance(value, _ColumnRef):
+        return columns[value.index]
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (_ColumnRef, dict, list)):
+                value[key] = _restore_columns(item, columns)
+        return value
+    if isinstance(value, list) and len(value) > 0 and isinstance(value[0], (dict, list)):
+        for index, item in enumerate(value):
+            value[index] = _restore_columns(item, columns)
+    return value
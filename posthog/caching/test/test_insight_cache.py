@@ -12,7 +12,7 @@ from posthog.caching.insight_caching_state import upsert
 from posthog.caching.test.test_insight_caching_state import create_insight, filter_dict
 from posthog.constants import INSIGHT_PATHS, INSIGHT_RETENTION, INSIGHT_STICKINESS, INSIGHT_TRENDS
 from posthog.decorators import CacheType
-from posthog.models import Filter, InsightCachingState, RetentionFilter, Team, User
+from posthog.models import EventDefinition, Filter, InsightCachingState, InsightViewed, RetentionFilter, Team, User
 from posthog.models.filters import PathFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.signals import mute_selected_signals
@@ -26,6 +26,7 @@ def create_insight_caching_state(
     last_refresh_queued_at: Optional[timedelta] = None,  # noqa
     target_cache_age: Optional[timedelta] = timedelta(days=1),  # noqa
     refresh_attempt: int = 0,
+    last_refresh_duration_seconds: Optional[float] = None,
     filters=filter_dict,
     **kw,
 ):
@@ -39,6 +40,7 @@ def create_insight_caching_state(
     model.last_refresh_queued_at = now() - last_refresh_queued_at if last_refresh_queued_at is not None else None
     model.target_cache_age_seconds = target_cache_age.total_seconds() if target_cache_age is not None else None
     model.refresh_attempt = refresh_attempt
+    model.last_refresh_duration_seconds = last_refresh_duration_seconds
     model.save()
     return model
 
@@ -96,6 +98,67 @@ def test_fetch_states_in_need_of_updating(team: Team, user: User, params, expect
     assert len(results) == expected_matches
 
 
+@pytest.mark.django_db
+def test_fetch_states_in_need_of_updating_prioritizes_viewed_and_cheap_insights(team: Team, user: User):
+    unviewed = create_insight_caching_state(team, user)
+    viewed = create_insight_caching_state(team, user)
+    InsightViewed.objects.create(team=team, user=user, insight=viewed.insight, last_viewed_at=now())
+    expensive = create_insight_caching_state(team, user, last_refresh_duration_seconds=30)
+    cheap = create_insight_caching_state(team, user, last_refresh_duration_seconds=0.2)
+
+    results = fetch_states_in_need_of_updating(10)
+
+    assert [id for _, _, id in results] == [cheap.pk, viewed.pk, unviewed.pk, expensive.pk]
+
+
+@pytest.mark.django_db
+def test_fetch_states_in_need_of_updating_prioritizes_staler_insights(team: Team, user: User):
+    stale = create_insight_caching_state(team, user, last_refresh=timedelta(days=5))
+    very_stale = create_insight_caching_state(team, user, last_refresh=timedelta(days=10))
+    never_refreshed = create_insight_caching_state(team, user, last_refresh=None)
+
+    results = fetch_states_in_need_of_updating(10)
+
+    assert [id for _, _, id in results] == [never_refreshed.pk, very_stale.pk, stale.pk]
+
+
+@pytest.mark.parametrize(
+    "last_seen_at,last_refresh,expected_matches",
+    [
+        (None, timedelta(days=14), 1),
+        (timedelta(days=1), timedelta(days=14), 1),
+        (timedelta(days=2), timedelta(days=2), 1),
+        (timedelta(days=20), timedelta(days=2), 0),
+        (timedelta(days=20), None, 1),
+        (timedelta(days=20), timedelta(days=8), 1),
+    ],
+)
+@pytest.mark.django_db
+def test_fetch_states_in_need_of_updating_skips_teams_without_new_events(
+    team: Team, user: User, last_seen_at, last_refresh, expected_matches
+):
+    if last_seen_at is not None:
+        EventDefinition.objects.create(team=team, name="$pageview", last_seen_at=now() - last_seen_at)
+    create_insight_caching_state(team, user, last_refresh=last_refresh)
+
+    results = fetch_states_in_need_of_updating(10)
+    assert len(results) == expected_matches
+
+
+@pytest.mark.django_db
+def test_fetch_states_in_need_of_updating_limits_share_of_single_team(team: Team, user: User):
+    other_team = Team.objects.create(organization=team.organization)
+    for _ in range(4):
+        create_insight_caching_state(team, user)
+    other_state = create_insight_caching_state(other_team, user, last_refresh=timedelta(days=2))
+
+    results = fetch_states_in_need_of_updating(4)
+
+    assert len(results) == 3
+    assert [team_id for team_id, _, _ in results].count(team.pk) == 2
+    assert other_state.pk in [id for _, _, id in results]
+
+
 @pytest.mark.django_db
 @freeze_time("2020-01-04T13:01:01Z")
 def test_update_cache(team: Team, user: User, cache):
@@ -112,6 +175,7 @@ def test_update_cache(team: Team, user: User, cache):
     updated_caching_state = InsightCachingState.objects.get(team=team)
     assert updated_caching_state.last_refresh == now()
     assert updated_caching_state.refresh_attempt == 0
+    assert updated_caching_state.last_refresh_duration_seconds is not None
 
 
 @pytest.mark.django_db
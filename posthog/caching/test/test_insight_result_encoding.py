@@ -0,0 +1,102 @@
+from datetime import datetime
+
+import pytz
+from django.core.cache import cache
+from django.test import TestCase
+from parameterized import parameterized
+
+from posthog.caching.insight_cache import update_cached_state
+from posthog.caching.insight_result_encoding import (
+    InsightResultDecodeError,
+    decode_insight_result,
+    encode_insight_result,
+    is_encoded_insight_result,
+)
+from posthog.utils import get_safe_cache
+
+trends_result = {
+    "result": [
+        {
+            "action": {"id": "$pageview", "type": "events", "order": 0},
+            "label": "$pageview",
+            "count": 1234.0,
+            "data": [float(i % 7) for i in range(100)],
+            "labels": [f"{i}-Jan-2023" for i in range(100)],
+            "days": [f"2023-01-{i:02}" for i in range(100)],
+            "breakdown_value": "Chrome",
+        },
+        {
+            "label": "small",
+            "data": [1, 2, 3],
+        },
+        {
+            "label": "integers",
+            "data": list(range(-10, 2**40, 2**36)),
+        },
+        {
+            "label": "mixed",
+            "data": [1, 2.5, None, 4, 5, 6, 7, 8, 9],
+        },
+    ],
+    "type": "Trends",
+    "last_refresh": datetime(2023, 1, 1, tzinfo=pytz.UTC),
+    "next_allowed_client_refresh": None,
+}
+
+funnel_result = {
+    "result": [[{"name": "$pageview", "count": 5, "order": 0}, {"name": "signup", "count": 2, "order": 1}]],
+    "type": "Funnel",
+    "last_refresh": datetime(2023, 1, 1, tzinfo=pytz.UTC),
+}
+
+
+class TestInsightResultEncoding(TestCase):
+    @parameterized.expand(
+        [
+            ("trends_compressed", trends_result, True),
+            ("trends_uncompressed", trends_result, False),
+            ("funnel", funnel_result, True),
+            ("empty", {}, True),
+        ]
+    )
+    def test_round_trip(self, _, value, compress: bool) -> None:
+        encoded = encode_insight_result(value, compress=compress)
+
+        assert is_encoded_insight_result(encoded)
+        assert decode_insight_result(encoded) == value
+
+    def test_round_trip_preserves_types(self) -> None:
+        decoded = decode_insight_result(encode_insight_result(trends_result))
+
+        assert all(type(value) is float for value in decoded["result"][0]["data"])
+        assert all(type(value) is int for value in decoded["result"][2]["data"])
+        assert decoded["result"][3]["data"] == [1, 2.5, None, 4, 5, 6, 7, 8, 9]
+
+    def test_encoding_does_not_modify_input(self) -> None:
+        data_before = list(trends_result["result"][0]["data"])  # type: ignore
+
+        encode_insight_result(trends_result)
+
+        assert trends_result["result"][0]["data"] == data_before  # type: ignore
+
+    def test_unknown_version_fails_to_decode(self) -> None:
+        encoded = bytearray(encode_insight_result(trends_result))
+        encoded[4] = 99
+
+        with self.assertRaises(InsightResultDecodeError):
+            decode_insight_result(bytes(encoded))
+
+    @parameterized.expand([("dict", {"result": 1}), ("plain_bytes", b"some bytes"), ("none", None)])
+    def test_legacy_values_are_not_detected_as_encoded(self, _, value) -> None:
+        assert not is_encoded_insight_result(value)
+
+    def test_cache_reads_both_formats(self) -> None:
+        with self.settings(INSIGHT_CACHE_BINARY_ENCODING=False):
+            update_cached_state(1, "legacy_key", datetime.now(), trends_result)
+        with self.settings(INSIGHT_CACHE_BINARY_ENCODING=True):
+            update_cached_state(1, "encoded_key", datetime.now(), trends_result)
+
+        assert not is_encoded_insight_result(cache.get("legacy_key"))
+        assert is_encoded_insight_result(cache.get("encoded_key"))
+        assert get_safe_cache("legacy_key") == trends_result
+        assert get_safe_cache("encoded_key") == trends_result
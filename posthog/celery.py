@@ -92,6 +92,11 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
     # Verify that persons data is in sync every day at 4 AM UTC
     sender.add_periodic_task(crontab(hour=4, minute=0), verify_persons_data_in_sync.s())
 
+    # Every 10 minutes, refresh the stored property value suggestions of recently used properties
+    sender.add_periodic_task(
+        crontab(minute="*/10"), refresh_top_property_values.s(), name="refresh top property values"
+    )
+
     # Every 30 minutes, send decide request counts to the main posthog instance
     sender.add_periodic_task(crontab(minute="*/30"), calculate_decide_usage.s(), name="calculate decide usage")
 
@@ -101,6 +106,9 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
 
     sender.add_periodic_task(crontab(day_of_week="fri", hour=0, minute=0), clean_stale_partials.s())
 
+    # Async query results outlive their status in object storage, clean them up
+    sender.add_periodic_task(crontab(minute="*/10"), clear_expired_query_results.s(), name="clear query results")
+
     # Sync all Organization.available_features every hour, only for billing v1 orgs
     sender.add_periodic_task(crontab(minute=30, hour="*"), sync_all_organization_available_features.s())
 
@@ -244,15 +252,21 @@ def enqueue_clickhouse_execute_with_progress(
 ):
     """
     Kick off query with progress reporting
-    Iterate over the progress status
-    Save status to redis
-    Once complete save results to redis
+    Save progress to redis while the query runs
+    Stream results into storage page by page
     """
     from posthog.client import execute_with_progress
 
     execute_with_progress(team_id, query_id, query, args, settings, with_column_types, task_id=self.request.id)
 
 
+@app.task(ignore_result=True)
+def clear_expired_query_results():
+    from posthog.clickhouse.client.execute_async import clear_expired_query_results
+
+    clear_expired_query_results()
+
+
 @app.task(ignore_result=True)
 def pg_table_cache_hit_rate():
     from statshog.defaults.django import statsd
@@ -783,6 +797,23 @@ def verify_persons_data_in_sync():
     verify()
 
 
+@app.task(ignore_result=True)
+def refresh_top_property_values():
+    from posthog.queries.property_values import refresh_stale_top_property_values
+
+    if not settings.USE_PRECALCULATED_PROPERTY_VALUES:
+        return
+
+    refresh_stale_top_property_values()
+
+
+@app.task(ignore_result=True)
+def refresh_top_property_values_for_key(team_id: int, table: str, key: str):
+    from posthog.queries.property_values import refresh_top_property_values as refresh
+
+    refresh(team_id, table, key)  # type: ignore
+
+
 def recompute_materialized_columns_enabled() -> bool:
     from posthog.models.instance_setting import get_instance_setting
 
@@ -801,7 +832,7 @@ def clickhouse_materialize_columns():
         except ImportError:
             pass
         else:
-            materialize_properties_task()
+            materialize_properties_task(dry_run=settings.MATERIALIZE_COLUMNS_DRY_RUN)
 
 
 @app.task(ignore_result=True)
@@ -1,31 +1,34 @@
+import gzip
 import hashlib
 import json
+import threading
 import time
-from dataclasses import asdict as dataclass_asdict
+from collections import defaultdict
 from dataclasses import dataclass
+from datetime import timedelta
 from time import perf_counter
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 
 from posthog import celery
-from clickhouse_driver import Client as SyncClient
 from django.conf import settings as app_settings
+from django.utils.timezone import now
 from statshog.defaults.django import statsd
 
 from posthog import redis
 from posthog.celery import enqueue_clickhouse_execute_with_progress
-from posthog.clickhouse.client.execute import _prepare_query
+from posthog.clickhouse.client.connection import Workload, get_pool
+from posthog.clickhouse.client.execute import _prepare_query, sync_execute
 from posthog.errors import wrap_query_error
-from posthog.settings import (
-    CLICKHOUSE_CA,
-    CLICKHOUSE_DATABASE,
-    CLICKHOUSE_HOST,
-    CLICKHOUSE_PASSWORD,
-    CLICKHOUSE_SECURE,
-    CLICKHOUSE_USER,
-    CLICKHOUSE_VERIFY,
-)
+from posthog.settings import CLICKHOUSE_CLUSTER
+from posthog.storage import object_storage
+from posthog.utils import generate_short_id
 
 REDIS_STATUS_TTL = 600  # 10 minutes
+REDIS_KEY_PREFIX_ASYNC_RESULTS = "query_with_progress"
+# Results are stored in pages of this many rows, so that they can be written while the query runs and read back in parts
+RESULTS_PAGE_SIZE = 10000
+# Queries returning more rows than this fail rather than fill up object storage
+MAX_RESULT_ROWS = 1_000_000
 
 
 @dataclass
@@ -40,10 +43,13 @@ class QueryStatus:
     start_time: Optional[float] = None
     end_time: Optional[float] = None
     task_id: Optional[str] = None
+    # Number of result rows stored so far, `results` only holds the page that was asked for
+    num_results: int = 0
+    columns: Optional[List] = None
+    clickhouse_query_id: Optional[str] = None
 
 
 def generate_redis_results_key(query_id):
-    REDIS_KEY_PREFIX_ASYNC_RESULTS = "query_with_progress"
     key = f"{REDIS_KEY_PREFIX_ASYNC_RESULTS}:{query_id}"
     return key
 
@@ -53,95 +59,90 @@ def execute_with_progress(
 ):
     """
     Kick off query with progress reporting
-    Iterate over the progress status
-    Save status to redis
-    Once complete save results to redis
+    Save progress to redis while the query runs
+    Stream results into storage page by page
     """
 
     key = generate_redis_results_key(query_id)
-    ch_client = SyncClient(
-        host=CLICKHOUSE_HOST,
-        database=CLICKHOUSE_DATABASE,
-        secure=CLICKHOUSE_SECURE,
-        user=CLICKHOUSE_USER,
-        password=CLICKHOUSE_PASSWORD,
-        ca_certs=CLICKHOUSE_CA,
-        verify=CLICKHOUSE_VERIFY,
-        settings={"max_result_rows": "10000"},
+    start_time = perf_counter()
+    clickhouse_query_id = f"{team_id}_{query_id}_{generate_short_id()}"
+    # :TRICKY: The status is a redis hash, so that progress updates only write the fields that change
+    _update_status(
+        key,
+        team_id=team_id,
+        task_id=task_id,
+        start_time=time.time(),
+        clickhouse_query_id=clickhouse_query_id,
+        num_rows=0,
+        total_rows=0,
+        num_results=0,
     )
-    redis_client = redis.get_client()
 
-    start_time = perf_counter()
+    with get_pool(Workload.ONLINE, team_id).get_client() as ch_client:
+        prepared_sql, prepared_args, tags = _prepare_query(client=ch_client, query=query, args=args)
 
-    prepared_sql, prepared_args, tags = _prepare_query(client=ch_client, query=query, args=args)
+        # Progress is reported from a separate thread, as reading results blocks until ClickHouse sends the next block
+        done = threading.Event()
+        progress_reporter = threading.Thread(
+            target=_report_progress, args=(ch_client, key, update_freq, done), daemon=True
+        )
 
-    query_status = QueryStatus(team_id, task_id=task_id)
+        try:
+            rows = ch_client.execute_iter(
+                prepared_sql,
+                params=prepared_args,
+                settings={"max_result_rows": MAX_RESULT_ROWS, **(settings or {})},
+                with_column_types=with_column_types,
+                query_id=clickhouse_query_id,
+            )
+            progress_reporter.start()
 
-    start_time = time.time()
+            columns = next(rows) if with_column_types else None
+            page: List[Any] = []
+            num_results = 0
+            for row in rows:
+                page.append(row)
+                if len(page) == RESULTS_PAGE_SIZE:
+                    _write_results_page(key, num_results // RESULTS_PAGE_SIZE, page)
+                    num_results += len(page)
+                    _update_status(key, num_results=num_results)
+                    _refresh_results_expiry(key, num_results // RESULTS_PAGE_SIZE)
+                    page = []
+            if page or num_results == 0:
+                _write_results_page(key, num_results // RESULTS_PAGE_SIZE, page)
+                num_results += len(page)
+            _refresh_results_expiry(key, num_results // RESULTS_PAGE_SIZE + 1)
 
-    try:
-        progress = ch_client.execute_with_progress(
-            prepared_sql, params=prepared_args, settings=settings, with_column_types=with_column_types
-        )
-        for num_rows, total_rows in progress:
-            query_status = QueryStatus(
-                team_id=team_id,
-                num_rows=num_rows,
-                total_rows=total_rows,
-                complete=False,
-                error=False,
-                error_message="",
-                results=None,
-                start_time=start_time,
-                task_id=task_id,
-            )
-            redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
-            time.sleep(update_freq)
-        else:
-            rv = progress.get_result()
-            query_status = QueryStatus(
-                team_id=team_id,
-                num_rows=query_status.num_rows,
-                total_rows=query_status.total_rows,
+            done.set()
+            progress_reporter.join()
+            _update_status(
+                key,
+                **_progress(ch_client),
                 complete=True,
-                error=False,
-                start_time=query_status.start_time,
                 end_time=time.time(),
-                error_message="",
-                results=rv,
-                task_id=task_id,
+                num_results=num_results,
+                columns=columns,
             )
-            redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
-
-    except Exception as err:
-        err = wrap_query_error(err)
-        tags["failed"] = True
-        tags["reason"] = type(err).__name__
-        statsd.incr("clickhouse_sync_execution_failure")
-        query_status = QueryStatus(
-            team_id=team_id,
-            num_rows=query_status.num_rows,
-            total_rows=query_status.total_rows,
-            complete=False,
-            error=True,
-            start_time=query_status.start_time,
-            end_time=time.time(),
-            error_message=str(err),
-            results=None,
-            task_id=task_id,
-        )
-        redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
 
-        raise err
-    finally:
-        ch_client.disconnect()
+        except Exception as err:
+            err = wrap_query_error(err)
+            tags["failed"] = True
+            tags["reason"] = type(err).__name__
+            statsd.incr("clickhouse_sync_execution_failure")
+            # the connection goes back to the pool, so don't leave unread results of a failed query on it
+            ch_client.disconnect()
+            _update_status(key, error=True, end_time=time.time(), error_message=str(err))
 
-        execution_time = perf_counter() - start_time
+            raise err
+        finally:
+            done.set()
 
-        statsd.timing("clickhouse_sync_execution_time", execution_time * 1000.0)
+            execution_time = perf_counter() - start_time
 
-        if app_settings.SHELL_PLUS_PRINT_SQL:
-            print("Execution time: %.6fs" % (execution_time,))  # noqa T201
+            statsd.timing("clickhouse_sync_execution_time", execution_time * 1000.0)
+
+            if app_settings.SHELL_PLUS_PRINT_SQL:
+                print("Execution time: %.6fs" % (execution_time,))  # noqa T201
 
 
 def enqueue_execute_with_progress(
@@ -152,27 +153,19 @@ def enqueue_execute_with_progress(
     key = generate_redis_results_key(query_id)
     redis_client = redis.get_client()
 
-    if force:
-        # If we want to force rerun of this query we need to
-        # 1) Get the current status from redis
-        task_str = redis_client.get(key)
-        if task_str:
-            # if the status exists in redis we need to tell celery to kill the job
-            task_str = task_str.decode("utf-8")
-            query_task = QueryStatus(**json.loads(task_str))
-            # Instruct celery to revoke task and terminate if running
-            celery.app.control.revoke(query_task.task_id, terminate=True)
-            # Then we need to make redis forget about this job entirely
-            # and continue as normal. As if we never saw this query before
-            redis_client.delete(key)
-
-    if redis_client.get(key):
+    if force and redis_client.exists(key):
+        # If we want to force rerun of this query we need to stop the running one
+        # and make redis forget about this job entirely, as if we never saw this query before
+        cancel_query(team_id, query_id)
+        _delete_results(key)
+        redis_client.delete(key)
+
+    if redis_client.exists(key):
         # If we've seen this query before return the query_id and don't resubmit it.
         return query_id
 
     # Immediately set status so we don't have race with celery
-    query_status = QueryStatus(team_id=team_id, start_time=time.time())
-    redis_client.set(key, json.dumps(dataclass_asdict(query_status)), ex=REDIS_STATUS_TTL)
+    _update_status(key, team_id=team_id, start_time=time.time())
 
     if bypass_celery:
         # Call directly ( for testing )
@@ -183,30 +176,148 @@ def enqueue_execute_with_progress(
     return query_id
 
 
-def get_status_or_results(team_id, query_id):
+def get_status_or_results(team_id, query_id, offset: int = 0, limit: int = RESULTS_PAGE_SIZE):
     """
     Returns QueryStatus data class
     QueryStatus data class contains either:
     Current status of running query
-    Results of completed query
+    Results of completed query, `limit` rows starting at `offset`
     Error payload of failed query
     """
-    redis_client = redis.get_client()
     key = generate_redis_results_key(query_id)
     try:
-        byte_results = redis_client.get(key)
-        if byte_results:
-            str_results = byte_results.decode("utf-8")
-        else:
+        query_status = _read_status(key)
+        if query_status is None:
             return QueryStatus(team_id, error=True, error_message="Query is unknown to backend")
-        query_status = QueryStatus(**json.loads(str_results))
         if query_status.team_id != team_id:
             raise Exception("Requesting team is not executing team")
+        if query_status.complete:
+            query_status.results = _read_results(key, offset, min(offset + limit, query_status.num_results))
     except Exception as e:
         query_status = QueryStatus(team_id, error=True, error_message=str(e))
     return query_status
 
 
+def cancel_query(team_id, query_id) -> None:
+    "Stops the celery task running the query and kills the query in ClickHouse"
+    key = generate_redis_results_key(query_id)
+    query_status = _read_status(key)
+    if query_status is None or query_status.complete or query_status.error:
+        return
+    if query_status.team_id != team_id:
+        raise Exception("Requesting team is not executing team")
+
+    if query_status.task_id:
+        # Instruct celery to revoke task and terminate if running
+        celery.app.control.revoke(query_status.task_id, terminate=True)
+    if query_status.clickhouse_query_id:
+        sync_execute(
+            f"KILL QUERY ON CLUSTER '{CLICKHOUSE_CLUSTER}' WHERE query_id = %(query_id)s",
+            {"query_id": query_status.clickhouse_query_id},
+        )
+    _update_status(key, error=True, end_time=time.time(), error_message="Query was cancelled")
+    statsd.incr("clickhouse.query.cancellation_requested", tags={"team_id": team_id})
+
+
+def clear_expired_query_results() -> None:
+    "Deletes result pages left in object storage by queries whose status has expired"
+    if not app_settings.OBJECT_STORAGE_ENABLED:
+        return
+
+    # :TRICKY: Statuses are kept for REDIS_STATUS_TTL after their last update, so older pages can still be reachable
+    prefix = f"{app_settings.OBJECT_STORAGE_QUERY_RESULTS_FOLDER}/{REDIS_KEY_PREFIX_ASYNC_RESULTS}/"
+    pages_by_key: Dict[str, List[str]] = defaultdict(list)
+    for page in object_storage.list_objects_modified_before(prefix, now() - timedelta(seconds=REDIS_STATUS_TTL)):
+        query_id = page[len(prefix) :].rsplit("/", 1)[0]
+        pages_by_key[generate_redis_results_key(query_id)].append(page)
+
+    redis_client = redis.get_client()
+    expired = [page for key, pages in pages_by_key.items() if not redis_client.exists(key) for page in pages]
+    if expired:
+        object_storage.delete_objects(expired)
+
+
+def _report_progress(ch_client, key: str, update_freq: float, done: threading.Event) -> None:
+    while not done.wait(update_freq):
+        _update_status(key, **_progress(ch_client))
+
+
+def _progress(ch_client) -> Dict[str, Any]:
+    progress = ch_client.last_query.progress if ch_client.last_query else None
+    if progress is None:
+        return {}
+    return {"num_rows": progress.rows, "total_rows": progress.total_rows}
+
+
+def _update_status(key: str, **fields: Any) -> None:
+    redis.get_client().hset(key, mapping={field: json.dumps(value) for field, value in fields.items()})
+    redis.get_client().expire(key, REDIS_STATUS_TTL)
+
+
+def _read_status(key: str) -> Optional[QueryStatus]:
+    fields = redis.get_client().hgetall(key)
+    if not fields or b"team_id" not in fields:
+        return None
+    return QueryStatus(**{field.decode("utf-8"): json.loads(value) for field, value in fields.items()})
+
+
+def _results_prefix(key: str) -> str:
+    return f"{app_settings.OBJECT_STORAGE_QUERY_RESULTS_FOLDER}/{key.replace(':', '/', 1)}/"
+
+
+def _results_page_key(key: str, page: int) -> str:
+    return f"{_results_prefix(key)}{page}"
+
+
+def _write_results_page(key: str, page: int, rows: List[Any]) -> None:
+    content = gzip.compress(json.dumps(rows, separators=(",", ":"), default=str).encode("utf-8"))
+    if app_settings.OBJECT_STORAGE_ENABLED:
+        object_storage.write(_results_page_key(key, page), content)
+    else:
+        # without object storage results are kept next to the status, so don't leave them behind any longer
+        redis.get_client().set(_results_page_key(key, page), content, ex=REDIS_STATUS_TTL)
+
+
+def _refresh_results_expiry(key: str, pages: int) -> None:
+    # without object storage pages expire like the status, so keep pages written early in long queries around too
+    if not app_settings.OBJECT_STORAGE_ENABLED:
+        pipeline = redis.get_client().pipeline()
+        for page in range(pages):
+            pipeline.expire(_results_page_key(key, page), REDIS_STATUS_TTL)
+        pipeline.execute()
+
+
+def _delete_results(key: str) -> None:
+    if app_settings.OBJECT_STORAGE_ENABLED:
+        pages = object_storage.list_objects(_results_prefix(key))
+        if pages:
+            object_storage.delete_objects(pages)
+    else:
+        query_status = _read_status(key)
+        if query_status is not None:
+            pages = range(query_status.num_results // RESULTS_PAGE_SIZE + 1)
+            redis.get_client().delete(*(_results_page_key(key, page) for page in pages))
+
+
+def _read_results_page(key: str, page: int) -> List[Any]:
+    if app_settings.OBJECT_STORAGE_ENABLED:
+        content = object_storage.read_bytes(_results_page_key(key, page))
+    else:
+        content = redis.get_client().get(_results_page_key(key, page))
+    if content is None:
+        raise Exception("Query results have expired")
+    return json.loads(gzip.decompress(content))
+
+
+def _read_results(key: str, start: int, end: int) -> List[Any]:
+    results: List[Any] = []
+    for page in range(start // RESULTS_PAGE_SIZE, (max(end, 1) - 1) // RESULTS_PAGE_SIZE + 1):
+        rows = _read_results_page(key, page)
+        page_start = page * RESULTS_PAGE_SIZE
+        results.extend(rows[max(start - page_start, 0) : end - page_start])
+    return results
+
+
 def _query_hash(query: str, team_id: int, args: Any) -> str:
     """
     Takes a query and returns a hex encoded hash of the query and args
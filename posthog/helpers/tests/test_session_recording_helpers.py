@@ -12,7 +12,9 @@ from posthog.session_recordings.session_recording_helpers import (
     RRWEB_MAP_EVENT_TYPE,
     SessionRecordingEventSummary,
     SnapshotData,
+    SnapshotDataSerializer,
     SnapshotDataTaggedWithWindowId,
+    byte_size_dict,
     decompress_chunked_snapshot_data,
     get_events_summary_from_snapshot_data,
     is_active_event,
@@ -756,3 +758,35 @@ def test_new_ingestion_groups_using_snapshot_bytes_if_possible(raw_snapshot_even
             },
         },
     ]
+
+
+def test_snapshot_data_is_serialized_once_for_both_ingestion_paths(mocker: MockerFixture):
+    mocker.patch("posthog.models.utils.UUIDT", return_value="0178495e-8521-0000-8e1c-2652fa57099b")
+    mocker.patch("time.time", return_value=0)
+    snapshot_data = [
+        {"type": 2, "timestamp": 123, "data": {"node": "ü" * 100}},
+        {"type": 3, "timestamp": 234, "data": {"source": 1}},
+        {"type": 3, "timestamp": 345, "data": {"source": 2}},
+    ]
+    events = [
+        {
+            "event": "$snapshot",
+            "properties": {"$session_id": "1234", "$window_id": "1", "$snapshot_data": data, "distinct_id": "abc123"},
+        }
+        for data in snapshot_data
+    ]
+    expected = mock_capture_flow(events, max_size_bytes=300)
+
+    serializer = SnapshotDataSerializer()
+    assert serializer.size(snapshot_data) == byte_size_dict(snapshot_data)
+    assert serializer.dumps(snapshot_data) == json.dumps(snapshot_data)
+
+    dumps = mocker.spy(json, "dumps")
+    serializer = SnapshotDataSerializer()
+    legacy_events = legacy_preprocess_session_recording_events_for_clickhouse(
+        events, chunk_size=300, serializer=serializer
+    )
+    blob_events = preprocess_replay_events_for_blob_ingestion(events, max_size_bytes=300, serializer=serializer)
+
+    assert (legacy_events, blob_events) == expected
+    assert dumps.call_count == len(snapshot_data)
@@ -1,4 +1,6 @@
 import json
+import threading
+import time
 from enum import Enum
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
@@ -7,6 +9,7 @@ from kafka import KafkaConsumer as KC
 from kafka import KafkaProducer as KP
 from kafka.producer.future import FutureProduceResult, FutureRecordMetadata, RecordMetadata
 from kafka.structs import TopicPartition
+from prometheus_client import Gauge, Histogram
 from statshog.defaults.django import statsd
 from structlog import get_logger
 from django.conf import settings
@@ -16,9 +19,45 @@ from posthog.kafka_client import helper
 from posthog.utils import SingletonDecorator
 
 KAFKA_PRODUCER_RETRIES = 5
+# kafka-python's default, made explicit as backpressure is signalled relative to it
+KAFKA_PRODUCER_BUFFER_MEMORY = 32 * 1024 * 1024
+# Share of the buffer holding unacknowledged messages above which producing is refused
+KAFKA_PRODUCER_BUFFER_FULL_RATIO = 0.9
 
 logger = get_logger(__name__)
 
+KAFKA_PRODUCER_BUFFERED_BYTES_GAUGE = Gauge(
+    "kafka_producer_buffered_bytes",
+    "Bytes of produced messages that have not been acknowledged by Kafka yet.",
+    labelnames=["profile"],
+)
+KAFKA_PRODUCER_BUFFER_USAGE_GAUGE = Gauge(
+    "kafka_producer_buffer_usage_ratio",
+    "Share of the producer buffer memory taken by unacknowledged messages.",
+    labelnames=["profile"],
+)
+KAFKA_PRODUCER_BATCH_SIZE_GAUGE = Gauge(
+    "kafka_producer_batch_size_avg_bytes",
+    "Average size of the batches sent to Kafka, as reported by the producer.",
+    labelnames=["profile"],
+)
+KAFKA_PRODUCER_MESSAGE_SIZE_HISTOGRAM = Histogram(
+    "kafka_producer_message_size_bytes",
+    "Size of serialized messages produced to Kafka.",
+    labelnames=["profile", "topic"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+KAFKA_PRODUCE_LATENCY_HISTOGRAM = Histogram(
+    "kafka_produce_latency_seconds",
+    "Time from producing a message to it being acknowledged by Kafka.",
+    labelnames=["profile", "topic"],
+)
+
+
+class KafkaProducerBufferFullError(Exception):
+    "Raised instead of producing when the producer buffer is close to full, so callers can shed load"
+    pass
+
 
 class KafkaProducerForTests:
     def __init__(self):
@@ -95,12 +134,18 @@ class _KafkaProducer:
         self,
         test=settings.TEST,
         # the default producer uses these defaulted environment variables,
-        # but the session recording producer needs to override them
+        # but the session recording and events producers need to override them
         kafka_base64_keys=None,
         kafka_hosts=None,
         kafka_security_protocol=None,
         max_request_size=None,
         compression_type=None,
+        # batching of the producer profile, every topic produced with this producer shares it
+        linger_ms=None,
+        batch_size=None,
+        # how long producing blocks waiting for buffer space before raising
+        max_block_ms=None,
+        profile="default",
     ):
         if kafka_security_protocol is None:
             kafka_security_protocol = settings.KAFKA_SECURITY_PROTOCOL
@@ -109,6 +154,22 @@ class _KafkaProducer:
         if kafka_base64_keys is None:
             kafka_base64_keys = settings.KAFKA_BASE64_KEYS
 
+        self.profile = profile
+        self.buffer_memory = KAFKA_PRODUCER_BUFFER_MEMORY
+        self.buffered_bytes = 0
+        self._buffered_bytes_lock = threading.Lock()
+
+        tuning = {
+            key: value
+            for key, value in {
+                "linger_ms": linger_ms,
+                "batch_size": batch_size,
+                "max_block_ms": max_block_ms,
+                "max_request_size": max_request_size,
+            }.items()
+            if value
+        }
+
         if test:
             self.producer = KafkaProducerForTests()
         elif kafka_base64_keys:
@@ -119,10 +180,15 @@ class _KafkaProducer:
                 bootstrap_servers=kafka_hosts,
                 security_protocol=kafka_security_protocol or _KafkaSecurityProtocol.PLAINTEXT,
                 compression_type=compression_type,
-                **{"max_request_size": max_request_size} if max_request_size else {},
+                buffer_memory=self.buffer_memory,
+                **tuning,
                 **_sasl_params(),
             )
 
+        KAFKA_PRODUCER_BUFFERED_BYTES_GAUGE.labels(profile=profile).set_function(lambda: self.buffered_bytes)
+        KAFKA_PRODUCER_BUFFER_USAGE_GAUGE.labels(profile=profile).set_function(self.buffer_usage)
+        KAFKA_PRODUCER_BATCH_SIZE_GAUGE.labels(profile=profile).set_function(self._batch_size_avg)
+
     @staticmethod
     def json_serializer(d):
         b = json.dumps(d).encode("utf-8")
@@ -134,6 +200,13 @@ class _KafkaProducer:
     def on_send_failure(self, topic: str, exc: Exception):
         statsd.incr("posthog_cloud_kafka_send_failure", tags={"topic": topic, "exception": exc.__class__.__name__})
 
+    def buffer_usage(self) -> float:
+        "Share of the buffer memory taken by messages that have not been acknowledged yet"
+        return self.buffered_bytes / self.buffer_memory
+
+    def is_buffer_full(self) -> bool:
+        return self.buffer_usage() >= KAFKA_PRODUCER_BUFFER_FULL_RATIO
+
     def produce(
         self,
         topic: str,
@@ -142,6 +215,10 @@ class _KafkaProducer:
         value_serializer: Optional[Callable[[Any], Any]] = None,
         headers: Optional[List[Tuple[str, str]]] = None,
     ):
+        if self.is_buffer_full():
+            statsd.incr("posthog_cloud_kafka_buffer_full", tags={"topic": topic, "profile": self.profile})
+            raise KafkaProducerBufferFullError(f"Kafka producer buffer of the {self.profile} profile is full")
+
         if not value_serializer:
             value_serializer = self.json_serializer
         b = value_serializer(data)
@@ -150,14 +227,46 @@ class _KafkaProducer:
         encoded_headers = (
             [(header[0], header[1].encode("utf-8")) for header in headers] if headers is not None else None
         )
-        future = self.producer.send(topic, value=b, key=key, headers=encoded_headers)
+        size = len(b) if isinstance(b, bytes) else 0
+        KAFKA_PRODUCER_MESSAGE_SIZE_HISTOGRAM.labels(profile=self.profile, topic=topic).observe(size)
+        self._add_buffered_bytes(size)
+        start_time = time.monotonic()
+
+        def on_done():
+            self._add_buffered_bytes(-size)
+            KAFKA_PRODUCE_LATENCY_HISTOGRAM.labels(profile=self.profile, topic=topic).observe(
+                time.monotonic() - start_time
+            )
+
+        try:
+            future = self.producer.send(topic, value=b, key=key, headers=encoded_headers)
+        except Exception:
+            self._add_buffered_bytes(-size)
+            raise
         # Record if the send request was successful or not
+        future.add_both(lambda _: on_done())
         future.add_callback(self.on_send_success).add_errback(lambda exc: self.on_send_failure(topic=topic, exc=exc))
         return future
 
+    def flush(self):
+        self.producer.flush()
+
     def close(self):
         self.producer.flush()
 
+    def _add_buffered_bytes(self, size: int) -> None:
+        # :TRICKY: Acknowledgements are handled on the producer's sender thread, sends on request threads
+        with self._buffered_bytes_lock:
+            self.buffered_bytes += size
+
+    def _batch_size_avg(self) -> float:
+        if isinstance(self.producer, KafkaProducerForTests):
+            return 0
+        for metrics in self.producer.metrics().values():
+            if "batch-size-avg" in metrics:
+                return metrics["batch-size-avg"] or 0
+        return 0
+
 
 def can_connect():
     """
@@ -181,6 +290,7 @@ def can_connect():
 
 KafkaProducer = SingletonDecorator(_KafkaProducer)
 SessionRecordingKafkaProducer = SingletonDecorator(_KafkaProducer)
+EventsKafkaProducer = SingletonDecorator(_KafkaProducer)
 
 
 def sessionRecordingKafkaProducer() -> _KafkaProducer:
@@ -189,6 +299,18 @@ def sessionRecordingKafkaProducer() -> _KafkaProducer:
         kafka_security_protocol=settings.SESSION_RECORDING_KAFKA_SECURITY_PROTOCOL,
         max_request_size=settings.SESSION_RECORDING_KAFKA_MAX_REQUEST_SIZE_BYTES,
         compression_type=settings.SESSION_RECORDING_KAFKA_COMPRESSION,
+        profile="session_recordings",
+    )
+
+
+def eventsKafkaProducer() -> _KafkaProducer:
+    "Producer for the events ingestion topics written by /capture, batched for throughput"
+    return EventsKafkaProducer(
+        compression_type=settings.KAFKA_EVENTS_PRODUCER_COMPRESSION,
+        linger_ms=settings.KAFKA_EVENTS_PRODUCER_LINGER_MS,
+        batch_size=settings.KAFKA_EVENTS_PRODUCER_BATCH_SIZE,
+        max_block_ms=settings.KAFKA_EVENTS_PRODUCER_MAX_BLOCK_MS,
+        profile="events",
     )
 
 
@@ -239,3 +361,8 @@ class ClickhouseProducer:
             self.producer.produce(topic=topic, data=data)
         else:
             sync_execute(sql, data)
+
+    def flush(self):
+        "Blocks until everything produced so far is delivered"
+        if self.producer is not None:
+            self.producer.flush()
@@ -3,7 +3,7 @@ from unittest.mock import patch
 import kafka
 from django.test import TestCase, override_settings
 
-from posthog.kafka_client.client import _KafkaProducer, build_kafka_consumer
+from posthog.kafka_client.client import KafkaProducerBufferFullError, _KafkaProducer, build_kafka_consumer
 
 
 class KafkaClientTestCase(TestCase):
@@ -20,6 +20,27 @@ class KafkaClientTestCase(TestCase):
         msg = next(consumer)
         self.assertEqual(msg, "message 1 from test_topic topic")
 
+    def test_kafka_buffered_bytes_are_released_on_ack(self):
+        producer = _KafkaProducer(test=True)
+
+        producer.produce(topic=self.topic, data=self.payload)
+
+        self.assertEqual(producer.buffered_bytes, 0)
+
+    def test_kafka_produce_refused_when_buffer_is_full(self):
+        producer = _KafkaProducer(test=True)
+        producer.buffered_bytes = producer.buffer_memory
+
+        with self.assertRaises(KafkaProducerBufferFullError):
+            producer.produce(topic=self.topic, data=self.payload)
+
+    def test_kafka_producer_profile_settings(self):
+        with patch.dict(kafka.KafkaProducer.DEFAULT_CONFIG, {"api_version": (2, 5, 0)}):
+            producer = _KafkaProducer(test=False, compression_type="gzip", linger_ms=20, batch_size=65536)
+        self.assertEqual(producer.producer.config["compression_type"], "gzip")  # type: ignore
+        self.assertEqual(producer.producer.config["linger_ms"], 20)  # type: ignore
+        self.assertEqual(producer.producer.config["batch_size"], 65536)  # type: ignore
+
     def test_kafka_produce(self):
         producer = _KafkaProducer(test=False)
         producer.produce(topic=self.topic, data=self.payload)
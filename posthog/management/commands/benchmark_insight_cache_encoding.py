@@ -0,0 +1,89 @@
+import logging
+import pickle
+import zlib
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, List
+
+import structlog
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posthog.caching.insight_result_encoding import (
+    decode_insight_result,
+    encode_insight_result,
+    is_encoded_insight_result,
+)
+from posthog.caching.tolerant_zlib_compressor import TolerantZlibCompressor
+from posthog.models import InsightCachingState
+
+logger = structlog.get_logger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    help = "Compare size and decode time of cached insight results in the pickled and binary encodings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--team-id", default=None, type=int, help="Only sample insights from this team.")
+        parser.add_argument("--insight-type", default="Trends", type=str, help="Only sample results of this type.")
+        parser.add_argument("--sample-size", default=100, type=int, help="Number of cached results to sample.")
+        parser.add_argument("--repeat", default=5, type=int, help="Number of times to decode each result.")
+
+    def handle(self, *args, **options):
+        run(options)
+
+
+def run(options):
+    payloads = sample_cached_results(options["team_id"], options["insight_type"], options["sample_size"])
+    if len(payloads) == 0:
+        logger.info("No cached insight results found to benchmark")
+        return
+
+    repeat = options["repeat"]
+    compressor = TolerantZlibCompressor({})
+
+    pickled = [zlib.compress(pickle.dumps(payload), compressor.preset) for payload in payloads]
+    encoded = [encode_insight_result(payload) for payload in payloads]
+
+    pickled_decode = [_time(lambda: pickle.loads(zlib.decompress(value)), repeat) for value in pickled]
+    encoded_decode = [_time(lambda: decode_insight_result(value), repeat) for value in encoded]
+
+    logger.info(
+        "Benchmarked insight cache encoding",
+        sample_size=len(payloads),
+        pickled_total_bytes=sum(map(len, pickled)),
+        encoded_total_bytes=sum(map(len, encoded)),
+        pickled_max_bytes=max(map(len, pickled)),
+        encoded_max_bytes=max(map(len, encoded)),
+        pickled_median_decode_ms=median(pickled_decode) * 1000,
+        encoded_median_decode_ms=median(encoded_decode) * 1000,
+        pickled_max_decode_ms=max(pickled_decode) * 1000,
+        encoded_max_decode_ms=max(encoded_decode) * 1000,
+    )
+
+
+def sample_cached_results(team_id, insight_type, sample_size) -> List[Any]:
+    states = InsightCachingState.objects.filter(last_refresh__isnull=False).order_by("-last_refresh")
+    if team_id is not None:
+        states = states.filter(team_id=team_id)
+
+    payloads = []
+    for cache_key in states.values_list("cache_key", flat=True)[: sample_size * 4]:
+        value = cache.get(cache_key)
+        if is_encoded_insight_result(value):
+            value = decode_insight_result(value)
+        if isinstance(value, dict) and (insight_type is None or value.get("type") == insight_type):
+            payloads.append(value)
+        if len(payloads) >= sample_size:
+            break
+    return payloads
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        timings.append(perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,106 @@
+import logging
+import time
+from statistics import median, quantiles
+from typing import Any, Dict, List, Optional
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posthog.kafka_client.client import _KafkaProducer
+from posthog.models.utils import UUIDT
+
+logger = structlog.get_logger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Command(BaseCommand):
+    help = "Compare throughput and ack latency of Kafka producer profiles against a local Kafka compatible broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kafka-hosts",
+            default=",".join(settings.KAFKA_HOSTS),
+            type=str,
+            help="Broker to produce to, e.g. the kafka or redpanda container of the dev docker compose stack.",
+        )
+        parser.add_argument("--topic", default="benchmark_kafka_producer", type=str, help="Topic to produce to.")
+        parser.add_argument("--messages", default=20000, type=int, help="Number of messages produced per profile.")
+        parser.add_argument("--properties", default=20, type=int, help="Number of properties of each event.")
+        parser.add_argument(
+            "--compression",
+            default="none,gzip,lz4,zstd",
+            type=str,
+            help="Comma separated codecs to compare, codecs whose library isn't installed are skipped.",
+        )
+        parser.add_argument("--linger-ms", default="0,5,20", type=str, help="Comma separated linger values to compare.")
+        parser.add_argument("--batch-size", default=16384, type=int, help="Producer batch size in bytes.")
+
+    def handle(self, *args, **options):
+        run(options)
+
+
+def run(options):
+    events = [_fake_event(options["properties"]) for _ in range(min(options["messages"], 1000))]
+
+    for compression in options["compression"].split(","):
+        for linger_ms in map(int, options["linger_ms"].split(",")):
+            try:
+                producer = _KafkaProducer(
+                    test=False,
+                    kafka_base64_keys=False,
+                    kafka_hosts=options["kafka_hosts"].split(","),
+                    compression_type=None if compression == "none" else compression,
+                    linger_ms=linger_ms,
+                    batch_size=options["batch_size"],
+                    profile="benchmark",
+                )
+            except Exception as err:
+                logger.warn("Skipping producer profile", compression=compression, linger_ms=linger_ms, error=err)
+                continue
+
+            result = benchmark_producer(producer, options["topic"], events, options["messages"])
+            producer.producer.close()
+            logger.info("Benchmarked Kafka producer profile", compression=compression, linger_ms=linger_ms, **result)
+
+
+def benchmark_producer(producer: _KafkaProducer, topic: str, events: List[Dict], messages: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+
+    def on_ack(sent_at: float):
+        latencies.append(time.monotonic() - sent_at)
+
+    start = time.monotonic()
+    for index in range(messages):
+        event = events[index % len(events)]
+        sent_at = time.monotonic()
+        future = producer.produce(topic=topic, data=event, key=event["distinct_id"])
+        future.add_callback(lambda _, sent_at=sent_at: on_ack(sent_at))
+    producer.flush()
+    duration = time.monotonic() - start
+
+    return {
+        "messages": messages,
+        "messages_per_second": round(messages / duration),
+        "median_ack_ms": round(median(latencies) * 1000, 2) if latencies else None,
+        "p99_ack_ms": round(quantiles(latencies, n=100)[98] * 1000, 2) if len(latencies) > 1 else None,
+        "batch_size_avg_bytes": _producer_metric(producer, "batch-size-avg"),
+        "compression_rate_avg": _producer_metric(producer, "compression-rate-avg"),
+    }
+
+
+def _producer_metric(producer: _KafkaProducer, name: str) -> Optional[float]:
+    for metrics in producer.producer.metrics().values():
+        if name in metrics:
+            return metrics[name]
+    return None
+
+
+def _fake_event(property_count: int) -> Dict[str, Any]:
+    distinct_id = str(UUIDT())
+    return {
+        "uuid": str(UUIDT()),
+        "distinct_id": distinct_id,
+        "event": "$pageview",
+        "properties": {f"property_{index}": f"value {index} of {distinct_id}" for index in range(property_count)},
+    }
@@ -1,6 +1,5 @@
 import json
 import logging
-from uuid import UUID
 
 import structlog
 from django.core.management.base import BaseCommand
@@ -9,14 +8,9 @@ from django.utils.timezone import now
 from posthog.client import sync_execute
 from posthog.models.group.group import Group
 from posthog.models.group.util import raw_create_group_ch
-from posthog.models.person import PersonDistinctId
-from posthog.models.person.person import Person, PersonOverride
-from posthog.models.person.util import (
-    _delete_ch_distinct_id,
-    create_person,
-    create_person_distinct_id,
-    create_person_override,
-)
+from posthog.models.person.person import PersonOverride
+from posthog.models.person.reconciliation import PersonDistinctIdReconciler, PersonReconciler
+from posthog.models.person.util import create_person_override
 
 logger = structlog.get_logger(__name__)
 logger.setLevel(logging.INFO)
@@ -39,6 +33,9 @@ class Command(BaseCommand):
             "--deletes", action="store_true", help="process deletes for data in ClickHouse but not Postgres"
         )
         parser.add_argument("--live-run", action="store_true", help="Run changes, default is dry-run")
+        parser.add_argument(
+            "--workers", default=4, type=int, help="Number of out of sync chunks reconciled in parallel"
+        )
 
     def handle(self, *args, **options):
         run(options)
@@ -53,12 +50,13 @@ def run(options, sync: bool = False):  # sync used for unittests
         exit(1)
 
     team_id = options["team_id"]
+    workers = options.get("workers", 1)
 
     if options["person"]:
-        run_person_sync(team_id, live_run, deletes, sync)
+        run_person_sync(team_id, live_run, deletes, sync, workers)
 
     if options["person_distinct_id"]:
-        run_distinct_id_sync(team_id, live_run, deletes, sync)
+        run_distinct_id_sync(team_id, live_run, deletes, sync, workers)
 
     if options["person_override"]:
         run_person_override_sync(team_id, live_run, deletes, sync)
@@ -67,113 +65,21 @@ def run(options, sync: bool = False):  # sync used for unittests
         run_group_sync(team_id, live_run, sync)
 
 
-def run_person_sync(team_id: int, live_run: bool, deletes: bool, sync: bool):
+def run_person_sync(team_id: int, live_run: bool, deletes: bool, sync: bool, workers: int = 1):
     logger.info("Running person table sync")
-    # lookup what needs to be updated in ClickHouse and send kafka messages for only those
-    persons = Person.objects.filter(team_id=team_id)
-    rows = sync_execute(
-        """
-            SELECT id, max(version) FROM person WHERE team_id = %(team_id)s GROUP BY id HAVING max(is_deleted) = 0
-        """,
-        {
-            "team_id": team_id,
-        },
-    )
-    ch_persons_to_version = {row[0]: row[1] for row in rows}
-    total_pg = len(persons)
-    logger.info(f"Got ${total_pg} in PG and ${len(ch_persons_to_version)} in CH")
-
-    for i, person in enumerate(persons):
-        if i % (max(total_pg // 10, 1)) == 0 and i > 0:
-            logger.info(f"Processed {i / total_pg * 100}%")
-        ch_version = ch_persons_to_version.get(person.uuid, None)
-        pg_version = person.version or 0
-        if ch_version is None or ch_version < pg_version:
-            logger.info(f"Updating {person.uuid} to version {pg_version}")
-            if live_run:
-                # Update ClickHouse via Kafka message
-                create_person(
-                    team_id=team_id,
-                    version=pg_version,
-                    uuid=str(person.uuid),
-                    properties=person.properties,
-                    is_identified=person.is_identified,
-                    created_at=person.created_at,
-                    sync=sync,
-                )
-        elif ch_version > pg_version:
-            logger.info(
-                f"Clickhouse version ({ch_version}) for '{person.uuid}' is higher than in Postgres ({pg_version}). Ignoring."
-            )
-
-    if deletes:
-        logger.info("Processing person deletions")
-        postgres_uuids = {person.uuid for person in persons}
-        for uuid, version in ch_persons_to_version.items():
-            if uuid not in postgres_uuids:
-                logger.info(f"Deleting person with uuid={uuid}")
-                if live_run:
-                    create_person(
-                        uuid=str(uuid),
-                        team_id=team_id,
-                        properties={},
-                        version=int(version or 0)
-                        + 100,  # keep in sync with deletePerson in plugin-server/src/utils/db/db.ts
-                        is_deleted=True,
-                        sync=sync,
-                    )
+    # compare chunks of persons and send kafka messages for only those in chunks that differ
+    results = PersonReconciler(team_id, live_run=live_run, deletes=deletes, sync=sync, workers=workers).reconcile()
+    logger.info("Person table sync done", **results)
 
 
-def run_distinct_id_sync(team_id: int, live_run: bool, deletes: bool, sync: bool):
+def run_distinct_id_sync(team_id: int, live_run: bool, deletes: bool, sync: bool, workers: int = 1):
     logger.info("Running person distinct id table sync")
-    # lookup what needs to be updated in ClickHouse and send kafka messages for only those
-    person_distinct_ids = PersonDistinctId.objects.filter(team_id=team_id)
-    rows = sync_execute(
-        """
-            SELECT distinct_id, max(version) FROM person_distinct_id2 WHERE team_id = %(team_id)s GROUP BY distinct_id HAVING max(is_deleted) = 0
-        """,
-        {
-            "team_id": team_id,
-        },
-    )
-    ch_distinct_id_to_version = {row[0]: row[1] for row in rows}
-
-    total_pg = len(person_distinct_ids)
-    logger.info(f"Got ${total_pg} in PG and ${len(ch_distinct_id_to_version)} in CH")
-
-    for i, person_distinct_id in enumerate(person_distinct_ids):
-        if i % (max(total_pg // 10, 1)) == 0 and i > 0:
-            logger.info(f"Processed {i / total_pg * 100}%")
-        ch_version = ch_distinct_id_to_version.get(person_distinct_id.distinct_id, None)
-        pg_version = person_distinct_id.version or 0
-        if ch_version is None or ch_version < pg_version:
-            logger.info(f"Updating {person_distinct_id.distinct_id} to version {pg_version}")
-            if live_run:
-                # Update ClickHouse via Kafka message
-                create_person_distinct_id(
-                    team_id=team_id,
-                    distinct_id=person_distinct_id.distinct_id,
-                    person_id=str(person_distinct_id.person.uuid),
-                    version=pg_version,
-                    is_deleted=False,
-                    sync=sync,
-                )
-        elif ch_version > pg_version:
-            # This could be happening due to person deletions - check out fix_person_distinct_ids_after_delete management cmd.
-            # Ignoring here to be safe.
-            logger.info(
-                f"Clickhouse version ({ch_version}) for '{person_distinct_id.distinct_id}' is higher than in Postgres ({pg_version}). Ignoring."
-            )
-            continue
-
-    if deletes:
-        logger.info("Processing distinct id deletions")
-        postgres_distinct_ids = {person_distinct_id.distinct_id for person_distinct_id in person_distinct_ids}
-        for distinct_id, version in ch_distinct_id_to_version.items():
-            if distinct_id not in postgres_distinct_ids:
-                logger.info(f"Deleting distinct ID {distinct_id}")
-                if live_run:
-                    _delete_ch_distinct_id(team_id, UUID(int=0), distinct_id, version, sync=sync)
+    # Higher versions in ClickHouse could be happening due to person deletions - check out
+    # fix_person_distinct_ids_after_delete management cmd. These are ignored to be safe.
+    results = PersonDistinctIdReconciler(
+        team_id, live_run=live_run, deletes=deletes, sync=sync, workers=workers
+    ).reconcile()
+    logger.info("Person distinct id table sync done", **results)
 
 
 def run_person_override_sync(team_id: int, live_run: bool, deletes: bool, sync: bool):
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from datetime import datetime, timedelta
 from unittest import mock
@@ -16,6 +17,12 @@ from posthog.management.commands.sync_persons_to_clickhouse import (
 from posthog.models.group.group import Group
 from posthog.models.group.util import create_group
 from posthog.models.person.person import Person, PersonDistinctId
+from posthog.models.person.reconciliation import (
+    CH_PERSON_CHUNK_SQL,
+    CHUNK_PREFIX_LENGTH,
+    PersonDistinctIdReconciler,
+    PersonReconciler,
+)
 from posthog.models.person.sql import PERSON_DISTINCT_ID2_TABLE
 from posthog.models.person.util import create_person, create_person_distinct_id
 from posthog.models.signals import mute_selected_signals
@@ -116,6 +123,43 @@ class TestSyncPersonsToClickHouse(BaseTest, ClickhouseTestMixin):
         )
         self.assertEqual(ch_person_distinct_ids, [(UUID(int=0), self.team.pk, "test-id-7", 107, True)])
 
+    def test_only_mismatched_chunks_are_compared(self):
+        # fixed uuids, so that the two persons are in different chunks
+        person_in_sync = Person.objects.create(
+            team_id=self.team.pk, version=3, uuid=UUID("00000000-0000-0000-0000-000000000001")
+        )
+        PersonDistinctId.objects.create(team=self.team, person=person_in_sync, distinct_id="in-sync", version=2)
+        with mute_selected_signals():  # without creating/updating in clickhouse
+            person_out_of_sync = Person.objects.create(
+                team_id=self.team.pk, version=None, uuid=UUID("00000000-0000-0000-0000-000000000002")
+            )
+            PersonDistinctId.objects.create(team=self.team, person=person_out_of_sync, distinct_id="out-of-sync")
+
+        def chunk(key: str) -> str:
+            return hashlib.md5(key.encode("utf-8")).hexdigest()[:CHUNK_PREFIX_LENGTH]
+
+        self.assertEqual(PersonReconciler(self.team.pk).mismatched_chunks()[1], [chunk(str(person_out_of_sync.uuid))])
+        self.assertEqual(PersonDistinctIdReconciler(self.team.pk).mismatched_chunks()[1], [chunk("out-of-sync")])
+
+        results = PersonReconciler(self.team.pk, live_run=True, sync=True).reconcile()
+        self.assertEqual(results["mismatched_chunks"], 1)
+        self.assertEqual(results["updated"], 1)
+        self.assertEqual(PersonReconciler(self.team.pk).mismatched_chunks()[1], [])
+
+    @mock.patch("posthog.models.person.reconciliation.sync_execute", wraps=sync_execute)
+    def test_mismatched_chunks_are_compared_in_one_batch(self, mocked_sync_execute):
+        with mute_selected_signals():  # without creating/updating in clickhouse
+            # fixed uuids, so that the two persons are in different chunks
+            Person.objects.create(team_id=self.team.pk, version=1, uuid=UUID("00000000-0000-0000-0000-000000000001"))
+            Person.objects.create(team_id=self.team.pk, version=1, uuid=UUID("00000000-0000-0000-0000-000000000002"))
+
+        results = PersonReconciler(self.team.pk, live_run=True, sync=True).reconcile()
+
+        self.assertEqual(results["mismatched_chunks"], 2)
+        self.assertEqual(results["updated"], 2)
+        chunk_queries = [call for call in mocked_sync_execute.call_args_list if call.args[0] == CH_PERSON_CHUNK_SQL]
+        self.assertEqual(len(chunk_queries), 1)
+
     @mock.patch(
         f"{posthog.management.commands.sync_persons_to_clickhouse.__name__}.raw_create_group_ch",
         wraps=posthog.management.commands.sync_persons_to_clickhouse.raw_create_group_ch,
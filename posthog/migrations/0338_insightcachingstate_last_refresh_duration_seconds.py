@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2023-07-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0337_more_session_recording_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="insightcachingstate",
+            name="last_refresh_duration_seconds",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
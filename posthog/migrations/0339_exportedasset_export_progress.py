@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2023-07-24 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0338_insightcachingstate_last_refresh_duration_seconds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportedasset",
+            name="export_progress",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2023-07-26 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0339_exportedasset_export_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="asyncmigration",
+            name="partition_progress",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -49,6 +49,9 @@ class AsyncMigration(models.Model):
 
     parameters: models.JSONField = models.JSONField(default=dict)
 
+    # partitions completed by partitioned operations, so that they can resume where they stopped
+    partition_progress: models.JSONField = models.JSONField(null=True, blank=True)
+
     def get_name_with_requirements(self) -> str:
         return (
             f"{self.name} - must be ran on PostHog version {self.posthog_min_version} up to {self.posthog_max_version}"
@@ -1,5 +1,6 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
@@ -20,14 +21,64 @@ class Element(models.Model):
     group: models.ForeignKey = models.ForeignKey("ElementGroup", on_delete=models.CASCADE, null=True, blank=True)
 
 
-parse_attributes_regex = re.compile(r"(?P<attribute>(?P<key>.*?)\=\"(?P<value>.*?[^\\])\")", re.MULTILINE)
-
-# Below splits all elements by ;, while ignoring escaped quotes and semicolons within quotes
-split_chain_regex = re.compile(r'(?:[^\s;"]|"(?:\\.|[^"])*")+')
-
-# Below splits the tag/classes from attributes
-# Needs a regex because classes can have : too
-split_class_attributes = re.compile(r"(.*?)($|:([a-zA-Z\-\_0-9]*=.*))")
+# Number of distinct `elements_chain` strings whose parsed form is remembered. Autocapture chains are highly
+# repetitive, as the same buttons and links get clicked over and over.
+ELEMENTS_CHAIN_CACHE_SIZE = 10_000
+
+# Characters which end an element string in a chain, unless within quotes
+_CHAIN_SPECIAL_CHARACTERS = re.compile(r'[\s;"]')
+_QUOTED_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+# Characters allowed in an attribute key right after the `:` which separates the tag and classes from attributes
+_ATTRIBUTE_KEY_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-_0123456789")
+
+
+class ParsedElement:
+    """
+    Lightweight, read-only representation of an element parsed out of an `elements_chain`.
+
+    Instances are shared between callers through the parsing cache, so they must not be mutated. Use `to_model` to
+    get an `Element` that can be changed or saved.
+    """
+
+    __slots__ = ("order", "tag_name", "attr_class", "text", "href", "attr_id", "nth_child", "nth_of_type", "attributes")
+
+    def __init__(self, order: int):
+        self.order = order
+        self.tag_name: Optional[str] = None
+        self.attr_class: Optional[List[str]] = None
+        self.text: Optional[str] = None
+        self.href: Optional[str] = None
+        self.attr_id: Optional[str] = None
+        self.nth_child: Optional[int] = None
+        self.nth_of_type: Optional[int] = None
+        self.attributes: Dict[str, str] = {}
+
+    def to_model(self) -> Element:
+        return Element(
+            order=self.order,
+            tag_name=self.tag_name,
+            attr_class=list(self.attr_class) if self.attr_class is not None else None,
+            text=self.text,
+            href=self.href,
+            attr_id=self.attr_id,
+            nth_child=self.nth_child,
+            nth_of_type=self.nth_of_type,
+            attributes=dict(self.attributes),
+        )
+
+    def serialize(self) -> Dict[str, Any]:
+        "Same fields and values as `ElementSerializer` returns for the equivalent `Element`"
+        return {
+            "text": self.text,
+            "tag_name": self.tag_name,
+            "attr_class": list(self.attr_class) if self.attr_class is not None else None,
+            "href": self.href,
+            "attr_id": self.attr_id,
+            "nth_child": self.nth_child,
+            "nth_of_type": self.nth_of_type,
+            "attributes": dict(self.attributes),
+            "order": self.order,
+        }
 
 
 def _escape(input: str) -> str:
@@ -37,55 +88,134 @@ def _escape(input: str) -> str:
 def elements_to_string(elements: List[Element]) -> str:
     ret = []
     for element in elements:
-        el_string = ""
-        if element.tag_name:
-            el_string += element.tag_name
+        el_string = element.tag_name or ""
         if element.attr_class:
-            for single_class in sorted(element.attr_class):
-                el_string += ".{}".format(single_class.replace('"', ""))
+            el_string += "".join("." + single_class.replace('"', "") for single_class in sorted(element.attr_class))
         attributes = {
-            **({"text": element.text} if element.text else {}),
             "nth-child": element.nth_child or 0,
             "nth-of-type": element.nth_of_type or 0,
-            **({"href": element.href} if element.href else {}),
-            **({"attr_id": element.attr_id} if element.attr_id else {}),
-            **element.attributes,
         }
-        attributes = {_escape(key): _escape(str(value)) for key, value in sorted(attributes.items())}
+        if element.text:
+            attributes["text"] = element.text
+        if element.href:
+            attributes["href"] = element.href
+        if element.attr_id:
+            attributes["attr_id"] = element.attr_id
+        attributes.update(element.attributes)
         el_string += ":"
-        el_string += "".join(['{}="{}"'.format(key, value) for key, value in attributes.items()])
+        el_string += "".join(
+            '{}="{}"'.format(_escape(key), _escape(str(value))) for key, value in sorted(attributes.items())
+        )
         ret.append(el_string)
     return ";".join(ret)
 
 
 def chain_to_elements(chain: str) -> List[Element]:
-    elements = []
-    for idx, el_string in enumerate(re.findall(split_chain_regex, chain)):
-        el_string_split = re.findall(split_class_attributes, el_string)[0]
-        attributes = re.finditer(parse_attributes_regex, el_string_split[2]) if len(el_string_split) > 2 else []
-
-        element = Element(order=idx)
-
-        if el_string_split[0]:
-            tag_and_class = el_string_split[0].split(".", 1)
-            element.tag_name = tag_and_class[0]
-            if len(tag_and_class) > 1:
-                element.attr_class = [cl for cl in tag_and_class[1].split(".") if cl != ""]
-
-        for ii in attributes:
-            item = ii.groupdict()
-            if item["key"] == "href":
-                element.href = item["value"]
-            elif item["key"] == "nth-child":
-                element.nth_child = int(item["value"])
-            elif item["key"] == "nth-of-type":
-                element.nth_of_type = int(item["value"])
-            elif item["key"] == "text":
-                element.text = item["value"]
-            elif item["key"] == "attr_id":
-                element.attr_id = item["value"]
-            elif item["key"]:
-                element.attributes[item["key"]] = item["value"]
-
-        elements.append(element)
-    return elements
+    return [element.to_model() for element in parse_elements_chain(chain)]
+
+
+def chain_to_serialized_elements(chain: str) -> List[Dict[str, Any]]:
+    "Equivalent to serializing `chain_to_elements(chain)`, without creating model instances"
+    return [element.serialize() for element in parse_elements_chain(chain)]
+
+
+@lru_cache(maxsize=ELEMENTS_CHAIN_CACHE_SIZE)
+def parse_elements_chain(chain: str) -> Tuple[ParsedElement, ...]:
+    return tuple(_parse_element(order, el_string) for order, el_string in enumerate(_split_chain(chain)))
+
+
+def _split_chain(chain: str) -> List[str]:
+    """
+    Splits the chain into element strings on `;` and whitespace, ignoring those within double quotes.
+
+    Within quotes, a backslash escapes the following character. A quote which is never closed is skipped over like
+    a separator.
+    """
+    parts = []
+    start = index = 0
+    while True:
+        match = _CHAIN_SPECIAL_CHARACTERS.search(chain, index)
+        if match is None:
+            break
+        index = match.start()
+        if match.group() == '"':
+            end = _find_closing_quote(chain, index)
+            if end != -1:
+                index = end + 1
+                continue
+        if index > start:
+            parts.append(chain[start:index])
+        index += 1
+        start = index
+    if len(chain) > start:
+        parts.append(chain[start:])
+    return parts
+
+
+def _find_closing_quote(chain: str, opening: int) -> int:
+    match = _QUOTED_STRING.match(chain, opening)
+    if match is not None:
+        return match.end() - 1
+    # :TRICKY: Every quote after the opening one is escaped. The old regex based splitting backtracked to treating the
+    #   last of them as the closing quote, keep doing the same.
+    return chain.rfind('"', opening + 1)
+
+
+def _parse_element(order: int, el_string: str) -> ParsedElement:
+    element = ParsedElement(order)
+
+    # Tag and classes are separated from the attributes by the first `:` followed by an attribute key and `=`. Classes
+    # can contain `:` too.
+    attributes_start = len(el_string)
+    colon = el_string.find(":")
+    while colon != -1:
+        key_end = colon + 1
+        while key_end < len(el_string) and el_string[key_end] in _ATTRIBUTE_KEY_CHARACTERS:
+            key_end += 1
+        if key_end < len(el_string) and el_string[key_end] == "=":
+            attributes_start = colon
+            break
+        colon = el_string.find(":", colon + 1)
+
+    tag_and_classes = el_string[:attributes_start]
+    if tag_and_classes:
+        tag_name, has_classes, classes = tag_and_classes.partition(".")
+        element.tag_name = tag_name
+        if has_classes:
+            element.attr_class = [single_class for single_class in classes.split(".") if single_class != ""]
+
+    for key, value in _parse_attributes(el_string, attributes_start + 1):
+        if key == "href":
+            element.href = value
+        elif key == "nth-child":
+            element.nth_child = int(value)
+        elif key == "nth-of-type":
+            element.nth_of_type = int(value)
+        elif key == "text":
+            element.text = value
+        elif key == "attr_id":
+            element.attr_id = value
+        elif key:
+            element.attributes[key] = value
+
+    return element
+
+
+def _parse_attributes(el_string: str, position: int) -> Iterator[Tuple[str, str]]:
+    "Yields `key=\"value\"` pairs, where values can contain escaped quotes and are at least one character long"
+    while position < len(el_string):
+        key_end = el_string.find('="', position)
+        while key_end != -1:
+            value_start = key_end + 2
+            value_end = el_string.find('"', value_start + 1)
+            while value_end != -1 and el_string[value_end - 1] == "\\":
+                value_end = el_string.find('"', value_end + 1)
+            if value_end != -1:
+                break
+            # :TRICKY: The value is never closed, so the `="` might have been part of the key
+            key_end = el_string.find('="', key_end + 1)
+
+        if key_end == -1:
+            return
+        yield el_string[position:key_end], el_string[value_start:value_end]
+        position = value_end + 1
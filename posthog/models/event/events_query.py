@@ -6,7 +6,6 @@ from dateutil.parser import isoparse
 from django.db.models import Prefetch
 from django.utils.timezone import now
 
-from posthog.api.element import ElementSerializer
 from posthog.api.utils import get_pk_or_uuid
 from posthog.clickhouse.client.connection import Workload
 from posthog.hogql import ast
@@ -14,7 +13,7 @@ from posthog.hogql.parser import parse_expr, parse_order_expr
 from posthog.hogql.property import action_to_expr, has_aggregation, property_to_expr
 from posthog.hogql.query import execute_hogql_query
 from posthog.models import Action, Person, Team
-from posthog.models.element import chain_to_elements
+from posthog.models.element import chain_to_serialized_elements
 from posthog.models.person.util import get_persons_by_distinct_ids
 from posthog.schema import EventsQuery, EventsQueryResponse
 from posthog.utils import relative_date_parse
@@ -36,6 +35,7 @@ def run_events_query(
     team: Team,
     query: EventsQuery,
     default_limit: Optional[int] = None,
+    extra_where: Optional[ast.Expr] = None,
 ) -> EventsQueryResponse:
     # Note: This code is inefficient and problematic, see https://github.com/PostHog/posthog/issues/13485 for details.
 
@@ -109,6 +109,8 @@ def run_events_query(
         except ValueError:
             parsed_date = relative_date_parse(after)
         where_exprs.append(parse_expr("timestamp > {timestamp}", {"timestamp": ast.Constant(value=parsed_date)}))
+    if extra_where is not None:
+        where_exprs.append(extra_where)
 
     # where & having
     where_list = [expr for expr in where_exprs if not has_aggregation(expr)]
@@ -152,9 +154,7 @@ def run_events_query(
             new_result = dict(zip(SELECT_STAR_FROM_EVENTS_FIELDS, select))
             new_result["properties"] = json.loads(new_result["properties"])
             if new_result["elements_chain"]:
-                new_result["elements"] = ElementSerializer(
-                    chain_to_elements(new_result["elements_chain"]), many=True
-                ).data
+                new_result["elements"] = chain_to_serialized_elements(new_result["elements_chain"])
             query_result.results[index][star_idx] = new_result
 
     if len(person_indices) > 0 and len(query_result.results) > 0:
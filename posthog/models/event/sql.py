@@ -286,6 +286,22 @@ WHERE
 LIMIT 10
 """
 
+TOP_PROP_VALUES_SQL = """
+SELECT
+    {property_field} AS value,
+    count() AS count
+FROM
+    events
+WHERE
+    team_id = %(team_id)s
+    {property_exists_filter}
+    {parsed_date_from}
+    {parsed_date_to}
+GROUP BY value
+ORDER BY count DESC
+LIMIT %(limit)s
+"""
+
 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_SQL = """
 SELECT
     uuid,
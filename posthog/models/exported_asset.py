@@ -1,6 +1,8 @@
 import secrets
+import struct
+import zlib
 from datetime import timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import structlog
 from django.conf import settings
@@ -23,6 +25,10 @@ logger = structlog.get_logger(__name__)
 
 PUBLIC_ACCESS_TOKEN_EXP_DAYS = 365
 MAX_AGE_CONTENT = 86400  # 1 day
+# Object storage rejects multipart upload parts smaller than 5MB, other than the last one
+UPLOAD_PART_SIZE = 5 * 1024 * 1024
+# gzip member header without a filename or modification time, see RFC 1952
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
 
 
 def get_default_access_token() -> str:
@@ -65,6 +71,8 @@ class ExportedAsset(models.Model):
     # path in object storage or some other location identifier for the asset
     # 1000 characters would hold a 20 UUID forward slash separated path with space to spare
     content_location: models.TextField = models.TextField(null=True, blank=True, max_length=1000)
+    # state of an export which is being streamed into object storage, used to resume it after a failure
+    export_progress: models.JSONField = models.JSONField(null=True, blank=True)
 
     # DEPRECATED: We now use JWT for accessing assets
     access_token: models.CharField = models.CharField(
@@ -95,6 +103,12 @@ class ExportedAsset(models.Model):
     def file_ext(self):
         return self.export_format.split("/")[1]
 
+    @property
+    def content_encoding(self) -> Optional[str]:
+        if self.export_context and self.export_context.get("compression") == "gzip":
+            return "gzip"
+        return None
+
     def get_analytics_metadata(self):
         return {"export_format": self.export_format, "dashboard_id": self.dashboard_id, "insight_id": self.insight_id}
 
@@ -135,6 +149,8 @@ def get_content_response(asset: ExportedAsset, download: bool = False):
         raise NotFound()
 
     res = HttpResponse(content, content_type=asset.export_format)
+    if asset.content_encoding:
+        res["Content-Encoding"] = asset.content_encoding
     if download:
         res["Content-Disposition"] = f'attachment; filename="{asset.filename}"'
 
@@ -164,6 +180,13 @@ def save_content_to_exported_asset(exported_asset: ExportedAsset, content: bytes
 
 
 def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes) -> None:
+    object_path = get_object_path(exported_asset)
+    object_storage.write(object_path, content)
+    exported_asset.content_location = object_path
+    exported_asset.save(update_fields=["content_location"])
+
+
+def get_object_path(exported_asset: ExportedAsset) -> str:
     path_parts: List[str] = [
         settings.OBJECT_STORAGE_EXPORTS_FOLDER,
         exported_asset.export_format.split("/")[1],
@@ -171,7 +194,105 @@ def save_content_to_object_storage(exported_asset: ExportedAsset, content: bytes
         f"task-{exported_asset.id}",
         str(UUIDT()),
     ]
-    object_path = "/".join(path_parts)
-    object_storage.write(object_path, content)
-    exported_asset.content_location = object_path
-    exported_asset.save(update_fields=["content_location"])
+    return "/".join(path_parts)
+
+
+class ContentWriter:
+    """
+    Writes an asset's content incrementally, optionally gzipped.
+
+    Content which fits in a single upload part is saved with `save_content` once the writer is closed. Anything larger
+    is streamed into object storage as a multipart upload, so memory use is bounded by the part size. Parts are only
+    uploaded at checkpoints, together with a cursor describing where the content written so far ends. If the export
+    fails, the next attempt picks up the upload and the cursor from `export_progress` and continues from there.
+    """
+
+    def __init__(self, exported_asset: ExportedAsset, part_size: Optional[int] = None):
+        self.exported_asset = exported_asset
+        self.part_size = part_size or UPLOAD_PART_SIZE
+        self.progress: Dict[str, Any] = exported_asset.export_progress or {}
+        self.buffer = bytearray()
+        self.compressor: Optional[Any] = None
+
+        if exported_asset.content_encoding == "gzip":
+            # :TRICKY: A single gzip stream is written across all parts, so that any client can decompress it. Raw
+            #   deflate output is fully flushed at every part boundary, which lets a new compressor continue the stream
+            #   after a restart. Only the checksum and size need to be remembered for the trailer.
+            self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+            if "gzip" not in self.progress:
+                self.buffer += GZIP_HEADER
+            self.crc = self.progress.get("gzip", {}).get("crc", 0)
+            self.size = self.progress.get("gzip", {}).get("size", 0)
+
+    @property
+    def cursor(self) -> Optional[Any]:
+        "Where the previous attempt's uploaded content ends, or None if starting from scratch"
+        return self.progress.get("cursor")
+
+    def write(self, content: bytes) -> None:
+        if self.compressor is not None:
+            self.crc = zlib.crc32(content, self.crc)
+            self.size += len(content)
+            self.buffer += self.compressor.compress(content)
+        else:
+            self.buffer += content
+
+    def checkpoint(self, cursor: Any) -> None:
+        "Uploads the content written so far if there's enough of it, and records `cursor` as the point to resume from"
+        if len(self.buffer) < self.part_size or not settings.OBJECT_STORAGE_ENABLED:
+            return
+
+        if self.compressor is not None:
+            self.buffer += self.compressor.flush(zlib.Z_FULL_FLUSH)
+
+        if "upload_id" not in self.progress:
+            object_path = get_object_path(self.exported_asset)
+            self.progress = {
+                "content_location": object_path,
+                "upload_id": object_storage.start_multipart_upload(object_path),
+                "parts": [],
+            }
+
+        part_number = len(self.progress["parts"]) + 1
+        etag = object_storage.upload_part(
+            self.progress["content_location"], self.progress["upload_id"], part_number, bytes(self.buffer)
+        )
+        self.progress["parts"].append([part_number, etag])
+        self.progress["cursor"] = cursor
+        if self.compressor is not None:
+            self.progress["gzip"] = {"crc": self.crc, "size": self.size}
+        self.buffer = bytearray()
+
+        self.exported_asset.export_progress = self.progress
+        self.exported_asset.save(update_fields=["export_progress"])
+
+    def close(self) -> None:
+        if self.compressor is not None:
+            self.buffer += self.compressor.flush()
+            self.buffer += struct.pack("<II", self.crc, self.size & 0xFFFFFFFF)
+
+        if "upload_id" not in self.progress:
+            save_content(self.exported_asset, bytes(self.buffer))
+            return
+
+        content_location = self.progress["content_location"]
+        parts = [(number, etag) for number, etag in self.progress["parts"]]
+        if self.buffer:
+            part_number = len(parts) + 1
+            etag = object_storage.upload_part(
+                content_location, self.progress["upload_id"], part_number, bytes(self.buffer)
+            )
+            parts.append((part_number, etag))
+        object_storage.complete_multipart_upload(content_location, self.progress["upload_id"], parts)
+
+        self.exported_asset.content_location = content_location
+        self.exported_asset.export_progress = None
+        self.exported_asset.save(update_fields=["content_location", "export_progress"])
+
+    def abort(self) -> None:
+        "Discards the parts uploaded by previous attempts, for when the export is given up on"
+        if "upload_id" in self.progress:
+            object_storage.abort_multipart_upload(self.progress["content_location"], self.progress["upload_id"])
+        self.progress = {}
+        self.exported_asset.export_progress = None
+        self.exported_asset.save(update_fields=["export_progress"])
@@ -1,9 +1,14 @@
-from typing import TYPE_CHECKING, Tuple
+import atexit
+import os
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 from posthog.constants import FlagRequestType
 from posthog.models.feature_flag.feature_flag import FeatureFlag
 from posthog.redis import redis, get_client
 import time
 from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
 from django.conf import settings
 from posthog.client import sync_execute
 from datetime import datetime
@@ -14,6 +19,8 @@ if TYPE_CHECKING:
 
 REDIS_LOCK_TOKEN = "posthog:decide_analytics:lock"
 CACHE_BUCKET_SIZE = 60 * 2  # duration in seconds
+# Number of (key, time bucket) counts a process holds on to while redis is unavailable, further counts are dropped
+MAX_PENDING_REQUEST_COUNTS = 10000
 
 # :NOTE: When making changes here, make sure you run test_no_interference_between_different_types_of_new_incoming_increments
 # locally. It's not included in CI because of tricky patching freeze time in thread issues.
@@ -28,14 +35,87 @@ def get_team_request_key(team_id: int, request_type: FlagRequestType) -> str:
         raise ValueError(f"Unknown request type: {request_type}")
 
 
+class RequestCountAggregator:
+    """
+    Accumulates request counts in memory and writes them to redis in a single transaction.
+
+    Counts are flushed by a background thread every DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL seconds, and when the process
+    exits. If a process dies, at most the counts of one interval are lost. While redis is unavailable, counts are kept
+    until MAX_PENDING_REQUEST_COUNTS distinct keys are pending and dropped after that.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._flusher_pid: Optional[int] = None
+
+    def add(self, key_name: str, time_bucket: str, count: int) -> None:
+        with self._lock:
+            self._add_locked(key_name, time_bucket, count)
+
+        if settings.DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+        if not counts:
+            return
+
+        start = time.monotonic()
+        try:
+            # :TRICKY: Counts are put back if the write fails, so it must be all or nothing to not count requests twice
+            pipeline = get_client().pipeline(transaction=True)
+            for (key_name, time_bucket), count in counts.items():
+                pipeline.hincrby(key_name, time_bucket, count)
+            pipeline.execute()
+        except Exception as error:
+            capture_exception(error)
+            with self._lock:
+                for (key_name, time_bucket), count in counts.items():
+                    self._add_locked(key_name, time_bucket, count)
+        finally:
+            statsd.timing("posthog_decide_request_counts_flush", (time.monotonic() - start) * 1000)
+
+    def _ensure_flusher(self) -> None:
+        # :TRICKY: Threads don't survive forking, so every worker process starts its own
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name="request-counts-flusher", daemon=True).start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(settings.DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL or 1)
+            try:
+                self.flush()
+            except Exception as error:
+                capture_exception(error)
+
+    def _add_locked(self, key_name: str, time_bucket: str, count: int) -> None:
+        if (key_name, time_bucket) not in self._counts and len(self._counts) >= MAX_PENDING_REQUEST_COUNTS:
+            statsd.incr("posthog_decide_request_counts_dropped", count)
+            return
+        self._counts[(key_name, time_bucket)] += count
+
+
+_request_counts = RequestCountAggregator()
+atexit.register(_request_counts.flush)
+
+
 def increment_request_count(
     team_id: int, count: int = 1, request_type: FlagRequestType = FlagRequestType.DECIDE
 ) -> None:
     try:
-        client = get_client()
+        # the bucket is decided when the request happens, not when it's written to redis
         time_bucket = str(int(time.time() / CACHE_BUCKET_SIZE))
         key_name = get_team_request_key(team_id, request_type)
-        client.hincrby(key_name, time_bucket, count)
+        _request_counts.add(key_name, time_bucket, count)
     except Exception as error:
         capture_exception(error)
 
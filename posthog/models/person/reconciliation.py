@@ -0,0 +1,297 @@
+"""
+Reconciles persons and person distinct ids between Postgres and ClickHouse.
+
+Rows of a team are split into chunks by the first hex digits of md5(key). Both databases aggregate a checksum for every
+chunk: the number of rows and the sum of a hash of each row's key and version, computed identically on both sides.
+Only chunks whose checksums differ are compared row by row, streaming rows out of Postgres with a server side cursor.
+
+Picking out a chunk can't use an index in either database, so mismatched chunks are compared in batches of up to
+BATCH_MAX_ROWS rows with one query per batch, rather than one per chunk. Batches are processed in parallel, and the
+fixes for a batch are flushed to Kafka together.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+from uuid import UUID
+
+import structlog
+from django.db import connection, connections
+from django.db.models import CharField
+from django.db.models.expressions import RawSQL
+
+from posthog.client import sync_execute
+from posthog.clickhouse.client.connection import Workload
+from posthog.kafka_client.client import ClickhouseProducer
+from posthog.models.person.person import Person, PersonDistinctId
+from posthog.models.person.util import _delete_ch_distinct_id, create_person, create_person_distinct_id
+
+logger = structlog.get_logger(__name__)
+
+# Number of leading md5 hex digits identifying a chunk, i.e. a team's rows are split into 16^2 chunks
+CHUNK_PREFIX_LENGTH = 2
+# Rows fetched per round trip when streaming a chunk out of Postgres
+FETCH_BATCH_SIZE = 2000
+# Mismatched chunks are compared together until they hold this many rows, bounding the ClickHouse rows held in memory
+BATCH_MAX_ROWS = 1_000_000
+
+# :TRICKY: The row hash is the first 4 bytes of md5("{key}:{version}") read as a big endian integer, which both
+#   databases can compute and sum without overflowing
+PG_ROW_HASH = "('x' || lpad(left(md5({key} || ':' || COALESCE(version, 0)::text), 8), 16, '0'))::bit(64)::bigint"
+CH_ROW_HASH = "reinterpretAsUInt32(reverse(unhex(substring(hex(MD5(concat({key}, ':', toString(version)))), 1, 8))))"
+CH_CHUNK = "substring(lower(hex(MD5({key}))), 1, %(prefix_length)s)"
+
+PG_PERSON_CHECKSUMS_SQL = f"""
+SELECT left(md5(uuid::text), %(prefix_length)s) AS chunk, count(*), sum({PG_ROW_HASH.format(key="uuid::text")})
+FROM posthog_person
+WHERE team_id = %(team_id)s
+GROUP BY chunk
+"""
+
+CH_PERSON_CHECKSUMS_SQL = f"""
+SELECT {CH_CHUNK.format(key="toString(id)")} AS chunk, count(), sum({CH_ROW_HASH.format(key="toString(id)")})
+FROM (
+    SELECT id, max(version) AS version
+    FROM person
+    WHERE team_id = %(team_id)s
+    GROUP BY id
+    HAVING max(is_deleted) = 0
+)
+GROUP BY chunk
+"""
+
+CH_PERSON_CHUNK_SQL = f"""
+SELECT id, max(version)
+FROM person
+WHERE team_id = %(team_id)s AND {CH_CHUNK.format(key="toString(id)")} IN %(chunks)s
+GROUP BY id
+HAVING max(is_deleted) = 0
+"""
+
+PG_DISTINCT_ID_CHECKSUMS_SQL = f"""
+SELECT left(md5(distinct_id), %(prefix_length)s) AS chunk, count(*), sum({PG_ROW_HASH.format(key="distinct_id")})
+FROM posthog_persondistinctid
+WHERE team_id = %(team_id)s
+GROUP BY chunk
+"""
+
+CH_DISTINCT_ID_CHECKSUMS_SQL = f"""
+SELECT {CH_CHUNK.format(key="distinct_id")} AS chunk, count(), sum({CH_ROW_HASH.format(key="distinct_id")})
+FROM (
+    SELECT distinct_id, max(version) AS version
+    FROM person_distinct_id2
+    WHERE team_id = %(team_id)s
+    GROUP BY distinct_id
+    HAVING max(is_deleted) = 0
+)
+GROUP BY chunk
+"""
+
+CH_DISTINCT_ID_CHUNK_SQL = f"""
+SELECT distinct_id, max(version)
+FROM person_distinct_id2
+WHERE team_id = %(team_id)s AND {CH_CHUNK.format(key="distinct_id")} IN %(chunks)s
+GROUP BY distinct_id
+HAVING max(is_deleted) = 0
+"""
+
+
+class Reconciler:
+    """
+    Brings one ClickHouse table of a team in line with Postgres.
+
+    Rows missing in ClickHouse or with a lower version there are updated. Higher versions in ClickHouse are ignored.
+    Rows in ClickHouse but not in Postgres are deleted when `deletes` is set.
+    Nothing is written unless `live_run` is set.
+    """
+
+    name: str
+    PG_CHECKSUMS_SQL: str
+    CH_CHECKSUMS_SQL: str
+    CH_CHUNK_SQL: str
+
+    def __init__(
+        self, team_id: int, live_run: bool = False, deletes: bool = False, sync: bool = False, workers: int = 1
+    ):
+        self.team_id = team_id
+        self.live_run = live_run
+        self.deletes = deletes
+        self.sync = sync  # used for unittests
+        self.workers = workers
+
+    def mismatched_chunks(self, using: str = "default") -> Tuple[int, List[str]]:
+        """
+        Returns the number of chunks compared and the chunks whose contents differ between Postgres and ClickHouse.
+        Postgres checksums are read from the `using` database.
+        """
+        total_chunks, chunk_rows = self._compare_checksums(using)
+        return total_chunks, sorted(chunk_rows)
+
+    def reconcile(self) -> Counter:
+        total_chunks, chunk_rows = self._compare_checksums()
+        logger.info(f"Found {len(chunk_rows)} of {total_chunks} {self.name} chunks out of sync", team_id=self.team_id)
+
+        results = Counter({"chunks": total_chunks, "mismatched_chunks": len(chunk_rows)})
+        batches = self._batch_chunks(chunk_rows)
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch_results in executor.map(self._reconcile_chunks_in_thread, batches):
+                    results += batch_results
+        else:
+            for batch in batches:
+                results += self._reconcile_chunks(batch)
+        return results
+
+    def _compare_checksums(self, using: str = "default") -> Tuple[int, Dict[str, int]]:
+        "Returns the number of chunks compared and the number of rows in each chunk whose contents differ"
+        params = {"team_id": self.team_id, "prefix_length": CHUNK_PREFIX_LENGTH}
+        with connections[using].cursor() as cursor:
+            cursor.execute(self.PG_CHECKSUMS_SQL, params)
+            pg_checksums = {chunk: (count, int(checksum)) for chunk, count, checksum in cursor.fetchall()}
+        ch_checksums = {
+            chunk: (count, int(checksum))
+            for chunk, count, checksum in sync_execute(self.CH_CHECKSUMS_SQL, params, workload=Workload.OFFLINE)
+        }
+
+        chunks = set(pg_checksums) | set(ch_checksums)
+        return len(chunks), {
+            chunk: max(pg_checksums.get(chunk, (0, 0))[0], ch_checksums.get(chunk, (0, 0))[0])
+            for chunk in chunks
+            if pg_checksums.get(chunk) != ch_checksums.get(chunk)
+        }
+
+    def _batch_chunks(self, chunk_rows: Dict[str, int]) -> List[List[str]]:
+        "Groups mismatched chunks into batches of up to BATCH_MAX_ROWS rows, split further to keep all workers busy"
+        max_rows = min(BATCH_MAX_ROWS, max(sum(chunk_rows.values()) // self.workers, 1))
+        batches: List[List[str]] = []
+        batch_rows = 0
+        for chunk in sorted(chunk_rows):
+            if not batches or batch_rows + chunk_rows[chunk] > max_rows:
+                batches.append([])
+                batch_rows = 0
+            batches[-1].append(chunk)
+            batch_rows += chunk_rows[chunk]
+        return batches
+
+    def _reconcile_chunks_in_thread(self, chunks: List[str]) -> Counter:
+        try:
+            return self._reconcile_chunks(chunks)
+        finally:
+            # every thread opens its own Postgres connection
+            connection.close()
+
+    def _reconcile_chunks(self, chunks: List[str]) -> Counter:
+        rows = sync_execute(
+            self.CH_CHUNK_SQL,
+            {"team_id": self.team_id, "prefix_length": CHUNK_PREFIX_LENGTH, "chunks": chunks},
+            workload=Workload.OFFLINE,
+        )
+        ch_versions: Dict[Any, int] = {key: version for key, version in rows}
+
+        results: Counter = Counter()
+        for key, pg_version, row in self._postgres_rows(chunks):
+            ch_version = ch_versions.pop(key, None)
+            if ch_version is None or ch_version < pg_version:
+                logger.info(f"Updating {key} to version {pg_version}")
+                results["updated"] += 1
+                if self.live_run:
+                    self._update(row, pg_version)
+            elif ch_version > pg_version:
+                logger.info(
+                    f"Clickhouse version ({ch_version}) for '{key}' is higher than in Postgres ({pg_version}). "
+                    "Ignoring."
+                )
+                results["ignored"] += 1
+
+        # whatever is left is only in ClickHouse
+        if self.deletes:
+            for key, ch_version in ch_versions.items():
+                logger.info(f"Deleting {self.name} {key}")
+                results["deleted"] += 1
+                if self.live_run:
+                    self._delete(key, ch_version)
+
+        if self.live_run:
+            ClickhouseProducer().flush()
+        return results
+
+    def _postgres_rows(self, chunks: List[str]) -> Iterator[Tuple[Any, int, Any]]:
+        "Streams (key, version, row) of the chunks out of Postgres"
+        raise NotImplementedError()
+
+    def _update(self, row: Any, version: int) -> None:
+        raise NotImplementedError()
+
+    def _delete(self, key: Any, ch_version: int) -> None:
+        raise NotImplementedError()
+
+
+class PersonReconciler(Reconciler):
+    name = "person"
+    PG_CHECKSUMS_SQL = PG_PERSON_CHECKSUMS_SQL
+    CH_CHECKSUMS_SQL = CH_PERSON_CHECKSUMS_SQL
+    CH_CHUNK_SQL = CH_PERSON_CHUNK_SQL
+
+    def _postgres_rows(self, chunks: List[str]) -> Iterator[Tuple[Any, int, Any]]:
+        persons = (
+            Person.objects.filter(team_id=self.team_id)
+            .annotate(chunk=RawSQL("left(md5(posthog_person.uuid::text), %s)", (CHUNK_PREFIX_LENGTH,), CharField()))
+            .filter(chunk__in=chunks)
+        )
+        for person in persons.iterator(chunk_size=FETCH_BATCH_SIZE):
+            yield person.uuid, person.version or 0, person
+
+    def _update(self, person: Person, version: int) -> None:
+        create_person(
+            team_id=self.team_id,
+            version=version,
+            uuid=str(person.uuid),
+            properties=person.properties,
+            is_identified=person.is_identified,
+            created_at=person.created_at,
+            sync=self.sync,
+        )
+
+    def _delete(self, uuid: Any, ch_version: int) -> None:
+        create_person(
+            uuid=str(uuid),
+            team_id=self.team_id,
+            properties={},
+            version=int(ch_version or 0) + 100,  # keep in sync with deletePerson in plugin-server/src/utils/db/db.ts
+            is_deleted=True,
+            sync=self.sync,
+        )
+
+
+class PersonDistinctIdReconciler(Reconciler):
+    name = "distinct id"
+    PG_CHECKSUMS_SQL = PG_DISTINCT_ID_CHECKSUMS_SQL
+    CH_CHECKSUMS_SQL = CH_DISTINCT_ID_CHECKSUMS_SQL
+    CH_CHUNK_SQL = CH_DISTINCT_ID_CHUNK_SQL
+
+    def _postgres_rows(self, chunks: List[str]) -> Iterator[Tuple[Any, int, Any]]:
+        person_distinct_ids = (
+            PersonDistinctId.objects.filter(team_id=self.team_id)
+            .annotate(
+                chunk=RawSQL(
+                    "left(md5(posthog_persondistinctid.distinct_id), %s)", (CHUNK_PREFIX_LENGTH,), CharField()
+                )
+            )
+            .filter(chunk__in=chunks)
+            .values_list("distinct_id", "version", "person__uuid")
+        )
+        for distinct_id, version, person_uuid in person_distinct_ids.iterator(chunk_size=FETCH_BATCH_SIZE):
+            yield distinct_id, version or 0, (distinct_id, person_uuid)
+
+    def _update(self, row: Tuple[str, Any], version: int) -> None:
+        distinct_id, person_uuid = row
+        create_person_distinct_id(
+            team_id=self.team_id,
+            distinct_id=distinct_id,
+            person_id=str(person_uuid),
+            version=version,
+            is_deleted=False,
+            sync=self.sync,
+        )
+
+    def _delete(self, distinct_id: Any, ch_version: int) -> None:
+        _delete_ch_distinct_id(self.team_id, UUID(int=0), distinct_id, ch_version, sync=self.sync)
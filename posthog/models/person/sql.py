@@ -425,7 +425,7 @@ FROM (
 )
 GROUP BY value
 ORDER BY count(value) DESC
-LIMIT 20
+LIMIT %(limit)s
 """
 
 SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER = """
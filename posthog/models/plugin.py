@@ -18,6 +18,7 @@ from posthog.cloud_utils import is_cloud
 from posthog.models.organization import Organization
 from posthog.models.signals import mutable_receiver
 from posthog.models.team import Team
+from posthog.models.team.team_caching import delete_decide_config_in_cache
 from posthog.plugins.access import can_configure_plugins, can_install_plugins
 from posthog.plugins.reload import reload_plugins_on_workers
 from posthog.plugins.site import get_decide_site_apps
@@ -453,11 +454,16 @@ def plugin_reload_needed(sender, instance, created=None, **kwargs):
     # Newly created plugins don't have a config yet, so no need to reload
     if not created:
         reload_plugins_on_workers()
+        # Site app urls change with the plugin
+        delete_decide_config_in_cache(
+            PluginConfig.objects.filter(plugin_id=instance.pk).values_list("team_id", flat=True)
+        )
 
 
 @mutable_receiver([post_save, post_delete], sender=PluginConfig)
 def plugin_config_reload_needed(sender, instance, created=None, **kwargs):
     reload_plugins_on_workers()
+    delete_decide_config_in_cache([instance.team_id])
     try:
         team = instance.team
     except Team.DoesNotExist:
@@ -466,6 +472,14 @@ def plugin_config_reload_needed(sender, instance, created=None, **kwargs):
         sync_team_inject_web_apps(instance.team)
 
 
+@mutable_receiver([post_save, post_delete], sender=PluginSourceFile)
+def plugin_source_file_changed(sender, instance, created=None, **kwargs):
+    # Transpiling a site.ts file can add a site app, or change the url of an existing one
+    delete_decide_config_in_cache(
+        PluginConfig.objects.filter(plugin_id=instance.plugin_id).values_list("team_id", flat=True)
+    )
+
+
 def sync_team_inject_web_apps(team: Team):
     inject_web_apps = len(get_decide_site_apps(team)) > 0
     if inject_web_apps != team.inject_web_apps:
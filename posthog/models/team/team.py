@@ -23,7 +23,7 @@ from posthog.models.utils import UUIDClassicModel, generate_random_token_project
 from posthog.settings.utils import get_list
 from posthog.utils import GenericEmails, PersonOnEventsMode
 
-from .team_caching import get_team_in_cache, set_team_in_cache
+from .team_caching import delete_decide_config_in_cache, get_team_in_cache, set_team_in_cache
 
 TIMEZONES = [(tz, tz) for tz in pytz.common_timezones]
 
@@ -310,11 +310,13 @@ class Team(UUIDClassicModel):
 @mutable_receiver(post_save, sender=Team)
 def put_team_in_cache_on_save(sender, instance: Team, **kwargs):
     set_team_in_cache(instance.api_token, instance)
+    delete_decide_config_in_cache([instance.pk])
 
 
 @mutable_receiver(post_delete, sender=Team)
 def delete_team_in_cache_on_delete(sender, instance: Team, **kwargs):
     set_team_in_cache(instance.api_token, None)
+    delete_decide_config_in_cache([instance.pk])
 
 
 def groups_on_events_querying_enabled():
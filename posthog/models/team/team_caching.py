@@ -1,5 +1,5 @@
 import json
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional
 
 from django.core.cache import cache
 from sentry_sdk import capture_exception
@@ -8,6 +8,9 @@ if TYPE_CHECKING:
     from posthog.models.team import Team
 
 FIVE_DAYS = 60 * 60 * 24 * 5  # 5 days in seconds
+# :TRICKY: plugin-server writes transpiled site apps straight to the database without invalidating the decide config,
+#   so keep it short lived rather than relying on invalidation alone
+DECIDE_CONFIG_CACHE_TTL = 60
 
 
 def set_team_in_cache(token: str, team: Optional["Team"] = None) -> None:
@@ -44,3 +47,49 @@ def get_team_in_cache(token: str) -> Optional["Team"]:
             return None
 
     return None
+
+
+def set_decide_config_in_cache(team_id: int, config: Dict[str, Any]) -> None:
+    try:
+        cache.set(f"team_decide_config:{team_id}", json.dumps(config), DECIDE_CONFIG_CACHE_TTL)
+    except Exception:
+        # redis is unavailable
+        return
+
+
+def get_decide_config_in_cache(team_id: int) -> Optional[Dict[str, Any]]:
+    try:
+        config = cache.get(f"team_decide_config:{team_id}")
+    except Exception:
+        # redis is unavailable
+        return None
+
+    if config:
+        try:
+            return json.loads(config)
+        except Exception as e:
+            capture_exception(e)
+            return None
+
+    return None
+
+
+def delete_decide_config_in_cache(team_ids: Iterable[int]) -> None:
+    team_ids = list(team_ids)
+    try:
+        cache.delete_many([f"team_decide_config:{team_id}" for team_id in team_ids])
+        # the read replica may lag behind the change, so mark the config to be rebuilt from the primary for a while
+        cache.set_many(
+            {f"team_decide_config_invalidated:{team_id}": True for team_id in team_ids}, DECIDE_CONFIG_CACHE_TTL
+        )
+    except Exception as e:
+        # Stale site app urls would be served until the cache expires, so make sure this is noticed
+        capture_exception(e)
+
+
+def decide_config_recently_invalidated(team_id: int) -> bool:
+    try:
+        return bool(cache.get(f"team_decide_config_invalidated:{team_id}"))
+    except Exception:
+        # redis is unavailable
+        return False
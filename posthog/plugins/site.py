@@ -1,4 +1,5 @@
 from dataclasses import asdict, dataclass
+from datetime import datetime
 from hashlib import md5
 from typing import TYPE_CHECKING, List, Optional
 
@@ -13,6 +14,7 @@ class WebJsSource:
     token: str
     config_schema: List[dict]
     config: dict
+    hash: str
 
 
 @dataclass
@@ -32,14 +34,30 @@ def get_transpiled_site_source(id: int, token: str) -> Optional[WebJsSource]:
             plugin__pluginsourcefile__filename="site.ts",
             plugin__pluginsourcefile__status=PluginSourceFile.Status.TRANSPILED,
         )
-        .values_list("id", "plugin__pluginsourcefile__transpiled", "web_token", "plugin__config_schema", "config")
+        .values_list(
+            "id",
+            "plugin__pluginsourcefile__transpiled",
+            "web_token",
+            "plugin__config_schema",
+            "config",
+            "plugin__pluginsourcefile__updated_at",
+            "plugin__updated_at",
+            "updated_at",
+        )
         .first()
     )
 
     if not response:
         return None
 
-    return WebJsSource(*(list(response)))  # type: ignore
+    return WebJsSource(*response[:5], hash=get_site_app_hash(*response[5:]))  # type: ignore
+
+
+def get_site_app_hash(
+    source_file_updated_at: Optional[datetime], plugin_updated_at: Optional[datetime], config_updated_at: datetime
+) -> str:
+    "Changes whenever the site app's source or config does, so that its url can be cached forever"
+    return md5(f"{source_file_updated_at}-{plugin_updated_at}-{config_updated_at}".encode("utf-8")).hexdigest()
 
 
 def get_decide_site_apps(team: "Team", using_database: str = "default") -> List[dict]:
@@ -58,8 +76,7 @@ def get_decide_site_apps(team: "Team", using_database: str = "default") -> List[
     )
 
     def site_app_url(source: tuple) -> str:
-        hash = md5(f"{source[2]}-{source[3]}-{source[4]}".encode("utf-8")).hexdigest()
-        return f"/site_app/{source[0]}/{source[1]}/{hash}/"
+        return f"/site_app/{source[0]}/{source[1]}/{get_site_app_hash(*source[2:])}/"
 
     return [asdict(WebJsUrl(source[0], site_app_url(source))) for source in sources]
 
@@ -1,5 +1,9 @@
+import json
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
+from hashlib import md5
 from typing import (
     Any,
     Dict,
@@ -13,8 +17,11 @@ from typing import (
     cast,
 )
 
-from django.db.models import OuterRef, Subquery
-from django.db.models.query import Prefetch, QuerySet
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery, TextField
+from django.db.models.query import QuerySet
 
 from posthog.constants import INSIGHT_FUNNELS, INSIGHT_PATHS, INSIGHT_TRENDS
 from posthog.models import Entity, Filter, PersonDistinctId, SessionRecording, Team
@@ -62,13 +69,22 @@ class SerializedGroup(CommonActor):
 SerializedActor = Union[SerializedGroup, SerializedPerson]
 
 
+class ArraySubquery(Subquery):
+    "Collects the single column of a subquery into an array, like ArraySubquery in newer Django versions"
+    template = "ARRAY(%(subquery)s)"
+
+
 class ActorBaseQuery:
     # Whether actor values are included as the second column of the actors query
     ACTOR_VALUES_INCLUDED = False
     # What query type to report
     QUERY_TYPE = "actors"
+    # Number of actor rows cached on the first page, so that following pages are sliced from the cache
+    CACHED_ACTORS_LIMIT = 5000
 
     entity: Optional[Entity] = None
+    # Seconds spent in each stage of the last `get_actors` call
+    timings: Dict[str, float]
 
     def __init__(
         self,
@@ -98,21 +114,64 @@ class ActorBaseQuery:
         self,
     ) -> Tuple[Union[QuerySet[Person], QuerySet[Group]], Union[List[SerializedGroup], List[SerializedPerson]], int]:
         """Get actors in data model and dict formats. Builds query and executes"""
-        query, params = self.actor_query()
-        raw_result = insight_sync_execute(
-            query,
-            {**params, **self._filter.hogql_context.values},
-            query_type=self.QUERY_TYPE,
-            filter=self._filter,
-            team_id=self._team.pk,
-        )
-        actors, serialized_actors = self.get_actors_from_result(raw_result)
+        self.timings = {}
+        with self._timed("actors_query"):
+            query, params = self.actor_query()
+            raw_result = self._execute_actor_query(query, {**params, **self._filter.hogql_context.values})
+
+        with self._timed("hydration"):
+            actors, serialized_actors = self.get_actors_from_result(raw_result)
 
         if hasattr(self._filter, "include_recordings") and self._filter.include_recordings and self._filter.insight in [INSIGHT_PATHS, INSIGHT_TRENDS, INSIGHT_FUNNELS]:  # type: ignore
-            serialized_actors = self.add_matched_recordings_to_serialized_actors(serialized_actors, raw_result)
+            with self._timed("recordings"):
+                serialized_actors = self.add_matched_recordings_to_serialized_actors(serialized_actors, raw_result)
 
         return actors, serialized_actors, len(raw_result)
 
+    def _execute_actor_query(self, query: str, params: Dict[str, Any]) -> List:
+        """
+        Runs the actors query, serving pages from a short lived cache of the ordered actor rows.
+
+        Opening the persons modal and paging through it only differ in the limit and offset, so the first request
+        fetches the first `CACHED_ACTORS_LIMIT` rows and later pages are slices of those.
+        """
+        paginated = "%(limit)s" in query and "%(offset)s" in query and params.get("limit")
+        if (
+            not settings.ACTORS_QUERY_CACHE_TTL
+            or not paginated
+            or params["offset"] + params["limit"] > self.CACHED_ACTORS_LIMIT
+        ):
+            return insight_sync_execute(
+                query, params, query_type=self.QUERY_TYPE, filter=self._filter, team_id=self._team.pk
+            )
+
+        cache_key = self._actor_rows_cache_key(query, params)
+        rows = cache.get(cache_key)
+        if rows is None:
+            rows = insight_sync_execute(
+                query,
+                {**params, "limit": self.CACHED_ACTORS_LIMIT, "offset": 0},
+                query_type=self.QUERY_TYPE,
+                filter=self._filter,
+                team_id=self._team.pk,
+            )
+            cache.set(cache_key, rows, settings.ACTORS_QUERY_CACHE_TTL)
+
+        return rows[params["offset"] : params["offset"] + params["limit"]]
+
+    def _actor_rows_cache_key(self, query: str, params: Dict[str, Any]) -> str:
+        params_without_page = {key: value for key, value in params.items() if key not in ("limit", "offset")}
+        key_data = json.dumps([type(self).__name__, query, params_without_page], sort_keys=True, default=str)
+        return f"actors_query:{self._team.pk}:{md5(key_data.encode('utf-8')).hexdigest()}"
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+
     def query_for_session_ids_with_recordings(self, session_ids: Set[str]) -> Set[str]:
         """Filters a list of session_ids to those that actually have recordings"""
         query = """
@@ -145,6 +204,9 @@ class ActorBaseQuery:
                     if event[2]:
                         all_session_ids.add(event[2])
 
+        if not all_session_ids:
+            return serialized_actors
+
         session_ids_with_all_recordings = self.query_for_session_ids_with_recordings(all_session_ids)
 
         # Prune out deleted recordings
@@ -220,20 +282,16 @@ def get_people(
     team: Team, people_ids: List[Any], value_per_actor_id: Optional[Dict[str, float]] = None, distinct_id_limit=1000
 ) -> Tuple[QuerySet[Person], List[SerializedPerson]]:
     """Get people from raw SQL results in data model and dict formats"""
-    distinct_id_subquery = Subquery(
-        PersonDistinctId.objects.filter(person_id=OuterRef("person_id")).values_list("id", flat=True)[
-            :distinct_id_limit
-        ]
+    # Distinct ids are collected into an array in the same query, rather than prefetched in a second round trip
+    distinct_ids_subquery = ArraySubquery(
+        PersonDistinctId.objects.filter(person_id=OuterRef("id"))
+        .order_by("id")
+        .values_list("distinct_id", flat=True)[:distinct_id_limit],
+        output_field=ArrayField(TextField()),
     )
     persons: QuerySet[Person] = (
         Person.objects.filter(team_id=team.pk, uuid__in=people_ids)
-        .prefetch_related(
-            Prefetch(
-                "persondistinctid_set",
-                to_attr="distinct_ids_cache",
-                queryset=PersonDistinctId.objects.filter(id__in=distinct_id_subquery),
-            )
-        )
+        .annotate(distinct_ids_list=distinct_ids_subquery)
         .order_by("-created_at", "uuid")
         .only("id", "is_identified", "created_at", "properties", "uuid")
     )
@@ -254,7 +312,7 @@ def serialize_people(
             properties=person.properties,
             is_identified=person.is_identified,
             name=get_person_name(team, person),
-            distinct_ids=person.distinct_ids,
+            distinct_ids=person.distinct_ids_list if hasattr(person, "distinct_ids_list") else person.distinct_ids,
             matched_recordings=[],
             value_at_data_point=value_per_actor_id[str(person.uuid)] if value_per_actor_id else None,
         )
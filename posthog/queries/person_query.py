@@ -1,6 +1,12 @@
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple, Union
 from uuid import UUID
 
+import pytz
+
 from posthog.clickhouse.materialized_columns import ColumnName
 from posthog.constants import PropertyOperatorType
 from posthog.models import Filter
@@ -23,6 +29,41 @@ from posthog.queries.trends.util import COUNT_PER_ACTOR_MATH_FUNCTIONS
 from posthog.queries.util import PersonPropertiesMode
 
 
+@dataclass(frozen=True)
+class PersonCursor:
+    """
+    Position in the persons list, which is ordered by creation time (newest first) and then by id.
+
+    Paging with a cursor instead of an offset means ClickHouse only has to keep the next page's worth of rows around
+    while sorting, rather than every row before it.
+    """
+
+    created_at: datetime
+    id: UUID
+    # Whether the page wanted is the one after or before this position
+    direction: Literal["next", "previous"] = "next"
+
+    def encode(self) -> str:
+        payload = [_as_utc(self.created_at).isoformat(), str(self.id), self.direction]
+        return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("utf-8")
+
+    @classmethod
+    def decode(cls, value: str) -> "PersonCursor":
+        "Raises ValueError if the cursor is malformed"
+        try:
+            created_at, id, direction = json.loads(base64.urlsafe_b64decode(value.encode("utf-8")))
+            if direction not in ("next", "previous"):
+                raise ValueError(f"Unknown cursor direction {direction}")
+            return cls(created_at=datetime.fromisoformat(created_at), id=UUID(id), direction=direction)
+        except (TypeError, json.JSONDecodeError, UnicodeDecodeError) as err:
+            raise ValueError("Malformed cursor") from err
+
+
+def _as_utc(value: datetime) -> datetime:
+    # ClickHouse returns `created_at` without a timezone, but it is stored in UTC
+    return value.replace(tzinfo=pytz.UTC) if value.tzinfo is None else value.astimezone(pytz.UTC)
+
+
 class PersonQuery:
     """
     Query class responsible for joining with `person` clickhouse table
@@ -76,13 +117,28 @@ class PersonQuery:
         ).inner
 
     def get_query(
-        self, prepend: Optional[Union[str, int]] = None, paginate: bool = False, filter_future_persons: bool = False
+        self,
+        prepend: Optional[Union[str, int]] = None,
+        paginate: bool = False,
+        filter_future_persons: bool = False,
+        *,
+        keyset: bool = False,
+        cursor: Optional[PersonCursor] = None,
+        sample_modulo: Optional[int] = None,
     ) -> Tuple[str, Dict]:
+        """
+        With `keyset`, pages are selected relative to `cursor` rather than by offset and each row ends with the
+        person's `created_at`, from which the cursor for the following page can be built.
+
+        With `sample_modulo`, only roughly 1 in `sample_modulo` persons are considered, for estimating counts.
+        """
         prepend = str(prepend) if prepend is not None else ""
 
         fields = "id" + " ".join(
             f", argMax({column_name}, version) as {alias}" for column_name, alias in self._get_fields()
         )
+        if keyset:
+            fields += ", argMax(created_at, version) as cursor_created_at"
 
         (
             person_filters_prefiltering_condition,
@@ -91,12 +147,18 @@ class PersonQuery:
         ) = self._get_person_filter_clauses(prepend=prepend)
         multiple_cohorts_condition, multiple_cohorts_params = self._get_multiple_cohorts_clause(prepend=prepend)
         single_cohort_join, single_cohort_params = self._get_fast_single_cohort_clause()
-        if paginate:
-            order = "ORDER BY argMax(created_at, version) DESC, id" if paginate else ""
-            limit_offset, limit_params = self._get_limit_offset_clause()
+        cursor_condition, cursor_params = self._get_cursor_clause(cursor) if keyset else ("", {})
+        if paginate and keyset and cursor is not None and cursor.direction == "previous":
+            # :TRICKY: The page before the cursor is selected in reverse order, callers need to flip it back
+            order = "ORDER BY argMax(created_at, version) ASC, id DESC"
+            limit_offset, limit_params = self._get_limit_offset_clause(include_offset=False)
+        elif paginate:
+            order = "ORDER BY argMax(created_at, version) DESC, id"
+            limit_offset, limit_params = self._get_limit_offset_clause(include_offset=not keyset)
         else:
             order = ""
             limit_offset, limit_params = "", {}
+        sample_condition = " AND cityHash64(id) %% %(sample_modulo)s = 0" if sample_modulo else ""
         search_prefiltering_condition, search_finalization_condition, search_params = self._get_search_clauses(
             prepend=prepend
         )
@@ -130,14 +192,14 @@ class PersonQuery:
             SELECT {fields}
             FROM person
             {top_level_single_cohort_join}
-            WHERE team_id = %(team_id)s
+            WHERE team_id = %(team_id)s{sample_condition}
             {prefiltering_lookup}
             {multiple_cohorts_condition}
             GROUP BY id
             HAVING max(is_deleted) = 0
             {filter_future_persons_condition} {updated_after_condition}
             {person_filters_finalization_condition} {search_finalization_condition}
-            {distinct_id_condition} {email_condition}
+            {distinct_id_condition} {email_condition}{cursor_condition}
             {order}
             {limit_offset}
             """,
@@ -150,6 +212,8 @@ class PersonQuery:
                 **distinct_id_params,
                 **email_params,
                 **multiple_cohorts_params,
+                **cursor_params,
+                **({"sample_modulo": sample_modulo} if sample_modulo else {}),
                 "team_id": self._team_id,
             },
         )
@@ -250,7 +314,7 @@ class PersonQuery:
         else:
             return "", {}
 
-    def _get_limit_offset_clause(self) -> Tuple[str, Dict]:
+    def _get_limit_offset_clause(self, include_offset: bool = True) -> Tuple[str, Dict]:
 
         if not isinstance(self._filter, Filter):
             return "", {}
@@ -266,12 +330,30 @@ class PersonQuery:
             clause += " LIMIT %(limit)s"
             params.update({"limit": self._filter.limit})
 
-        if self._filter.offset:
+        if self._filter.offset and include_offset:
             clause += " OFFSET %(offset)s"
             params.update({"offset": self._filter.offset})
 
         return clause, params
 
+    def _get_cursor_clause(self, cursor: Optional[PersonCursor]) -> Tuple[str, Dict]:
+        if cursor is None:
+            return "", {}
+
+        comparison, id_comparison = ("<", ">") if cursor.direction == "next" else (">", "<")
+        created_at = "toDateTime64(%(cursor_created_at)s, 3, 'UTC')"
+        return (
+            f"""
+            AND (
+                argMax(created_at, version) {comparison} {created_at}
+                OR (argMax(created_at, version) = {created_at} AND id {id_comparison} %(cursor_id)s)
+            )""",
+            {
+                "cursor_created_at": _as_utc(cursor.created_at).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                "cursor_id": str(cursor.id),
+            },
+        )
+
     def _get_search_clauses(self, prepend: str = "") -> Tuple[str, str, Dict]:
         """
         Return - respectively - the prefiltering search clause (not aggregated by is_deleted or version, which is great
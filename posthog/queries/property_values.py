@@ -1,18 +1,80 @@
-from typing import List, Optional
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional, Tuple
 
+import structlog
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from sentry_sdk import capture_exception
 
-from posthog.models.event.sql import SELECT_PROP_VALUES_SQL_WITH_FILTER
+from posthog.clickhouse.client.connection import Workload
+from posthog.client import sync_execute
+from posthog.models.event.sql import SELECT_PROP_VALUES_SQL_WITH_FILTER, TOP_PROP_VALUES_SQL
 from posthog.models.person.sql import SELECT_PERSON_PROP_VALUES_SQL, SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER
 from posthog.models.property.util import get_property_string_expr
 from posthog.models.team import Team
 from posthog.queries.insight import insight_sync_execute
+from posthog.redis import get_client
 from posthog.utils import relative_date_parse
 
+logger = structlog.get_logger(__name__)
+
+PropertyValuesTable = Literal["events", "person"]
+
+# Number of suggestions returned for event and person properties
+EVENT_PROPERTY_VALUES_LIMIT = 10
+PERSON_PROPERTY_VALUES_LIMIT = 20
+# Number of most common values stored per property. Searches for rarer values fall back to querying ClickHouse.
+TOP_PROPERTY_VALUES_COUNT = 500
+# Stored values older than this are refreshed by the `refresh_top_property_values` task
+TOP_PROPERTY_VALUES_REFRESH_INTERVAL = timedelta(hours=1)
+# Stored values older than this are not served, the live query answers until they are refreshed
+TOP_PROPERTY_VALUES_MAX_AGE = timedelta(hours=2)
+# Properties whose values haven't been looked up for this long are no longer refreshed
+TOP_PROPERTY_VALUES_ACCESS_TTL = timedelta(days=3)
+# Number of properties refreshed per task run, stalest first
+TOP_PROPERTY_VALUES_REFRESH_BATCH_SIZE = 200
+# A property's access time is recorded at most this often
+TOP_PROPERTY_VALUES_ACCESS_THROTTLE = timedelta(minutes=10)
+
+# Sorted sets of recently accessed properties, scored by when they were last accessed and last refreshed
+ACCESSED_PROPERTY_KEYS_REDIS_KEY = "PROPERTY_VALUES_RECENTLY_ACCESSED_KEYS"
+REFRESHED_PROPERTY_KEYS_REDIS_KEY = "PROPERTY_VALUES_REFRESHED_KEYS"
+
+
+@dataclass
+class TopPropertyValues:
+    # (value, count) pairs, most common first
+    values: List[Tuple[str, int]]
+    # Whether `values` holds every distinct value, in which case searches never need the live query
+    complete: bool
+    refreshed_at: datetime
+
+    def search(self, value: Optional[str], limit: int) -> Optional[List[Tuple[str, int]]]:
+        "Matches `value` like the live queries' ILIKE, or returns None if rarer values might be missing"
+        if value:
+            needle = value.lower()
+            matches = [(candidate, count) for candidate, count in self.values if needle in candidate.lower()]
+        else:
+            matches = self.values
+
+        if len(matches) < limit and not self.complete:
+            return None
+        return matches[:limit]
+
 
 def get_property_values_for_key(
     key: str, team: Team, event_names: Optional[List[str]] = None, value: Optional[str] = None
 ):
+    # :TRICKY: Values are only stored across all events, suggestions for specific events are always queried
+    if settings.USE_PRECALCULATED_PROPERTY_VALUES and not event_names:
+        top_values = get_top_property_values(team.pk, "events", key)
+        matches = top_values.search(value, EVENT_PROPERTY_VALUES_LIMIT) if top_values else None
+        if matches is not None:
+            return [(match,) for match, _ in matches]
+
     property_field, mat_column_exists = get_property_string_expr("events", key, "%(key)s", "properties")
     parsed_date_from = "AND timestamp >= '{}'".format(relative_date_parse("-7d").strftime("%Y-%m-%d 00:00:00"))
     parsed_date_to = "AND timestamp <= '{}'".format(timezone.now().strftime("%Y-%m-%d 23:59:59"))
@@ -56,6 +118,12 @@ def get_property_values_for_key(
 
 
 def get_person_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
+    if settings.USE_PRECALCULATED_PROPERTY_VALUES:
+        top_values = get_top_property_values(team.pk, "person", key)
+        matches = top_values.search(value, PERSON_PROPERTY_VALUES_LIMIT) if top_values else None
+        if matches is not None:
+            return matches
+
     property_field, _ = get_property_string_expr("person", key, "%(key)s", "properties")
 
     if value:
@@ -67,7 +135,139 @@ def get_person_property_values_for_key(key: str, team: Team, value: Optional[str
         )
     return insight_sync_execute(
         SELECT_PERSON_PROP_VALUES_SQL.format(property_field=property_field),
-        {"team_id": team.pk, "key": key},
+        {"team_id": team.pk, "key": key, "limit": PERSON_PROPERTY_VALUES_LIMIT},
         query_type="get_person_property_values",
         team_id=team.pk,
     )
+
+
+def get_top_property_values(team_id: int, table: PropertyValuesTable, key: str) -> Optional[TopPropertyValues]:
+    """
+    Returns the stored most common values of the property, or None if they haven't been computed yet or are too old.
+
+    Either way the property is marked as recently accessed, so that its values are kept fresh in the background.
+    Values which are missing or too old are computed right away, so that the next keystroke can use them.
+    """
+    cache_key = _top_property_values_cache_key(team_id, table, key)
+    try:
+        if cache.add(f"{cache_key}:accessed", True, TOP_PROPERTY_VALUES_ACCESS_THROTTLE.total_seconds()):
+            member = json.dumps([team_id, table, key])
+            pipeline = get_client().pipeline(transaction=False)
+            pipeline.zadd(ACCESSED_PROPERTY_KEYS_REDIS_KEY, {member: timezone.now().timestamp()})
+            # properties which were never refreshed are the stalest of all
+            pipeline.zadd(REFRESHED_PROPERTY_KEYS_REDIS_KEY, {member: 0}, nx=True)
+            pipeline.execute()
+
+        top_values = _load_top_property_values(team_id, table, key)
+        if top_values is not None and timezone.now() - top_values.refreshed_at > TOP_PROPERTY_VALUES_MAX_AGE:
+            top_values = None
+        if top_values is None and cache.add(f"{cache_key}:lock", True, 60):
+            from posthog.celery import refresh_top_property_values_for_key
+
+            refresh_top_property_values_for_key.delay(team_id, table, key)
+        return top_values
+    except Exception as e:
+        # redis is unavailable
+        capture_exception(e)
+        return None
+
+
+def compute_top_property_values(team_id: int, table: PropertyValuesTable, key: str) -> TopPropertyValues:
+    property_field, mat_column_exists = get_property_string_expr(table, key, "%(key)s", "properties")
+    # :TRICKY: Asking for one more value than is kept tells whether any values are left out
+    params = {"team_id": team_id, "key": key, "limit": TOP_PROPERTY_VALUES_COUNT + 1}
+
+    if table == "events":
+        query = TOP_PROP_VALUES_SQL.format(
+            property_field=property_field,
+            property_exists_filter=(
+                "AND notEmpty({})".format(property_field) if mat_column_exists else "AND JSONHas(properties, %(key)s)"
+            ),
+            parsed_date_from="AND timestamp >= '{}'".format(
+                relative_date_parse("-7d").strftime("%Y-%m-%d 00:00:00")
+            ),
+            parsed_date_to="AND timestamp <= '{}'".format(timezone.now().strftime("%Y-%m-%d 23:59:59")),
+        )
+    else:
+        query = SELECT_PERSON_PROP_VALUES_SQL.format(property_field=property_field)
+
+    rows = sync_execute(query, params, workload=Workload.OFFLINE, team_id=team_id)
+    return TopPropertyValues(
+        values=[(value, count) for value, count in rows[:TOP_PROPERTY_VALUES_COUNT]],
+        complete=len(rows) <= TOP_PROPERTY_VALUES_COUNT,
+        refreshed_at=timezone.now(),
+    )
+
+
+def refresh_top_property_values(team_id: int, table: PropertyValuesTable, key: str) -> None:
+    top_values = compute_top_property_values(team_id, table, key)
+    # only properties which are still being accessed are tracked
+    get_client().zadd(
+        REFRESHED_PROPERTY_KEYS_REDIS_KEY,
+        {json.dumps([team_id, table, key]): top_values.refreshed_at.timestamp()},
+        xx=True,
+    )
+    cache.set(
+        _top_property_values_cache_key(team_id, table, key),
+        json.dumps(
+            {
+                "values": top_values.values,
+                "complete": top_values.complete,
+                "refreshed_at": top_values.refreshed_at.isoformat(),
+            }
+        ),
+        TOP_PROPERTY_VALUES_ACCESS_TTL.total_seconds(),
+    )
+
+
+def refresh_stale_top_property_values() -> int:
+    """
+    Refreshes the stored values of recently accessed properties which are missing or older than the refresh interval.
+
+    Only properties someone looked up recently are kept up to date, so the work done is proportional to what is
+    actually used in the filter UI. Returns the number of properties refreshed.
+    """
+    redis = get_client()
+    now = timezone.now()
+
+    expired = redis.zrangebyscore(
+        ACCESSED_PROPERTY_KEYS_REDIS_KEY, "-inf", (now - TOP_PROPERTY_VALUES_ACCESS_TTL).timestamp()
+    )
+    if expired:
+        redis.zrem(ACCESSED_PROPERTY_KEYS_REDIS_KEY, *expired)
+        redis.zrem(REFRESHED_PROPERTY_KEYS_REDIS_KEY, *expired)
+
+    stale = redis.zrangebyscore(
+        REFRESHED_PROPERTY_KEYS_REDIS_KEY,
+        "-inf",
+        (now - TOP_PROPERTY_VALUES_REFRESH_INTERVAL).timestamp(),
+        start=0,
+        num=TOP_PROPERTY_VALUES_REFRESH_BATCH_SIZE,
+    )
+    refreshed = 0
+    for member in stale:
+        team_id, table, key = json.loads(member)
+        try:
+            refresh_top_property_values(team_id, table, key)
+            refreshed += 1
+        except Exception as e:
+            capture_exception(e)
+            logger.warn("refresh_top_property_values_failed", team_id=team_id, table=table, key=key, error=e)
+
+    return refreshed
+
+
+def _load_top_property_values(team_id: int, table: PropertyValuesTable, key: str) -> Optional[TopPropertyValues]:
+    stored = cache.get(_top_property_values_cache_key(team_id, table, key))
+    if stored is None:
+        return None
+    data = json.loads(stored)
+    return TopPropertyValues(
+        values=[(value, count) for value, count in data["values"]],
+        complete=data["complete"],
+        refreshed_at=datetime.fromisoformat(data["refreshed_at"]),
+    )
+
+
+def _top_property_values_cache_key(team_id: int, table: PropertyValuesTable, key: str) -> str:
+    return f"top_property_values:{team_id}:{table}:{key}"
@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from posthog.queries.property_values import (
+    TopPropertyValues,
+    get_person_property_values_for_key,
+    get_property_values_for_key,
+    get_top_property_values,
+    refresh_stale_top_property_values,
+    refresh_top_property_values,
+)
+from posthog.redis import get_client
+from posthog.test.base import APIBaseTest, ClickhouseTestMixin, _create_event, _create_person
+
+
+@override_settings(USE_PRECALCULATED_PROPERTY_VALUES=True)
+@patch("posthog.celery.refresh_top_property_values_for_key.delay")
+class TestPropertyValues(ClickhouseTestMixin, APIBaseTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_client().delete("PROPERTY_VALUES_RECENTLY_ACCESSED_KEYS", "PROPERTY_VALUES_REFRESHED_KEYS")
+
+    def _create_events(self, values):
+        for value in values:
+            _create_event(distinct_id="bla", event="random event", team=self.team, properties={"random_prop": value})
+
+    def test_search_top_values(self, _):
+        top_values = TopPropertyValues(
+            values=[("Chrome", 5), ("Firefox", 3), ("chromium", 1)], complete=False, refreshed_at=timezone.now()
+        )
+
+        self.assertEqual(top_values.search("chrom", 2), [("Chrome", 5), ("chromium", 1)])
+        self.assertEqual(top_values.search(None, 2), [("Chrome", 5), ("Firefox", 3)])
+        # rarer values might match too, so the live query has to answer
+        self.assertIsNone(top_values.search("chrom", 10))
+        self.assertIsNone(top_values.search("safari", 10))
+
+        top_values.complete = True
+        self.assertEqual(top_values.search("safari", 10), [])
+
+    def test_event_property_values_from_store(self, mock_refresh):
+        self._create_events(["asdf", "asdf", "qwerty"])
+
+        # nothing stored yet, so the live query answers and the values get computed in the background
+        self.assertCountEqual(get_property_values_for_key("random_prop", self.team), [("asdf",), ("qwerty",)])
+        mock_refresh.assert_called_once_with(self.team.pk, "events", "random_prop")
+
+        refresh_top_property_values(self.team.pk, "events", "random_prop")
+        self._create_events(["zxcv"])
+
+        self.assertEqual(get_property_values_for_key("random_prop", self.team), [("asdf",), ("qwerty",)])
+        self.assertEqual(get_property_values_for_key("random_prop", self.team, value="QW"), [("qwerty",)])
+        # values for specific events are always queried
+        self.assertCountEqual(
+            get_property_values_for_key("random_prop", self.team, event_names=["random event"]),
+            [("asdf",), ("qwerty",), ("zxcv",)],
+        )
+
+    def test_incomplete_store_falls_back_to_live_query(self, _):
+        self._create_events(["asdf", "asdf", "qwerty"])
+
+        with patch("posthog.queries.property_values.TOP_PROPERTY_VALUES_COUNT", 1):
+            refresh_top_property_values(self.team.pk, "events", "random_prop")
+
+        top_values = get_top_property_values(self.team.pk, "events", "random_prop")
+        assert top_values is not None
+        self.assertEqual(top_values.values, [("asdf", 2)])
+        self.assertFalse(top_values.complete)
+
+        self.assertEqual(get_property_values_for_key("random_prop", self.team, value="qw"), [("qwerty",)])
+
+    def test_person_property_values_from_store(self, _):
+        _create_person(distinct_ids=["a"], team=self.team, properties={"email": "a@posthog.com"})
+        _create_person(distinct_ids=["b"], team=self.team, properties={"email": "b@example.com"})
+
+        refresh_top_property_values(self.team.pk, "person", "email")
+        _create_person(distinct_ids=["c"], team=self.team, properties={"email": "c@posthog.com"})
+
+        self.assertEqual(
+            get_person_property_values_for_key("email", self.team, value="posthog"), [("a@posthog.com", 1)]
+        )
+
+    def test_refresh_stale_top_property_values(self, _):
+        self._create_events(["asdf"])
+
+        with freeze_time("2023-01-01T10:00:00Z"):
+            get_top_property_values(self.team.pk, "events", "random_prop")
+            get_top_property_values(self.team.pk, "person", "email")
+
+            self.assertEqual(refresh_stale_top_property_values(), 2)
+            self.assertEqual(refresh_stale_top_property_values(), 0)
+
+        with freeze_time("2023-01-01T11:30:00Z"):
+            self.assertEqual(refresh_stale_top_property_values(), 2)
+
+        # properties nobody looked up for a while are no longer refreshed
+        with freeze_time("2023-01-05T12:00:00Z"):
+            self.assertEqual(refresh_stale_top_property_values(), 0)
+
+    def test_refresh_stale_top_property_values_in_batches(self, _):
+        with freeze_time("2023-01-01T10:00:00Z"), patch(
+            "posthog.queries.property_values.TOP_PROPERTY_VALUES_REFRESH_BATCH_SIZE", 2
+        ):
+            for index in range(3):
+                get_top_property_values(self.team.pk, "events", f"prop_{index}")
+
+            self.assertEqual(refresh_stale_top_property_values(), 2)
+            self.assertEqual(refresh_stale_top_property_values(), 1)
+            self.assertEqual(refresh_stale_top_property_values(), 0)
+
+    def test_old_top_values_are_not_served(self, mock_refresh):
+        self._create_events(["asdf"])
+
+        with freeze_time("2023-01-01T10:00:00Z"):
+            refresh_top_property_values(self.team.pk, "events", "random_prop")
+            self.assertIsNotNone(get_top_property_values(self.team.pk, "events", "random_prop"))
+            mock_refresh.assert_not_called()
+
+        with freeze_time("2023-01-01T12:30:00Z"):
+            self.assertIsNone(get_top_property_values(self.team.pk, "events", "random_prop"))
+            mock_refresh.assert_called_once_with(self.team.pk, "events", "random_prop")
+
+    def test_access_is_recorded_once_per_throttle_interval(self, _):
+        with patch("posthog.queries.property_values.get_client", wraps=get_client) as mock_get_client:
+            for _ in range(3):
+                get_top_property_values(self.team.pk, "events", "random_prop")
+
+        self.assertEqual(mock_get_client.call_count, 1)
+        self.assertEqual(get_client().zcard("PROPERTY_VALUES_RECENTLY_ACCESSED_KEYS"), 1)
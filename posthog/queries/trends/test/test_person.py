@@ -1,6 +1,8 @@
+from unittest.mock import patch
 from uuid import UUID
 
 from dateutil.relativedelta import relativedelta
+from django.test import override_settings
 from django.utils import timezone
 from freezegun.api import freeze_time
 
@@ -8,6 +10,7 @@ from posthog.models.entity import Entity
 from posthog.models.filters import Filter
 from posthog.models.group.util import create_group
 from posthog.models.group_type_mapping import GroupTypeMapping
+from posthog.queries.insight import insight_sync_execute
 from posthog.queries.trends.trends_actors import TrendsActors
 from posthog.session_recordings.test.test_factory import create_session_recording_events
 from posthog.test.base import (
@@ -155,3 +158,57 @@ class TestPerson(ClickhouseTestMixin, APIBaseTest):
                 }
             ],
         )
+
+    @override_settings(ACTORS_QUERY_CACHE_TTL=60)
+    @freeze_time("2021-01-21T20:00:00.000Z")
+    def test_paging_through_actors_reuses_cached_rows(self):
+        for index in range(5):
+            _create_person(team_id=self.team.pk, distinct_ids=[f"u{index}", f"other_u{index}"])
+            _create_event(event="pageview", distinct_id=f"u{index}", team=self.team, timestamp=timezone.now())
+
+        event = {"id": "pageview", "name": "pageview", "type": "events", "order": 0}
+        filter = Filter(
+            data={"date_from": "2021-01-21T00:00:00Z", "date_to": "2021-01-21T23:59:59Z", "events": [event]}
+        )
+        entity = Entity(event)
+
+        with patch(
+            "posthog.queries.actor_base_query.insight_sync_execute", wraps=insight_sync_execute
+        ) as mock_execute:
+            actors_query = TrendsActors(self.team, entity, filter.shallow_clone({"limit": 2}))
+            _, first_page, raw_count = actors_query.get_actors()
+            _, second_page, _ = TrendsActors(
+                self.team, entity, filter.shallow_clone({"limit": 2, "offset": 2})
+            ).get_actors()
+            _, last_page, _ = TrendsActors(
+                self.team, entity, filter.shallow_clone({"limit": 2, "offset": 4})
+            ).get_actors()
+
+        self.assertEqual(mock_execute.call_count, 1)
+        self.assertEqual(raw_count, 2)
+        self.assertEqual((len(first_page), len(second_page), len(last_page)), (2, 2, 1))
+        self.assertEqual(len({actor["id"] for actor in first_page + second_page + last_page}), 5)
+        self.assertEqual(len(first_page[0]["distinct_ids"]), 2)
+        self.assertEqual(set(actors_query.timings.keys()), {"actors_query", "hydration"})
+
+    @freeze_time("2021-01-21T20:00:00.000Z")
+    def test_people_are_hydrated_in_a_single_query(self):
+        for index in range(3):
+            _create_person(team_id=self.team.pk, distinct_ids=[f"u{index}", f"other_u{index}"])
+            _create_event(event="pageview", distinct_id=f"u{index}", team=self.team, timestamp=timezone.now())
+
+        event = {"id": "pageview", "name": "pageview", "type": "events", "order": 0}
+        filter = Filter(
+            data={"date_from": "2021-01-21T00:00:00Z", "date_to": "2021-01-21T23:59:59Z", "events": [event]}
+        )
+        actors_query = TrendsActors(self.team, Entity(event), filter)
+        query, params = actors_query.actor_query()
+        raw_result = insight_sync_execute(query, params, query_type="actors", team_id=self.team.pk)
+
+        with self.assertNumQueries(1):
+            _, serialized_actors = actors_query.get_actors_from_result(raw_result)
+
+        self.assertEqual(len(serialized_actors), 3)
+        for actor in serialized_actors:
+            index = actor["distinct_ids"][0][1:]
+            self.assertEqual(actor["distinct_ids"], [f"u{index}", f"other_u{index}"])
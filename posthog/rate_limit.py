@@ -1,8 +1,11 @@
 import re
+import threading
 import time
+from collections import Counter as CountingDict
 from functools import lru_cache
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+import structlog
 from prometheus_client import Counter
 from rest_framework.throttling import SimpleRateThrottle, BaseThrottle, UserRateThrottle
 from rest_framework.request import Request
@@ -11,9 +14,12 @@ from statshog.defaults.django import statsd
 from posthog.auth import PersonalAPIKeyAuthentication
 from posthog.metrics import LABEL_PATH, LABEL_TEAM_ID
 from posthog.models.instance_setting import get_instance_setting
+from posthog.redis import get_client
 from posthog.settings.utils import get_list
 from token_bucket import Limiter, MemoryStorage
 
+logger = structlog.get_logger(__name__)
+
 
 RATE_LIMIT_EXCEEDED_COUNTER = Counter(
     "rate_limit_exceeded_total",
@@ -259,3 +265,131 @@ class AISustainedRateThrottle(UserRateThrottle):
     # Intended to block slower but sustained bursts of requests, per user
     scope = "ai_sustained"
     rate = "40/day"
+
+
+# Longest a shared rate limiter waits before trying to sync with redis again after failures
+SHARED_RATE_LIMITER_MAX_SYNC_BACKOFF_SECONDS = 30
+
+SHARED_RATE_LIMITER_SYNC_FAILURE_COUNTER = Counter(
+    "shared_rate_limiter_sync_failure_total",
+    "Failures to sync a shared rate limiter with redis, during which it limits with local state only.",
+    labelnames=["limiter"],
+)
+
+# :TRICKY: Applies the counts consumed locally since the last sync to the cluster wide state of every key, using the
+#   generic cell rate algorithm (GCRA). The only state is the key's "theoretical arrival time", i.e. when its bucket
+#   would be full again. A request is allowed while that is no more than the burst tolerance in the future. The stored
+#   time is capped at now + tolerance, so that like a token bucket a key recovers at `rate` once it slows down.
+#   Times are returned as strings, as redis would truncate Lua numbers to integers.
+GCRA_SYNC_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local arrival_times = {}
+for index, key in ipairs(KEYS) do
+    local arrival_time = math.max(tonumber(redis.call("GET", key)) or now, now)
+    arrival_time = math.min(arrival_time + tonumber(ARGV[index + 3]) * interval, now + tolerance)
+    redis.call("SET", key, tostring(arrival_time), "PX", math.ceil((arrival_time - now) * 1000) + 1)
+    arrival_times[index] = tostring(arrival_time)
+end
+return arrival_times
+"""
+
+
+class SharedRateLimiter:
+    """
+    Rate limiter whose state is shared by all workers through redis, for rates that hold across the whole cluster.
+
+    To keep redis off the hot path, every worker decides locally with the GCRA state it last got from redis plus what it
+    consumed since, and syncs its counts to redis in a single round trip every `sync_interval` seconds. Rates are
+    therefore exact up to what other workers consumed within one sync interval. If redis is unavailable, limiting
+    carries on with the local state only, and syncs are retried with an exponential backoff so that only the odd
+    request waits on redis timing out.
+
+    Keys allowed `capacity` requests in a burst, replenished at `rate` per second, like `token_bucket.Limiter`.
+    """
+
+    def __init__(
+        self, name: str, rate: float, capacity: int, sync_interval: float = 0.5, max_pending_keys: int = 1000
+    ):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.max_pending_keys = max_pending_keys
+
+        self._interval = 1 / rate
+        self._tolerance = capacity * self._interval
+        # the theoretical arrival time of every key that isn't fully replenished
+        self._arrival_times: Dict[str, float] = {}
+        # requests consumed locally since the last sync
+        self._pending: CountingDict = CountingDict()
+        # sync right away on the first request, to pick up the state other workers built up
+        self._last_sync = 0.0
+        self._syncing = False
+        self._sync_failures = 0
+        self._next_sync_attempt = 0.0
+        self._lock = threading.Lock()
+        self._script = None
+
+    def consume(self, key: str) -> bool:
+        "Consumes one request for `key`, returning whether it was within the rate limit"
+        now = time.time()
+        with self._lock:
+            arrival_time = max(self._arrival_times.get(key, now), now) + self._interval
+            allowed = arrival_time - now <= self._tolerance
+            self._arrival_times[key] = min(arrival_time, now + self._tolerance)
+            self._pending[key] += 1
+
+            sync_due = now - self._last_sync >= self.sync_interval or len(self._pending) >= self.max_pending_keys
+            should_sync = sync_due and not self._syncing and now >= self._next_sync_attempt
+            if should_sync:
+                pending, self._pending = self._pending, CountingDict()
+                self._last_sync = now
+                self._syncing = True
+            elif len(self._pending) >= self.max_pending_keys:
+                # while redis is backing off or another request syncs, the local state alone limits
+                self._pending = CountingDict()
+
+        # :TRICKY: Redis is called without holding the lock, so that other requests aren't held up by the round trip
+        if should_sync:
+            self._sync(pending, now)
+
+        return allowed
+
+    def _sync(self, pending: CountingDict, now: float) -> None:
+        keys = list(pending.keys())
+        arrival_times: Optional[List[float]] = None
+        try:
+            if self._script is None:
+                self._script = get_client().register_script(GCRA_SYNC_SCRIPT)
+            arrival_times = [
+                float(arrival_time)
+                for arrival_time in self._script(
+                    keys=[self._redis_key(key) for key in keys],
+                    args=[now, self._interval, self._tolerance, *(pending[key] for key in keys)],
+                )
+            ]
+        except Exception as e:
+            SHARED_RATE_LIMITER_SYNC_FAILURE_COUNTER.labels(limiter=self.name).inc()
+            logger.warning("shared_rate_limiter_sync_failed", limiter=self.name, error=e)
+
+        with self._lock:
+            self._syncing = False
+            current_time = time.time()
+            if arrival_times is None:
+                self._sync_failures += 1
+                backoff = self.sync_interval * 2**self._sync_failures
+                self._next_sync_attempt = current_time + min(backoff, SHARED_RATE_LIMITER_MAX_SYNC_BACKOFF_SECONDS)
+            else:
+                self._sync_failures = 0
+                for key, arrival_time in zip(keys, arrival_times):
+                    # requests consumed while syncing aren't in redis yet
+                    arrival_time += self._pending.get(key, 0) * self._interval
+                    self._arrival_times[key] = min(arrival_time, current_time + self._tolerance)
+
+            # replenished keys are no different from keys never seen
+            self._arrival_times = {key: value for key, value in self._arrival_times.items() if value > current_time}
+
+    def _redis_key(self, key: str) -> str:
+        return f"@posthog/rate-limiter/{self.name}/{key}"
@@ -88,18 +88,51 @@ EVENT_SUMMARY_DATA_INCLUSIONS = [
 Event = Dict[str, Any]
 
 
+class SnapshotDataSerializer:
+    """
+    Serializes every snapshot data item at most once, only when it is needed.
+
+    The legacy and blob ingestion paths both need the JSON of the same items, to compress it or to measure its size, so
+    they share one serializer per request. Lists are joined exactly like `json.dumps` would serialize them.
+    """
+
+    def __init__(self):
+        # keyed by id(), the items outlive the serializer as they are part of the request's events
+        self._serialized: Dict[int, str] = {}
+
+    def dumps_item(self, snapshot_data: Any) -> str:
+        key = id(snapshot_data)
+        if key not in self._serialized:
+            self._serialized[key] = json.dumps(snapshot_data)
+        return self._serialized[key]
+
+    def dumps(self, snapshot_data_list: List[Any]) -> str:
+        return "[" + ", ".join(self.dumps_item(snapshot_data) for snapshot_data in snapshot_data_list) + "]"
+
+    def size(self, snapshot_data_list: List[Any]) -> int:
+        "The same as `byte_size_dict(snapshot_data_list)`"
+        separators = 2 * (len(snapshot_data_list) - 1) if snapshot_data_list else 0
+        return 2 + separators + sum(len(self.dumps_item(snapshot_data)) for snapshot_data in snapshot_data_list)
+
+
 def legacy_preprocess_session_recording_events_for_clickhouse(
-    events: List[Event], chunk_size=512 * 1024
+    events: List[Event], chunk_size=512 * 1024, serializer: Optional[SnapshotDataSerializer] = None
 ) -> List[Event]:
-    return _process_windowed_events(events, lambda x: legacy_compress_and_chunk_snapshots(x, chunk_size=chunk_size))
+    serializer = serializer or SnapshotDataSerializer()
+    return _process_windowed_events(
+        events, lambda x: legacy_compress_and_chunk_snapshots(x, chunk_size=chunk_size, serializer=serializer)
+    )
 
 
-def legacy_compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) -> Generator[Event, None, None]:
+def legacy_compress_and_chunk_snapshots(
+    events: List[Event], chunk_size=512 * 1024, serializer: Optional[SnapshotDataSerializer] = None
+) -> Generator[Event, None, None]:
+    serializer = serializer or SnapshotDataSerializer()
     data_list = list(flatten([event["properties"]["$snapshot_data"] for event in events], max_depth=1))
     session_id = events[0]["properties"]["$session_id"]
     window_id = events[0]["properties"].get("$window_id")
     has_full_snapshot = any(snapshot_data["type"] == RRWEB_MAP_EVENT_TYPE.FullSnapshot for snapshot_data in data_list)
-    compressed_data = compress_to_string(json.dumps(data_list))
+    compressed_data = compress_to_string(serializer.dumps(data_list))
 
     id = str(utils.UUIDT())
     chunks = chunk_string(compressed_data, chunk_size)
@@ -135,11 +168,18 @@ def split_replay_events(events: List[Event]) -> List[Event]:
     return replay, other
 
 
-def preprocess_replay_events_for_blob_ingestion(events: List[Event], max_size_bytes=1024 * 1024) -> List[Event]:
-    return _process_windowed_events(events, lambda x: preprocess_replay_events(x, max_size_bytes=max_size_bytes))
+def preprocess_replay_events_for_blob_ingestion(
+    events: List[Event], max_size_bytes=1024 * 1024, serializer: Optional[SnapshotDataSerializer] = None
+) -> List[Event]:
+    serializer = serializer or SnapshotDataSerializer()
+    return _process_windowed_events(
+        events, lambda x: preprocess_replay_events(x, max_size_bytes=max_size_bytes, serializer=serializer)
+    )
 
 
-def preprocess_replay_events(events: List[Event], max_size_bytes=1024 * 1024) -> List[Event]:
+def preprocess_replay_events(
+    events: List[Event], max_size_bytes=1024 * 1024, serializer: Optional[SnapshotDataSerializer] = None
+) -> List[Event]:
     """
     The events going to blob ingestion are uncompressed (the compression happens in the Kafka producer)
     1. Since posthog-js {version} we are grouping events on the frontend in a batch and passing their size in $snapshot_bytes
@@ -152,6 +192,7 @@ def preprocess_replay_events(events: List[Event], max_size_bytes=1024 * 1024) ->
     if len(events) == 0:
         return []
 
+    serializer = serializer or SnapshotDataSerializer()
     size_with_headroom = max_size_bytes * 0.95  # Leave 5% headroom
 
     distinct_id = events[0]["properties"]["distinct_id"]
@@ -196,7 +237,7 @@ def preprocess_replay_events(events: List[Event], max_size_bytes=1024 * 1024) ->
         snapshot_data_list = list(flatten([event["properties"]["$snapshot_data"] for event in events], max_depth=1))
 
         # 2. Otherwise, try and group all the events if they are small enough
-        if byte_size_dict(snapshot_data_list) < size_with_headroom:
+        if serializer.size(snapshot_data_list) < size_with_headroom:
             event = new_event(snapshot_data_list)
             yield event
         else:
@@ -216,7 +257,7 @@ def preprocess_replay_events(events: List[Event], max_size_bytes=1024 * 1024) ->
                 yield event
 
             # Try and group the rest
-            if byte_size_dict(other_snapshots) < size_with_headroom:
+            if serializer.size(other_snapshots) < size_with_headroom:
                 event = new_event(other_snapshots)
                 yield event
             else:
@@ -196,6 +196,14 @@ KAFKA_HOSTS_FOR_CLICKHOUSE = _parse_kafka_hosts(os.getenv("KAFKA_URL_FOR_CLICKHO
 # so, at time of writing only 'gzip' and None/'uncompressed' are available
 SESSION_RECORDING_KAFKA_COMPRESSION = os.getenv("SESSION_RECORDING_KAFKA_COMPRESSION", None)
 
+# Producer profile for the events ingestion topics written by /capture. Compression applies to whole batches, so it
+# pays off together with a linger that lets batches fill up. 'lz4' and 'zstd' need the lz4/zstandard packages.
+KAFKA_EVENTS_PRODUCER_COMPRESSION = os.getenv("KAFKA_EVENTS_PRODUCER_COMPRESSION", None)
+KAFKA_EVENTS_PRODUCER_LINGER_MS: int = get_from_env("KAFKA_EVENTS_PRODUCER_LINGER_MS", 0, type_cast=int)
+KAFKA_EVENTS_PRODUCER_BATCH_SIZE: int = get_from_env("KAFKA_EVENTS_PRODUCER_BATCH_SIZE", 16384, type_cast=int)
+# Capture answers with a 503 rather than hold the request for longer than this while the producer buffer is full
+KAFKA_EVENTS_PRODUCER_MAX_BLOCK_MS: int = get_from_env("KAFKA_EVENTS_PRODUCER_MAX_BLOCK_MS", 1000, type_cast=int)
+
 # To support e.g. Multi-tenanted plans on Heroko, we support specifying a prefix for
 # Kafka Topics. See
 # https://devcenter.heroku.com/articles/multi-tenant-kafka-on-heroku#differences-to-dedicated-kafka-plans
@@ -269,6 +277,11 @@ if not REDIS_URL:
 # can cope with compressed and uncompressed reading at the same time
 USE_REDIS_COMPRESSION = get_from_env("USE_REDIS_COMPRESSION", False, type_cast=str_to_bool)
 
+# Controls whether insight results are written to the cache with the compact binary encoding from
+# posthog.caching.insight_result_encoding. Readers understand both formats regardless of this setting,
+# so it should only be turned on once every process that reads the insight cache has been deployed.
+INSIGHT_CACHE_BINARY_ENCODING = get_from_env("INSIGHT_CACHE_BINARY_ENCODING", False, type_cast=str_to_bool)
+
 # AWS ElastiCache supports "reader" endpoints.
 # See "Finding a Redis (Cluster Mode Disabled) Cluster's Endpoints (Console)"
 # on https://docs.aws.amazon.com/AmazonElastiCache/latest/red-ug/Endpoints.html#Endpoints.Find.Redis
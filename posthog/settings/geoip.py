@@ -1,5 +1,17 @@
 import os
 
-from posthog.settings.base_variables import BASE_DIR
+from django.core.exceptions import ImproperlyConfigured
+
+from posthog.settings.base_variables import BASE_DIR, TEST
+from posthog.settings.utils import get_from_env
 
 GEOIP_PATH = os.path.join(BASE_DIR, "share")
+
+# How the GeoLite database is opened: "memory" loads it into each worker's heap, while "mmap" memory-maps the file so
+# that all workers on a host share the same pages.
+GEOIP_MODE = get_from_env("GEOIP_MODE", "memory")
+if GEOIP_MODE not in ("memory", "mmap"):
+    raise ImproperlyConfigured(f'GEOIP_MODE must be "memory" or "mmap", got "{GEOIP_MODE}"')
+
+# Number of resolved IP addresses (and network prefixes) whose geoip properties are remembered per worker
+GEOIP_CACHE_SIZE = get_from_env("GEOIP_CACHE_SIZE", 0 if TEST else 10_000, type_cast=int)
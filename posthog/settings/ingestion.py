@@ -31,6 +31,9 @@ PARTITION_KEY_BUCKET_REPLENTISH_RATE = get_from_env(
 )
 
 REPLAY_EVENT_MAX_SIZE = get_from_env("REPLAY_EVENT_MAX_SIZE", type_cast=int, default=1024 * 512)  # 512kb
+# Project API tokens of teams whose recordings skip the legacy (ClickHouse) or the blob ingestion path in capture
+REPLAY_LEGACY_INGESTION_DISABLED_TOKENS = get_list(os.getenv("REPLAY_LEGACY_INGESTION_DISABLED_TOKENS", ""))
+REPLAY_BLOB_INGESTION_DISABLED_TOKENS = get_list(os.getenv("REPLAY_BLOB_INGESTION_DISABLED_TOKENS", ""))
 REPLAY_EVENTS_NEW_CONSUMER_RATIO = get_from_env("REPLAY_EVENTS_NEW_CONSUMER_RATIO", type_cast=float, default=0.0)
 
 if REPLAY_EVENTS_NEW_CONSUMER_RATIO > 1 or REPLAY_EVENTS_NEW_CONSUMER_RATIO < 0:
@@ -1,7 +1,9 @@
 from posthog.settings.base_variables import TEST
-from posthog.settings.utils import get_from_env
+from posthog.settings.utils import get_from_env, str_to_bool
 
 USE_PRECALCULATED_CH_COHORT_PEOPLE = not TEST
+# Serve property value suggestions from periodically refreshed top values rather than querying on every keystroke
+USE_PRECALCULATED_PROPERTY_VALUES = get_from_env("USE_PRECALCULATED_PROPERTY_VALUES", not TEST, type_cast=str_to_bool)
 CALCULATE_X_COHORTS_PARALLEL = get_from_env("CALCULATE_X_COHORTS_PARALLEL", 5, type_cast=int)
 
 ACTION_EVENT_MAPPING_INTERVAL_SECONDS = get_from_env("ACTION_EVENT_MAPPING_INTERVAL_SECONDS", 300, type_cast=int)
@@ -24,6 +26,14 @@ COUNT_TILES_WITH_NO_FILTERS_HASH_INTERVAL_SECONDS = get_from_env(
 
 
 CACHED_RESULTS_TTL = 7 * 24 * 60 * 60  # how long to keep cached results for
+# how long funnel correlation counts are reused by requests which only differ in exclusions, 0 disables it
+FUNNEL_CORRELATION_CACHE_TTL = get_from_env("FUNNEL_CORRELATION_CACHE_TTL", 0 if TEST else 60 * 60, type_cast=int)
+# how long the persons modal reuses actor query rows while paging, 0 disables it
+ACTORS_QUERY_CACHE_TTL = get_from_env("ACTORS_QUERY_CACHE_TTL", 0 if TEST else 5 * 60, type_cast=int)
+# how long usage report re-runs for the same day reuse its ClickHouse counts, 0 disables it
+USAGE_REPORT_CACHE_TTL = get_from_env("USAGE_REPORT_CACHE_TTL", 0 if TEST else 12 * 60 * 60, type_cast=int)
+# how many usage report ClickHouse queries run at the same time
+USAGE_REPORT_QUERY_WORKERS = get_from_env("USAGE_REPORT_QUERY_WORKERS", 1 if TEST else 4, type_cast=int)
 
 # Schedule to run asynchronous data deletion on. Follows crontab syntax.
 # Use empty string to prevent this
@@ -29,6 +29,10 @@ DECIDE_BUCKET_REPLENISH_RATE = get_from_env("DECIDE_BUCKET_REPLENISH_RATE", type
 
 DECIDE_BILLING_SAMPLING_RATE = get_from_env("DECIDE_BILLING_SAMPLING_RATE", 0.1, type_cast=float)
 DECIDE_BILLING_ANALYTICS_TOKEN = get_from_env("DECIDE_BILLING_ANALYTICS_TOKEN", None, type_cast=str, optional=True)
+# Seconds request counts are accumulated in memory before being written to redis, 0 writes them on every request
+DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL = get_from_env(
+    "DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL", 0 if TEST else 5, type_cast=int
+)
 
 # Decide regular request analytics
 # Takes 3 possible formats, all separated by commas:
@@ -124,6 +128,8 @@ else:
 
 # Max size of a POST body (for event ingestion)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20971520  # 20 MB
+# Max size of a POST body once decompressed, so that small compressed bodies can't take up unbounded memory
+DATA_UPLOAD_MAX_DECOMPRESSED_SIZE = get_from_env("DATA_UPLOAD_MAX_DECOMPRESSED_SIZE", 200 * 1024 * 1024, type_cast=int)
 
 ROOT_URLCONF = "posthog.urls"
 
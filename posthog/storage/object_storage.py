@@ -1,5 +1,6 @@
 import abc
-from typing import Optional, Union, List
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
 
 import structlog
 from boto3 import client
@@ -29,6 +30,10 @@ class ObjectStorageClient(metaclass=abc.ABCMeta):
     def list_objects(self, bucket: str, prefix: str) -> Optional[List[str]]:
         pass
 
+    @abc.abstractmethod
+    def list_objects_modified_before(self, bucket: str, prefix: str, modified_before: datetime) -> List[str]:
+        pass
+
     @abc.abstractmethod
     def read(self, bucket: str, key: str) -> Optional[str]:
         pass
@@ -41,6 +46,26 @@ class ObjectStorageClient(metaclass=abc.ABCMeta):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    @abc.abstractmethod
+    def delete_objects(self, bucket: str, keys: List[str]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def start_multipart_upload(self, bucket: str, key: str) -> str:
+        pass
+
+    @abc.abstractmethod
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, content: bytes) -> str:
+        pass
+
+    @abc.abstractmethod
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        pass
+
 
 class UnavailableStorage(ObjectStorageClient):
     def head_bucket(self, bucket: str):
@@ -52,6 +77,9 @@ class UnavailableStorage(ObjectStorageClient):
     def list_objects(self, bucket: str, prefix: str) -> Optional[List[str]]:
         pass
 
+    def list_objects_modified_before(self, bucket: str, prefix: str, modified_before: datetime) -> List[str]:
+        return []
+
     def read(self, bucket: str, key: str) -> Optional[str]:
         pass
 
@@ -61,6 +89,21 @@ class UnavailableStorage(ObjectStorageClient):
     def write(self, bucket: str, key: str, content: Union[str, bytes]) -> None:
         pass
 
+    def delete_objects(self, bucket: str, keys: List[str]) -> None:
+        pass
+
+    def start_multipart_upload(self, bucket: str, key: str) -> str:
+        raise ObjectStorageError("object storage is not available")
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, content: bytes) -> str:
+        raise ObjectStorageError("object storage is not available")
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        raise ObjectStorageError("object storage is not available")
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        pass
+
 
 class ObjectStorage(ObjectStorageClient):
     def __init__(self, aws_client) -> None:
@@ -98,6 +141,19 @@ class ObjectStorage(ObjectStorageClient):
             capture_exception(e)
             return None
 
+    def list_objects_modified_before(self, bucket: str, prefix: str, modified_before: datetime) -> List[str]:
+        try:
+            keys: List[str] = []
+            for s3_response in self.aws_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+                keys.extend(
+                    obj["Key"] for obj in s3_response.get("Contents", []) if obj["LastModified"] < modified_before
+                )
+            return keys
+        except Exception as e:
+            logger.error("object_storage.list_objects_failed", bucket=bucket, prefix=prefix, error=e)
+            capture_exception(e)
+            return []
+
     def read(self, bucket: str, key: str) -> Optional[str]:
         object_bytes = self.read_bytes(bucket, key)
         if object_bytes:
@@ -124,6 +180,60 @@ class ObjectStorage(ObjectStorageClient):
             capture_exception(e)
             raise ObjectStorageError("write failed") from e
 
+    def delete_objects(self, bucket: str, keys: List[str]) -> None:
+        try:
+            # at most 1000 keys can be deleted per request
+            for start in range(0, len(keys), 1000):
+                self.aws_client.delete_objects(
+                    Bucket=bucket,
+                    Delete={"Objects": [{"Key": key} for key in keys[start : start + 1000]], "Quiet": True},
+                )
+        except Exception as e:
+            logger.error("object_storage.delete_objects_failed", bucket=bucket, error=e)
+            capture_exception(e)
+            raise ObjectStorageError("delete failed") from e
+
+    def start_multipart_upload(self, bucket: str, key: str) -> str:
+        try:
+            return self.aws_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        except Exception as e:
+            logger.error("object_storage.start_multipart_upload_failed", bucket=bucket, file_name=key, error=e)
+            capture_exception(e)
+            raise ObjectStorageError("start multipart upload failed") from e
+
+    def upload_part(self, bucket: str, key: str, upload_id: str, part_number: int, content: bytes) -> str:
+        try:
+            s3_response = self.aws_client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=content
+            )
+            return s3_response["ETag"]
+        except Exception as e:
+            logger.error(
+                "object_storage.upload_part_failed", bucket=bucket, file_name=key, part_number=part_number, error=e
+            )
+            capture_exception(e)
+            raise ObjectStorageError("upload part failed") from e
+
+    def complete_multipart_upload(self, bucket: str, key: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+        try:
+            self.aws_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag in parts]},
+            )
+        except Exception as e:
+            logger.error("object_storage.complete_multipart_upload_failed", bucket=bucket, file_name=key, error=e)
+            capture_exception(e)
+            raise ObjectStorageError("complete multipart upload failed") from e
+
+    def abort_multipart_upload(self, bucket: str, key: str, upload_id: str) -> None:
+        try:
+            self.aws_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            # leftover parts only take up storage until the bucket cleans them up, so don't fail the caller
+            logger.warn("object_storage.abort_multipart_upload_failed", bucket=bucket, file_name=key, error=e)
+
 
 _client: ObjectStorageClient = UnavailableStorage()
 
@@ -152,6 +262,32 @@ def write(file_name: str, content: Union[str, bytes]) -> None:
     return object_storage_client().write(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, content=content)
 
 
+def start_multipart_upload(file_name: str) -> str:
+    return object_storage_client().start_multipart_upload(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name)
+
+
+def upload_part(file_name: str, upload_id: str, part_number: int, content: bytes) -> str:
+    return object_storage_client().upload_part(
+        bucket=settings.OBJECT_STORAGE_BUCKET,
+        key=file_name,
+        upload_id=upload_id,
+        part_number=part_number,
+        content=content,
+    )
+
+
+def complete_multipart_upload(file_name: str, upload_id: str, parts: List[Tuple[int, str]]) -> None:
+    return object_storage_client().complete_multipart_upload(
+        bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, upload_id=upload_id, parts=parts
+    )
+
+
+def abort_multipart_upload(file_name: str, upload_id: str) -> None:
+    return object_storage_client().abort_multipart_upload(
+        bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name, upload_id=upload_id
+    )
+
+
 def read(file_name: str) -> Optional[str]:
     return object_storage_client().read(bucket=settings.OBJECT_STORAGE_BUCKET, key=file_name)
 
@@ -164,6 +300,16 @@ def list_objects(prefix: str) -> Optional[List[str]]:
     return object_storage_client().list_objects(bucket=settings.OBJECT_STORAGE_BUCKET, prefix=prefix)
 
 
+def list_objects_modified_before(prefix: str, modified_before: datetime) -> List[str]:
+    return object_storage_client().list_objects_modified_before(
+        bucket=settings.OBJECT_STORAGE_BUCKET, prefix=prefix, modified_before=modified_before
+    )
+
+
+def delete_objects(file_names: List[str]) -> None:
+    return object_storage_client().delete_objects(bucket=settings.OBJECT_STORAGE_BUCKET, keys=file_names)
+
+
 def get_presigned_url(file_key: str, expiration: int = 3600) -> Optional[str]:
     return object_storage_client().get_presigned_url(
         bucket=settings.OBJECT_STORAGE_BUCKET, file_key=file_key, expiration=expiration
@@ -4,8 +4,8 @@ from posthog.celery import app
 from posthog.models import ExportedAsset
 
 
-@app.task(autoretry_for=(Exception,), max_retries=5, retry_backoff=True, acks_late=True)
-def export_asset(exported_asset_id: int, limit: Optional[int] = None) -> None:
+@app.task(bind=True, autoretry_for=(Exception,), max_retries=5, retry_backoff=True, acks_late=True)
+def export_asset(self, exported_asset_id: int, limit: Optional[int] = None) -> None:
     from statshog.defaults.django import statsd
 
     from posthog.tasks.exports import csv_exporter, image_exporter
@@ -16,8 +16,10 @@ def export_asset(exported_asset_id: int, limit: Optional[int] = None) -> None:
 
     is_csv_export = exported_asset.export_format == ExportedAsset.ExportFormat.CSV
     if is_csv_export:
-        max_limit = exported_asset.export_context.get("max_limit", 10000)
-        csv_exporter.export_csv(exported_asset, limit=limit, max_limit=max_limit)
+        max_limit = exported_asset.export_context.get("max_limit")
+        csv_exporter.export_csv(
+            exported_asset, limit=limit, max_limit=max_limit, last_attempt=self.request.retries >= self.max_retries
+        )
         statsd.incr("csv_exporter.queued", tags={"team_id": str(exported_asset.team_id)})
     else:
         image_exporter.export_image(exported_asset)
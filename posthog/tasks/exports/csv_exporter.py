@@ -1,22 +1,37 @@
+import csv
 import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import io
+import itertools
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, cast
 from urllib.parse import parse_qsl, quote, urlencode, urlparse, urlunparse
+from uuid import UUID
 
 import requests
 import structlog
+from django.conf import settings
 from sentry_sdk import capture_exception, push_scope
 from statshog.defaults.django import statsd
 
 from posthog.jwt import PosthogJwtAudience, encode_jwt
 from posthog.api.query import process_query
+from posthog.clickhouse.query_tagging import tag_queries
+from posthog.hogql import ast
+from posthog.hogql.parser import parse_expr, parse_order_expr, parse_select
+from posthog.hogql.property import has_aggregation
+from posthog.hogql.query import execute_hogql_query
 from posthog.logging.timing import timed
-from posthog.models.exported_asset import ExportedAsset, save_content
+from posthog.models.event.events_query import run_events_query
+from posthog.models.exported_asset import ContentWriter, ExportedAsset
+from posthog.schema import EventsQuery
 from posthog.utils import absolute_uri
 
 from .ordered_csv_renderer import OrderedCsvRenderer
 
 logger = structlog.get_logger(__name__)
 
+# Without object storage the whole export is held in memory and saved to the asset's content column
+MAX_ROWS_WITHOUT_OBJECT_STORAGE = 10000
+
 
 # SUPPORTED CSV TYPES
 
@@ -38,9 +53,14 @@ logger = structlog.get_logger(__name__)
 # HOW DOES THIS WORK
 # 1. We receive an export task with a given resource uri (identical to the API)
 # 2. We call the actual API to load the data with the given params so that we receive a paginateable response
-# 3. We save the response to a chunk in object storage and then load the `next` page of results
-# 4. Repeat until exhausted or limit reached
-# 5. We save the final blob output and update the ExportedAsset
+# 3. We render the response to CSV rows and then load the `next` page of results
+# 4. Once enough rows have been rendered they are uploaded as one part of a multipart upload to object storage,
+#    and the position of the next page is saved on the ExportedAsset so that a retried task can continue from there
+# 5. Repeat until exhausted or limit reached
+# 6. We upload the final part and update the ExportedAsset
+#
+# HogQL and events queries are run directly rather than through the API, in blocks where the query order allows it.
+# Blocks continue from the sort key values of the previous block's last row rather than from an offset.
 
 
 def add_query_params(url: str, params: Dict[str, str]) -> str:
@@ -165,80 +185,300 @@ class UnexpectedEmptyJsonResponse(Exception):
     pass
 
 
-def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit: int = 3_500) -> None:
+def _export_to_csv(exported_asset: ExportedAsset, limit: int = 1000, max_limit: Optional[int] = None) -> None:
     resource = exported_asset.export_context
-
     columns: List[str] = resource.get("columns", [])
 
-    all_csv_rows: List[Any] = []
+    if not settings.OBJECT_STORAGE_ENABLED:
+        max_limit = min(max_limit or MAX_ROWS_WITHOUT_OBJECT_STORAGE, MAX_ROWS_WITHOUT_OBJECT_STORAGE)
+
+    writer = ContentWriter(exported_asset)
+    cursor: Dict[str, Any] = writer.cursor or {}
+    header: Optional[List[str]] = cursor.get("header") or columns or None
+    row_count: int = cursor.get("row_count", 0)
 
     if resource.get("source"):
-        from posthog.hogql.constants import MAX_SELECT_RETURNED_ROWS
+        blocks = _iter_query_blocks(exported_asset, resource["source"], cursor)
+    else:
+        blocks = _iter_api_blocks(exported_asset, limit, cursor.get("next_url"))
 
-        query = resource.get("source")
-        query_response = process_query(
-            team=exported_asset.team, query_json=query, default_limit=MAX_SELECT_RETURNED_ROWS
-        )
-        all_csv_rows = _convert_response_to_csv_data(query_response)
+    renderer = OrderedCsvRenderer()
+    for csv_rows, position in blocks:
+        # NOTE: This is not ideal as some rows _could_ have different keys. The header is fixed by the first block
+        # so that rows can be written as they come in, later blocks are rendered with the same columns.
+        if header is None and csv_rows:
+            if not [x for x in csv_rows[0].values() if isinstance(x, dict) or isinstance(x, list)]:
+                # If values are serialised then keep the order of the keys, else allow it to be unordered
+                header = list(csv_rows[0].keys())
 
-    else:
-        path: str = resource["path"]
-        method: str = resource.get("method", "GET")
-        body = resource.get("body", None)
-        next_url = None
+        table = renderer.tablize(csv_rows, header=header)
+        first_row = next(table, None)
+        if row_count == 0 and first_row is not None:
+            header = list(first_row)
+            table = itertools.chain([first_row], table)
+
+        writer.write(_render_csv_rows(table))
+        row_count += len(csv_rows)
+
+        if position is None or (max_limit is not None and row_count >= max_limit):
+            break
+        writer.checkpoint({**position, "header": header, "row_count": row_count})
+
+    writer.close()
+
+
+def _render_csv_rows(rows: Iterator[List[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _iter_api_blocks(
+    exported_asset: ExportedAsset, limit: int, next_url: Optional[str]
+) -> Iterator[Tuple[List[Any], Optional[Dict[str, Any]]]]:
+    "Pages through the API, yielding each page's rows and the position of the next page"
+    resource = exported_asset.export_context
+    path: str = resource["path"]
+    method: str = resource.get("method", "GET")
+    body = resource.get("body", None)
+
+    while True:
+        # minted for every page, as large exports can run for longer than a token is valid
         access_token = encode_jwt(
             {"id": exported_asset.created_by_id}, datetime.timedelta(minutes=15), PosthogJwtAudience.IMPERSONATED_USER
         )
+        response = make_api_call(access_token, body, limit, method, next_url, path)
 
-        while len(all_csv_rows) < max_limit:
-            response = make_api_call(access_token, body, limit, method, next_url, path)
-
-            if response.status_code != 200:
-                # noinspection PyBroadException
-                try:
-                    response_json = response.json()
-                except Exception:
-                    response_json = "no response json to parse"
-                raise Exception(f"export API call failed with status_code: {response.status_code}. {response_json}")
-
-            # Figure out how to handle funnel polling....
-            data = response.json()
-
-            if data is None:
-                unexpected_empty_json_response = UnexpectedEmptyJsonResponse("JSON is None when calling API for data")
-                logger.error(
-                    "csv_exporter.json_was_none",
-                    exc=unexpected_empty_json_response,
-                    exc_info=True,
-                    response_text=response.text,
-                )
+        if response.status_code != 200:
+            # noinspection PyBroadException
+            try:
+                response_json = response.json()
+            except Exception:
+                response_json = "no response json to parse"
+            raise Exception(f"export API call failed with status_code: {response.status_code}. {response_json}")
 
-                raise unexpected_empty_json_response
+        # Figure out how to handle funnel polling....
+        data = response.json()
 
-            csv_rows = _convert_response_to_csv_data(data)
+        if data is None:
+            unexpected_empty_json_response = UnexpectedEmptyJsonResponse("JSON is None when calling API for data")
+            logger.error(
+                "csv_exporter.json_was_none",
+                exc=unexpected_empty_json_response,
+                exc_info=True,
+                response_text=response.text,
+            )
 
-            all_csv_rows = all_csv_rows + csv_rows
+            raise unexpected_empty_json_response
 
-            if not data.get("next") or not csv_rows:
-                break
+        csv_rows = _convert_response_to_csv_data(data)
+        next_url = data.get("next")
 
-            next_url = data.get("next")
+        if not next_url or not csv_rows:
+            yield csv_rows, None
+            return
 
-    renderer = OrderedCsvRenderer()
+        yield csv_rows, {"next_url": next_url}
 
-    # NOTE: This is not ideal as some rows _could_ have different keys
-    # Ideally we would extend the csvrenderer to supported keeping the order in place
-    if len(all_csv_rows):
-        if not [x for x in all_csv_rows[0].values() if isinstance(x, dict) or isinstance(x, list)]:
-            # If values are serialised then keep the order of the keys, else allow it to be unordered
-            renderer.header = all_csv_rows[0].keys()
 
-    render_context = {}
-    if columns:
-        render_context["header"] = columns
+def _iter_query_blocks(
+    exported_asset: ExportedAsset, query: Dict[str, Any], position: Dict[str, Any]
+) -> Iterator[Tuple[List[Any], Optional[Dict[str, Any]]]]:
+    """
+    Runs the query in blocks of up to MAX_SELECT_RETURNED_ROWS rows, yielding each block's rows and the position of
+    the next block.
 
-    rendered_csv_content = renderer.render(all_csv_rows, renderer_context=render_context)
-    save_content(exported_asset, rendered_csv_content)
+    Only queries with a stable order can be paged through, anything else is returned as a single block as before.
+    """
+    from posthog.hogql.constants import MAX_SELECT_RETURNED_ROWS
+
+    team = exported_asset.team
+    block_size = MAX_SELECT_RETURNED_ROWS
+
+    if query.get("kind") == "EventsQuery" and query.get("limit") is None:
+        events_sort_keys = _events_query_sort_keys(query)
+        if events_sort_keys is not None:
+
+            def run_events_block(condition: Optional[ast.Expr], skip: int) -> Dict[str, Any]:
+                tag_queries(query=query)
+                events_query = EventsQuery.parse_obj(
+                    {
+                        **query,
+                        "select": [*(query.get("select") or ["*"]), *(key for key, _ in events_sort_keys)],
+                        "orderBy": [f"{key} {'DESC' if descending else 'ASC'}" for key, descending in events_sort_keys],
+                        "limit": block_size,
+                        "offset": skip,
+                    }
+                )
+                return run_events_query(team=team, query=events_query, extra_where=condition).dict()
+
+            yield from _iter_keyset_blocks(run_events_block, events_sort_keys, block_size, position)
+            return
+
+    if query.get("kind") == "HogQLQuery":
+        select_query = parse_select(query["query"])
+        if (
+            isinstance(select_query, ast.SelectQuery)
+            and select_query.order_by
+            and select_query.limit is None
+            and all(order.expr.start is not None for order in select_query.order_by)
+        ):
+            hogql_sort_keys = [
+                (query["query"][order.expr.start : order.expr.end], order.order == "DESC")
+                for order in select_query.order_by
+            ]
+
+            def run_hogql_block(condition: Optional[ast.Expr], skip: int) -> Dict[str, Any]:
+                # parsed again for every block, as running the query resolves types on the AST in place
+                select_query = cast(ast.SelectQuery, parse_select(query["query"]))
+                select_query.select = [*select_query.select, *(parse_expr(key) for key, _ in hogql_sort_keys)]
+                if condition is not None:
+                    if select_query.group_by or any(has_aggregation(expr) for expr in select_query.select):
+                        select_query.having = _and(select_query.having, condition)
+                    else:
+                        select_query.where = _and(select_query.where, condition)
+                select_query.limit = ast.Constant(value=block_size)
+                select_query.offset = ast.Constant(value=skip)
+                return execute_hogql_query(query=select_query, team=team, query_type="HogQLQuery").dict()
+
+            yield from _iter_keyset_blocks(run_hogql_block, hogql_sort_keys, block_size, position)
+            return
+
+    query_response = process_query(team=team, query_json=query, default_limit=MAX_SELECT_RETURNED_ROWS)
+    yield _convert_response_to_csv_data(query_response), None
+
+
+def _iter_keyset_blocks(
+    run_block: Callable[[Optional[ast.Expr], int], Dict[str, Any]],
+    sort_keys: List[Tuple[str, bool]],
+    block_size: int,
+    position: Dict[str, Any],
+) -> Iterator[Tuple[List[Any], Optional[Dict[str, Any]]]]:
+    """
+    Pages through a query by the values of its sort keys, which `run_block` selects after the query's own columns.
+
+    Every block continues from the last row of the previous one, so that each is as cheap to fetch as the first no
+    matter how many rows were exported before. Rows which sort the same as that last row are skipped with an offset.
+    """
+    after: Optional[List[Any]] = position.get("after")
+    skip: int = position.get("skip", 0)
+    key_count = len(sort_keys)
+
+    while True:
+        condition = (
+            _keyset_condition(sort_keys, [_decode_sort_key_value(value) for value in after])
+            if after is not None
+            else None
+        )
+        response = run_block(condition, skip)
+        rows = response["results"]
+        key_values = [[_encode_sort_key_value(value) for value in row[-key_count:]] for row in rows]
+        response = {
+            **response,
+            "results": [list(row[:-key_count]) for row in rows],
+            "columns": response["columns"][:-key_count],
+            "types": response["types"][:-key_count],
+        }
+        csv_rows = _convert_response_to_csv_data(response)
+        if len(rows) < block_size:
+            yield csv_rows, None
+            return
+
+        ties = sum(1 for values in key_values if values == key_values[-1])
+        skip = skip + ties if key_values[-1] == after else ties
+        after = key_values[-1]
+        yield csv_rows, {"after": after, "skip": skip}
+
+
+def _keyset_condition(sort_keys: List[Tuple[str, bool]], after: List[Any]) -> ast.Expr:
+    "Matches the rows which sort the same as or after the `after` values, with NULLs sorting last"
+
+    def key(index: int) -> ast.Expr:
+        # parsed for every use, so that no node appears in the query twice
+        return parse_expr(sort_keys[index][0])
+
+    def equals(index: int) -> ast.Expr:
+        if after[index] is None:
+            return ast.Call(name="isNull", args=[key(index)])
+        return ast.CompareOperation(
+            op=ast.CompareOperationOp.Eq, left=key(index), right=ast.Constant(value=after[index])
+        )
+
+    terms: List[ast.Expr] = []
+    for index, (_, descending) in enumerate(sort_keys):
+        if after[index] is None:
+            # nothing sorts after NULL
+            continue
+        later = ast.Or(
+            exprs=[
+                ast.CompareOperation(
+                    op=ast.CompareOperationOp.Lt if descending else ast.CompareOperationOp.Gt,
+                    left=key(index),
+                    right=ast.Constant(value=after[index]),
+                ),
+                ast.Call(name="isNull", args=[key(index)]),
+            ]
+        )
+        terms.append(ast.And(exprs=[*(equals(previous) for previous in range(index)), later]))
+    terms.append(ast.And(exprs=[equals(index) for index in range(len(sort_keys))]))
+    return ast.Or(exprs=terms)
+
+
+def _encode_sort_key_value(value: Any) -> Any:
+    "Sort key values are kept in the export's cursor, so they need to survive a JSON round trip"
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"date": value.isoformat()}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    return value
+
+
+def _decode_sort_key_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "datetime" in value:
+            return datetime.datetime.fromisoformat(value["datetime"])
+        if "date" in value:
+            return datetime.date.fromisoformat(value["date"])
+        if "uuid" in value:
+            return UUID(value["uuid"])
+    return value
+
+
+def _events_query_sort_keys(query: Dict[str, Any]) -> Optional[List[Tuple[str, bool]]]:
+    """
+    Returns the (expression, descending) pairs the events query is ordered by, followed by the event uuid to break
+    ties, or None if its results are grouped and not paged through.
+    """
+    select: List[str] = query.get("select") or ["*"]
+    columns = [column for column in select if column != "*" and column.split("--")[0].strip() != "person"]
+    if any(has_aggregation(parse_expr(column)) for column in columns):
+        return None
+
+    # the same order as run_events_query picks
+    sort_keys: List[Tuple[str, bool]] = []
+    if query.get("orderBy"):
+        for order_by in query["orderBy"]:
+            order = cast(ast.OrderExpr, parse_order_expr(order_by))
+            if order.expr.start is None:
+                return None
+            sort_keys.append((order_by[order.expr.start : order.expr.end], order.order == "DESC"))
+    elif "timestamp" in select:
+        sort_keys = [("timestamp", True)]
+    elif select[0] in columns:
+        sort_keys = [(select[0], False)]
+    elif select[0] != "*":
+        # person columns are selected as the distinct id, "*" is a tuple of the event's fields starting with its uuid
+        sort_keys = [("distinct_id", False)]
+
+    if ("uuid", False) not in sort_keys:
+        sort_keys.append(("uuid", False))
+    return sort_keys
+
+
+def _and(left: Optional[ast.Expr], right: ast.Expr) -> ast.Expr:
+    return ast.And(exprs=[left, right]) if left is not None else right
 
 
 def make_api_call(
@@ -265,7 +505,12 @@ def make_api_call(
 
 
 @timed("csv_exporter")
-def export_csv(exported_asset: ExportedAsset, limit: Optional[int] = None, max_limit: int = 3_500) -> None:
+def export_csv(
+    exported_asset: ExportedAsset,
+    limit: Optional[int] = None,
+    max_limit: Optional[int] = None,
+    last_attempt: bool = False,
+) -> None:
     if not limit:
         limit = 1000
 
@@ -288,4 +533,8 @@ def export_csv(exported_asset: ExportedAsset, limit: Optional[int] = None, max_l
 
         logger.error("csv_exporter.failed", exception=e, exc_info=True)
         statsd.incr("csv_exporter.failed", tags={"team_id": team_id})
+
+        if last_attempt:
+            # nothing will resume the upload, so don't leave its parts behind
+            ContentWriter(exported_asset).abort()
         raise e
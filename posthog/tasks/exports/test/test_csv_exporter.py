@@ -1,3 +1,4 @@
+import gzip
 from typing import Any, Dict, Optional
 from unittest.mock import MagicMock, Mock, patch
 
@@ -8,6 +9,7 @@ from dateutil.relativedelta import relativedelta
 from django.test import override_settings
 from django.utils.timezone import now
 
+from posthog.hogql.query import execute_hogql_query
 from posthog.models import ExportedAsset
 from posthog.models.utils import UUIDT
 from posthog.settings import (
@@ -24,6 +26,7 @@ from posthog.test.base import APIBaseTest, _create_event, flush_persons_and_even
 from posthog.utils import absolute_uri
 
 TEST_PREFIX = "Test-Exports"
+EXPECTED_CONTENT = b"id,distinct_id,properties.$browser,event,timestamp,person,elements_chain\r\ne9ca132e-400f-4854-a83c-16c151b2f145,2,Safari,event_name,2022-07-06T19:37:43.095295+00:00,,\r\n1624228e-a4f1-48cd-aabc-6baa3ddb22e4,2,Safari,event_name,2022-07-06T19:37:43.095279+00:00,,\r\n66d45914-bdf5-4980-a54a-7dc699bdcce9,2,Safari,event_name,2022-07-06T19:37:43.095262+00:00,,\r\n"
 
 # see GitHub issue #11204
 regression_11204 = "api/projects/6642/insights/trend/?events=%5B%7B%22id%22%3A%22product%20viewed%22%2C%22name%22%3A%22product%20viewed%22%2C%22type%22%3A%22events%22%2C%22order%22%3A0%7D%5D&actions=%5B%5D&display=ActionsTable&insight=TRENDS&interval=day&breakdown=productName&new_entity=%5B%5D&properties=%5B%5D&step_limit=5&funnel_filter=%7B%7D&breakdown_type=event&exclude_events=%5B%5D&path_groupings=%5B%5D&include_event_types=%5B%22%24pageview%22%5D&filter_test_accounts=false&local_path_cleaning_filters=%5B%5D&date_from=-14d&offset=50"
@@ -34,6 +37,7 @@ class TestCSVExporter(APIBaseTest):
     @pytest.fixture(autouse=True)
     def patched_request(self):
         with patch("posthog.tasks.exports.csv_exporter.requests.request") as patched_request:
+            self.patched_request = patched_request
             mock_response = Mock()
             mock_response.status_code = 200
             # API responses copied from https://github.com/PostHog/posthog/runs/7221634689?check_suite_focus=true
@@ -302,6 +306,45 @@ class TestCSVExporter(APIBaseTest):
 
             assert exported_asset.content is None
 
+    @patch("posthog.hogql.constants.MAX_SELECT_RETURNED_ROWS", 10)
+    @patch("posthog.tasks.exports.csv_exporter.execute_hogql_query", wraps=execute_hogql_query)
+    def test_csv_exporter_pages_hogql_query_by_sort_keys(self, mocked_execute_hogql_query) -> None:
+        random_uuid = str(UUIDT())
+        for i in range(15):
+            _create_event(
+                event="$pageview",
+                distinct_id=random_uuid,
+                team=self.team,
+                timestamp=now() - relativedelta(hours=1),
+                properties={"prop": i},
+            )
+        flush_persons_and_events()
+
+        exported_asset = ExportedAsset(
+            team=self.team,
+            export_format=ExportedAsset.ExportFormat.CSV,
+            export_context={
+                "source": {
+                    "kind": "HogQLQuery",
+                    "query": f"select properties.prop from events where distinct_id = '{random_uuid}' "
+                    "order by intDiv(toInt(properties.prop), 5) desc",
+                }
+            },
+        )
+        exported_asset.save()
+
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        lines = exported_asset.content.decode("utf-8").split("\r\n")
+        self.assertEqual(len(lines), 17)
+        self.assertEqual(sorted(int(line) for line in lines[1:6]), [10, 11, 12, 13, 14])
+        self.assertEqual(sorted(int(line) for line in lines[1:16]), list(range(15)))
+        # the second block continues from the sort key of the first block's last row, skipping its ties
+        self.assertEqual(mocked_execute_hogql_query.call_count, 2)
+        second_block = mocked_execute_hogql_query.call_args_list[1].kwargs["query"]
+        self.assertEqual(second_block.offset.value, 5)
+
     @patch("posthog.hogql.constants.MAX_SELECT_RETURNED_ROWS", 10)
     @patch("posthog.models.exported_asset.UUIDT")
     def test_csv_exporter_events_query(self, mocked_uuidt, MAX_SELECT_RETURNED_ROWS=10) -> None:
@@ -330,17 +373,125 @@ class TestCSVExporter(APIBaseTest):
             csv_exporter.export_csv(exported_asset)
             content = object_storage.read(exported_asset.content_location)
             lines = (content or "").split("\r\n")
-            self.assertEqual(len(lines), 12)
+            # all rows are exported, in blocks of MAX_SELECT_RETURNED_ROWS
+            self.assertEqual(len(lines), 17)
             self.assertEqual(
                 lines[0],
                 "event,*.uuid,*.event,*.properties.prop,*.timestamp,*.team_id,*.distinct_id,*.elements_chain,*.created_at",
             )
-            self.assertEqual(lines[11], "")
+            self.assertEqual(lines[16], "")
+            self.assertEqual(len({line.split(",")[1] for line in lines[1:16]}), 15)
             first_row = lines[1].split(",")
             self.assertEqual(first_row[0], "$pageview")
             self.assertEqual(first_row[2], "$pageview")
             self.assertEqual(first_row[5], str(self.team.pk))
 
+    @patch("posthog.tasks.exports.csv_exporter.MAX_ROWS_WITHOUT_OBJECT_STORAGE", 2)
+    def test_csv_exporter_caps_rows_when_object_storage_is_disabled(self) -> None:
+        exported_asset = self._create_asset()
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        assert exported_asset.content == b"\r\n".join(EXPECTED_CONTENT.split(b"\r\n")[:3]) + b"\r\n"
+        assert self.patched_request.call_count == 2
+
+    @patch("posthog.tasks.exports.csv_exporter.encode_jwt", return_value="token")
+    def test_csv_exporter_mints_a_token_for_every_page(self, mocked_encode_jwt) -> None:
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(self._create_asset())
+
+        assert mocked_encode_jwt.call_count == 3
+        assert self.patched_request.call_count == 3
+
+    def test_csv_exporter_gzips_content(self) -> None:
+        exported_asset = self._create_asset({"compression": "gzip"})
+        with self.settings(OBJECT_STORAGE_ENABLED=False):
+            csv_exporter.export_csv(exported_asset)
+
+        assert gzip.decompress(exported_asset.content) == EXPECTED_CONTENT
+        assert exported_asset.content_encoding == "gzip"
+
+    @patch("posthog.models.exported_asset.UPLOAD_PART_SIZE", 1)
+    @patch("posthog.models.exported_asset.object_storage")
+    def test_csv_exporter_uploads_pages_as_parts(self, mocked_object_storage) -> None:
+        uploaded_parts = self._mock_multipart_upload(mocked_object_storage)
+        exported_asset = self._create_asset()
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            csv_exporter.export_csv(exported_asset)
+
+        assert len(uploaded_parts) == 3
+        assert b"".join(uploaded_parts.values()) == EXPECTED_CONTENT
+        mocked_object_storage.complete_multipart_upload.assert_called_once_with(
+            exported_asset.content_location, "upload-id", [(1, "etag-1"), (2, "etag-2"), (3, "etag-3")]
+        )
+        assert exported_asset.content is None
+        assert exported_asset.export_progress is None
+
+    @patch("posthog.models.exported_asset.UPLOAD_PART_SIZE", 1)
+    @patch("posthog.models.exported_asset.object_storage")
+    def test_csv_exporter_gzips_across_parts(self, mocked_object_storage) -> None:
+        uploaded_parts = self._mock_multipart_upload(mocked_object_storage)
+        exported_asset = self._create_asset({"compression": "gzip"})
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            csv_exporter.export_csv(exported_asset)
+
+        assert len(uploaded_parts) == 3
+        assert gzip.decompress(b"".join(uploaded_parts.values())) == EXPECTED_CONTENT
+
+    @patch("posthog.models.exported_asset.UPLOAD_PART_SIZE", 1)
+    @patch("posthog.models.exported_asset.object_storage")
+    def test_csv_exporter_resumes_after_failure(self, mocked_object_storage) -> None:
+        uploaded_parts = self._mock_multipart_upload(mocked_object_storage, fail_on_first_upload_of_part=2)
+        first, second, third = self.patched_request.return_value.json.side_effect
+        self.patched_request.return_value.json.side_effect = [first, second, second, third]
+        exported_asset = self._create_asset()
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            with pytest.raises(ObjectStorageError):
+                csv_exporter.export_csv(exported_asset)
+
+            exported_asset.refresh_from_db()
+            assert exported_asset.export_progress["cursor"]["next_url"] == first["next"]
+            assert exported_asset.export_progress["parts"] == [[1, "etag-1"]]
+
+            csv_exporter.export_csv(exported_asset)
+
+        # the second attempt continues from the page after the last uploaded part
+        assert self.patched_request.call_args_list[2].kwargs["url"].startswith(first["next"].split("?")[0])
+        assert b"".join(uploaded_parts[number] for number in sorted(uploaded_parts)) == EXPECTED_CONTENT
+        mocked_object_storage.start_multipart_upload.assert_called_once()
+        assert exported_asset.export_progress is None
+
+    @patch("posthog.models.exported_asset.UPLOAD_PART_SIZE", 1)
+    @patch("posthog.models.exported_asset.object_storage")
+    def test_csv_exporter_aborts_upload_after_last_attempt(self, mocked_object_storage) -> None:
+        self._mock_multipart_upload(mocked_object_storage, fail_on_first_upload_of_part=2)
+        exported_asset = self._create_asset()
+
+        with self.settings(OBJECT_STORAGE_ENABLED=True, OBJECT_STORAGE_EXPORTS_FOLDER="Test-Exports"):
+            with pytest.raises(ObjectStorageError):
+                csv_exporter.export_csv(exported_asset, last_attempt=True)
+
+        mocked_object_storage.abort_multipart_upload.assert_called_once()
+        exported_asset.refresh_from_db()
+        assert exported_asset.export_progress is None
+
+    def _mock_multipart_upload(self, mocked_object_storage: MagicMock, fail_on_first_upload_of_part=None) -> Dict:
+        uploaded_parts: Dict[int, bytes] = {}
+
+        def upload_part(file_name, upload_id, part_number, content):
+            if part_number == fail_on_first_upload_of_part and part_number not in uploaded_parts:
+                uploaded_parts[part_number] = b""
+                raise ObjectStorageError("mock upload failed")
+            uploaded_parts[part_number] = content
+            return f"etag-{part_number}"
+
+        mocked_object_storage.start_multipart_upload.return_value = "upload-id"
+        mocked_object_storage.upload_part.side_effect = upload_part
+        return uploaded_parts
+
     def _split_to_dict(self, url: str) -> Dict[str, Any]:
         first_split_parts = url.split("?")
         assert len(first_split_parts) == 2
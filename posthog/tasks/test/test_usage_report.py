@@ -7,7 +7,8 @@ import pytest
 import structlog
 from dateutil.relativedelta import relativedelta
 from dateutil.tz import tzutc
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 from freezegun import freeze_time
 
@@ -26,7 +27,7 @@ from posthog.models.plugin import PluginConfig
 from posthog.models.sharing_configuration import SharingConfiguration
 from posthog.schema import EventsQuery
 from posthog.session_recordings.test.test_factory import create_snapshot
-from posthog.tasks.usage_report import capture_event, send_all_org_usage_reports
+from posthog.tasks.usage_report import capture_event, get_teams_clickhouse_usage, send_all_org_usage_reports
 from posthog.test.base import (
     APIBaseTest,
     ClickhouseDestroyTablesMixin,
@@ -528,6 +529,26 @@ class UsageReport(APIBaseTest, ClickhouseTestMixin, ClickhouseDestroyTablesMixin
         assert mock_posthog.capture.call_count == 2
         mock_posthog.capture.assert_has_calls(calls, any_order=True)
 
+    @freeze_time("2022-01-10T00:01:00Z")
+    @override_settings(USAGE_REPORT_CACHE_TTL=60)
+    def test_clickhouse_usage_is_cached_for_the_period(self) -> None:
+        cache.clear()
+        period_start = datetime(2022, 1, 9, tzinfo=tzutc())
+        period_end = datetime(2022, 1, 9, 23, 59, 59, tzinfo=tzutc())
+        _create_event(event="$pageview", team=self.team, distinct_id="a", timestamp="2022-01-09T12:00:00Z")
+        flush_persons_and_events()
+
+        usage = get_teams_clickhouse_usage(period_start, period_end)
+        assert usage["teams_with_event_count_in_period"] == {self.team.pk: 1}
+
+        _create_event(event="$pageview", team=self.team, distinct_id="a", timestamp="2022-01-09T13:00:00Z")
+        flush_persons_and_events()
+
+        with patch("posthog.tasks.usage_report.sync_execute") as sync_execute_mock:
+            assert get_teams_clickhouse_usage(period_start, period_end) == usage
+            sync_execute_mock.assert_not_called()
+        cache.clear()
+
 
 class HogQLUsageReport(APIBaseTest, ClickhouseTestMixin, ClickhouseDestroyTablesMixin):
     def test_usage_report_hogql_queries(self) -> None:
@@ -1,12 +1,12 @@
 import dataclasses
 import os
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import (
     Any,
     Dict,
     List,
-    Literal,
     Optional,
     Sequence,
     Tuple,
@@ -19,6 +19,7 @@ import requests
 import structlog
 from dateutil import parser
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connection
 from django.db.models import Count, Q
 from posthoganalytics.client import Client
@@ -29,7 +30,6 @@ from posthog import version_requirement
 from posthog.celery import app
 from posthog.client import sync_execute
 from posthog.cloud_utils import is_cloud
-from posthog.constants import FlagRequestType
 from posthog.logging.timing import timed_log
 from posthog.models import GroupTypeMapping, OrganizationMembership, User
 from posthog.models.dashboard import Dashboard
@@ -341,21 +341,6 @@ def get_teams_with_event_count_in_period(begin: datetime, end: datetime) -> List
     return result
 
 
-@timed_log()
-def get_teams_with_event_count_with_groups_in_period(begin: datetime, end: datetime) -> List[Tuple[int, int]]:
-    result = sync_execute(
-        """
-        SELECT team_id, count(1) as count
-        FROM events
-        WHERE timestamp between %(begin)s AND %(end)s
-        AND ($group_0 != '' OR $group_1 != '' OR $group_2 != '' OR $group_3 != '' OR $group_4 != '')
-        GROUP BY team_id
-    """,
-        {"begin": begin, "end": end},
-    )
-    return result
-
-
 @timed_log()
 def get_teams_with_event_count_by_lib(begin: datetime, end: datetime) -> List[Tuple[int, str, int]]:
     results = sync_execute(
@@ -422,65 +407,165 @@ def get_teams_with_recording_count_total() -> List[Tuple[int, int]]:
 
 
 @timed_log()
-def get_teams_with_hogql_metric(
-    begin: datetime,
-    end: datetime,
-    query_types: List[str],
-    access_method: str = "",
-    metric: Literal["read_bytes", "read_rows", "query_duration_ms"] = "read_bytes",
-) -> List[Tuple[int, int]]:
-    if metric not in ["read_bytes", "read_rows", "query_duration_ms"]:
-        # :TRICKY: Inlined into the query below.
-        raise ValueError(f"Invalid metric {metric}")
+def get_teams_with_event_counts(
+    begin: datetime, month_begin: datetime, end: datetime
+) -> List[Tuple[int, int, int, int]]:
+    "Counts events in the period, in the month and with groups in the period in a single pass over the month"
     result = sync_execute(
-        f"""
-        WITH JSONExtractInt(log_comment, 'team_id') as team_id,
-             JSONExtractString(log_comment, 'query_type') as query_type,
-             JSONExtractString(log_comment, 'access_method') as access_method
-        SELECT team_id, sum({metric}) as count
-        FROM clusterAllReplicas({CLICKHOUSE_CLUSTER}, system.query_log)
-        WHERE (type = 'QueryFinish' OR type = 'ExceptionWhileProcessing')
-          AND is_initial_query = 1
-          AND query_type IN (%(query_types)s)
-          AND query_start_time between %(begin)s AND %(end)s
-          AND access_method = %(access_method)s
+        """
+        SELECT team_id,
+               countIf(timestamp >= %(begin)s) as count_in_period,
+               count(1) as count_in_month,
+               countIf(
+                   timestamp >= %(begin)s
+                   AND ($group_0 != '' OR $group_1 != '' OR $group_2 != '' OR $group_3 != '' OR $group_4 != '')
+               ) as count_with_groups_in_period
+        FROM events
+        WHERE timestamp between %(month_begin)s AND %(end)s
         GROUP BY team_id
     """,
-        {"begin": begin, "end": end, "query_types": query_types, "access_method": access_method},
+        {"begin": begin, "month_begin": month_begin, "end": end},
     )
     return result
 
 
 @timed_log()
-def get_teams_with_feature_flag_requests_count_in_period(
-    begin: datetime, end: datetime, request_type: FlagRequestType
-) -> List[Tuple[int, int]]:
+def get_teams_with_feature_flag_requests_counts(
+    begin: datetime, month_begin: datetime, end: datetime
+) -> List[Tuple[str, int, int, int, int]]:
+    "Sums decide and local evaluation requests in the period and in the month in a single pass"
     # depending on the region, events are stored in different teams
     team_to_query = 1 if get_instance_region() == "EU" else 2
     validity_token = settings.DECIDE_BILLING_ANALYTICS_TOKEN
 
-    target_event = "decide usage" if request_type == FlagRequestType.DECIDE else "local evaluation usage"
-
     result = sync_execute(
         """
-        SELECT distinct_id as team, sum(JSONExtractInt(properties, 'count')) as sum
+        WITH JSONExtractInt(properties, 'count') as request_count
+        SELECT distinct_id as team,
+               sumIf(request_count, event = 'decide usage' AND timestamp >= %(begin)s) as decide_in_period,
+               sumIf(request_count, event = 'decide usage') as decide_in_month,
+               sumIf(request_count, event = 'local evaluation usage' AND timestamp >= %(begin)s) as local_in_period,
+               sumIf(request_count, event = 'local evaluation usage') as local_in_month
         FROM events
-        WHERE team_id = %(team_to_query)s AND event=%(target_event)s AND timestamp between %(begin)s AND %(end)s
+        WHERE team_id = %(team_to_query)s
+        AND event IN ('decide usage', 'local evaluation usage')
+        AND timestamp between %(month_begin)s AND %(end)s
         AND has([%(validity_token)s], replaceRegexpAll(JSONExtractRaw(properties, 'token'), '^"|"$', ''))
         GROUP BY team
     """,
         {
             "begin": begin,
+            "month_begin": month_begin,
             "end": end,
             "team_to_query": team_to_query,
             "validity_token": validity_token,
-            "target_event": target_event,
         },
     )
 
     return result
 
 
+HOGQL_METRIC_QUERY_TYPES = {"hogql": ["hogql_query", "HogQLQuery"], "event_explorer": ["EventsQuery"]}
+HOGQL_METRIC_ACCESS_METHODS = {"app": "", "api": "personal_api_key"}
+HOGQL_METRICS = {"bytes_read": "read_bytes", "rows_read": "read_rows", "duration_ms": "query_duration_ms"}
+# Names of the columns returned by `get_teams_with_hogql_metrics`, e.g. "hogql_app_bytes_read"
+HOGQL_METRIC_COLUMNS = [
+    f"{product}_{access}_{metric}"
+    for product in HOGQL_METRIC_QUERY_TYPES
+    for access in HOGQL_METRIC_ACCESS_METHODS
+    for metric in HOGQL_METRICS
+]
+
+
+@timed_log()
+def get_teams_with_hogql_metrics(begin: datetime, end: datetime) -> List[Tuple[int, ...]]:
+    "Sums every metric in HOGQL_METRIC_COLUMNS in a single pass over the query log"
+    # :TRICKY: Only names from the constants above are inlined into the query
+    metric_columns = ",\n".join(
+        f"sumIf({column}, query_type IN (%({product}_query_types)s) AND access_method = %({access}_access_method)s)"
+        for product in HOGQL_METRIC_QUERY_TYPES
+        for access in HOGQL_METRIC_ACCESS_METHODS
+        for column in HOGQL_METRICS.values()
+    )
+    result = sync_execute(
+        f"""
+        WITH JSONExtractInt(log_comment, 'team_id') as team_id,
+             JSONExtractString(log_comment, 'query_type') as query_type,
+             JSONExtractString(log_comment, 'access_method') as access_method
+        SELECT team_id, {metric_columns}
+        FROM clusterAllReplicas({CLICKHOUSE_CLUSTER}, system.query_log)
+        WHERE (type = 'QueryFinish' OR type = 'ExceptionWhileProcessing')
+          AND is_initial_query = 1
+          AND query_type IN (%(query_types)s)
+          AND query_start_time between %(begin)s AND %(end)s
+          AND access_method IN (%(access_methods)s)
+        GROUP BY team_id
+    """,
+        {
+            "begin": begin,
+            "end": end,
+            "query_types": [query_type for types in HOGQL_METRIC_QUERY_TYPES.values() for query_type in types],
+            "access_methods": list(HOGQL_METRIC_ACCESS_METHODS.values()),
+            **{f"{product}_query_types": types for product, types in HOGQL_METRIC_QUERY_TYPES.items()},
+            **{f"{access}_access_method": method for access, method in HOGQL_METRIC_ACCESS_METHODS.items()},
+        },
+    )
+    return result
+
+
+def get_teams_clickhouse_usage(period_start: datetime, period_end: datetime) -> Dict[str, Dict[int, int]]:
+    """
+    Returns the ClickHouse based counters of all teams, keyed like `all_data` in `send_all_org_usage_reports`.
+
+    Counters sharing a table are computed by the same query, and the queries run concurrently. Results are cached for
+    the period, so that re-runs and reports for single organizations don't query ClickHouse again.
+    """
+    cache_key = f"usage_report_clickhouse_data:{period_start.isoformat()}:{period_end.isoformat()}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    month_start = period_start.replace(day=1)
+    with ThreadPoolExecutor(max_workers=settings.USAGE_REPORT_QUERY_WORKERS) as executor:
+        event_counts = executor.submit(get_teams_with_event_counts, period_start, month_start, period_end)
+        event_count_lifetime = executor.submit(get_teams_with_event_count_lifetime)
+        recording_count_in_period = executor.submit(get_teams_with_recording_count_in_period, period_start, period_end)
+        recording_count_total = executor.submit(get_teams_with_recording_count_total)
+        feature_flag_requests_counts = executor.submit(
+            get_teams_with_feature_flag_requests_counts, period_start, month_start, period_end
+        )
+        hogql_metrics = executor.submit(get_teams_with_hogql_metrics, period_start, period_end)
+
+        data = dict(
+            teams_with_event_count_lifetime=convert_team_usage_rows_to_dict(event_count_lifetime.result()),
+            teams_with_recording_count_in_period=convert_team_usage_rows_to_dict(recording_count_in_period.result()),
+            teams_with_recording_count_total=convert_team_usage_rows_to_dict(recording_count_total.result()),
+            **split_team_usage_columns(
+                event_counts.result(),
+                [
+                    "teams_with_event_count_in_period",
+                    "teams_with_event_count_in_month",
+                    "teams_with_event_count_with_groups_in_period",
+                ],
+            ),
+            **split_team_usage_columns(
+                feature_flag_requests_counts.result(),
+                [
+                    "teams_with_decide_requests_count_in_period",
+                    "teams_with_decide_requests_count_in_month",
+                    "teams_with_local_evaluation_requests_count_in_period",
+                    "teams_with_local_evaluation_requests_count_in_month",
+                ],
+            ),
+            **split_team_usage_columns(
+                hogql_metrics.result(), [f"teams_with_{column}" for column in HOGQL_METRIC_COLUMNS]
+            ),
+        )
+
+    cache.set(cache_key, data, settings.USAGE_REPORT_CACHE_TTL)
+    return data
+
+
 @app.task(ignore_result=True, max_retries=0)
 def capture_report(
     capture_event_name: str, org_id: str, full_report_dict: Dict[str, Any], at_date: Optional[datetime] = None
@@ -520,6 +605,11 @@ def convert_team_usage_rows_to_dict(rows: List[Union[dict, Tuple[int, int]]]) ->
     return team_id_map
 
 
+def split_team_usage_columns(rows: List[Tuple[Any, ...]], keys: List[str]) -> Dict[str, Dict[int, int]]:
+    "Turns rows of team_id followed by one value per key into a map of team_id -> value for every key"
+    return {key: {int(row[0]): row[index + 1] for row in rows} for index, key in enumerate(keys)}
+
+
 @app.task(ignore_result=True, max_retries=3, autoretry_for=(Exception,))
 def send_all_org_usage_reports(
     dry_run: bool = False,
@@ -538,31 +628,9 @@ def send_all_org_usage_reports(
 
     # Clickhouse is good at counting things so we count across all teams rather than doing it one by one
     try:
-        all_data = dict(
-            teams_with_event_count_lifetime=get_teams_with_event_count_lifetime(),
-            teams_with_event_count_in_period=get_teams_with_event_count_in_period(period_start, period_end),
-            teams_with_event_count_in_month=get_teams_with_event_count_in_period(
-                period_start.replace(day=1), period_end
-            ),
-            teams_with_event_count_with_groups_in_period=get_teams_with_event_count_with_groups_in_period(
-                period_start, period_end
-            ),
-            # teams_with_event_count_by_lib=get_teams_with_event_count_by_lib(period_start, period_end),
-            # teams_with_event_count_by_name=get_teams_with_event_count_by_name(period_start, period_end),
-            teams_with_recording_count_in_period=get_teams_with_recording_count_in_period(period_start, period_end),
-            teams_with_recording_count_total=get_teams_with_recording_count_total(),
-            teams_with_decide_requests_count_in_period=get_teams_with_feature_flag_requests_count_in_period(
-                period_start, period_end, FlagRequestType.DECIDE
-            ),
-            teams_with_decide_requests_count_in_month=get_teams_with_feature_flag_requests_count_in_period(
-                period_start.replace(day=1), period_end, FlagRequestType.DECIDE
-            ),
-            teams_with_local_evaluation_requests_count_in_period=get_teams_with_feature_flag_requests_count_in_period(
-                period_start, period_end, FlagRequestType.LOCAL_EVALUATION
-            ),
-            teams_with_local_evaluation_requests_count_in_month=get_teams_with_feature_flag_requests_count_in_period(
-                period_start.replace(day=1), period_end, FlagRequestType.LOCAL_EVALUATION
-            ),
+        all_data = dict(get_teams_clickhouse_usage(period_start, period_end))
+
+        postgres_data = dict(
             teams_with_group_types_total=list(
                 GroupTypeMapping.objects.values("team_id").annotate(total=Count("id")).order_by("team_id")
             ),
@@ -596,95 +664,11 @@ def send_all_org_usage_reports(
                 .annotate(total=Count("id"))
                 .order_by("team_id")
             ),
-            teams_with_hogql_app_bytes_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_bytes",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="",
-            ),
-            teams_with_hogql_app_rows_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_rows",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="",
-            ),
-            teams_with_hogql_app_duration_ms=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="query_duration_ms",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="",
-            ),
-            teams_with_hogql_api_bytes_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_bytes",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="personal_api_key",
-            ),
-            teams_with_hogql_api_rows_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_rows",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="personal_api_key",
-            ),
-            teams_with_hogql_api_duration_ms=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="query_duration_ms",
-                query_types=["hogql_query", "HogQLQuery"],
-                access_method="personal_api_key",
-            ),
-            teams_with_event_explorer_app_bytes_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_bytes",
-                query_types=["EventsQuery"],
-                access_method="",
-            ),
-            teams_with_event_explorer_app_rows_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_rows",
-                query_types=["EventsQuery"],
-                access_method="",
-            ),
-            teams_with_event_explorer_app_duration_ms=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="query_duration_ms",
-                query_types=["EventsQuery"],
-                access_method="",
-            ),
-            teams_with_event_explorer_api_bytes_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_bytes",
-                query_types=["EventsQuery"],
-                access_method="personal_api_key",
-            ),
-            teams_with_event_explorer_api_rows_read=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="read_rows",
-                query_types=["EventsQuery"],
-                access_method="personal_api_key",
-            ),
-            teams_with_event_explorer_api_duration_ms=get_teams_with_hogql_metric(
-                period_start,
-                period_end,
-                metric="query_duration_ms",
-                query_types=["EventsQuery"],
-                access_method="personal_api_key",
-            ),
         )
 
         # The data is all as raw rows which will dramatically slow down the upcoming loop
         # so we convert it to a map of team_id -> value
-        for key, rows in all_data.items():
+        for key, rows in postgres_data.items():
             all_data[key] = convert_team_usage_rows_to_dict(rows)
 
         teams: Sequence[Team] = list(
@@ -4,12 +4,14 @@ from datetime import timedelta
 from typing import Any, Dict, List
 
 import structlog
+from django.conf import settings
 from django.db.models.query import Prefetch
 from django.utils.timezone import now
 
 from posthog.celery import app
 from posthog.client import sync_execute
 from posthog.models.person import Person
+from posthog.models.person.reconciliation import PersonDistinctIdReconciler, PersonReconciler
 
 logger = structlog.get_logger(__name__)
 
@@ -19,6 +21,8 @@ LIMIT = 100000
 BATCH_SIZE = 500
 PERIOD_START = timedelta(hours=1)
 PERIOD_END = timedelta(days=2)
+# Whole tables are compared chunk by chunk for the teams with the most persons in the sample
+CHUNK_CHECK_TEAMS_LIMIT = 50
 
 GET_PERSON_CH_QUERY = """
 SELECT id, version, properties FROM person JOIN (
@@ -66,12 +70,18 @@ def verify_persons_data_in_sync(
             "properties_mismatch": 0,
             "distinct_ids_mismatch": 0,
             "properties_mismatch_same_version": 0,
+            "person_chunks_mismatch": 0,
+            "distinct_id_chunks_mismatch": 0,
         }
     )
     for i in range(0, len(person_data), BATCH_SIZE):
         batch = person_data[i : i + BATCH_SIZE]
         results += _team_integrity_statistics(batch)
 
+    team_counts = Counter(team_id for _, _, team_id in person_data)
+    for team_id, _ in team_counts.most_common(CHUNK_CHECK_TEAMS_LIMIT):
+        results += _team_chunk_statistics(team_id)
+
     if emit_results:
         _emit_metrics(results)
 
@@ -146,6 +156,25 @@ def _team_integrity_statistics(person_data: List[Any]) -> Counter:
     return result
 
 
+def _team_chunk_statistics(team_id: int) -> Counter:
+    "Compares checksums of all persons and distinct ids of the team, catching drift outside of the sampled persons"
+    # :TRICKY: Checksums scan every row of the team, keep that load off the primary where a read replica exists
+    using = "replica" if "replica" in settings.DATABASES else "default"
+    result: Counter = Counter()
+    _, person_chunks = PersonReconciler(team_id).mismatched_chunks(using=using)
+    _, distinct_id_chunks = PersonDistinctIdReconciler(team_id).mismatched_chunks(using=using)
+    result["person_chunks_mismatch"] += len(person_chunks)
+    result["distinct_id_chunks_mismatch"] += len(distinct_id_chunks)
+    if person_chunks or distinct_id_chunks:
+        logger.info(
+            "Found chunks out of sync",
+            team_id=team_id,
+            person_chunks=person_chunks,
+            distinct_id_chunks=distinct_id_chunks,
+        )
+    return result
+
+
 def _emit_metrics(integrity_results: Counter) -> None:
     from statshog.defaults.django import statsd
 
@@ -23,13 +23,16 @@ from posthog.models.person_overrides.sql import (
     PERSON_OVERRIDES_CREATE_TABLE_SQL,
 )
 from posthog.temporal.workflows.squash_person_overrides import (
+    PersonOverrideToDelete,
     QueryInputs,
-    SerializablePersonOverrideToDelete,
     SquashPersonOverridesInputs,
     SquashPersonOverridesWorkflow,
     delete_squashed_person_overrides_from_clickhouse,
     delete_squashed_person_overrides_from_postgres,
     drop_dictionary,
+    drop_person_overrides_to_delete_table,
+    insert_person_overrides_to_delete,
+    iter_person_overrides_to_delete,
     prepare_dictionary,
     prepare_person_overrides,
     select_persons_to_delete,
@@ -276,10 +279,10 @@ async def test_drop_dictionary(query_inputs, activity_environment, person_overri
     assert after == 0
 
 
-get_team_id_old_person_id = operator.attrgetter("team_id", "old_person_id")
+get_person_override_sort_key = operator.attrgetter("team_id", "old_person_id", "latest_created_at")
 
 
-def is_equal_sorted(list_left, list_right, key=get_team_id_old_person_id) -> bool:
+def is_equal_sorted(list_left, list_right, key=get_person_override_sort_key) -> bool:
     """Compare two lists sorted by key are equal.
 
     Useful when we don't care about order.
@@ -300,21 +303,23 @@ async def test_select_persons_to_delete(query_inputs, activity_environment, pers
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
 
-    to_delete = await activity_environment.run(select_persons_to_delete, query_inputs)
+    selected = await activity_environment.run(select_persons_to_delete, query_inputs)
+    to_delete = list(iter_person_overrides_to_delete(query_inputs))
 
     expected = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_override.old_person_id,
             person_override.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
         for team_id, person_overrides in person_overrides_data.items()
         for person_override in person_overrides
     ]
 
+    assert selected == len(expected)
     assert is_equal_sorted(to_delete, expected)
 
 
@@ -334,16 +339,17 @@ async def test_select_persons_to_delete_selects_persons_in_older_partitions(
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
 
-    to_delete = await activity_environment.run(select_persons_to_delete, query_inputs)
+    selected = await activity_environment.run(select_persons_to_delete, query_inputs)
+    to_delete = list(iter_person_overrides_to_delete(query_inputs))
 
     expected = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_override.old_person_id,
             person_override.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
         for team_id, person_overrides in person_overrides_data.items()
         for person_override in person_overrides
@@ -351,19 +357,20 @@ async def test_select_persons_to_delete_selects_persons_in_older_partitions(
 
     expected.extend(
         [
-            SerializablePersonOverrideToDelete(
+            PersonOverrideToDelete(
                 team_id,
                 person_override.old_person_id,
                 person_override.override_person_id,
-                "2019-12-01T00:00:00+00:00",
+                datetime.fromisoformat("2019-12-01T00:00:00+00:00"),
                 1,
-                "2019-12-01T00:00:00+00:00",
+                datetime.fromisoformat("2019-12-01T00:00:00+00:00"),
             )
             for team_id, person_overrides in older_overrides.items()
             for person_override in person_overrides
         ]
     )
 
+    assert selected == len(expected)
     assert is_equal_sorted(to_delete, expected)
 
 
@@ -380,9 +387,10 @@ async def test_select_persons_to_squash_with_empty_table(query_inputs, activity_
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
 
-    to_delete = await activity_environment.run(select_persons_to_delete, query_inputs)
+    selected = await activity_environment.run(select_persons_to_delete, query_inputs)
 
-    assert to_delete == []
+    assert selected == 0
+    assert list(iter_person_overrides_to_delete(query_inputs)) == []
 
 
 @pytest.mark.django_db
@@ -400,9 +408,10 @@ async def test_select_persons_to_squash_with_different_partition(
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
 
-    to_delete = await activity_environment.run(select_persons_to_delete, query_inputs)
+    selected = await activity_environment.run(select_persons_to_delete, query_inputs)
 
-    assert to_delete == []
+    assert selected == 0
+    assert list(iter_person_overrides_to_delete(query_inputs)) == []
 
 
 @pytest.mark.django_db
@@ -442,21 +451,23 @@ async def test_select_persons_to_delete_with_newer_merges(query_inputs, activity
     # Our latest_created_at is before the newer values happened
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
 
-    to_delete = await activity_environment.run(select_persons_to_delete, query_inputs)
+    selected = await activity_environment.run(select_persons_to_delete, query_inputs)
+    to_delete = list(iter_person_overrides_to_delete(query_inputs))
 
     expected = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_override.old_person_id,
             person_override.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
         for team_id, person_overrides in person_overrides_data.items()
         for person_override in person_overrides
     ]
 
+    assert selected == len(expected)
     assert is_equal_sorted(to_delete, expected)
 
 
@@ -543,10 +554,34 @@ async def test_squash_events_partition(query_inputs, activity_environment, perso
 
     await activity_environment.run(prepare_dictionary, query_inputs)
 
-    await activity_environment.run(squash_events_partition, query_inputs)
+    rows_squashed = await activity_environment.run(squash_events_partition, query_inputs)
+
+    await activity_environment.run(drop_dictionary, query_inputs)
+
+    assert rows_squashed == len(events_to_override)
+    assert_events_have_been_overriden(events_to_override, person_overrides_data)
+
+
+@pytest.mark.django_db
+@pytest.mark.asyncio
+async def test_squash_events_partition_skips_squashed_partitions(
+    query_inputs, activity_environment, person_overrides_data, events_to_override
+):
+    """Test partitions without events left to squash are skipped when an activity is retried."""
+    query_inputs.dictionary_name = "exciting_dictionary"
+    query_inputs.partition_ids = ["202001"]
+    query_inputs.latest_created_at = OVERRIDES_CREATED_AT
+    query_inputs.dry_run = False
+
+    await activity_environment.run(prepare_dictionary, query_inputs)
+
+    rows_squashed = await activity_environment.run(squash_events_partition, query_inputs)
+    rows_squashed_on_retry = await activity_environment.run(squash_events_partition, query_inputs)
 
     await activity_environment.run(drop_dictionary, query_inputs)
 
+    assert rows_squashed == len(events_to_override)
+    assert rows_squashed_on_retry == 0
     assert_events_have_been_overriden(events_to_override, person_overrides_data)
 
 
@@ -680,13 +715,13 @@ async def test_delete_squashed_person_overrides_from_clickhouse(
     delete.
     """
     persons_to_delete = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_override.old_person_id,
             person_override.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
         for team_id, person_overrides in person_overrides_data.items()
         for person_override in person_overrides
@@ -694,7 +729,7 @@ async def test_delete_squashed_person_overrides_from_clickhouse(
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
     query_inputs.dry_run = False
-    query_inputs.person_overrides_to_delete = persons_to_delete
+    insert_person_overrides_to_delete(query_inputs, persons_to_delete)
 
     not_overriden_id = uuid4()
     not_overriden_person: PersonOverrideValues = {
@@ -725,13 +760,13 @@ async def test_delete_squashed_person_overrides_from_clickhouse_dry_run(
 ):
     """Test we do not delete person overrides when dry_run=True."""
     persons_to_delete = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_override.old_person_id,
             person_override.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
         for team_id, person_overrides in person_overrides_data.items()
         for person_override in person_overrides
@@ -739,7 +774,7 @@ async def test_delete_squashed_person_overrides_from_clickhouse_dry_run(
     query_inputs.partition_ids = ["202001"]
     query_inputs.latest_created_at = OVERRIDES_CREATED_AT
     query_inputs.dry_run = True
-    query_inputs.person_overrides_to_delete = persons_to_delete
+    insert_person_overrides_to_delete(query_inputs, persons_to_delete)
 
     not_overriden_id = uuid4()
     not_overriden_person: PersonOverrideValues = {
@@ -1008,16 +1043,16 @@ async def test_delete_squashed_person_overrides_from_postgres(
             assert len(overrides) == 1
 
     person_overrides_to_delete = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_overrides.old_person_id,
             person_overrides.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
     ]
-    query_inputs.person_overrides_to_delete = person_overrides_to_delete
+    insert_person_overrides_to_delete(query_inputs, person_overrides_to_delete)
     query_inputs.dry_run = False
 
     await activity_environment.run(delete_squashed_person_overrides_from_postgres, query_inputs)
@@ -1053,16 +1088,16 @@ async def test_delete_squashed_person_overrides_from_postgres_dry_run(
             assert len(overrides) == 1
 
     person_overrides_to_delete = [
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_overrides.old_person_id,
             person_overrides.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
     ]
-    query_inputs.person_overrides_to_delete = person_overrides_to_delete
+    insert_person_overrides_to_delete(query_inputs, person_overrides_to_delete)
     query_inputs.dry_run = True
 
     await activity_environment.run(delete_squashed_person_overrides_from_postgres, query_inputs)
@@ -1123,16 +1158,16 @@ async def test_delete_squashed_person_overrides_from_postgres_with_newer_overrid
 
     person_overrides_to_delete = [
         # We are schedulling for deletion an override with lower version number, so nothing should happen.
-        SerializablePersonOverrideToDelete(
+        PersonOverrideToDelete(
             team_id,
             person_overrides.old_person_id,
             person_overrides.override_person_id,
-            OVERRIDES_CREATED_AT.isoformat(),
+            OVERRIDES_CREATED_AT,
             1,
-            OLDEST_EVENT_AT.isoformat(),
+            OLDEST_EVENT_AT,
         )
     ]
-    query_inputs.person_overrides_to_delete = person_overrides_to_delete
+    insert_person_overrides_to_delete(query_inputs, person_overrides_to_delete)
     query_inputs.dry_run = False
 
     await activity_environment.run(delete_squashed_person_overrides_from_postgres, query_inputs)
@@ -1196,6 +1231,7 @@ async def test_squash_person_overrides_workflow(
             select_persons_to_delete,
             squash_events_partition,
             drop_dictionary,
+            drop_person_overrides_to_delete_table,
             delete_squashed_person_overrides_from_clickhouse,
             delete_squashed_person_overrides_from_postgres,
         ],
@@ -1241,6 +1277,7 @@ async def test_squash_person_overrides_workflow_with_newer_overrides(
             select_persons_to_delete,
             squash_events_partition,
             drop_dictionary,
+            drop_person_overrides_to_delete_table,
             delete_squashed_person_overrides_from_clickhouse,
             delete_squashed_person_overrides_from_postgres,
         ],
@@ -1285,6 +1322,7 @@ async def test_squash_person_overrides_workflow_with_limited_team_ids(
             select_persons_to_delete,
             squash_events_partition,
             drop_dictionary,
+            drop_person_overrides_to_delete_table,
             delete_squashed_person_overrides_from_clickhouse,
             delete_squashed_person_overrides_from_postgres,
         ],
@@ -17,6 +17,7 @@ ACTIVITIES: Sequence[Callable] = [
     delete_squashed_person_overrides_from_clickhouse,
     delete_squashed_person_overrides_from_postgres,
     drop_dictionary,
+    drop_person_overrides_to_delete_table,
     insert_into_s3_activity,
     insert_into_snowflake_activity,
     noop_activity,
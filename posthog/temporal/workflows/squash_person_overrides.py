@@ -1,9 +1,11 @@
+import asyncio
 import contextlib
 import json
+import time
 from collections.abc import Iterator
-from dataclasses import asdict, dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime, timedelta, timezone
-from typing import AsyncIterator, Iterable, NamedTuple
+from typing import AsyncIterator, NamedTuple
 from uuid import UUID
 
 import psycopg2
@@ -11,6 +13,7 @@ from temporalio import activity, workflow
 from temporalio.common import RetryPolicy
 
 from posthog.clickhouse.client.execute import sync_execute
+from posthog.temporal.utils import auto_heartbeater
 from posthog.temporal.workflows.base import PostHogWorkflow
 
 EPOCH = datetime(1970, 1, 1, 0, 0, tzinfo=timezone.utc)
@@ -62,15 +65,56 @@ WHERE
     AND created_at <= %(latest_created_at)s;
 """
 
+COUNT_EVENTS_TO_SQUASH_QUERY = """
+SELECT
+    count()
+FROM
+    {database}.sharded_events
+WHERE
+    _partition_id = %(partition_id)s
+    AND dictHas('{database}.{dictionary_name}', (toInt32(team_id), person_id))
+    {team_id_filter}
+    AND created_at <= %(latest_created_at)s;
+"""
+
 DROP_DICTIONARY_QUERY = """
 DROP DICTIONARY {database}.{dictionary_name};
 """
 
+CREATE_PERSON_OVERRIDES_TO_DELETE_TABLE_QUERY = """
+CREATE TABLE {database}.{table_name} ON CLUSTER {cluster_name} (
+    `team_id` INT,
+    `old_person_id` UUID,
+    `override_person_id` UUID,
+    `latest_created_at` DateTime64(6, 'UTC'),
+    `latest_version` INT,
+    `oldest_event_at` DateTime64(6, 'UTC')
+)
+ENGINE = ReplicatedMergeTree('/clickhouse/tables/{{uuid}}/noshard/{database}.{table_name}', '{{replica}}-{{shard}}')
+ORDER BY (team_id, old_person_id)
+"""
+
+DROP_PERSON_OVERRIDES_TO_DELETE_TABLE_QUERY = """
+DROP TABLE IF EXISTS {database}.{table_name} ON CLUSTER {cluster_name} SYNC
+"""
+
+SELECT_PERSON_OVERRIDES_TO_DELETE_QUERY = """
+SELECT
+    team_id,
+    old_person_id,
+    override_person_id,
+    latest_created_at,
+    latest_version,
+    oldest_event_at
+FROM
+    {database}.{table_name}
+"""
+
 DELETE_SQUASHED_PERSON_OVERRIDES_QUERY = """
 ALTER TABLE
     {database}.person_overrides
 DELETE WHERE
-    old_person_id IN %(old_person_ids)s
+    old_person_id IN (SELECT old_person_id FROM {database}.{table_name})
     AND created_at <= %(latest_created_at)s;
 """
 
@@ -136,31 +180,11 @@ class PersonOverrideToDelete(NamedTuple):
     latest_version: int
     oldest_event_at: datetime
 
-    def _make_serializable(self) -> "SerializablePersonOverrideToDelete":
-        return SerializablePersonOverrideToDelete._make(
-            value.isoformat() if isinstance(value, datetime) else value for value in self
-        )
-
     def is_in_partitions(self, partition_ids: list[str]):
         """Check if this PersonOverrideToDelete's oldest_event_at is in a list of partitions."""
         return self.oldest_event_at.strftime("%Y%m") in partition_ids
 
 
-class SerializablePersonOverrideToDelete(NamedTuple):
-    """A JSON serializable version of PersonOverrideToDelete.
-
-    Only datetime types from PersonOverrideToDelete are not serializable by temporal's JSON
-    encoder.
-    """
-
-    team_id: int
-    old_person_id: UUID
-    override_person_id: UUID
-    latest_created_at: str
-    latest_version: int
-    oldest_event_at: str
-
-
 @dataclass
 class QueryInputs:
     """Inputs for activities that run queries in the SquashPersonOverrides workflow.
@@ -169,19 +193,20 @@ class QueryInputs:
         clickhouse: Inputs required to connect to ClickHouse.
         postgres: Inputs required to connect to Postgres.
         partition_ids: When necessary, the partition ids this query should run on.
-        person_overrides_to_delete: For delete queries, a list of PersonOverrideToDelete.
         database: The database where the query is supposed to run.
         user: Database username required to create a dictionary.
         password: Database password required to create a dictionary.
         dictionary_name: The name for a dictionary used in the join.
+        overrides_to_delete_table_name: The name for a table holding the person overrides to delete
+            once squashed. Keeping them in ClickHouse keeps them out of workflow payloads and history.
         _latest_merged_at: A timestamp representing an upper bound for events to squash. Obtained
             as the latest timestamp of a person merge.
     """
 
     partition_ids: list[str] = field(default_factory=list)
     team_ids: list[int] = field(default_factory=list)
-    person_overrides_to_delete: list[SerializablePersonOverrideToDelete] = field(default_factory=list)
     dictionary_name: str = "person_overrides_join_dict"
+    overrides_to_delete_table_name: str = "person_overrides_to_delete"
     dry_run: bool = True
     _latest_created_at: str | datetime | None = None
 
@@ -202,16 +227,6 @@ class QueryInputs:
         else:
             self._latest_created_at = v
 
-    def iter_person_overides_to_delete(self) -> Iterable[SerializablePersonOverrideToDelete]:
-        """Iterate over SerializablePersonOverrideToDelete ensuring they are of that type.
-
-        Looking at the types, this seems pointless, just iterate over person_overrides_to_delete!
-        However, as Temporal passes inputs to and from activities, namedtuples will be cast to
-        lists. This method thus exists to transform them back into namedtuples.
-        """
-        for person_override_to_delete in self.person_overrides_to_delete:
-            yield SerializablePersonOverrideToDelete(*person_override_to_delete)
-
 
 @activity.defn
 async def prepare_person_overrides(inputs: QueryInputs) -> None:
@@ -272,8 +287,59 @@ async def drop_dictionary(inputs: QueryInputs) -> None:
     )
 
 
+def insert_person_overrides_to_delete(inputs: QueryInputs, persons_to_delete: list[PersonOverrideToDelete]) -> None:
+    """(Re-)create the table of person overrides to delete and insert persons_to_delete into it.
+
+    The table is replicated to every node, like person_overrides, so that mutations on
+    person_overrides can read it no matter which node they run on.
+    """
+    from django.conf import settings
+
+    table_arguments = {
+        "database": settings.CLICKHOUSE_DATABASE,
+        "table_name": inputs.overrides_to_delete_table_name,
+        "cluster_name": settings.CLICKHOUSE_CLUSTER,
+    }
+    sync_execute(DROP_PERSON_OVERRIDES_TO_DELETE_TABLE_QUERY.format(**table_arguments))
+    sync_execute(CREATE_PERSON_OVERRIDES_TO_DELETE_TABLE_QUERY.format(**table_arguments))
+
+    if persons_to_delete:
+        sync_execute(
+            f"INSERT INTO {settings.CLICKHOUSE_DATABASE}.{inputs.overrides_to_delete_table_name} VALUES",
+            [tuple(person_to_delete) for person_to_delete in persons_to_delete],
+        )
+
+
+def iter_person_overrides_to_delete(inputs: QueryInputs) -> Iterator[PersonOverrideToDelete]:
+    """Iterate over the person overrides to delete stored by select_persons_to_delete."""
+    from django.conf import settings
+
+    rows = sync_execute(
+        SELECT_PERSON_OVERRIDES_TO_DELETE_QUERY.format(
+            database=settings.CLICKHOUSE_DATABASE, table_name=inputs.overrides_to_delete_table_name
+        )
+    )
+    for row in rows:
+        yield PersonOverrideToDelete._make(row)
+
+
+@activity.defn
+async def drop_person_overrides_to_delete_table(inputs: QueryInputs) -> None:
+    """DROP the table of person overrides to delete used in the squash workflow."""
+    from django.conf import settings
+
+    activity.logger.info("Dropping TABLE %s", inputs.overrides_to_delete_table_name)
+    sync_execute(
+        DROP_PERSON_OVERRIDES_TO_DELETE_TABLE_QUERY.format(
+            database=settings.CLICKHOUSE_DATABASE,
+            table_name=inputs.overrides_to_delete_table_name,
+            cluster_name=settings.CLICKHOUSE_CLUSTER,
+        )
+    )
+
+
 @activity.defn
-async def select_persons_to_delete(inputs: QueryInputs) -> list[SerializablePersonOverrideToDelete]:
+async def select_persons_to_delete(inputs: QueryInputs) -> int:
     """Select the persons we'll override to lock them in and safely delete afterwards
 
     New overrides may come in while we are executing this workflow, so we need to
@@ -285,8 +351,9 @@ async def select_persons_to_delete(inputs: QueryInputs) -> list[SerializablePers
     is an override in an older partition that is not covered by the current workflow
     we want to keep the override as there could still be events to squash.
 
-    The output of this activity is a dictionary that maps integer team_ids to sets of
-    person ids that are safe to delete. Team_id is used as a filter in later queries.
+    The selected overrides are stored in a ClickHouse table, rather than returned, as there
+    can be far too many of them to pass around in workflow payloads. Returns how many were
+    selected.
     """
     from django.conf import settings
 
@@ -302,7 +369,7 @@ async def select_persons_to_delete(inputs: QueryInputs) -> list[SerializablePers
     if not isinstance(to_delete_rows, list):
         # Could return None if no results or int if this were an insert.
         # Mostly to appease type checker
-        return []
+        to_delete_rows = []
 
     # We need to be absolutely sure which is the oldest event for a given person
     # as we cannot delete persons that have events in the past that aren't being
@@ -340,7 +407,7 @@ async def select_persons_to_delete(inputs: QueryInputs) -> list[SerializablePers
         person_to_delete = person_to_delete._replace(oldest_event_at=min_oldest_event_at)
 
         if person_to_delete.is_in_partitions(inputs.partition_ids):
-            persons_to_delete.append(person_to_delete._make_serializable())
+            persons_to_delete.append(person_to_delete)
         else:
             older_persons_to_delete.append(person_to_delete)
 
@@ -351,18 +418,21 @@ async def select_persons_to_delete(inputs: QueryInputs) -> list[SerializablePers
     persons_to_delete_ids = set(person.old_person_id for person in persons_to_delete)
     persons_to_delete.extend(
         (
-            older_person._make_serializable()
+            older_person
             for older_person in older_persons_to_delete
             if older_person.old_person_id in persons_to_delete_ids
         )
     )
 
-    return persons_to_delete
+    insert_person_overrides_to_delete(inputs, persons_to_delete)
+
+    return len(persons_to_delete)
 
 
 @activity.defn
-async def squash_events_partition(inputs: QueryInputs) -> None:
-    """Execute the squash query for a given partition_id and persons to_override.
+@auto_heartbeater
+async def squash_events_partition(inputs: QueryInputs) -> int:
+    """Execute the squash query for each of the given partition_ids and persons to_override.
 
     As ClickHouse doesn't support an UPDATE ... FROM statement ala PostgreSQL, we must
     do this in 4 basic steps:
@@ -371,16 +441,28 @@ async def squash_events_partition(inputs: QueryInputs) -> None:
     2. Build a DICTIONARY from person_overrides.
     3. Perform ALTER TABLE UPDATE using dictGet to query the DICTIONARY.
     4. Clean up the DICTIONARY once done.
+
+    Each mutation is waited on, heartbeating meanwhile so that a lost worker is noticed quickly.
+    Partitions with no events left to squash are skipped altogether, so a retried activity only
+    squashes what's left. Returns the number of events rewritten.
+
+    Queries run in a separate thread, so that partitions squashed by concurrent activities in
+    the same worker progress in parallel.
     """
     from django.conf import settings
 
     query = SQUASH_EVENTS_QUERY
+    format_arguments = {
+        "database": settings.CLICKHOUSE_DATABASE,
+        "dictionary_name": inputs.dictionary_name,
+        "team_id_filter": "AND team_id in %(team_ids)s" if inputs.team_ids else "",
+    }
 
     latest_created_at = inputs.latest_created_at.timestamp() if inputs.latest_created_at else inputs.latest_created_at
 
-    for partition_id in inputs.partition_ids:
-        activity.logger.info("Executing squash query on partition %s", partition_id)
+    rows_squashed = 0
 
+    for partition_id in inputs.partition_ids:
         parameters = {
             "partition_id": partition_id,
             "team_ids": inputs.team_ids,
@@ -390,19 +472,35 @@ async def squash_events_partition(inputs: QueryInputs) -> None:
             "latest_created_at": latest_created_at,
         }
 
+        rows_to_squash = (
+            await asyncio.to_thread(
+                sync_execute, COUNT_EVENTS_TO_SQUASH_QUERY.format(**format_arguments), parameters
+            )
+        )[0][0]
+        activity.logger.info("Found %s events to squash in partition %s", rows_to_squash, partition_id)
+
         if inputs.dry_run is True:
             activity.logger.info("This is a DRY RUN so nothing will be squashed.")
             activity.logger.info("Would have run query: %s with parameters %s", query, parameters)
             continue
 
-        sync_execute(
-            query.format(
-                database=settings.CLICKHOUSE_DATABASE,
-                dictionary_name=inputs.dictionary_name,
-                team_id_filter="AND team_id in %(team_ids)s" if inputs.team_ids else "",
-            ),
-            parameters,
-        )
+        if rows_to_squash > 0:
+            activity.logger.info("Executing squash query on partition %s", partition_id)
+            start_time = time.monotonic()
+            await asyncio.to_thread(
+                sync_execute, query.format(**format_arguments), parameters, settings={"mutations_sync": 2}
+            )
+            duration = time.monotonic() - start_time
+            rows_squashed += rows_to_squash
+            activity.logger.info(
+                "Squashed %s events in partition %s in %.1f seconds (%.1f events per second)",
+                rows_to_squash,
+                partition_id,
+                duration,
+                rows_to_squash / duration if duration > 0 else rows_to_squash,
+            )
+
+    return rows_squashed
 
 
 @activity.defn
@@ -412,13 +510,9 @@ async def delete_squashed_person_overrides_from_clickhouse(inputs: QueryInputs)
 
     activity.logger.info("Deleting squashed persons from ClickHouse")
 
-    old_person_ids_to_delete = tuple(person.old_person_id for person in inputs.iter_person_overides_to_delete())
-    activity.logger.debug("%s", old_person_ids_to_delete)
-
     query = DELETE_SQUASHED_PERSON_OVERRIDES_QUERY
     latest_created_at = inputs.latest_created_at.timestamp() if inputs.latest_created_at else inputs.latest_created_at
     parameters = {
-        "old_person_ids": old_person_ids_to_delete,
         # We pass this as a timestamp ourselves as clickhouse-driver will drop any microseconds from the datetime.
         # This would cause the latest merge event to be ignored.
         # See: https://github.com/mymarilyn/clickhouse-driver/issues/306
@@ -430,7 +524,13 @@ async def delete_squashed_person_overrides_from_clickhouse(inputs: QueryInputs)
         activity.logger.info("Would have run query: %s with parameters %s", query, parameters)
         return
 
-    sync_execute(query.format(database=settings.CLICKHOUSE_DATABASE), parameters)
+    sync_execute(
+        query.format(database=settings.CLICKHOUSE_DATABASE, table_name=inputs.overrides_to_delete_table_name),
+        parameters,
+        # The subquery reads a table that is replicated just like person_overrides, so every replica
+        # deletes the same rows.
+        settings={"allow_nondeterministic_mutations": 1, "mutations_sync": 2},
+    )
 
 
 @activity.defn
@@ -452,7 +552,7 @@ async def delete_squashed_person_overrides_from_postgres(inputs: QueryInputs) ->
         **settings.DATABASES["default"].get("SSL_OPTIONS", {}),
     ) as connection:
         with connection.cursor() as cursor:
-            for person_override_to_delete in inputs.iter_person_overides_to_delete():
+            for person_override_to_delete in iter_person_overrides_to_delete(inputs):
                 activity.logger.debug("%s", person_override_to_delete)
 
                 cursor.execute(
@@ -563,16 +663,20 @@ class SquashPersonOverridesInputs:
         clickhouse_database: The name of the ClickHouse database where to perform the squash.
         postgres_database: The name of the Postgres database where to delete overrides once done.
         dictionary_name: A name for the JOIN table created for the squash.
+        overrides_to_delete_table_name: A name for the table of overrides to delete after the squash.
         team_ids: List of team ids to squash. If None, will squash all.
         partition_ids: Partitions to squash, preferred over last_n_months.
         last_n_months: Execute the squash on the partitions for the last_n_months.
+        max_concurrent_partitions: How many partitions are squashed at the same time.
         dry_run: If True, queries that mutate or delete data will not execute and instead will be logged.
     """
 
     team_ids: list[int] = field(default_factory=list)
     partition_ids: list[str] | None = None
     dictionary_name: str = "person_overrides_join_dict"
+    overrides_to_delete_table_name: str = "person_overrides_to_delete"
     last_n_months: int = 1
+    max_concurrent_partitions: int = 4
     dry_run: bool = True
 
     def iter_partition_ids(self) -> Iterator[str]:
@@ -691,6 +795,7 @@ class SquashPersonOverridesWorkflow(PostHogWorkflow):
         retry_policy = RetryPolicy(maximum_attempts=3)
         query_inputs = QueryInputs(
             dictionary_name=inputs.dictionary_name,
+            overrides_to_delete_table_name=inputs.overrides_to_delete_table_name,
             team_ids=inputs.team_ids,
             dry_run=inputs.dry_run,
         )
@@ -705,40 +810,68 @@ class SquashPersonOverridesWorkflow(PostHogWorkflow):
             query_inputs._latest_created_at = latest_created_at
             query_inputs.partition_ids = list(inputs.iter_partition_ids())
 
-            persons_to_delete = await workflow.execute_activity(
-                select_persons_to_delete,
-                query_inputs,
-                start_to_close_timeout=timedelta(seconds=60),
-                retry_policy=retry_policy,
-            )
-
-            query_inputs.person_overrides_to_delete = persons_to_delete
+            try:
+                persons_to_delete = await workflow.execute_activity(
+                    select_persons_to_delete,
+                    query_inputs,
+                    start_to_close_timeout=timedelta(seconds=300),
+                    retry_policy=retry_policy,
+                )
 
-            await workflow.execute_activity(
-                squash_events_partition,
-                query_inputs,
-                start_to_close_timeout=timedelta(seconds=300),
-                retry_policy=retry_policy,
-            )
+                # Each partition is squashed by its own activity, so that partitions progress in parallel
+                # and a failure only retries the partition that failed.
+                semaphore = asyncio.Semaphore(inputs.max_concurrent_partitions)
+
+                async def squash_partition(partition_id: str) -> int:
+                    async with semaphore:
+                        return await workflow.execute_activity(
+                            squash_events_partition,
+                            replace(query_inputs, partition_ids=[partition_id]),
+                            # Mutations are waited on, which can take a while for large partitions.
+                            start_to_close_timeout=timedelta(hours=6),
+                            heartbeat_timeout=timedelta(minutes=1),
+                            retry_policy=retry_policy,
+                        )
+
+                squash_started_at = workflow.now()
+                squashed = await asyncio.gather(
+                    *(squash_partition(partition_id) for partition_id in query_inputs.partition_ids)
+                )
+                rows_squashed = sum(squashed)
+                squash_duration = (workflow.now() - squash_started_at).total_seconds()
+
+                workflow.logger.info(
+                    "Squash finished for all requested partitions: %s events in %.1f seconds (%.1f events per second)",
+                    rows_squashed,
+                    squash_duration,
+                    rows_squashed / squash_duration if squash_duration > 0 else rows_squashed,
+                )
+                workflow.logger.info("Running clean up activities")
 
-            workflow.logger.info("Squash finished for all requested partitions, running clean up activities")
+                if persons_to_delete == 0:
+                    workflow.logger.info("No overrides to delete were found, workflow done")
+                    return
 
-            if not persons_to_delete:
-                workflow.logger.info("No overrides to delete were found, workflow done")
-                return
+                await workflow.execute_activity(
+                    delete_squashed_person_overrides_from_clickhouse,
+                    query_inputs,
+                    start_to_close_timeout=timedelta(seconds=300),
+                    retry_policy=retry_policy,
+                )
 
-            await workflow.execute_activity(
-                delete_squashed_person_overrides_from_clickhouse,
-                query_inputs,
-                start_to_close_timeout=timedelta(seconds=300),
-                retry_policy=retry_policy,
-            )
+                await workflow.execute_activity(
+                    delete_squashed_person_overrides_from_postgres,
+                    query_inputs,
+                    start_to_close_timeout=timedelta(seconds=300),
+                    retry_policy=retry_policy,
+                )
 
-            await workflow.execute_activity(
-                delete_squashed_person_overrides_from_postgres,
-                query_inputs,
-                start_to_close_timeout=timedelta(seconds=300),
-                retry_policy=retry_policy,
-            )
+            finally:
+                await workflow.execute_activity(
+                    drop_person_overrides_to_delete_table,
+                    query_inputs,
+                    start_to_close_timeout=timedelta(seconds=60),
+                    retry_policy=retry_policy,
+                )
 
         workflow.logger.info("Done 🎉")
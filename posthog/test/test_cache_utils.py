@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from time import sleep
 from typing import Optional
 from unittest.mock import Mock
 
-from posthog.cache_utils import cache_for
+from freezegun import freeze_time
+
+from posthog.cache_utils import cache_for, instance_memoize
 from posthog.test.base import APIBaseTest
 
 mocked_dependency = Mock()
@@ -28,11 +31,38 @@ def fn_background(number: float) -> int:
     return value
 
 
+@cache_for(timedelta(minutes=1), maxsize=2)
+def fn_bounded(number: int) -> int:
+    return mocked_dependency(number)
+
+
+@cache_for(timedelta(minutes=1))
+def fn_slow(number: int) -> int:
+    sleep(0.2)
+    return mocked_dependency(number)
+
+
+@cache_for(lambda value: timedelta(minutes=1) if value else timedelta(seconds=1))
+def fn_ttl_per_value(number: int) -> int:
+    mocked_dependency(number)
+    return number
+
+
+class Memoized:
+    @instance_memoize(maxsize=2)
+    def double(self, number: int) -> int:
+        return mocked_dependency(number) * 2
+
+
 class TestCacheUtils(APIBaseTest):
     def setUp(self):
         mocked_dependency.reset_mock()
         mocked_dependency.return_value = 1
         order_of_events.reset_mock()
+        fn._cache.clear()
+        fn_bounded._cache.clear()
+        fn_slow._cache.clear()
+        fn_ttl_per_value._cache.clear()
 
     def test_cache_for_with_different_passed_arguments_styles_when_skipping_cache(self) -> None:
         assert 1 == fn(use_cache=False)
@@ -93,3 +123,63 @@ class TestCacheUtils(APIBaseTest):
             "Background task finished",
             "Post refresh call 1",
         ]
+
+    def test_cache_for_expires_values(self) -> None:
+        with freeze_time("2020-01-04T13:01:01Z") as frozen_time:
+            assert 1 == fn(3, use_cache=True)
+            assert 1 == fn(3, use_cache=True)
+            assert mocked_dependency.call_count == 1
+
+            frozen_time.tick(timedelta(seconds=2))
+            assert 1 == fn(3, use_cache=True)
+            assert mocked_dependency.call_count == 2
+
+    def test_cache_for_evicts_least_recently_used_values(self) -> None:
+        fn_bounded(1, use_cache=True)
+        fn_bounded(2, use_cache=True)
+        fn_bounded(1, use_cache=True)
+        fn_bounded(3, use_cache=True)
+
+        assert len(fn_bounded._cache) == 2
+        assert mocked_dependency.call_count == 3
+
+        # 2 was least recently used, so it was evicted
+        fn_bounded(1, use_cache=True)
+        assert mocked_dependency.call_count == 3
+        fn_bounded(2, use_cache=True)
+        assert mocked_dependency.call_count == 4
+
+    def test_cache_for_computes_concurrent_calls_once(self) -> None:
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: fn_slow(1, use_cache=True), range(5)))
+
+        assert results == [1] * 5
+        assert mocked_dependency.call_count == 1
+
+    def test_cache_for_with_ttl_per_value(self) -> None:
+        with freeze_time("2020-01-04T13:01:01Z") as frozen_time:
+            assert fn_ttl_per_value(0, use_cache=True) == 0
+            assert fn_ttl_per_value(1, use_cache=True) == 1
+            assert mocked_dependency.call_count == 2
+
+            frozen_time.tick(timedelta(seconds=2))
+            fn_ttl_per_value(0, use_cache=True)
+            fn_ttl_per_value(1, use_cache=True)
+            # only the empty value expired
+            assert mocked_dependency.call_count == 3
+
+    def test_instance_memoize_is_bounded(self) -> None:
+        memoized = Memoized()
+
+        assert memoized.double(1) == 2
+        assert memoized.double(1) == 2
+        assert mocked_dependency.call_count == 1
+
+        memoized.double(2)
+        memoized.double(3)
+        memoized.double(1)
+        assert mocked_dependency.call_count == 4
+
+        # Memoization is per instance
+        Memoized().double(3)
+        assert mocked_dependency.call_count == 5
@@ -1,4 +1,11 @@
-from posthog.models.element import Element, chain_to_elements, elements_to_string
+from posthog.api.element import ElementSerializer
+from posthog.models.element import (
+    Element,
+    chain_to_elements,
+    chain_to_serialized_elements,
+    elements_to_string,
+    parse_elements_chain,
+)
 from posthog.test.base import BaseTest, ClickhouseTestMixin
 
 
@@ -75,3 +82,38 @@ class TestElement(ClickhouseTestMixin, BaseTest):
         self.assertEqual(elements[0].tag_name, "a")
         self.assertEqual(elements[0].href, "/a-url")
         self.assertEqual(elements[0].attr_class, ["small", "xy:z"])
+
+    def test_serialized_elements_match_serializer(self):
+        elements_string = ";".join(
+            [
+                r'a.small:data-attr="something \" that; could mess up"href="/a-url"nth-child="1"nth-of-type="0"text="bla"',
+                'button.btn.btn-primary:attr_id="submit"nth-child="0"nth-of-type="0"',
+                "div",
+            ]
+        )
+
+        self.assertEqual(
+            chain_to_serialized_elements(elements_string),
+            [ElementSerializer(element).data for element in chain_to_elements(elements_string)],
+        )
+
+    def test_cached_chains_return_independent_elements(self):
+        elements_string = 'a.small:href="/a-url"nth-child="1"nth-of-type="0"prop="value"'
+
+        elements = chain_to_elements(elements_string)
+        elements[0].attr_class.append("changed")
+        elements[0].attributes["prop"] = "changed"
+
+        elements = chain_to_elements(elements_string)
+        self.assertEqual(elements[0].attr_class, ["small"])
+        self.assertEqual(elements[0].attributes, {"prop": "value"})
+        self.assertIs(parse_elements_chain(elements_string), parse_elements_chain(elements_string))
+
+    def test_quoted_values_with_separators_and_newlines(self):
+        elements = chain_to_elements('a:nth-child="0"nth-of-type="0"text="multi\nline; text";span:text="x"')
+
+        self.assertEqual(len(elements), 2)
+        self.assertEqual(elements[0].text, "multi\nline; text")
+        self.assertEqual(elements[0].nth_child, 0)
+        self.assertEqual(elements[1].tag_name, "span")
+        self.assertEqual(elements[1].order, 1)
@@ -5,6 +5,8 @@ import pytest
 from posthog.constants import FlagRequestType
 from posthog.models.feature_flag.feature_flag import FeatureFlag
 from posthog.models.feature_flag.flag_analytics import (
+    RequestCountAggregator,
+    _request_counts,
     find_flags_with_enriched_analytics,
     increment_request_count,
     capture_team_decide_usage,
@@ -13,6 +15,7 @@ from posthog.test.base import BaseTest
 from posthog import redis
 import datetime
 import concurrent.futures
+import time
 from posthog.test.base import _create_event, flush_persons_and_events
 
 
@@ -63,6 +66,68 @@ class TestFeatureFlagAnalytics(BaseTest):
             )
             self.assertEqual(client.hgetall(f"posthog:decide_requests:other"), {})
 
+    @patch("posthog.models.feature_flag.flag_analytics.CACHE_BUCKET_SIZE", 10)
+    @patch("posthog.models.feature_flag.flag_analytics.RequestCountAggregator._ensure_flusher")
+    def test_increment_request_count_batches_writes(self, mock_ensure_flusher):
+        team_id = 3
+        client = redis.get_client()
+
+        with freeze_time("2022-05-07 12:23:07") as frozen_datetime, self.settings(
+            DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL=5
+        ):
+            _request_counts.flush()
+            for _ in range(10):
+                increment_request_count(team_id)
+            increment_request_count(team_id, 2, FlagRequestType.LOCAL_EVALUATION)
+
+            self.assertEqual(client.hgetall(f"posthog:decide_requests:{team_id}"), {})
+
+            frozen_datetime.tick(datetime.timedelta(seconds=5))
+            # counts keep the bucket of when the request happened
+            increment_request_count(team_id)
+            self.assertEqual(client.hgetall(f"posthog:decide_requests:{team_id}"), {})
+
+            # requests don't write to redis, the background thread does
+            mock_ensure_flusher.assert_called()
+            _request_counts.flush()
+
+            self.assertEqual(
+                client.hgetall(f"posthog:decide_requests:{team_id}"), {b"165192618": b"10", b"165192619": b"1"}
+            )
+            self.assertEqual(client.hgetall(f"posthog:local_evaluation_requests:{team_id}"), {b"165192618": b"2"})
+
+    def test_request_counts_are_flushed_in_the_background(self):
+        request_counts = RequestCountAggregator()
+        client = redis.get_client()
+
+        with self.settings(DECIDE_REQUEST_COUNTS_FLUSH_INTERVAL=1):
+            request_counts.add("posthog:decide_requests:3", "165192618", 5)
+            self.assertEqual(client.hgetall("posthog:decide_requests:3"), {})
+
+            for _ in range(50):
+                if client.hgetall("posthog:decide_requests:3"):
+                    break
+                time.sleep(0.1)
+
+        self.assertEqual(client.hgetall("posthog:decide_requests:3"), {b"165192618": b"5"})
+
+    @patch("posthog.models.feature_flag.flag_analytics.MAX_PENDING_REQUEST_COUNTS", 1)
+    def test_increment_request_count_keeps_counts_while_redis_is_down(self):
+        team_id = 3
+        client = redis.get_client()
+
+        with freeze_time("2022-05-07 12:23:07"):
+            with patch("posthog.models.feature_flag.flag_analytics.get_client", side_effect=Exception("redis is down")):
+                increment_request_count(team_id, 3)
+                increment_request_count(team_id, 4)
+                # only one key is kept while redis is down, the other team's count is dropped
+                increment_request_count(team_id + 1, 5)
+
+            _request_counts.flush()
+
+        self.assertEqual(client.hgetall(f"posthog:decide_requests:{team_id}"), {b"13766051": b"7"})
+        self.assertEqual(client.hgetall(f"posthog:decide_requests:{team_id + 1}"), {})
+
     @patch("posthog.models.feature_flag.flag_analytics.CACHE_BUCKET_SIZE", 10)
     def test_capture_team_decide_usage(self):
         mock_capture = MagicMock()
@@ -5,6 +5,7 @@ from unittest.mock import ANY, call, patch
 from urllib.parse import quote
 
 from django.core.cache import cache
+from django.test import TestCase
 from django.utils.timezone import now
 from freezegun.api import freeze_time
 from rest_framework import status
@@ -17,6 +18,8 @@ from posthog.api.test.test_user import create_user
 from posthog.models.instance_setting import override_instance_config
 from posthog.models.personal_api_key import PersonalAPIKey, hash_key_value
 from posthog.models.utils import generate_random_token_personal
+from posthog.rate_limit import SharedRateLimiter
+from posthog.redis import get_client
 from posthog.test.base import APIBaseTest
 
 
@@ -362,3 +365,76 @@ class TestUserAPI(APIBaseTest):
                     )
                     self.assertEqual(response.status_code, status.HTTP_200_OK)
                 assert call("rate_limit_exceeded", tags=ANY) not in incr_mock.mock_calls
+
+
+class TestSharedRateLimiter(TestCase):
+    def setUp(self):
+        super().setUp()
+        get_client().flushall()
+
+    def test_limits_bursts_and_replenishes(self):
+        limiter = SharedRateLimiter(name="test", rate=1, capacity=2, sync_interval=0)
+
+        with freeze_time("2023-01-01T00:00:00Z"):
+            self.assertEqual([limiter.consume("2:alice") for _ in range(3)], [True, True, False])
+            self.assertTrue(limiter.consume("2:bob"))
+
+        with freeze_time("2023-01-01T00:00:01Z"):
+            self.assertEqual([limiter.consume("2:alice") for _ in range(2)], [True, False])
+
+    def test_rate_is_shared_by_all_workers(self):
+        worker = SharedRateLimiter(name="test", rate=1, capacity=2, sync_interval=0)
+        other_worker = SharedRateLimiter(name="test", rate=1, capacity=2, sync_interval=0)
+
+        with freeze_time("2023-01-01T00:00:00Z"):
+            self.assertEqual([worker.consume("2:alice") for _ in range(2)], [True, True])
+
+            # the other worker only learns about the burst when it syncs after its first request
+            self.assertEqual([other_worker.consume("2:alice") for _ in range(2)], [True, False])
+
+    def test_counts_are_synced_to_redis_in_batches(self):
+        limiter = SharedRateLimiter(name="test", rate=1, capacity=100, sync_interval=10)
+
+        with patch.object(limiter, "_sync", wraps=limiter._sync) as sync:
+            with freeze_time("2023-01-01T00:00:00Z") as frozen_time:
+                for _ in range(5):
+                    limiter.consume("2:alice")
+                frozen_time.tick(10)
+                limiter.consume("2:alice")
+
+        self.assertEqual(sync.call_count, 2)
+        stored_arrival_time = float(get_client().get("@posthog/rate-limiter/test/2:alice"))
+        self.assertEqual(stored_arrival_time, limiter._arrival_times["2:alice"])
+
+    @patch("posthog.rate_limit.get_client", side_effect=Exception("redis is down"))
+    def test_limits_locally_when_redis_is_unavailable(self, _):
+        limiter = SharedRateLimiter(name="test", rate=1, capacity=2, sync_interval=0)
+
+        with freeze_time("2023-01-01T00:00:00Z"):
+            self.assertEqual([limiter.consume("2:alice") for _ in range(3)], [True, True, False])
+
+    @patch("posthog.rate_limit.get_client", side_effect=Exception("redis is down"))
+    def test_backs_off_syncing_while_redis_is_unavailable(self, get_client_mock):
+        limiter = SharedRateLimiter(name="test", rate=100, capacity=100, sync_interval=0.5)
+
+        with freeze_time("2023-01-01T00:00:00Z") as frozen_time:
+            limiter.consume("2:alice")
+            self.assertEqual(get_client_mock.call_count, 1)
+
+            # the first retry waits twice the sync interval
+            frozen_time.tick(0.5)
+            limiter.consume("2:alice")
+            self.assertEqual(get_client_mock.call_count, 1)
+
+            frozen_time.tick(0.5)
+            limiter.consume("2:alice")
+            self.assertEqual(get_client_mock.call_count, 2)
+
+            # and the next one twice as long again
+            frozen_time.tick(1)
+            limiter.consume("2:alice")
+            self.assertEqual(get_client_mock.call_count, 2)
+
+            frozen_time.tick(1)
+            limiter.consume("2:alice")
+            self.assertEqual(get_client_mock.call_count, 3)
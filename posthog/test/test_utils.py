@@ -1,10 +1,13 @@
+import gzip
+import json
 from datetime import datetime
 from unittest.mock import call, patch
 
 import pytest
+from django.core.exceptions import RequestDataTooBig
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpRequest
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
 from freezegun import freeze_time
 from rest_framework.request import Request
@@ -15,6 +18,7 @@ from posthog.models import EventDefinition
 from posthog.settings.utils import get_from_env
 from posthog.test.base import BaseTest
 from posthog.utils import (
+    STREAMING_DECODE_MIN_BYTES,
     PotentialSecurityProblemException,
     absolute_uri,
     flatten,
@@ -303,6 +307,34 @@ class TestLoadDataFromRequest(TestCase):
         data = load_data_from_request(post_request)
         self.assertEqual({"what is it": "the decompressed value"}, data)
 
+    def test_decompresses_large_gzipped_body_while_reading_it(self):
+        batch = [{"event": "$snapshot", "properties": {"index": index, "padding": "x" * 100}} for index in range(2000)]
+        # stored without compressing, so that the body is large enough to be streamed
+        body = gzip.compress(json.dumps({"batch": batch}).encode("utf-8"), compresslevel=0)
+        self.assertGreater(len(body), STREAMING_DECODE_MIN_BYTES)
+
+        post_request = RequestFactory().post("/batch/?compression=gzip-js", body, "text/plain")
+
+        with patch("posthog.utils.gzip.decompress") as in_memory_decompress:
+            data = load_data_from_request(post_request)
+
+        in_memory_decompress.assert_not_called()
+        self.assertEqual(data, {"batch": batch})
+
+    def test_loads_streamed_body_more_than_once(self):
+        body = gzip.compress(json.dumps({"token": "x" * STREAMING_DECODE_MIN_BYTES}).encode("utf-8"), compresslevel=0)
+        post_request = RequestFactory().post("/decide/?compression=gzip", body, "text/plain")
+
+        self.assertEqual(load_data_from_request(post_request), load_data_from_request(post_request))
+
+    @override_settings(DATA_UPLOAD_MAX_DECOMPRESSED_SIZE=1000)
+    def test_rejects_body_too_large_once_decompressed(self):
+        body = gzip.compress(json.dumps({"batch": [{"event": "x" * 2000}]}).encode("utf-8"))
+        post_request = RequestFactory().post("/batch/?compression=gzip-js", body, "text/plain")
+
+        with self.assertRaises(RequestDataTooBig):
+            load_data_from_request(post_request)
+
 
 class TestShouldRefresh(TestCase):
     def test_refresh_requested_by_client_with_refresh_true(self):
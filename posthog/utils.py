@@ -27,7 +27,7 @@ from typing import (
     Union,
     cast,
 )
-from urllib.parse import urljoin, urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
 
 import lzstring
 import posthoganalytics
@@ -38,10 +38,12 @@ from dateutil import parser
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import RequestDataTooBig
 from django.db.utils import DatabaseError
 from django.http import HttpRequest, HttpResponse
 from django.template.loader import get_template
 from django.utils import timezone
+from prometheus_client import Counter, Histogram
 from rest_framework.request import Request
 from sentry_sdk import configure_scope
 from sentry_sdk.api import capture_exception
@@ -628,6 +630,23 @@ def base64_decode(data):
     return data.decode("utf8", "surrogatepass").encode("utf-16", "surrogatepass")
 
 
+# Compressed request bodies at least this large are decompressed while being read, instead of read whole first
+STREAMING_DECODE_MIN_BYTES = 64 * 1024
+DECODE_CHUNK_SIZE = 64 * 1024
+DECODE_COMPRESSION_LABELS = ("gzip", "gzip-js", "lz64", "base64")
+
+REQUEST_DECODE_TIME_HISTOGRAM = Histogram(
+    "request_body_decode_seconds",
+    "Time taken to decompress and parse the body of capture and decide requests.",
+    labelnames=["compression"],
+)
+REQUEST_DECODE_BYTES_COUNTER = Counter(
+    "request_body_decode_bytes",
+    "Bytes of capture and decide request bodies, as received and once decompressed.",
+    labelnames=["compression", "stage"],
+)
+
+
 def decompress(data: Any, compression: str):
     if not data:
         return None
@@ -655,14 +674,27 @@ def decompress(data: Any, compression: str):
 
         data = data.encode("utf-16", "surrogatepass").decode("utf-16")
 
-    base64_decoded = None
-    try:
-        base64_decoded = base64_decode(data)
-    except Exception:
-        pass
+    if len(data) > settings.DATA_UPLOAD_MAX_DECOMPRESSED_SIZE:
+        raise RequestDataTooBig("Decompressed request body exceeded settings.DATA_UPLOAD_MAX_DECOMPRESSED_SIZE.")
+
+    return _parse_json(data, compression)
+
+
+def _parse_json(data: Any, compression: str):
+    REQUEST_DECODE_BYTES_COUNTER.labels(compression=_compression_label(compression), stage="decompressed").inc(
+        len(data)
+    )
 
-    if base64_decoded:
-        data = base64_decoded
+    # :TRICKY: Base64 never contains braces, so JSON is parsed right away instead of making a decoded copy first
+    if not _looks_like_json(data):
+        base64_decoded = None
+        try:
+            base64_decoded = base64_decode(data)
+        except Exception:
+            pass
+
+        if base64_decoded:
+            data = base64_decoded
 
     try:
         # parse_constant gets called in case of NaN, Infinity etc
@@ -683,11 +715,71 @@ def decompress(data: Any, compression: str):
     return data
 
 
+def _looks_like_json(data: Any) -> bool:
+    head = data[:16].lstrip()
+    return head[:1] in ("{", "[", b"{", b"[")
+
+
+def _compression_label(compression: str) -> str:
+    if compression == "":
+        return "none"
+    return compression if compression in DECODE_COMPRESSION_LABELS else "other"
+
+
+def _content_length(request) -> int:
+    try:
+        return int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return 0
+
+
+def _can_stream_body(request, compression: str) -> bool:
+    return (
+        request.method == "POST"
+        and request.content_type in ["", "text/plain", "application/json"]
+        and compression in ("gzip", "gzip-js")
+        # once anything read the body, e.g. a middleware, it is already in memory
+        and not getattr(request, "_read_started", True)
+        and _content_length(request) >= STREAMING_DECODE_MIN_BYTES
+    )
+
+
+def _read_gzipped_body(request) -> bytearray:
+    """
+    Decompresses the request body while it is read from the client, so that the compressed body is never held in memory
+    as a whole, and oversized bodies are rejected as soon as they exceed the limits.
+    """
+    if _content_length(request) > settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+        raise RequestDataTooBig("Request body exceeded settings.DATA_UPLOAD_MAX_MEMORY_SIZE.")
+
+    body = bytearray()
+    try:
+        with gzip.GzipFile(fileobj=request, mode="rb") as stream:
+            while chunk := stream.read(DECODE_CHUNK_SIZE):
+                body += chunk
+                if len(body) > settings.DATA_UPLOAD_MAX_DECOMPRESSED_SIZE:
+                    raise RequestDataTooBig(
+                        "Decompressed request body exceeded settings.DATA_UPLOAD_MAX_DECOMPRESSED_SIZE."
+                    )
+    except (EOFError, OSError, zlib.error) as error:
+        raise RequestParsingError("Failed to decompress data. %s" % (str(error)))
+    return body
+
+
 # Used by non-DRF endpoints from capture.py and decide.py (/decide, /batch, /capture, etc)
 def load_data_from_request(request):
+    compression = (
+        request.GET.get("compression") or request.POST.get("compression") or request.headers.get("content-encoding", "")
+    ).lower()
+
+    # :TRICKY: A streamed body can only be read once, but e.g. the decide rate limiter loads the data before the view
+    streamed_body = getattr(request, "_streamed_body", None)
+    stream_body = streamed_body is None and _can_stream_body(request, compression)
+    data = None
     if request.method == "POST":
         if request.content_type in ["", "text/plain", "application/json"]:
-            data = request.body
+            if streamed_body is None and not stream_body:
+                data = request.body
         else:
             data = request.POST.get("data")
     else:
@@ -702,11 +794,16 @@ def load_data_from_request(request):
         # since version 1.20.0 posthog-js adds its version to the `ver` query parameter as a debug signal here
         scope.set_tag("library.version", request.GET.get("ver", "unknown"))
 
-    compression = (
-        request.GET.get("compression") or request.POST.get("compression") or request.headers.get("content-encoding", "")
-    ).lower()
+    label = _compression_label(compression)
+    with REQUEST_DECODE_TIME_HISTOGRAM.labels(compression=label).time():
+        if stream_body:
+            REQUEST_DECODE_BYTES_COUNTER.labels(compression=label, stage="received").inc(_content_length(request))
+            streamed_body = request._streamed_body = _read_gzipped_body(request)
+        if streamed_body is not None:
+            return _parse_json(streamed_body, compression)
 
-    return decompress(data, compression)
+        REQUEST_DECODE_BYTES_COUNTER.labels(compression=label, stage="received").inc(len(data or ""))
+        return decompress(data, compression)
 
 
 class SingletonDecorator:
@@ -967,8 +1064,12 @@ def get_daterange(
 
 
 def get_safe_cache(cache_key: str):
+    from posthog.caching.insight_result_encoding import decode_insight_result, is_encoded_insight_result
+
     try:
         cached_result = cache.get(cache_key)  # cache.get is safe in most cases
+        if is_encoded_insight_result(cached_result):
+            return decode_insight_result(cached_result)
         return cached_result
     except Exception:  # if it errors out, the cache is probably corrupted
         try:
@@ -1087,6 +1188,23 @@ def format_query_params_absolute_url(
     return url_to_format
 
 
+def format_cursor_absolute_url(request: Request, cursor: str, cursor_alias: str = "cursor") -> Optional[str]:
+    "Returns the current url with the given pagination cursor, replacing any offset based pagination"
+    url_to_format = request.build_absolute_uri()
+
+    if not url_to_format:
+        return None
+
+    parsed = urlsplit(url_to_format)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key not in (cursor_alias, "offset")
+    ]
+    query.append((cursor_alias, cursor))
+    return urlunsplit(parsed._replace(query=urlencode(query)))
+
+
 def get_milliseconds_between_dates(d1: dt.datetime, d2: dt.datetime) -> int:
     return abs(int((d1 - d2).total_seconds() * 1000))
 